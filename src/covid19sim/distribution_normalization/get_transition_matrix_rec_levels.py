@@ -18,12 +18,13 @@ import numpy as np
 import os
 import glob
 import yaml
-import pickle
 import warnings
 import logging
 from datetime import datetime
 from collections import defaultdict
 from pathlib import Path
+from covid19sim.utils.utils import load_tracker_data
+
 
 
 def print_title(i, method_dir, to_normalize):
@@ -75,8 +76,7 @@ def get_config_and_data(folder):
             "Taking the first data file `{1}`.".format(folder, data_filenames[0])
         )
 
-    with open(data_filenames[0], "rb") as f:
-        data = pickle.load(f)
+    data = load_tracker_data(data_filenames[0])
 
     if ("intervention_day" not in data) or (data["intervention_day"] < 0):
         raise ValueError(
@@ -126,6 +126,66 @@ ACHES = STR_TO_SYMPTOMS['aches']
 # SWELLING = STR_TO_SYMPTOMS['swelling']
 
 
+#
+# SYMPTOM BITMASKS
+#
+
+
+# The symptoms of a day are encoded as a bitmask of their ids, which fits in a uint64.
+# Progressions and rolling histories are arrays of such bitmasks, and `decode_symptoms`
+# converts a bitmask back to symptoms for the places that need their names.
+N_SYMPTOM_IDS = max(_INT_TO_SYMPTOMS_NAME) + 1
+SYMPTOM_IDS = np.arange(N_SYMPTOM_IDS, dtype=np.uint64)
+SYMPTOM_BITS = np.left_shift(np.uint64(1), SYMPTOM_IDS)
+_INT_TO_SYMPTOMS = {symptom.id: symptom for symptom in STR_TO_SYMPTOMS.values()}
+
+
+def encode_symptoms(symptoms: typing.Iterable[Symptom]) -> int:
+    """Returns the bitmask of a list of symptoms."""
+    mask = 0
+    for symptom in symptoms:
+        mask |= 1 << int(symptom)
+    return mask
+
+
+def decode_symptoms(mask: int) -> typing.List[Symptom]:
+    """Returns the symptoms of a bitmask, sorted by id."""
+    mask = int(mask)
+    symptoms = []
+    while mask:
+        symptom_id = (mask & -mask).bit_length() - 1
+        symptoms.append(_INT_TO_SYMPTOMS[symptom_id])
+        mask &= mask - 1
+    return symptoms
+
+
+def count_symptoms(mask: int) -> int:
+    """Returns the number of symptoms of a bitmask."""
+    return bin(int(mask)).count("1")
+
+
+def encode_progression(progression: typing.List[typing.List[Symptom]]) -> np.ndarray:
+    """Returns the daily symptoms of a progression as an array of bitmasks."""
+    return np.fromiter((encode_symptoms(symptoms) for symptoms in progression),
+                       dtype=np.uint64, count=len(progression))
+
+
+def bitmasks_to_np(masks: np.ndarray) -> np.ndarray:
+    """Returns the multi-hot encoding of an array of bitmasks, with one trailing column per symptom id."""
+    masks = np.asarray(masks, dtype=np.uint64)
+    return ((masks[..., None] >> SYMPTOM_IDS) & np.uint64(1)).astype(np.float64)
+
+
+def drop_symptoms(mask: int, rng: np.random.RandomState, p_dropout: float) -> int:
+    """Drops each symptom of a bitmask with probability `p_dropout`, drawing one number per symptom."""
+    mask = np.uint64(mask)
+    if not mask:
+        return 0
+    bits = SYMPTOM_BITS[(SYMPTOM_BITS & mask) != 0]
+    kept_bits = bits[rng.random_sample(len(bits)) > p_dropout]
+    return int(np.bitwise_or.reduce(kept_bits))
+
+
 class SymptomGroups:
     DROP_IN_GROUPS = [
         [MILD],
@@ -160,17 +220,26 @@ class SymptomGroups:
         [EXTREMELY_SEVERE, TROUBLE_BREATHING, HEAVY_TROUBLE_BREATHING],
     ]
 
+    DROP_IN_BITMASKS = np.array([encode_symptoms(group) for group in DROP_IN_GROUPS], dtype=np.uint64)
+
     @classmethod
-    def sample(cls, rng: np.random.RandomState, p_num_drops: typing.List[int]):
+    def _sample_indices(cls, rng: np.random.RandomState, p_num_drops: typing.List[int]):
         assert len(cls.DROP_IN_GROUPS) >= len(p_num_drops) > 0
         p_num_drops = np.array(p_num_drops) / sum(p_num_drops)
         # Sample the number of symptom groups to drop-in
         num_drops = rng.choice(list(range(1, len(p_num_drops) + 1)),
                                p=p_num_drops)
         # Sample that many symptom groups
-        dropin_groups = rng.choice(cls.DROP_IN_GROUPS,
-                                   size=num_drops, replace=False).tolist()
-        return dropin_groups
+        return rng.choice(len(cls.DROP_IN_GROUPS), size=num_drops, replace=False)
+
+    @classmethod
+    def sample(cls, rng: np.random.RandomState, p_num_drops: typing.List[int]):
+        return [cls.DROP_IN_GROUPS[idx] for idx in cls._sample_indices(rng, p_num_drops)]
+
+    @classmethod
+    def sample_bitmask(cls, rng: np.random.RandomState, p_num_drops: typing.List[int]) -> int:
+        """Same as `sample`, but returns the union of the sampled groups as a bitmask."""
+        return int(np.bitwise_or.reduce(cls.DROP_IN_BITMASKS[cls._sample_indices(rng, p_num_drops)]))
 
 
 #
@@ -1,7 +1,7 @@
 import math
 import numpy as np
 from scipy.stats import gamma, truncnorm
-from covid19sim.epidemiology.symptoms import _get_covid_progression, \
+from covid19sim.epidemiology.symptoms import _get_covid_progression, encode_progression, encode_symptoms, \
     MODERATE, SEVERE, EXTREMELY_SEVERE
 from covid19sim.utils.constants import SECONDS_PER_DAY
 
@@ -251,9 +251,9 @@ def compute_covid_properties(human):
     human.plateau_end_recovery_slope = numerator / denominator
     assert human.plateau_end_recovery_slope >= 0, f"slopes are assumed to be positive for ease of calculation"
 
-    human.covid_progression = []
+    human.covid_progression = encode_progression([])
     if not human.is_asymptomatic:
-        human.covid_progression = _get_covid_progression(human.initial_viral_load, human.viral_load_plateau_start,
+        human.covid_progression = encode_progression(_get_covid_progression(human.initial_viral_load, human.viral_load_plateau_start,
                                                         human.viral_load_plateau_end,
                                                         human.recovery_days, age=human.age,
                                                         incubation_days=human.incubation_days,
@@ -262,14 +262,14 @@ def compute_covid_properties(human):
                                                         extremely_sick=human.can_get_extremely_sick,
                                                         rng=human.rng,
                                                         preexisting_conditions=human.preexisting_conditions,
-                                                        carefulness=human.carefulness)
+                                                        carefulness=human.carefulness))
 
-    all_symptoms = set(symptom for symptoms_per_day in human.covid_progression for symptom in symptoms_per_day)
+    all_symptoms = int(np.bitwise_or.reduce(human.covid_progression))
     # infection ratios
     if human.is_asymptomatic:
         human.infection_ratio = human.conf['ASYMPTOMATIC_INFECTION_RATIO']
 
-    elif sum(x in all_symptoms for x in [MODERATE, SEVERE, EXTREMELY_SEVERE]) > 0:
+    elif all_symptoms & encode_symptoms([MODERATE, SEVERE, EXTREMELY_SEVERE]):
         human.infection_ratio = 1.0
 
     else:
@@ -13,6 +13,7 @@ from orderedset import OrderedSet
 
 from covid19sim.utils.mobility_planner import MobilityPlanner
 from covid19sim.utils.utils import proba_to_risk_fn
+from covid19sim.utils.risk_history import RiskHistoryMap
 from covid19sim.locations.city import PersonalMailboxType
 from covid19sim.locations.hospital import Hospital, ICU
 from collections import deque
@@ -22,7 +23,8 @@ from covid19sim.epidemiology.human_properties import may_develop_severe_illness,
     _get_preexisting_conditions, _get_random_sex, get_carefulness, get_age_bin
 from covid19sim.epidemiology.viral_load import compute_covid_properties, viral_load_for_day
 from covid19sim.epidemiology.symptoms import _get_cold_progression, _get_flu_progression, \
-    _get_allergy_progression, SymptomGroups, SEVERE, EXTREMELY_SEVERE, COUGH
+    _get_allergy_progression, SymptomGroups, SEVERE, EXTREMELY_SEVERE, COUGH, encode_symptoms, \
+    encode_progression, decode_symptoms, drop_symptoms
 from covid19sim.epidemiology.p_infection import get_human_human_p_transmission, infectiousness_delta
 from covid19sim.inference.message_utils import ContactBook, exchange_encounter_messages, RealUserIDType
 from covid19sim.utils.visits import Visits
@@ -33,6 +35,10 @@ from covid19sim.utils.constants import SECONDS_PER_MINUTE, SECONDS_PER_HOUR, SEC
 from covid19sim.utils.constants import NEGATIVE_TEST_RESULT, POSITIVE_TEST_RESULT
 from covid19sim.utils.constants import TEST_TAKEN, RISK_LEVEL_UPDATE, SELF_DIAGNOSIS
 
+_SEVERE_BIT = encode_symptoms([SEVERE])
+_EXTREMELY_SEVERE_BIT = encode_symptoms([EXTREMELY_SEVERE])
+_COUGH_BIT = encode_symptoms([COUGH])
+
 if typing.TYPE_CHECKING:
     from covid19sim.utils.env import Env
     from covid19sim.locations.city import City
@@ -104,9 +110,6 @@ class Human(BaseHuman):
         self.preexisting_conditions = _get_preexisting_conditions(self.age, self.sex, self.rng)  # Which pre-existing conditions does this person have? E.g. COPD, asthma
         self.inflammatory_disease_level = _get_inflammatory_disease_level(self.rng, self.preexisting_conditions, self.conf.get("INFLAMMATORY_CONDITIONS"))  # how many pre-existing conditions are inflammatory (e.g. smoker)
         self.carefulness = get_carefulness(self.age, self.rng, self.conf)  # How careful is this person? Determines their liklihood of contracting Covid / getting really sick, etc
-        self.proba_dropout_symptoms = self.conf["P_DROPOUT_SYMPTOM"]
-        self.proba_dropin_symptoms = self.conf["P_DROPIN_SYMPTOM"]
-        self.proba_report_age_and_sex = self.conf["P_REPORT_AGE_AND_SEX_TO_APP"]
 
         # Illness Properties
         self.is_asymptomatic = self.rng.rand() < self.conf.get("BASELINE_P_ASYMPTOMATIC") - (self.age - 50) * 0.5 / 100  # e.g. 70: baseline-0.1, 20: baseline+0.15
@@ -118,7 +121,7 @@ class Human(BaseHuman):
         # Allergies
         len_allergies = self.rng.normal(1/self.carefulness, 1)   # determines the number of symptoms this persons allergies would present with (if they start experiencing symptoms)
         self.len_allergies = 7 if len_allergies > 7 else math.ceil(len_allergies)
-        self.allergy_progression = _get_allergy_progression(self.rng)  # if this human starts having allergy symptoms, then there is a progression of symptoms over one or multiple days
+        self.allergy_progression = encode_progression(_get_allergy_progression(self.rng))  # bitmasks of symptoms; if this human starts having allergy symptoms, then there is a progression of symptoms over one or multiple days
 
         ### Covid-19 ###
         # Covid-19 properties
@@ -144,28 +147,22 @@ class Human(BaseHuman):
 
         # Symptoms
         self.covid_symptom_start_time = None  # The time when this persons covid symptoms start (requires that they are in infectious state)
-        self.cold_progression = _get_cold_progression(self.age, self.rng, self.carefulness, self.preexisting_conditions, self.can_get_really_sick, self.can_get_extremely_sick) # determines the symptoms that this person would have if they had a cold
-        self.flu_progression = _get_flu_progression(
+        self.cold_progression = encode_progression(_get_cold_progression(self.age, self.rng, self.carefulness, self.preexisting_conditions, self.can_get_really_sick, self.can_get_extremely_sick)) # determines the symptoms that this person would have if they had a cold
+        self.flu_progression = encode_progression(_get_flu_progression(
             self.age, self.rng, self.carefulness, self.preexisting_conditions,
             self.can_get_really_sick, self.can_get_extremely_sick, self.conf.get("AVG_FLU_DURATION")
-        )  # determines the symptoms this person would have if they had the flu
-        self.all_symptoms, self.cold_symptoms, self.flu_symptoms, self.covid_symptoms, self.allergy_symptoms = [], [], [], [], []
-        self.rolling_all_symptoms = deque(
-            [tuple()] * self.conf.get('TRACING_N_DAYS_HISTORY'),
-            maxlen=self.conf.get('TRACING_N_DAYS_HISTORY')
-        )  # stores the ground-truth Covid-19 symptoms this person has on day D (used for our ML predictor and other symptom-based predictors)
-        self.rolling_all_reported_symptoms = deque(
-            [tuple()] * self.conf.get('TRACING_N_DAYS_HISTORY'),
-            maxlen=self.conf.get('TRACING_N_DAYS_HISTORY')
-        )  # stores the Covid-19 symptoms this person had reported in the app until the current simulation day (empty if they do not have the app)
+        ))  # determines the symptoms this person would have if they had the flu
+        self.cold_symptoms, self.flu_symptoms, self.covid_symptoms, self.allergy_symptoms = 0, 0, 0, 0  # bitmasks of today's symptoms per disease
+        self.rolling_all_symptoms = np.zeros(
+            self.conf.get('TRACING_N_DAYS_HISTORY'), dtype=np.uint64
+        )  # bitmasks of the ground-truth Covid-19 symptoms this person has on day D (used for our ML predictor and other symptom-based predictors), most recent first
+        self.rolling_all_reported_symptoms = np.zeros(
+            self.conf.get('TRACING_N_DAYS_HISTORY'), dtype=np.uint64
+        )  # bitmasks of the Covid-19 symptoms this person had reported in the app until the current simulation day (empty if they do not have the app), most recent first
 
         ### App-related ###
         self.has_app = False  # Does this prson have the app
-        time_slot = self.rng.randint(0, 24)  # Assign this person to some timeslot
-        self.time_slots = [
-            int((time_slot + i * 24 / self.conf.get('UPDATES_PER_DAY')) % 24)
-            for i in range(self.conf.get('UPDATES_PER_DAY'))
-        ]  # If people update their risk predictions 4 times per day (every 6 hours) then this code assigns the specific times _this_ person will update
+        self.time_slot = self.rng.randint(0, 24)  # Assign this person to some timeslot (see `time_slots`)
         self.phone_bluetooth_noise = self.rng.rand()  # Error in distance estimation using Bluetooth with a specific type of phone is sampled from a uniform distribution between 0 and 1
 
         # Observed attributes; whether people enter stuff in the app
@@ -185,32 +182,54 @@ class Human(BaseHuman):
         self.healthy_effective_contacts = 0  # A scaled number of the high-risk contacts (under 2m for over 15 minutes) that this person had while healthy
         self.healthy_days = 0
         self.num_contacts = 0  # unscaled number of high-risk contacts
-        self.intervened_behavior = IntervenedBehavior(self, self.env, self.conf) # keeps track of behavior level of human
         self.heuristic_reasons = set() # Defined here so that we remember it's an attribute of human (gets re-initialized daily)
 
         ### Risk prediction ###
-        self.contact_book = ContactBook(tracing_n_days_history=self.conf.get("TRACING_N_DAYS_HISTORY"))  # Used for tracking high-risk contacts (for app-based contact tracing methods)
+        self.contact_book = ContactBook(tracing_n_days_history=self.conf.get("TRACING_N_DAYS_HISTORY"), store=getattr(city, "message_store", None))  # Used for tracking high-risk contacts (for app-based contact tracing methods)
         self.infectiousness_history_map = dict()  # Stores the (predicted) 14-day history of Covid-19 infectiousness (based on viral load and symptoms)
-        self.risk_history_map = dict()  # 14-day risk history (estimated infectiousness) updated inside the human's (current) timeslot
-        self.prev_risk_history_map = dict()  # used to check how the risk changed since the last timeslot
+        # the risk history maps are rows of the city's population-wide matrices, if it has them
+        n_risk_history_days = self.conf.get("TRACING_N_DAYS_HISTORY") + 1
+        self.risk_history_map = RiskHistoryMap(getattr(city, "risk_history_matrix", None), n_days=n_risk_history_days)  # 14-day risk history (estimated infectiousness) updated inside the human's (current) timeslot
+        self.prev_risk_history_map = RiskHistoryMap(getattr(city, "prev_risk_history_matrix", None), n_days=n_risk_history_days)  # used to check how the risk changed since the last timeslot
+        self.reported_symptoms_version = 0  # incremented whenever the reported symptoms change (for dirty tracking)
+        self.risk_inference_inputs = None  # inputs of the latest risk inference, to skip it if they do not change
+        self.risk_inference_output = None  # risk history returned by the latest risk inference
         self.last_sent_update_gaen = 0  # Used for modelling the Googe-Apple Exposure Notification protocol
-        risk_mapping_array = np.array(self.conf.get('RISK_MAPPING'))  # mapping from float risk value to risk level
-        assert len(risk_mapping_array) > 0, "risk mapping must always be defined!"
-        self.proba_to_risk_level_map = proba_to_risk_fn(risk_mapping_array)
-
-        ###Mobility###
-        self.rho = conf['RHO']  # controls mobility (how often this person goes out and visits new places)
-        self.gamma = conf['GAMMA']  # controls mobility (how often this person goes out and visits new places)
 
         self.household, self.location = None, None
         self.obs_hospitalized, self.obs_in_icu = None, None
         self.visits = Visits()  # used to help implement mobility
-        self.last_date = defaultdict(lambda : self.env.initial_timestamp.date())  # used to track the last time this person did various things (like record smptoms)
+        self.last_date = defaultdict(self.env.initial_timestamp.date)  # used to track the last time this person did various things (like record smptoms)
         self.mobility_planner = MobilityPlanner(self, self.env, self.conf)
 
         self.location_leaving_time = self.env.ts_initial + SECONDS_PER_HOUR
         self.location_start_time = self.env.ts_initial
 
+        self.set_runtime_settings()
+
+    def set_runtime_settings(self):
+        """
+        Sets the attributes which depend on settings that don't change the synthesized population, e.g. the risk model
+        or the intervention. It is called again on the humans of a population loaded from the cache, so that they
+        follow the settings of the new simulation (see `covid19sim.utils.population_cache.POPULATION_SYNTHESIS_KEYS`).
+        No random number is drawn here.
+        """
+        self.proba_dropout_symptoms = self.conf["P_DROPOUT_SYMPTOM"]
+        self.proba_dropin_symptoms = self.conf["P_DROPIN_SYMPTOM"]
+        self.proba_report_age_and_sex = self.conf["P_REPORT_AGE_AND_SEX_TO_APP"]
+        self.time_slots = [
+            int((self.time_slot + i * 24 / self.conf.get('UPDATES_PER_DAY')) % 24)
+            for i in range(self.conf.get('UPDATES_PER_DAY'))
+        ]  # If people update their risk predictions 4 times per day (every 6 hours) then this code assigns the specific times _this_ person will update
+        self.intervened_behavior = IntervenedBehavior(self, self.env, self.conf) # keeps track of behavior level of human
+        risk_mapping_array = np.array(self.conf.get('RISK_MAPPING'))  # mapping from float risk value to risk level
+        assert len(risk_mapping_array) > 0, "risk mapping must always be defined!"
+        self.proba_to_risk_level_map = proba_to_risk_fn(risk_mapping_array)
+
+        ###Mobility###
+        self.rho = self.conf['RHO']  # controls mobility (how often this person goes out and visits new places)
+        self.gamma = self.conf['GAMMA']  # controls mobility (how often this person goes out and visits new places)
+
     def assign_household(self, location):
         if location is not None:
             self.household = location
@@ -283,7 +302,7 @@ class Human(BaseHuman):
         Returns:
             bool: True if the human is very sick, false otherwise
         """
-        return self.can_get_really_sick and SEVERE in self.symptoms
+        return self.can_get_really_sick and bool(self.symptoms_bitmask & _SEVERE_BIT)
 
     @property
     def is_extremely_sick(self):
@@ -294,8 +313,7 @@ class Human(BaseHuman):
             bool: True if the human is extremely sick, false otherwise
         """
 
-        return self.can_get_extremely_sick and (SEVERE in self.symptoms or
-                                                EXTREMELY_SEVERE in self.symptoms)
+        return self.can_get_extremely_sick and bool(self.symptoms_bitmask & (_SEVERE_BIT | _EXTREMELY_SEVERE_BIT))
 
     @property
     def viral_load(self):
@@ -324,7 +342,7 @@ class Human(BaseHuman):
         severity_multiplier = 1
         if 'immuno-compromised' in self.preexisting_conditions:
             severity_multiplier += self.conf['IMMUNOCOMPROMISED_SEVERITY_MULTIPLIER_ADDITION']
-        if COUGH in self.symptoms:
+        if self.symptoms_bitmask & _COUGH_BIT:
             severity_multiplier += self.conf['COUGH_SEVERITY_MULTIPLIER_ADDITION']
         return severity_multiplier
 
@@ -343,18 +361,23 @@ class Human(BaseHuman):
         return self.get_infectiousness_for_day(self.env.now, self.is_infectious)
 
     @property
-    def symptoms(self):
-        """ Symptoms accessor"""
+    def symptoms_bitmask(self):
+        """ Bitmask of today's symptoms """
         # TODO: symptoms should not be updated here.
         #  Explicit call to Human.update_symptoms() should be required
         self.update_symptoms()
-        return self.rolling_all_symptoms[0]
+        return int(self.rolling_all_symptoms[0])
+
+    @property
+    def symptoms(self):
+        """ Symptoms accessor"""
+        return decode_symptoms(self.symptoms_bitmask)
 
     @property
     def reported_symptoms(self):
         """ Reported symptoms accessor"""
         self.update_reported_symptoms()
-        return self.rolling_all_reported_symptoms[0]
+        return decode_symptoms(self.rolling_all_reported_symptoms[0])
 
     @property
     def all_reported_symptoms(self):
@@ -370,7 +393,7 @@ class Human(BaseHuman):
         # TODO: symptoms should not be updated here.
         # Explicit call to Human.update_reported_symptoms() should be required
         self.update_reported_symptoms()
-        return set(symptom for symptoms in self.rolling_all_reported_symptoms for symptom in symptoms)
+        return set(decode_symptoms(np.bitwise_or.reduce(self.rolling_all_reported_symptoms)))
 
     def update_symptoms(self):
         """
@@ -385,32 +408,30 @@ class Human(BaseHuman):
         if self.has_cold:
             t = self.days_since_cold
             if t < len(self.cold_progression):
-                self.cold_symptoms = self.cold_progression[t]
+                self.cold_symptoms = int(self.cold_progression[t])
             else:
-                self.cold_symptoms = []
+                self.cold_symptoms = 0
 
         if self.has_flu:
             t = self.days_since_flu
             if t < len(self.flu_progression):
-                self.flu_symptoms = self.flu_progression[t]
+                self.flu_symptoms = int(self.flu_progression[t])
             else:
-                self.flu_symptoms = []
+                self.flu_symptoms = 0
 
         if self.has_covid and not self.is_asymptomatic:
             t = self.days_since_covid
             if self.is_removed or t >= len(self.covid_progression):
-                self.covid_symptoms = []
+                self.covid_symptoms = 0
             else:
-                self.covid_symptoms = self.covid_progression[t]
+                self.covid_symptoms = int(self.covid_progression[t])
 
         if self.has_allergy_symptoms:
-            self.allergy_symptoms = self.allergy_progression[0]
+            self.allergy_symptoms = int(self.allergy_progression[0])
 
-        all_symptoms = self.flu_symptoms + self.cold_symptoms + self.allergy_symptoms + self.covid_symptoms
-        # self.new_symptoms = list(all_symptoms - set(self.all_symptoms))
-        # TODO: remove self.all_symptoms in favor of self.rolling_all_symptoms[0]
-        self.all_symptoms = OrderedSet(all_symptoms)
-        self.rolling_all_symptoms.appendleft(self.all_symptoms)
+        # shift the history by one day, today's symptoms go first
+        self.rolling_all_symptoms[1:] = self.rolling_all_symptoms[:-1]
+        self.rolling_all_symptoms[0] = self.flu_symptoms | self.cold_symptoms | self.allergy_symptoms | self.covid_symptoms
         self.city.tracker.track_symptoms(self)
 
     def update_reported_symptoms(self):
@@ -424,12 +445,13 @@ class Human(BaseHuman):
 
         self.last_date['reported_symptoms'] = current_date
 
-        reported_symptoms = set([s for s in self.rolling_all_symptoms[0] if self.rng.random() > self.proba_dropout_symptoms])
+        reported_symptoms = drop_symptoms(self.rolling_all_symptoms[0], self.rng, self.proba_dropout_symptoms)
         if self.rng.random() < self.proba_dropin_symptoms:
             # Drop some bad boys in
-            dropped_in_symptoms = SymptomGroups.sample(self.rng, self.conf["P_NUM_DROPIN_GROUPS"])
-            reported_symptoms = reported_symptoms.union(set([s for s in dropped_in_symptoms for s in s]))
-        self.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+            reported_symptoms |= SymptomGroups.sample_bitmask(self.rng, self.conf["P_NUM_DROPIN_GROUPS"])
+        self.rolling_all_reported_symptoms[1:] = self.rolling_all_reported_symptoms[:-1]
+        self.rolling_all_reported_symptoms[0] = reported_symptoms
+        self.reported_symptoms_version += 1
         self.city.tracker.track_symptoms(self)
 
     @property
@@ -575,10 +597,11 @@ class Human(BaseHuman):
             # (assumption) those who self-diagnose gets a test
             self_diagnosis_and_should_get_tested = False
             SUSPICIOUS_SYMPTOMS = set(self.conf['GET_TESTED_SYMPTOMS_CHECKED_BY_SELF'])
+            symptoms = self.symptoms
             if (
-                SEVERE in self.symptoms
-                or EXTREMELY_SEVERE in self.symptoms
-                or (set(self.symptoms) & SUSPICIOUS_SYMPTOMS)
+                SEVERE in symptoms
+                or EXTREMELY_SEVERE in symptoms
+                or (set(symptoms) & SUSPICIOUS_SYMPTOMS)
             ):
                 self_diagnosis_and_should_get_tested = self.rng.rand() < self.conf['P_TEST_SEVERE_OR_SUSPICIOUS']
             else:
@@ -611,7 +634,7 @@ class Human(BaseHuman):
         # greater than incubation_days.
         # Note: it doesn't count symptom start time from environmental infection or asymptomatic/presymptomatic infections
         # reference is in city.tracker.track_serial_interval.__doc__
-        if self.is_incubated and self.covid_symptom_start_time is None and any(self.symptoms):
+        if self.is_incubated and self.covid_symptom_start_time is None and self.symptoms_bitmask:
             self.covid_symptom_start_time = self.env.timestamp
             self.city.tracker.track_serial_interval(self.name)
 
@@ -626,7 +649,7 @@ class Human(BaseHuman):
             # when the person has recovered; currently not reset
             # self.reset_test_result()
             self.infection_timestamp = None
-            self.all_symptoms, self.covid_symptoms = [], []
+            self.covid_symptoms = 0
             if self.never_recovers:
                 self.mobility_planner.human_dies_in_next_activity = True
                 return
@@ -728,7 +751,7 @@ class Human(BaseHuman):
             infector.n_infectious_contacts += 1
             infectee._get_infected(initial_viral_load=infector.rng.random())
             if infectee_msg is not None:  # could be None if we are not currently tracing
-                infectee_msg._exposition_event = True
+                infectee.contact_book.flag_exposition(infectee_msg)
         else:
             infector, infectee = None, None
 
@@ -759,15 +782,17 @@ class Human(BaseHuman):
 
         curr_day_set = set(self.risk_history_map.keys())
         prev_day_set = set(self.prev_risk_history_map.keys())
-        day_set_diff = curr_day_set.symmetric_difference(prev_day_set)
+        expected_history_len = self.conf.get("TRACING_N_DAYS_HISTORY")
+        # note: the risk history rings may already have evicted the day that fell out of the history
+        day_set_diff = {day_idx for day_idx in curr_day_set.symmetric_difference(prev_day_set)
+                        if current_day_idx - day_idx <= expected_history_len}
         assert not day_set_diff or day_set_diff == {current_day_idx}, \
             "1st timeslot should have single-day-diff, otherwise no diff, what is this?"
         history_day_idxs = curr_day_set | prev_day_set
-        expected_history_len = self.conf.get("TRACING_N_DAYS_HISTORY")
         for day_idx in history_day_idxs:
             assert day_idx <= current_day_idx, "...we're looking into the future now?"
             if current_day_idx - day_idx > expected_history_len:
-                del self.risk_history_map[day_idx]
+                self.risk_history_map.pop(day_idx, None)
                 if day_idx in self.prev_risk_history_map:
                     del self.prev_risk_history_map[day_idx]
         # ready for the day now; prepare the prev risk entry in case we need a quick diff
@@ -856,17 +881,17 @@ class Human(BaseHuman):
         if (self.has_cold and
             self.days_since_cold >= len(self.cold_progression)):
             self.cold_timestamp = None
-            self.cold_symptoms = []
+            self.cold_symptoms = 0
 
         if (self.has_flu and
             self.days_since_flu >= len(self.flu_progression)):
             self.flu_timestamp = None
-            self.flu_symptoms = []
+            self.flu_symptoms = 0
 
         if (self.has_allergy_symptoms and
             self.days_since_allergies >= len(self.allergy_progression)):
             self.allergy_timestamp = None
-            self.allergy_symptoms = []
+            self.allergy_symptoms = 0
 
     def catch_other_disease_at_random(self):
         # BUG: Is it intentional that if a random cold is caught, then one
@@ -907,7 +932,7 @@ class Human(BaseHuman):
         self.flu_timestamp = None
         self.allergy_timestamp = None
         self.recovered_timestamp = datetime.datetime.max
-        self.all_symptoms, self.covid_symptoms = [], []
+        self.covid_symptoms = 0
         # important to remove this human from the location or else there will be sampled interactions
         if self in self.location.humans:
             self.location.remove_human(self)
@@ -926,16 +951,21 @@ class Human(BaseHuman):
         # (delete) remove intervention_start
         self.update_recommendations_level(intervention_start=True)
 
-    def run(self):
+    def run(self, previous_activity=None, next_activity=None):
         """
         Transitions `self` from one `Activity` to other
         Note: use -O command line option to avoid checking for assertions
 
+        Args:
+            previous_activity (covid19sim.utils.mobility_planner.Activity, optional): last activity of `self`
+            next_activity (covid19sim.utils.mobility_planner.Activity, optional): activity to start with. Defaults to the next activity in the schedule.
+
         Yields:
             simpy.events.Event:
         """
 
-        previous_activity, next_activity = None, self.mobility_planner.get_next_activity()
+        if next_activity is None:
+            next_activity = self.mobility_planner.get_next_activity()
         while True:
 
             #
@@ -945,6 +975,11 @@ class Human(BaseHuman):
             #
             if next_activity.location is not None:
 
+                # the activity takes place in another shard, which carries on with `self` (see `covid19sim.locations.sharding`)
+                if self.city.shard is not None and not self.city.shard.owns(next_activity.location):
+                    self.city.shard.send_away(self, previous_activity, next_activity)
+                    return
+
                 # (debug) to print the schedule for someone
                 # if self.name == "human:77":
                 #       print("A\t", self.env.timestamp, self, next_activity)
@@ -1007,7 +1042,7 @@ class Human(BaseHuman):
         else:
             return round(self.lon + self.rng.normal(0, 10))
 
-    def transition_to(self, next_activity, previous_activity):
+    def transition_to(self, next_activity, previous_activity, duration=None):
         """
         Enter/Exit human to/from a `location` for some `duration`.
         Once human is at a location, encounters are sampled.
@@ -1018,24 +1053,25 @@ class Human(BaseHuman):
         Args:
             next_activity (covid19sim.utils.mobility_planner.Acitvity): next activity to do
             previous_activity (covid19sim.utils.mobility_planner.Acitvity): previous activity where human was
+            duration (float, optional): seconds to stay at the location. Defaults to the duration of `next_activity`.
 
         Yields:
             (simpy.events.Timeout)
         """
         # print("before", self.env.timestamp, self, location, duration)
         location = next_activity.location
-        duration = next_activity.duration
+        if duration is None:
+            duration = next_activity.duration
         type_of_activity = next_activity.name
 
         # track transitions & locations visited
         self.city.tracker.track_mobility(previous_activity, next_activity, self)
 
-        # add human to the location
+        # add human to the location (times are set first because the location records them on arrival)
         self.location = location
-        location.add_human(self)
-
         self.location_start_time = self.env.now
         self.location_leaving_time = self.location_start_time + duration
+        location.add_human(self)
 
         # (WIP) check if human needs a test if it's a hospital
         # self.check_if_needs_covid_test(at_hospital=isinstance(location, (Hospital, ICU)))
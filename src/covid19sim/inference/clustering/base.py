@@ -77,11 +77,133 @@ class ClusterBase:
         """Returns the list of timestamps for which this cluster possesses at least one encounter."""
         raise NotImplementedError
 
+    def get_daily_encounters(self) -> typing.Dict[datetime.date, typing.Tuple[int, bool]]:
+        """Returns the number of encounters of this cluster on each day, and their exposition flag.
+
+        These are the values of the embeddings (see `get_cluster_embedding` in old compat mode) and
+        expositions of the cluster for each day on which it has encounters.
+        """
+        raise NotImplementedError
+
     def get_encounter_count(self) -> int:
         """Returns the number of encounters aggregated inside this cluster."""
         raise NotImplementedError
 
 
+class ClusterEmbeddingBuffer:
+    """Columnar store holding one row per (cluster, day) pair of the embeddings of a manager.
+
+    The rows of a cluster are (re)written when the manager adds or updates it, and dropped when the
+    cluster is merged or cleaned up, so that the embeddings and expositions arrays are gathered from
+    the columns without visiting the clusters. Rows stay contiguous: the last row is moved into the
+    hole left by a dropped one. Clusters are identified by their object id, so the store is rebuilt
+    from the clusters when the manager is unpickled.
+    """
+
+    def __init__(self, capacity: int = 64):
+        self.capacity = capacity
+        # cluster id, risk level, encounter count, day (as a proleptic Gregorian ordinal)
+        self.rows = np.empty((capacity, 4), dtype=np.int64)
+        self.expositions = np.empty(capacity, dtype=bool)
+        self.slots = np.empty(capacity, dtype=np.int64)  # slot of the cluster owning each row
+        self.size = 0
+        self._slots: typing.Dict[int, int] = {}  # id of each cluster => its slot
+        self._slot_rows: typing.Dict[int, typing.List[int]] = {}  # slot => rows of its cluster
+        self._free_slots: typing.List[int] = []
+        self._n_slots = 0
+
+    def __reduce__(self):
+        # object ids do not survive pickling, and the rows are rebuilt from the clusters anyway
+        return ClusterEmbeddingBuffer, ()
+
+    def __len__(self):
+        """Returns the number of clusters whose rows are in the store."""
+        return len(self._slots)
+
+    def set_cluster(self, cluster: ClusterBase):
+        """Writes the rows of a new cluster, or replaces those of a cluster that was updated."""
+        slot = self._slots.get(id(cluster))
+        if slot is None:
+            slot = self._free_slots.pop() if self._free_slots else self._n_slots
+            self._n_slots = max(self._n_slots, slot + 1)
+            self._slots[id(cluster)] = slot
+        else:
+            self._drop_rows(slot)
+        rows = []
+        for day, (encounter_count, exposition) in cluster.get_daily_encounters().items():
+            if not encounter_count:
+                continue
+            if self.size == self.capacity:
+                self._grow()
+            row = self.size
+            self.rows[row] = (cluster.cluster_id, cluster.risk_level, encounter_count, day.toordinal())
+            self.expositions[row] = exposition
+            self.slots[row] = slot
+            rows.append(row)
+            self.size += 1
+        self._slot_rows[slot] = rows
+
+    def remove_cluster(self, cluster: ClusterBase):
+        """Drops the rows of a cluster that was merged into another one or cleaned up."""
+        slot = self._slots.pop(id(cluster))
+        self._drop_rows(slot)
+        del self._slot_rows[slot]
+        self._free_slots.append(slot)
+
+    def _drop_rows(self, slot: int):
+        for row in sorted(self._slot_rows[slot], reverse=True):
+            last_row = self.size - 1
+            if row != last_row:
+                self.rows[row] = self.rows[last_row]
+                self.expositions[row] = self.expositions[last_row]
+                self.slots[row] = self.slots[last_row]
+                moved_rows = self._slot_rows[int(self.slots[row])]
+                moved_rows[moved_rows.index(last_row)] = row
+            self.size -= 1
+        self._slot_rows[slot] = []
+
+    def _grow(self):
+        self.capacity *= 2
+        self.rows = np.resize(self.rows, (self.capacity, 4))
+        self.expositions = np.resize(self.expositions, self.capacity)
+        self.slots = np.resize(self.slots, self.capacity)
+
+    def get_arrays(
+            self,
+            clusters: typing.Sequence[ClusterBase],
+            day_offsets: typing.Dict[datetime.date, int],
+    ) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns the embeddings and expositions arrays of the clusters on the given days.
+
+        The (cluster id, risk level, encounter count, day offset) rows go from the oldest day to the
+        latest one, and follow the order of the clusters within a day.
+
+        Args:
+            clusters: the clusters of the manager, in order; their rows must be up-to-date.
+            day_offsets: day => number of days between that day and the latest refresh timestamp.
+        """
+        assert len(self._slots) == len(clusters), "the embedding rows are out of sync with the clusters"
+        if not day_offsets:
+            return np.asarray([]), np.asarray([])
+        first_day = min(day_offsets).toordinal()
+        offsets_by_day = np.empty(max(day_offsets).toordinal() - first_day + 1, dtype=np.int64)
+        for day, day_offset in day_offsets.items():
+            offsets_by_day[day.toordinal() - first_day] = day_offset
+        days = self.rows[:self.size, 3]
+        rows = np.flatnonzero((days >= first_day) & (days < first_day + len(offsets_by_day)))
+        if not len(rows):
+            return np.asarray([]), np.asarray([])
+        positions = np.empty(self._n_slots, dtype=np.int64)
+        for position, cluster in enumerate(clusters):
+            positions[self._slots[id(cluster)]] = position
+        offsets = offsets_by_day[days[rows] - first_day]
+        order = np.lexsort((positions[self.slots[rows]], -offsets))
+        rows = rows[order]
+        embeddings = self.rows[rows]
+        embeddings[:, 3] = offsets[order]
+        return embeddings, self.expositions[rows]
+
+
 class ClusterManagerBase:
     """Manages message cluster creation and updates.
 
@@ -106,6 +228,7 @@ class ClusterManagerBase:
     ):
         self._is_being_used = False  # for multithread sanity checks (could be a mutex?)
         self.clusters = []
+        self._embedding_buffer = ClusterEmbeddingBuffer()
         self.max_cluster_id = max_cluster_id
         self.next_cluster_id = 0
         self.latest_refresh_timestamp = TimestampDefault
@@ -115,6 +238,20 @@ class ClusterManagerBase:
         self.generate_backw_compat_embeddings = generate_backw_compat_embeddings
         assert not self.generate_backw_compat_embeddings or self.generate_embeddings_by_timestamp
 
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._embedding_buffer = ClusterEmbeddingBuffer()
+        for cluster in self.clusters:
+            self._embedding_buffer.set_cluster(cluster)
+
+    def _replace_clusters(self, clusters: typing.List[ClusterBase]):
+        """Replaces the cluster list by a subset of it, dropping the embedding rows of the removed clusters."""
+        kept_cluster_ids = {id(cluster) for cluster in clusters}
+        for cluster in self.clusters:
+            if id(cluster) not in kept_cluster_ids:
+                self._embedding_buffer.remove_cluster(cluster)
+        self.clusters = clusters
+
     def cleanup_clusters(self, current_timestamp: TimestampType):
         """Gets rid of clusters that are too old given the current timestamp."""
         to_keep = []
@@ -122,7 +259,7 @@ class ClusterManagerBase:
             update_offset = current_timestamp - cluster.first_update_time
             if update_offset < self.max_history_offset:
                 to_keep.append(cluster)
-        self.clusters = to_keep
+        self._replace_clusters(to_keep)
 
     def _check_if_message_outdated(self, message: GenericMessageType, cleanup: bool = True) -> bool:
         """Returns whether a message is outdated or not. Will also refresh the internal check timestamp."""
@@ -202,23 +339,25 @@ class ClusterManagerBase:
         if cleanup:
             self.cleanup_clusters(self.latest_refresh_timestamp)
         # note: we start the sequence with the OLDEST encounters, and move forward in time
-        output = []
-        target_timestamp = self.latest_refresh_timestamp - self.max_history_offset
-        while target_timestamp <= self.latest_refresh_timestamp:
-            for cluster in self.clusters:
-                embed = cluster.get_cluster_embedding(
-                    current_timestamp=target_timestamp,
-                    include_cluster_id=True,
-                    old_compat_mode=True,
-                )
-                if embed is not None:
-                    output.append([*embed, (self.latest_refresh_timestamp - target_timestamp).days])
-            target_timestamp += datetime.timedelta(days=1)
-        return np.asarray(output)
+        return self._get_embeddings_and_expositions_arrays()[0]
 
     def _get_expositions_array(self) -> np.ndarray:
         """Returns the 'expositions' array for all clusters managed by this object."""
-        raise NotImplementedError
+        if not self.generate_backw_compat_embeddings or not self.generate_embeddings_by_timestamp:
+            raise NotImplementedError  # must keep 1:1 mapping with embedding!
+        # assume the latest refresh timestamp is up-to-date FIXME should we pass in curr timestamp as above?
+        return self._get_embeddings_and_expositions_arrays()[1]
+
+    def _get_embeddings_and_expositions_arrays(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """Returns both the 'embeddings' and 'expositions' arrays, gathered from the embedding buffer."""
+        if not self.generate_backw_compat_embeddings or not self.generate_embeddings_by_timestamp:
+            raise NotImplementedError
+        day_offsets = {}
+        target_timestamp = self.latest_refresh_timestamp - self.max_history_offset
+        while target_timestamp <= self.latest_refresh_timestamp:
+            day_offsets[target_timestamp.date()] = (self.latest_refresh_timestamp - target_timestamp).days
+            target_timestamp += datetime.timedelta(days=1)
+        return self._embedding_buffer.get_arrays(self.clusters, day_offsets)
 
     def _get_homogeneity_scores(self) -> typing.Dict[RealUserIDType, float]:
         """Returns the homogeneity score for all real users in the clusters.
@@ -1,4 +1,6 @@
+import bisect
 import dataclasses
+import datetime
 import numpy as np
 import typing
 
@@ -8,6 +10,8 @@ from covid19sim.inference.clustering.base import ClusterIDType, RealUserIDType,
     ClusterBase, ClusterManagerBase, MessagesArrayType, UpdateMessageBatchType
 from covid19sim.inference.clustering.simple import SimpleCluster, SimplisticClusterManager
 
+CLUSTER_ORDER_KEY_GAP = 1 << 32  # spacing of the order keys of appended clusters (see `BlindClusterManager`)
+
 # TODO: determine whether these class can really derive from their 'simple' counterparts, and
 #       make sure there is no bad stuff happening when calling functions from outside
 
@@ -212,6 +216,11 @@ class BlindCluster(ClusterBase):
         # code is 100% identical in SimpleCluster, use that instead
         return SimpleCluster._get_cluster_exposition_flag(self)
 
+    def get_daily_encounters(self) -> typing.Dict[datetime.date, typing.Tuple[int, bool]]:
+        """Returns the number of encounters of this cluster on each day, and their exposition flag."""
+        # code is 100% identical in SimpleCluster, use that instead
+        return SimpleCluster.get_daily_encounters(self)
+
     def get_timestamps(self) -> typing.List[TimestampType]:
         """Returns the list of timestamps for which this cluster possesses at least one encounter."""
         return [self.first_update_time]  # this impl's clusters always only cover a single timestamp
@@ -221,12 +230,23 @@ class BlindCluster(ClusterBase):
         return len(self.messages)
 
 
+ClusterSignatureType = typing.Tuple[int, TimestampType]
+
+
+def _get_signature(cluster: BlindCluster) -> ClusterSignatureType:
+    return cluster.risk_level, cluster.first_update_time
+
+
 class BlindClusterManager(ClusterManagerBase):
     """Manages message cluster creation and updates.
 
     This class implements a blind clustering strategy where encounters are only combined
     on a timestamp and risk-level basis. This means clusters cannot contain messages with
     different timestamps or risk levels.
+
+    Clusters are indexed by their (risk level, timestamp) signature, so that the clusters matching a
+    message are found without scanning all clusters. The index is kept in sync by the functions
+    which modify the cluster list, and rebuilt if the list is replaced.
     """
 
     clusters: typing.List[BlindCluster]
@@ -246,38 +266,113 @@ class BlindClusterManager(ClusterManagerBase):
             generate_backw_compat_embeddings=generate_backw_compat_embeddings,
             max_cluster_id=max_cluster_id,
         )
+        # signature => clusters with that signature, in the order of the cluster list
+        self._cluster_index: typing.Dict[ClusterSignatureType, typing.List[BlindCluster]] = {}
+        self._indexed_clusters = self.clusters  # the list the index was built for
+        # id of each cluster => its order key, which increases along the list; the keys are spaced so that
+        # the clusters split from another one get a key in between, and are renumbered once there is no room left
+        self._cluster_order: typing.Optional[typing.Dict[int, int]] = {}
+        self._cluster_order_keys: typing.List[int] = []  # the order keys, in the order of the cluster list
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cluster_order"] = None  # object ids do not survive pickling
+        state["_cluster_order_keys"] = []
+        return state
+
+    def _get_cluster_index(self) -> typing.Dict[ClusterSignatureType, typing.List[BlindCluster]]:
+        """Returns the signature index of the clusters, rebuilding it if the cluster list was replaced."""
+        if self._indexed_clusters is not self.clusters:
+            self._cluster_index = {}
+            for cluster in self.clusters:
+                self._cluster_index.setdefault(_get_signature(cluster), []).append(cluster)
+            self._indexed_clusters = self.clusters
+            self._cluster_order = None
+        return self._cluster_index
+
+    def _get_cluster_order_key(self, cluster: BlindCluster) -> int:
+        if self._cluster_order is None:
+            self._cluster_order_keys = [idx * CLUSTER_ORDER_KEY_GAP for idx in range(len(self.clusters))]
+            self._cluster_order = {id(c): key for c, key in zip(self.clusters, self._cluster_order_keys)}
+        return self._cluster_order[id(cluster)]
+
+    def _find_cluster(self, risk_level, timestamp: TimestampType) -> typing.Optional[BlindCluster]:
+        """Returns the first cluster with the given signature, if any."""
+        clusters = self._get_cluster_index().get((risk_level, timestamp))
+        return clusters[0] if clusters else None
+
+    def _append_cluster(self, cluster: BlindCluster):
+        index = self._get_cluster_index()
+        self.clusters.append(cluster)
+        if self._cluster_order is not None:
+            key = self._cluster_order_keys[-1] + CLUSTER_ORDER_KEY_GAP if self._cluster_order_keys else 0
+            self._cluster_order[id(cluster)] = key
+            self._cluster_order_keys.append(key)
+        index.setdefault(_get_signature(cluster), []).append(cluster)
+        self._embedding_buffer.set_cluster(cluster)
+
+    def _insert_cluster_after(self, previous_cluster: BlindCluster, cluster: BlindCluster):
+        self._get_cluster_index()
+        previous_key = self._get_cluster_order_key(previous_cluster)
+        position = bisect.bisect_right(self._cluster_order_keys, previous_key)
+        self.clusters.insert(position, cluster)
+        next_key = self._cluster_order_keys[position] \
+            if position < len(self._cluster_order_keys) else previous_key + 2 * CLUSTER_ORDER_KEY_GAP
+        key = (previous_key + next_key) // 2
+        if key == previous_key:
+            self._cluster_order = None  # no room left between the keys, renumber all the clusters
+        else:
+            self._cluster_order[id(cluster)] = key
+            self._cluster_order_keys.insert(position, key)
+        self._index_cluster(cluster)
+        self._embedding_buffer.set_cluster(cluster)
+
+    def _index_cluster(self, cluster: BlindCluster):
+        """Adds a cluster of the list to the index, after the clusters with the same signature preceding it."""
+        clusters = self._cluster_index.setdefault(_get_signature(cluster), [])
+        key = self._get_cluster_order_key(cluster)
+        insert_idx = len(clusters)
+        while insert_idx > 0 and self._get_cluster_order_key(clusters[insert_idx - 1]) > key:
+            insert_idx -= 1
+        clusters.insert(insert_idx, cluster)
+
+    def _reindex_cluster(self, cluster: BlindCluster, old_signature: ClusterSignatureType):
+        """Moves a cluster in the index after its risk level was updated."""
+        self._embedding_buffer.set_cluster(cluster)
+        if _get_signature(cluster) == old_signature:
+            return
+        clusters = self._cluster_index[old_signature]
+        clusters.pop(next(idx for idx, c in enumerate(clusters) if c is cluster))
+        if not clusters:
+            del self._cluster_index[old_signature]
+        self._index_cluster(cluster)
 
     def _merge_clusters(self):
         """Merges clusters that have the exact same signature (because of updates)."""
-        cluster_matches, reserved_idxs_for_merge = [], []
-        for base_cluster_idx, cluster in enumerate(self.clusters):
-            matched_cluster_idxs = []
-            for target_cluster_idx in reversed(range(base_cluster_idx + 1, len(self.clusters))):
-                if target_cluster_idx in reserved_idxs_for_merge:
-                    continue
-                if cluster.risk_level == self.clusters[target_cluster_idx].risk_level and \
-                        cluster.first_update_time == self.clusters[target_cluster_idx].first_update_time:
-                    matched_cluster_idxs.append(target_cluster_idx)
-            cluster_matches.append(matched_cluster_idxs)
-            reserved_idxs_for_merge.extend(matched_cluster_idxs)
         to_keep = []
-        for base_cluster_idx, (cluster, target_idxs) in enumerate(zip(self.clusters, cluster_matches)):
-            if base_cluster_idx in reserved_idxs_for_merge:
-                continue
-            for target_idx in target_idxs:
-                target_cluster = self.clusters[target_idx]
+        for cluster in self.clusters:
+            clusters = self._get_cluster_index()[_get_signature(cluster)]
+            if clusters[0] is not cluster:
+                continue  # merged in the first cluster of its signature
+            # clusters are merged starting from the last one, as they were before the index existed
+            for target_cluster in reversed(clusters[1:]):
                 cluster.fit_cluster(target_cluster)
+            if len(clusters) > 1:
+                self._embedding_buffer.set_cluster(cluster)
             to_keep.append(cluster)
-        self.clusters = to_keep
+        self._replace_clusters(to_keep)
+        self._cluster_index = {_get_signature(cluster): [cluster] for cluster in to_keep}
+        self._indexed_clusters = self.clusters
+        self._cluster_order = None
 
     def cleanup_clusters(self, current_timestamp: TimestampType):
         """Gets rid of clusters that are too old given the current timestamp."""
-        to_keep = []
-        for cluster_idx, cluster in enumerate(self.clusters):
-            cluster_update_offset = current_timestamp - cluster.first_update_time
-            if cluster_update_offset < self.max_history_offset:
-                to_keep.append(cluster)
-        self.clusters = to_keep
+        to_keep = [
+            cluster for cluster in self.clusters
+            if current_timestamp - cluster.first_update_time < self.max_history_offset
+        ]
+        if len(to_keep) < len(self.clusters):
+            self._replace_clusters(to_keep)  # the index will be rebuilt
 
     def add_messages(
             self,
@@ -296,41 +391,36 @@ class BlindClusterManager(ClusterManagerBase):
         if self._check_if_message_outdated(message, cleanup):
             return
         # blind clustering = we are looking for an exact timestamp/risk level match
-        matched_cluster = None
-        for cluster in self.clusters:
-            if cluster.risk_level == message.risk_level and \
-                    cluster.first_update_time == message.encounter_time:
-                matched_cluster = cluster
-                break
+        matched_cluster = self._find_cluster(message.risk_level, message.encounter_time)
         if matched_cluster is not None:
             matched_cluster.fit_encounter_message(message)
+            self._embedding_buffer.set_cluster(matched_cluster)
         else:
             new_cluster = BlindCluster.create_cluster_from_message(message, self.next_cluster_id)
             self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
-            self.clusters.append(new_cluster)
+            self._append_cluster(new_cluster)
 
     def _add_update_message(self, message: UpdateMessage, cleanup: bool = True):
         """Fits an update message to an existing cluster."""
         if self._check_if_message_outdated(message, cleanup):
             return
-        matched_cluster_idx = None
-        for cluster_idx, cluster in enumerate(self.clusters):
-            if cluster.risk_level == message.old_risk_level and \
-                    cluster.first_update_time == message.encounter_time:
-                matched_cluster_idx = cluster_idx
-                break
-        if matched_cluster_idx is not None:
-            fit_result = self.clusters[matched_cluster_idx].fit_update_message(message)
+        matched_cluster = self._find_cluster(message.old_risk_level, message.encounter_time)
+        if matched_cluster is not None:
+            old_signature = _get_signature(matched_cluster)
+            fit_result = matched_cluster.fit_update_message(message)
             if fit_result is not None:
                 assert isinstance(fit_result, BlindCluster)
                 fit_result.cluster_id = self.next_cluster_id
                 self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
-                self.clusters.insert(matched_cluster_idx + 1, fit_result)
+                self._embedding_buffer.set_cluster(matched_cluster)
+                self._insert_cluster_after(matched_cluster, fit_result)
+            else:
+                self._reindex_cluster(matched_cluster, old_signature)
         else:
             if self.add_orphan_updates_as_clusters:
                 new_cluster = BlindCluster.create_cluster_from_message(message, self.next_cluster_id)
                 self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
-                self.clusters.append(new_cluster)
+                self._append_cluster(new_cluster)
             else:
                 raise AssertionError(f"could not find any proper cluster match for: {message}")
 
@@ -339,25 +429,21 @@ class BlindClusterManager(ClusterManagerBase):
         # we assume all update messages in the batch have the same old/new risk levels, & are not outdated
         assert isinstance(messages, dict) and messages, "missing implementation for non-timestamped batches"
         first_message_key = next(iter(messages.keys()))
-        batch_risk_level = messages[first_message_key][0].old_risk_level
-        batch_encounter_time = messages[first_message_key][0].encounter_time
-        cluster_idx = 0
-        while cluster_idx < len(self.clusters):
-            cluster = self.clusters[cluster_idx]
-            if cluster.risk_level != batch_risk_level or \
-                    cluster.first_update_time != batch_encounter_time:
-                cluster_idx += 1
-                continue
+        batch_signature = (messages[first_message_key][0].old_risk_level,
+                           messages[first_message_key][0].encounter_time)
+        # the matching clusters are visited in list order; new clusters have another signature
+        for cluster in list(self._get_cluster_index().get(batch_signature, [])):
             messages, new_cluster = cluster.fit_update_message_batch(messages)
             if new_cluster is not None:
                 new_cluster.cluster_id = self.next_cluster_id
                 self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
                 # to keep the results identical with/without batching, insert at curr index + 1
-                self.clusters.insert(cluster_idx + 1, new_cluster)
-                cluster_idx += 1  # skip that cluster if there are still updates to apply
+                self._embedding_buffer.set_cluster(cluster)
+                self._insert_cluster_after(cluster, new_cluster)
+            else:
+                self._reindex_cluster(cluster, batch_signature)
             if not any([len(msgs) for msgs in messages.values()]):
                 break  # all messages got adopted
-            cluster_idx += 1
         if messages and self.add_orphan_updates_as_clusters:
             self._add_new_cluster_from_message_batch(messages)
         elif messages:
@@ -382,7 +468,7 @@ class BlindClusterManager(ClusterManagerBase):
             _real_encounter_times={m._real_encounter_time for m in flat_messages},
         )
         self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
-        self.clusters.append(new_cluster)
+        self._append_cluster(new_cluster)
 
     def get_embeddings_array(
             self,
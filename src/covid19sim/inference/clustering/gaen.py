@@ -299,6 +299,16 @@ class GAENCluster(ClusterBase):
         """Returns the list of timestamps for which this cluster possesses at least one encounter."""
         return list(self.messages_by_timestamp.keys())
 
+    def get_daily_encounters(self) -> typing.Dict[datetime.date, typing.Tuple[int, bool]]:
+        """Returns the number of encounters of this cluster on each day, and their exposition flag."""
+        # the exposition flag of a day only covers the messages of that day
+        daily_encounters = {}
+        for timestamp, messages in self.messages_by_timestamp.items():
+            count, exposition = daily_encounters.get(timestamp.date(), (0, False))
+            daily_encounters[timestamp.date()] = \
+                (count + len(messages), exposition or any([m._exposition_event for m in messages]))
+        return daily_encounters
+
     def get_encounter_count(self) -> int:
         """Returns the number of encounters aggregated inside this cluster."""
         return sum([len(msgs) for msgs in self.messages_by_timestamp.values()])
@@ -356,8 +366,10 @@ class GAENClusterManager(ClusterManagerBase):
             for target_idx in target_idxs:
                 target_cluster = self.clusters[target_idx]
                 cluster.fit_cluster(target_cluster)
+            if target_idxs:
+                self._embedding_buffer.set_cluster(cluster)
             to_keep.append(cluster)
-        self.clusters = to_keep
+        self._replace_clusters(to_keep)
 
     def cleanup_clusters(self, current_timestamp: TimestampType):
         """Gets rid of clusters that are too old given the current timestamp, and single encounters
@@ -366,13 +378,16 @@ class GAENClusterManager(ClusterManagerBase):
         for cluster_idx, cluster in enumerate(self.clusters):
             cluster_update_offset = current_timestamp - cluster.latest_update_time
             if cluster_update_offset < self.max_history_offset:
+                n_timestamps = len(cluster.messages_by_timestamp)
                 for batch_timestamp in list(cluster.messages_by_timestamp.keys()):
                     message_update_offset = current_timestamp - batch_timestamp
                     if message_update_offset >= self.max_history_offset:
                         del cluster.messages_by_timestamp[batch_timestamp]
                 if cluster.messages_by_timestamp:
+                    if len(cluster.messages_by_timestamp) < n_timestamps:
+                        self._embedding_buffer.set_cluster(cluster)
                     to_keep.append(cluster)
-        self.clusters = to_keep
+        self._replace_clusters(to_keep)
 
     def add_messages(
             self,
@@ -393,6 +408,7 @@ class GAENClusterManager(ClusterManagerBase):
         for cluster in self.clusters:
             if cluster.risk_level == message.risk_level:
                 cluster._force_fit_encounter_message(message)
+                self._embedding_buffer.set_cluster(cluster)
                 return
         self._add_new_cluster_from_message(message)
 
@@ -404,11 +420,13 @@ class GAENClusterManager(ClusterManagerBase):
         for cluster in self.clusters:
             if cluster.risk_level == messages[0].risk_level:
                 cluster._force_fit_encounter_message_batch(messages)
+                self._embedding_buffer.set_cluster(cluster)
                 return
         new_cluster = GAENCluster.create_cluster_from_message(messages[0], self.next_cluster_id)
         new_cluster._force_fit_encounter_message_batch(messages[1:])
         self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
         self.clusters.append(new_cluster)
+        self._embedding_buffer.set_cluster(new_cluster)
         if cleanup:
             self.cleanup_clusters(self.latest_refresh_timestamp)
 
@@ -426,11 +444,13 @@ class GAENClusterManager(ClusterManagerBase):
                 continue
             fit_result = cluster.fit_update_message(message)
             if fit_result is None or isinstance(fit_result, GAENCluster):
+                self._embedding_buffer.set_cluster(cluster)
                 if fit_result is not None and isinstance(fit_result, GAENCluster):
                     fit_result.cluster_id = self.next_cluster_id
                     self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
                     # to keep the results identical with/without batching, insert at curr index + 1
                     self.clusters.insert(cluster_idx + 1, fit_result)
+                    self._embedding_buffer.set_cluster(fit_result)
                 found_adopter = True
                 break
         if not found_adopter and self.add_orphan_updates_as_clusters:
@@ -452,11 +472,13 @@ class GAENClusterManager(ClusterManagerBase):
                 cluster_idx += 1
                 continue
             messages, new_cluster = cluster.fit_update_message_batch(messages)
+            self._embedding_buffer.set_cluster(cluster)
             if new_cluster is not None:
                 new_cluster.cluster_id = self.next_cluster_id
                 self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
                 # to keep the results identical with/without batching, insert at curr index + 1
                 self.clusters.insert(cluster_idx + 1, new_cluster)
+                self._embedding_buffer.set_cluster(new_cluster)
                 cluster_idx += 1  # skip that cluster if there are still updates to apply
             if not any([len(msgs) for msgs in messages.values()]):
                 break  # all messages got adopted
@@ -473,6 +495,7 @@ class GAENClusterManager(ClusterManagerBase):
         new_cluster = GAENCluster.create_cluster_from_message(message, self.next_cluster_id)
         self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
         self.clusters.append(new_cluster)
+        self._embedding_buffer.set_cluster(new_cluster)
 
     def _add_new_cluster_from_message_batch(self, messages: MessagesArrayType):
         """Creates and adds a new cluster in the internal structs while cycling the cluster ids."""
@@ -488,29 +511,7 @@ class GAENClusterManager(ClusterManagerBase):
         new_cluster._force_fit_encounter_message_batch(new_encounters)
         self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
         self.clusters.append(new_cluster)
-
-    def _get_expositions_array(self) -> np.ndarray:
-        """Returns the 'expositions' array for all clusters managed by this object."""
-        if not self.generate_backw_compat_embeddings or not self.generate_embeddings_by_timestamp:
-            raise NotImplementedError  # must keep 1:1 mapping with embedding!
-        # assume the latest refresh timestamp is up-to-date FIXME should we pass in curr timestamp as above?
-        output = []
-        target_timestamp = self.latest_refresh_timestamp - self.max_history_offset
-        while target_timestamp <= self.latest_refresh_timestamp:
-            for cluster in self.clusters:
-                cluster_timestamp_match = False
-                cluster_contains_matching_exposition = False
-                for cluster_timestamp, messages in cluster.messages_by_timestamp.items():
-                    if cluster_timestamp.date() == target_timestamp.date():
-                        cluster_timestamp_match = True
-                        cluster_contains_matching_exposition |= \
-                            any([m._exposition_event for m in messages])
-                        if cluster_contains_matching_exposition:
-                            break
-                if cluster_timestamp_match:
-                    output.append(cluster_contains_matching_exposition)
-            target_timestamp += datetime.timedelta(days=1)
-        return np.asarray(output)
+        self._embedding_buffer.set_cluster(new_cluster)
 
     def _get_homogeneity_scores(self) -> typing.Dict[RealUserIDType, float]:
         """Returns the homogeneity score for all real users in the clusters.
@@ -42,10 +42,12 @@ class PerfectClusterManager(SimplisticClusterManager):
         if matched_cluster is not None:
             matched_cluster.skip_homogeneity_checks = True  # ensure the fit won't throw
             matched_cluster.fit_encounter_message(message)
+            self._embedding_buffer.set_cluster(matched_cluster)
         else:
             new_cluster = SimpleCluster.create_cluster_from_message(message, self.next_cluster_id)
             self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
             self.clusters.append(new_cluster)
+            self._embedding_buffer.set_cluster(new_cluster)
 
     def _add_update_message(self, message: UpdateMessage, cleanup: bool = True):
         """Fits an update message to an existing cluster."""
@@ -58,11 +60,13 @@ class PerfectClusterManager(SimplisticClusterManager):
             if message._sender_uid in cluster._real_encounter_uids:
                 cluster.skip_homogeneity_checks = True  # ensure the fit won't throw
                 message = cluster.fit_update_message(message)
+                self._embedding_buffer.set_cluster(cluster)
                 if message is None:
                     return
         if self.add_orphan_updates_as_clusters:
             new_cluster = SimpleCluster.create_cluster_from_message(message, self.next_cluster_id)
             self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
             self.clusters.append(new_cluster)
+            self._embedding_buffer.set_cluster(new_cluster)
         else:
             raise AssertionError(f"could not find any proper cluster match for: {message}")
@@ -131,6 +131,16 @@ class SimpleCluster(ClusterBase):
         """Returns the list of timestamps for which this cluster possesses at least one encounter."""
         return [self.first_update_time]  # this impl's clusters always only cover a single timestamp
 
+    def get_daily_encounters(self) -> typing.Dict[datetime.date, typing.Tuple[int, bool]]:
+        """Returns the number of encounters of this cluster on each day, and their exposition flag."""
+        # the exposition flag covers all the messages of the cluster, whatever their day
+        exposition = self._get_cluster_exposition_flag()
+        encounter_counts = {}
+        for message in self.messages:
+            day = message.encounter_time.date()
+            encounter_counts[day] = encounter_counts.get(day, 0) + 1
+        return {day: (count, exposition) for day, count in encounter_counts.items()}
+
     def get_encounter_count(self) -> int:
         """Returns the number of encounters aggregated inside this cluster."""
         return len(self.messages)
@@ -176,10 +186,12 @@ class SimplisticClusterManager(ClusterManagerBase):
                 break
         if matched_cluster is not None:
             matched_cluster.fit_encounter_message(message)
+            self._embedding_buffer.set_cluster(matched_cluster)
         else:
             new_cluster = SimpleCluster.create_cluster_from_message(message, self.next_cluster_id)
             self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
             self.clusters.append(new_cluster)
+            self._embedding_buffer.set_cluster(new_cluster)
 
     def _add_update_message(self, message: UpdateMessage, cleanup: bool = True):
         """Fits an update message to an existing cluster."""
@@ -202,32 +214,16 @@ class SimplisticClusterManager(ClusterManagerBase):
                 break
         if matched_cluster is not None:
             matched_cluster.fit_update_message(message)
+            self._embedding_buffer.set_cluster(matched_cluster)
         else:
             if self.add_orphan_updates_as_clusters:
                 new_cluster = SimpleCluster.create_cluster_from_message(message, self.next_cluster_id)
                 self.next_cluster_id = (self.next_cluster_id + 1) % self.max_cluster_id
                 self.clusters.append(new_cluster)
+                self._embedding_buffer.set_cluster(new_cluster)
             else:
                 raise AssertionError(f"could not find any proper cluster match for: {message}")
 
-    def _get_expositions_array(self) -> np.ndarray:
-        """Returns the 'expositions' array for all clusters managed by this object."""
-        if not self.generate_backw_compat_embeddings or not self.generate_embeddings_by_timestamp:
-            raise NotImplementedError  # must keep 1:1 mapping with embedding!
-        # assume the latest refresh timestamp is up-to-date FIXME should we pass in curr timestamp as above?
-        output = []
-        target_timestamp = self.latest_refresh_timestamp - self.max_history_offset
-        while target_timestamp <= self.latest_refresh_timestamp:
-            for cluster in self.clusters:
-                cluster_timestamp_match = \
-                    any([msg.encounter_time.date() == target_timestamp.date() for msg in cluster.messages])
-                if cluster_timestamp_match:
-                    cluster_contains_matching_exposition = \
-                        any([m._exposition_event for m in cluster.messages])
-                    output.append(cluster_contains_matching_exposition)
-            target_timestamp += datetime.timedelta(days=1)
-        return np.asarray(output)
-
     def _get_homogeneity_scores(self) -> typing.Dict[RealUserIDType, float]:
         """Returns the homogeneity score for all real users in the clusters.
 
@@ -2,18 +2,17 @@
 Handles querying the inference server with serialized humans and their messages.
 """
 
+import dataclasses
 import datetime
 import os
-import functools
 import typing
-from joblib import Parallel, delayed
 
-from covid19sim.inference.server_utils import InferenceClient, InferenceEngineWrapper, proc_human_batch
+from covid19sim.inference.server_utils import InferenceClientPool, InferenceEngineWrapper, proc_human_batch
 from covid19sim.inference.clustering.base import ClusterManagerBase
-from covid19sim.inference.human_as_message import make_human_as_message
+from covid19sim.inference.human_as_message import get_test_results_array, make_human_as_message
 if typing.TYPE_CHECKING:
     from covid19sim.human import Human
-    from covid19sim.locations.city import SimulatorMailboxType
+    from covid19sim.locations.city import PersonalMailboxType, SimulatorMailboxType
 
 
 class DummyMemManager:
@@ -33,10 +32,56 @@ class DummyMemManager:
             and not conf.get('USE_ORACLE', False)
             and conf.get('TRANSFORMER_EXP_PATH') != ""
         ):
-            cls.global_inference_engine = InferenceEngineWrapper(conf.get('TRANSFORMER_EXP_PATH'))
+            cls.global_inference_engine = InferenceEngineWrapper(
+                conf.get('TRANSFORMER_EXP_PATH'),
+                n_threads=conf.get('INFERENCE_CPU_THREADS'),
+            )
         return cls.global_inference_engine
 
 
+@dataclasses.dataclass
+class RiskInferenceCounters:
+    """Counts the humans whose risk inference was run, or skipped because its inputs had not changed."""
+
+    inferred: int = 0
+    skipped: int = 0
+
+    @property
+    def skip_ratio(self) -> float:
+        """Returns the fraction of the risk inferences which were skipped."""
+        total = self.inferred + self.skipped
+        return self.skipped / total if total else 0.
+
+
+def get_risk_inference_inputs(human: "Human", current_day_idx: int) -> typing.Tuple:
+    """
+    Returns the inputs of the risk inference of a human which can change without new update messages.
+
+    The other inputs of the model are either fixed (e.g. the observed age or preexisting conditions) or
+    derived from the clusters of the human, which only change with new messages or with the day index.
+    """
+    test_results = get_test_results_array(human, human.env.timestamp)
+    return current_day_idx, human.reported_symptoms_version, test_results.tobytes()
+
+
+def clear_risk_inference_cache(humans: typing.Iterable["Human"]):
+    """
+    Forgets the latest risk inference of the humans, so that none of them is skipped by the next one.
+
+    This must be done whenever the clusters held by the inference engine are reset, as the cached risk
+    histories were inferred from those clusters.
+    """
+    for human in humans:
+        human.risk_inference_inputs = None
+        human.risk_inference_output = None
+
+
+def has_pending_update_messages(human: "Human", personal_mailbox: "PersonalMailboxType") -> bool:
+    """Returns whether the personal mailbox holds update messages that `make_human_as_message` would pop."""
+    mailbox_key_positions = human.contact_book.mailbox_key_positions
+    return any(key in mailbox_key_positions for key in personal_mailbox)
+
+
 def batch_run_timeslot_heavy_jobs(
         humans: typing.Iterable["Human"],
         init_timestamp: datetime.datetime,
@@ -45,6 +90,8 @@ def batch_run_timeslot_heavy_jobs(
         time_slot: int,
         conf: typing.Dict,
         city_hash: int = 0,
+        inference_client_pool: typing.Optional[InferenceClientPool] = None,
+        risk_inference_counters: typing.Optional[RiskInferenceCounters] = None,
 ) -> typing.Iterable["Human"]:
     """
     Runs the 'heavy' processes that must occur for all users in parallel.
@@ -63,14 +110,30 @@ def batch_run_timeslot_heavy_jobs(
         conf: YAML configuration dictionary with all relevant settings for the simulation.
         city_hash: a hash used to tag this city's humans on an inference server that may be used by
             multiple cities in parallel. Bad mojo will happen if two cities have the same hash...
+        inference_client_pool: the connections to the inference server through which the batches of
+            humans are streamed, if the simulator is configured to use one. If None, a pool is opened
+            for this call only.
+        risk_inference_counters: counters of the risk inferences which were run or skipped, if any.
+
+    With the transformer risk model and `SKIP_UNCHANGED_RISK_INFERENCE`, the humans which received no
+    new update messages and whose other inputs did not change since their last inference are not sent
+    to the inference engine, and their previous risk history is applied again.
+
     Returns:
         A tuple consisting of the updated humans & of the newly generated update messages to register.
     """
     current_day_idx = (current_timestamp - init_timestamp).days
     assert current_day_idx >= 0
+    # e.g. a shard whose humans are all visiting other shards
+    if not humans:
+        return humans
 
     hd = next(iter(humans)).city.hd
     all_params = []
+    # the oracle is noisy, and training data must be collected for every human
+    skip_unchanged = conf.get('SKIP_UNCHANGED_RISK_INFERENCE') and conf.get('RISK_MODEL') == "transformer" \
+        and not conf.get('USE_ORACLE') and not conf.get('COLLECT_TRAINING_DATA')
+    reused_results = []
 
     for human in humans:
         if (
@@ -80,6 +143,18 @@ def batch_run_timeslot_heavy_jobs(
         ):
             continue
 
+        if skip_unchanged:
+            inputs = get_risk_inference_inputs(human, current_day_idx)
+            if inputs == human.risk_inference_inputs and \
+                    not has_pending_update_messages(human, global_mailbox[human.name]):
+                # keep the random stream of the human as if its message had been created
+                human.rng.randint(1000)
+                reused_results.append((human.name, human.risk_inference_output))
+                continue
+            human.risk_inference_inputs = inputs
+        if risk_inference_counters is not None:
+            risk_inference_counters.inferred += 1
+
         all_params.append({
             "start": init_timestamp,
             "current_day": current_day_idx,
@@ -101,19 +176,15 @@ def batch_run_timeslot_heavy_jobs(
             batch_end_offset = min(batch_start_offset + batch_size, len(all_params))
             batched_params.append(all_params[batch_start_offset:batch_end_offset])
             batch_start_offset += batch_size
-        parallel_reqs = conf.get('INFERENCE_REQ_PARALLEL_JOBS', 16)
-        parallel_reqs = max(min(parallel_reqs, len(batched_params)), 1)
-
-        def query_inference_server(params, **inf_client_kwargs):
-            # lambda used to create one socket per request (so we can request in parallel)
-            client = InferenceClient(**inf_client_kwargs)
-            return client.infer(params)
-
-        inference_frontend_address = conf.get('INFERENCE_SERVER_ADDRESS', None)
-        query_func = functools.partial(query_inference_server, server_address=inference_frontend_address)
-
-        with Parallel(n_jobs=parallel_reqs, prefer="threads") as parallel:
-            batched_results = parallel((delayed(query_func)(params) for params in batched_params))
+        if inference_client_pool is None:
+            client_pool = InferenceClientPool(
+                server_address=conf.get('INFERENCE_SERVER_ADDRESS', None),
+                n_sockets=conf.get('INFERENCE_REQ_PARALLEL_JOBS', 16),
+            )
+            batched_results = client_pool.infer_batches(batched_params)
+            client_pool.close()
+        else:
+            batched_results = inference_client_pool.infer_batches(batched_params)
         results = []
         for b in batched_results:
             results.extend(b)
@@ -122,6 +193,13 @@ def batch_run_timeslot_heavy_jobs(
         engine = DummyMemManager.get_engine(conf)
         results = proc_human_batch(all_params, engine, cluster_mgr_map)
 
+    if risk_inference_counters is not None:
+        risk_inference_counters.skipped += len(reused_results)
+    if skip_unchanged:
+        for name, risk_history in results:
+            hd[name].risk_inference_output = risk_history
+        results = list(results) + reused_results
+
     for name, risk_history in results:
         human = hd[name]
         if conf.get('RISK_MODEL') == "transformer":
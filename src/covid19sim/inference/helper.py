@@ -1,6 +1,6 @@
 import numpy as np
 
-from covid19sim.epidemiology.symptoms import SYMPTOMS
+from covid19sim.epidemiology.symptoms import SYMPTOMS, bitmasks_to_np
 from covid19sim.inference.clustering.base import ClusterManagerBase
 
 # NOTE: THIS MAP SHOULD ALWAYS MATCH THE NAME/IDS PROVIDED IN utils.py
@@ -61,9 +61,9 @@ def messages_to_np(cluster_mgr):
 
 
 def candidate_exposures(cluster_mgr):
-    candidate_encounters = messages_to_np(cluster_mgr)
     assert isinstance(cluster_mgr, ClusterManagerBase)
-    exposed_encounters = cluster_mgr._get_expositions_array()
+    # both arrays are sliced out of the same pass over the clusters
+    candidate_encounters, exposed_encounters = cluster_mgr._get_embeddings_and_expositions_arrays()
     return candidate_encounters, exposed_encounters
 
 
@@ -75,11 +75,11 @@ def conditions_to_np(conditions):
 
 
 def symptoms_to_np(all_symptoms, conf):
+    # `all_symptoms` holds one bitmask of symptoms per day, most recent first
     rolling_window = conf.get("TRACING_N_DAYS_HISTORY")
     symptoms_enc = np.zeros((rolling_window, len(SYMPTOMS)))
-    for day, symptoms in zip(range(rolling_window), all_symptoms):
-        for symptom in symptoms:
-            symptoms_enc[day, symptom.id] = 1.
+    all_symptoms = all_symptoms[:rolling_window]
+    symptoms_enc[:len(all_symptoms)] = bitmasks_to_np(all_symptoms)[:, :len(SYMPTOMS)]
     return symptoms_enc
 
 
@@ -53,13 +53,16 @@ def make_human_as_message(
     rolling_all_symptoms = symptoms_to_np(human.rolling_all_symptoms, conf)
     rolling_all_reported_symptoms = symptoms_to_np(human.rolling_all_reported_symptoms, conf)
 
-    # TODO: we could index the global mailbox by day, it might be faster that way
-    target_mailbox_keys = [key for keys in human.contact_book.mailbox_keys_by_day.values() for key in keys]
+    # only look up the keys with pending messages, in the order they were added to the contact book
+    mailbox_key_positions = human.contact_book.mailbox_key_positions
+    target_mailbox_keys = sorted(
+        (key for key in personal_mailbox if key in mailbox_key_positions),
+        key=mailbox_key_positions.__getitem__,
+    )
     update_messages = []
     for key in target_mailbox_keys:
-        if key in personal_mailbox:
-            assert isinstance(personal_mailbox[key], list)
-            update_messages.extend(personal_mailbox.pop(key))
+        assert isinstance(personal_mailbox[key], list)
+        update_messages.extend(personal_mailbox.pop(key))
 
     return HumanAsMessage(
         name=human.name,
@@ -0,0 +1,520 @@
+"""
+Columnar storage of encounter and update messages.
+
+The `EncounterMessage` and `UpdateMessage` dataclasses (defined here, and used through
+`covid19sim.inference.message_utils`) hold one Python object (with 128-bit integer uids and `datetime`
+fields) per message. This module stores messages as rows of NumPy structured arrays instead, so that
+contact books can generate their update messages with vectorized operations:
+
+    - uids are split into two uint64 columns (with a flag for messages which have no uid);
+    - risk levels are uint8, with `NO_RISK_LEVEL` standing for None;
+    - the observed (discretized) times are int32 minutes since the simulation start;
+    - the unobserved variables (real user ids, update reasons) are indices in a string table shared
+      by a `MessageStore`, and the real times are int64 microseconds since the simulation start.
+
+The encounters of a `covid19sim.inference.message_utils.ContactBook` are kept in an `EncounterBook`. The dataclasses
+can still be obtained from the records as views (see `MessageStore.encounter_messages` and
+`MessageStore.update_messages`), e.g. for the mailboxes of the simulation, for tests and debugging.
+"""
+import dataclasses
+import datetime
+import typing
+
+import numpy as np
+
+if typing.TYPE_CHECKING:
+    from covid19sim.interventions.tracing import BaseMethod
+
+TimestampType = datetime.datetime
+RealUserIDType = typing.Union[int, str]
+UIDType = int  # should be at least 16 bytes for truly unique keys?
+RiskLevelType = np.uint8
+
+
+@dataclasses.dataclass
+class EncounterMessage:
+    """Contains all the observed+unobserved data related to a user encounter message."""
+
+    #####################
+    # observed variables
+
+    uid: UIDType
+    """Unique Identifier (UID) of the encountered user."""
+
+    risk_level: RiskLevelType
+    """Quantified risk level of the encountered user."""
+
+    encounter_time: TimestampType
+    """Discretized encounter timestamp."""
+
+    #############################################
+    # unobserved variables (for debugging only!)
+
+    _sender_uid: typing.Optional[RealUserIDType] = None
+    """Real Unique Identifier (UID) of the encountered user."""
+
+    _receiver_uid: typing.Optional[RealUserIDType] = None
+    """Real Unique Identifier (UID) of the user receiving the message."""
+
+    _real_encounter_time: typing.Optional[TimestampType] = None
+    """Real encounter timestamp."""
+
+    _exposition_event: typing.Optional[bool] = None
+    """Flags whether this encounter corresponds to an exposition event for the receiver."""
+
+    _applied_update_count: typing.Optional[int] = None
+    """List of update messages which have been applied to this encounter."""
+
+
+@dataclasses.dataclass
+class UpdateMessage:
+    """Contains all the observed+unobserved data related to a user update message."""
+
+    #####################
+    # observed variables
+
+    uid: UIDType
+    """Unique Identifier (UID) of the updater at the time of the encounter."""
+
+    old_risk_level: RiskLevelType
+    """Previous quantified risk level of the updater."""
+
+    new_risk_level: RiskLevelType
+    """New quantified risk level of the updater."""
+
+    encounter_time: TimestampType
+    """Discretized encounter timestamp."""
+
+    update_time: TimestampType
+    """Update generation timestamp."""  # TODO: this might be a 1-31 rotating day id?
+
+    #############################################
+    # unobserved variables (for debugging only!)
+
+    _sender_uid: typing.Optional[RealUserIDType] = None
+    """Real Unique Identifier (UID) of the updater."""
+
+    _receiver_uid: typing.Optional[RealUserIDType] = None
+    """Real Unique Identifier (UID) of the user receiving the message."""
+
+    _real_encounter_time: typing.Optional[TimestampType] = None
+    """Real encounter timestamp."""
+
+    _real_update_time: typing.Optional[TimestampType] = None
+    """Real update generation timestamp."""
+
+    _exposition_event: typing.Optional[bool] = None
+    """Flags whether the original encounter corresponds to an exposition event for the receiver."""
+
+    _update_reason: typing.Optional[str] = None
+    """Reason why this update message was sent (for debugging)."""
+
+
+# sentinel values of the fields which can be None
+NO_RISK_LEVEL = np.iinfo(np.uint8).max
+NO_STRING = -1
+NO_REAL_TIME = np.iinfo(np.int64).min
+NO_EXPOSITION_EVENT = -1
+NO_UPDATE_COUNT = -1
+
+_UID_LOW_MASK = (1 << 64) - 1
+_MAX_RISK_LEVEL = 15
+_ONE_MINUTE = datetime.timedelta(minutes=1)
+_ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+ENCOUNTER_MESSAGE_DTYPE = np.dtype([
+    ("uid_high", np.uint64),
+    ("uid_low", np.uint64),
+    ("has_uid", np.bool_),
+    ("risk_level", np.uint8),
+    ("encounter_time", np.int32),
+    # unobserved variables
+    ("sender_uid", np.int32),
+    ("receiver_uid", np.int32),
+    ("real_encounter_time", np.int64),
+    ("exposition_event", np.int8),
+    ("applied_update_count", np.int32),
+])
+
+UPDATE_MESSAGE_DTYPE = np.dtype([
+    ("uid_high", np.uint64),
+    ("uid_low", np.uint64),
+    ("has_uid", np.bool_),
+    ("old_risk_level", np.uint8),
+    ("new_risk_level", np.uint8),
+    ("encounter_time", np.int32),
+    ("update_time", np.int32),
+    # unobserved variables
+    ("sender_uid", np.int32),
+    ("receiver_uid", np.int32),
+    ("real_encounter_time", np.int64),
+    ("real_update_time", np.int64),
+    ("exposition_event", np.int8),
+    ("update_reason", np.int32),
+])
+
+# fields copied as-is from an encounter to the updates generated for it
+_SHARED_FIELDS = ["uid_high", "uid_low", "has_uid", "encounter_time",
+                  "sender_uid", "receiver_uid", "real_encounter_time", "exposition_event"]
+
+
+class MessageStore:
+    """
+    Converts messages between their dataclass and columnar forms.
+
+    The store defines the time base of the records (the simulation start) and holds the table of the
+    strings they reference, so all the records exchanged in a simulation should use the same store.
+    """
+
+    def __init__(self, start_timestamp: datetime.datetime):
+        """
+        Args:
+            start_timestamp: the start of the simulation, from which record times are offset.
+        """
+        self.start_timestamp = start_timestamp
+        self.strings: typing.List[str] = []
+        self.string_ids: typing.Dict[str, int] = {}
+
+    def string_id(self, value: typing.Optional[typing.Any]) -> int:
+        """Returns the index of a string in the table of the store, adding it if needed."""
+        if value is None:
+            return NO_STRING
+        string_id = self.string_ids.get(value)
+        if string_id is None:
+            string_id = self.string_ids[value] = len(self.strings)
+            self.strings.append(value)
+        return string_id
+
+    def string(self, string_id: int) -> typing.Optional[typing.Any]:
+        return None if string_id == NO_STRING else self.strings[string_id]
+
+    def minutes(self, timestamp: datetime.datetime) -> int:
+        """Returns the (discretized) time of a message in minutes since the simulation start."""
+        return (timestamp - self.start_timestamp) // _ONE_MINUTE
+
+    def real_time(self, timestamp: typing.Optional[datetime.datetime]) -> int:
+        """Returns an unobserved time of a message in microseconds since the simulation start."""
+        return NO_REAL_TIME if timestamp is None else (timestamp - self.start_timestamp) // _ONE_MICROSECOND
+
+    def _timestamp(self, minutes: int) -> datetime.datetime:
+        return self.start_timestamp + datetime.timedelta(minutes=int(minutes))
+
+    def _real_timestamp(self, real_time: int) -> typing.Optional[datetime.datetime]:
+        return None if real_time == NO_REAL_TIME else self.start_timestamp + datetime.timedelta(microseconds=int(real_time))
+
+    def encounter_records(self, messages: typing.Sequence[EncounterMessage]) -> np.ndarray:
+        """Converts encounter messages to records of `ENCOUNTER_MESSAGE_DTYPE`."""
+        return np.array([
+            (
+                *_split_uid(m.uid),
+                NO_RISK_LEVEL if m.risk_level is None else m.risk_level,
+                self.minutes(m.encounter_time),
+                self.string_id(m._sender_uid),
+                self.string_id(m._receiver_uid),
+                self.real_time(m._real_encounter_time),
+                NO_EXPOSITION_EVENT if m._exposition_event is None else m._exposition_event,
+                NO_UPDATE_COUNT if m._applied_update_count is None else m._applied_update_count,
+            )
+            for m in messages
+        ], dtype=ENCOUNTER_MESSAGE_DTYPE)
+
+    def update_records(self, messages: typing.Sequence[UpdateMessage]) -> np.ndarray:
+        """Converts update messages to records of `UPDATE_MESSAGE_DTYPE`."""
+        return np.array([
+            (
+                *_split_uid(m.uid),
+                NO_RISK_LEVEL if m.old_risk_level is None else m.old_risk_level,
+                NO_RISK_LEVEL if m.new_risk_level is None else m.new_risk_level,
+                self.minutes(m.encounter_time),
+                self.minutes(m.update_time),
+                self.string_id(m._sender_uid),
+                self.string_id(m._receiver_uid),
+                self.real_time(m._real_encounter_time),
+                self.real_time(m._real_update_time),
+                NO_EXPOSITION_EVENT if m._exposition_event is None else m._exposition_event,
+                self.string_id(m._update_reason),
+            )
+            for m in messages
+        ], dtype=UPDATE_MESSAGE_DTYPE)
+
+    def encounter_messages(self, records: np.ndarray) -> typing.List[EncounterMessage]:
+        """Returns the encounter messages of some records (a view for tests and debugging)."""
+        return [
+            EncounterMessage(
+                uid=_join_uid(r["has_uid"], r["uid_high"], r["uid_low"]),
+                risk_level=None if r["risk_level"] == NO_RISK_LEVEL else r["risk_level"],
+                encounter_time=self._timestamp(r["encounter_time"]),
+                _sender_uid=self.string(r["sender_uid"]),
+                _receiver_uid=self.string(r["receiver_uid"]),
+                _real_encounter_time=self._real_timestamp(r["real_encounter_time"]),
+                _exposition_event=None if r["exposition_event"] == NO_EXPOSITION_EVENT
+                else bool(r["exposition_event"]),
+                _applied_update_count=None if r["applied_update_count"] == NO_UPDATE_COUNT
+                else r["applied_update_count"],
+            )
+            for r in _as_dicts(records)
+        ]
+
+    def update_messages(self, records: np.ndarray) -> typing.List[UpdateMessage]:
+        """Returns the update messages of some records (a view for tests and debugging)."""
+        return [
+            UpdateMessage(
+                uid=_join_uid(r["has_uid"], r["uid_high"], r["uid_low"]),
+                old_risk_level=None if r["old_risk_level"] == NO_RISK_LEVEL else r["old_risk_level"],
+                new_risk_level=None if r["new_risk_level"] == NO_RISK_LEVEL else r["new_risk_level"],
+                encounter_time=self._timestamp(r["encounter_time"]),
+                update_time=self._timestamp(r["update_time"]),
+                _sender_uid=self.string(r["sender_uid"]),
+                _receiver_uid=self.string(r["receiver_uid"]),
+                _real_encounter_time=self._real_timestamp(r["real_encounter_time"]),
+                _real_update_time=self._real_timestamp(r["real_update_time"]),
+                _exposition_event=None if r["exposition_event"] == NO_EXPOSITION_EVENT
+                else bool(r["exposition_event"]),
+                _update_reason=self.string(r["update_reason"]),
+            )
+            for r in _as_dicts(records)
+        ]
+
+
+def _split_uid(uid: typing.Optional[int]) -> typing.Tuple[int, int, bool]:
+    if uid is None:
+        return 0, 0, False
+    return uid >> 64, uid & _UID_LOW_MASK, True
+
+
+def _join_uid(has_uid: bool, uid_high: int, uid_low: int) -> typing.Optional[int]:
+    return (uid_high << 64) | uid_low if has_uid else None
+
+
+def _as_dicts(records: np.ndarray) -> typing.Iterator[typing.Dict]:
+    # tolist() converts all fields to Python scalars at once
+    names = records.dtype.names
+    return (dict(zip(names, record)) for record in records.tolist())
+
+
+def create_update_records(
+        encounters: np.ndarray,
+        new_risk_levels: np.ndarray,
+        update_minutes: int,
+        real_update_time: int,
+        update_reason_id: int,
+) -> np.ndarray:
+    """
+    Creates the update messages of some encounters (the vectorized `create_update_message`).
+
+    Args:
+        encounters: the encounter records to update.
+        new_risk_levels: the new risk level of the sender for each encounter.
+        update_minutes: the (discretized) update time, in minutes since the simulation start.
+        real_update_time: the current time, in microseconds since the simulation start.
+        update_reason_id: index of the reason of the updates in the string table of the store.
+
+    Returns:
+        The update records.
+    """
+    updates = np.empty(len(encounters), dtype=UPDATE_MESSAGE_DTYPE)
+    for key in _SHARED_FIELDS:
+        updates[key] = encounters[key]
+    updates["old_risk_level"] = encounters["risk_level"]
+    updates["new_risk_level"] = new_risk_levels
+    updates["update_time"] = update_minutes
+    updates["real_update_time"] = real_update_time
+    updates["update_reason"] = update_reason_id
+    return updates
+
+
+def _risk_levels(
+        risk_history_map: typing.Dict[int, float],
+        day_idxs: np.ndarray,
+        proba_to_risk_level_map: typing.Callable,
+) -> np.ndarray:
+    # the mapping is only evaluated once for each day
+    unique_days, inverse = np.unique(day_idxs, return_inverse=True)
+    levels = np.array([
+        min(proba_to_risk_level_map(risk_history_map[int(day_idx)]), _MAX_RISK_LEVEL) for day_idx in unique_days
+    ], dtype=np.uint8)
+    return levels[inverse]
+
+
+class EncounterBook:
+    """
+    Columnar counterpart of the encounters of a `covid19sim.inference.message_utils.ContactBook`.
+
+    The encounter messages sent by the owner of the book are appended, in chronological order, to a
+    record array which grows by doubling, along with the day index of each encounter. Update messages
+    are generated for all encounters at once.
+    """
+
+    def __init__(
+            self,
+            store: MessageStore,
+            tracing_n_days_history: int,
+            initial_capacity: int = 64,
+    ):
+        """
+        Args:
+            store: the store of the simulation, which defines the time base and the string table.
+            tracing_n_days_history: length of the contact history to keep in this object.
+            initial_capacity: number of encounters for which memory is initially allocated.
+        """
+        self.store = store
+        self.tracing_n_days_history = tracing_n_days_history
+        self._records = np.empty(initial_capacity, dtype=ENCOUNTER_MESSAGE_DTYPE)
+        self._day_idxs = np.empty(initial_capacity, dtype=np.int32)
+        self._count = 0
+
+    @property
+    def encounters(self) -> np.ndarray:
+        """Records of the encounters kept in the book, in chronological order."""
+        return self._records[:self._count]
+
+    @property
+    def day_idxs(self) -> np.ndarray:
+        """Day index of each encounter kept in the book."""
+        return self._day_idxs[:self._count]
+
+    def __len__(self):
+        return self._count
+
+    def add_encounters(self, day_idx: int, encounters: np.ndarray):
+        """Registers encounter records sent on the given day."""
+        needed = self._count + len(encounters)
+        if needed > len(self._records):
+            capacity = max(needed, 2 * len(self._records))
+            self._records = np.resize(self._records, capacity)
+            self._day_idxs = np.resize(self._day_idxs, capacity)
+        self._records[self._count:needed] = encounters
+        self._day_idxs[self._count:needed] = day_idx
+        self._count = needed
+
+    def add_encounter_messages(self, day_idx: int, messages: typing.Sequence[EncounterMessage]):
+        """Registers encounter messages sent on the given day."""
+        self.add_encounters(day_idx, self.store.encounter_records(messages))
+
+    def flag_exposition(self, receiver_uid: str, real_encounter_time: datetime.datetime):
+        """Flags the latest encounter with the given receiver and real time as an exposition event."""
+        encounters = self.encounters
+        matches = np.flatnonzero(
+            (encounters["receiver_uid"] == self.store.string_id(receiver_uid))
+            & (encounters["real_encounter_time"] == self.store.real_time(real_encounter_time))
+        )
+        assert len(matches), f"no encounter with {receiver_uid} at {real_encounter_time} in the book"
+        self._records["exposition_event"][matches[-1]] = True
+
+    def cleanup_contacts(self, current_day_idx: int) -> np.ndarray:
+        """
+        Removes all encounters older than `tracing_n_days_history` days.
+
+        Returns:
+            The removed encounter records.
+        """
+        keep = self.day_idxs >= current_day_idx - self.tracing_n_days_history
+        kept_count = int(keep.sum())
+        if kept_count == self._count:
+            return np.empty(0, dtype=ENCOUNTER_MESSAGE_DTYPE)
+        removed = self.encounters[~keep]
+        self._records[:kept_count] = self.encounters[keep]
+        self._day_idxs[:kept_count] = self.day_idxs[keep]
+        self._count = kept_count
+        return removed
+
+    def generate_initial_updates(
+            self,
+            current_day_idx: int,
+            current_timestamp: datetime.datetime,
+            risk_history_map: typing.Dict[int, float],
+            proba_to_risk_level_map: typing.Callable,
+            intervention: typing.Optional["BaseMethod"],
+    ) -> np.ndarray:
+        """
+        Generates and returns the update records needed to communicate the initial risk level of
+        recent encounters (see `ContactBook.generate_initial_updates`).
+
+        Returns:
+            The update records to send out to contacts (if any).
+        """
+        if intervention is None:
+            return np.empty(0, dtype=UPDATE_MESSAGE_DTYPE)  # no need to generate updates until tracing is enabled
+        assert current_day_idx >= 0
+        new_indices = np.flatnonzero(self.encounters["risk_level"] == NO_RISK_LEVEL)
+        if not len(new_indices):
+            return np.empty(0, dtype=UPDATE_MESSAGE_DTYPE)
+        day_idxs = self.day_idxs[new_indices]
+        assert day_idxs.min() >= 0 and day_idxs.max() <= current_day_idx, \
+            "can't have encounters before init or after today...?"
+        risk_levels = _risk_levels(risk_history_map, day_idxs, proba_to_risk_level_map)
+        self._records["risk_level"][new_indices] = risk_levels
+        # the initial update of an encounter has the same old and new risk levels
+        return self._create_updates(new_indices, risk_levels, current_timestamp, "contact")
+
+    def generate_updates(
+            self,
+            current_day_idx: int,
+            current_timestamp: datetime.datetime,
+            prev_risk_history_map: typing.Dict[int, float],
+            curr_risk_history_map: typing.Dict[int, float],
+            proba_to_risk_level_map: typing.Callable,
+            update_reason: str,
+            intervention: typing.Optional["BaseMethod"],
+    ) -> np.ndarray:
+        """
+        Compares the previous and latest risk levels of the days of the encounters, and returns
+        the update records of the encounters whose risk level changed (see `ContactBook.generate_updates`).
+
+        Returns:
+            The update records to send out to contacts (if any).
+        """
+        if intervention is None:
+            return np.empty(0, dtype=UPDATE_MESSAGE_DTYPE)  # no need to generate updates until tracing is enabled
+        assert current_day_idx >= 0
+        if not self._count:
+            return np.empty(0, dtype=UPDATE_MESSAGE_DTYPE)
+        assert current_day_idx - self.day_idxs.min() <= self.tracing_n_days_history, \
+            "contact book should have been cleaned up before calling update method...?"
+        changed_days = []
+        for day_idx in np.unique(self.day_idxs).tolist():
+            if day_idx not in prev_risk_history_map:
+                prev_risk_history_map[day_idx] = curr_risk_history_map[day_idx]
+                continue
+            old_risk_level = min(proba_to_risk_level_map(prev_risk_history_map[day_idx]), _MAX_RISK_LEVEL)
+            new_risk_level = min(proba_to_risk_level_map(curr_risk_history_map[day_idx]), _MAX_RISK_LEVEL)
+            if old_risk_level != new_risk_level:
+                changed_days.append((day_idx, old_risk_level, new_risk_level))
+        if not changed_days:
+            return np.empty(0, dtype=UPDATE_MESSAGE_DTYPE)
+        n_days = self.day_idxs.max() - self.day_idxs.min() + 1
+        old_levels_by_day = np.full(n_days, NO_RISK_LEVEL, dtype=np.uint8)
+        new_levels_by_day = np.full(n_days, NO_RISK_LEVEL, dtype=np.uint8)
+        for day_idx, old_risk_level, new_risk_level in changed_days:
+            old_levels_by_day[day_idx - self.day_idxs.min()] = old_risk_level
+            new_levels_by_day[day_idx - self.day_idxs.min()] = new_risk_level
+        old_risk_levels = old_levels_by_day[self.day_idxs - self.day_idxs.min()]
+        new_risk_levels = new_levels_by_day[self.day_idxs - self.day_idxs.min()]
+        risk_levels = self.encounters["risk_level"]
+        changed = new_risk_levels != NO_RISK_LEVEL
+        assert not np.any(changed & (risk_levels == NO_RISK_LEVEL)), \
+            "should have already initialized all encounters before updating...?"
+        assert np.all((risk_levels[changed] == old_risk_levels[changed]) |
+                      (risk_levels[changed] == new_risk_levels[changed])), \
+            "encounter message risk mismatch (should have old level if already initialized " \
+            "or new level if it was initialized just now, but nothing else)"
+        updated_indices = np.flatnonzero(changed & (risk_levels != new_risk_levels))
+        if not len(updated_indices):
+            return np.empty(0, dtype=UPDATE_MESSAGE_DTYPE)
+        new_risk_levels = new_risk_levels[updated_indices]
+        updates = self._create_updates(updated_indices, new_risk_levels, current_timestamp, update_reason)
+        # keep track of the applied updates, as `create_updated_encounter_with_message` does
+        self._records["risk_level"][updated_indices] = new_risk_levels
+        update_counts = self._records["applied_update_count"][updated_indices]
+        self._records["applied_update_count"][updated_indices] = np.maximum(update_counts, 0) + 1
+        return updates
+
+    def _create_updates(self, indices, new_risk_levels, current_timestamp, update_reason) -> np.ndarray:
+        update_time = datetime.datetime.combine(current_timestamp.date(), datetime.datetime.min.time())
+        return create_update_records(
+            encounters=self._records[indices],
+            new_risk_levels=np.asarray(new_risk_levels, dtype=RiskLevelType),
+            update_minutes=self.store.minutes(update_time),
+            real_update_time=self.store.real_time(current_timestamp),
+            update_reason_id=self.store.string_id(update_reason),
+        )
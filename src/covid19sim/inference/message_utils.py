@@ -1,25 +1,22 @@
 import collections
-import dataclasses
 import datetime
 import typing
 
 import numpy as np
 
+from covid19sim.inference.message_store import EncounterBook, EncounterMessage, MessageStore, NO_RISK_LEVEL, \
+    RealUserIDType, RiskLevelType, TimestampType, UIDType, UpdateMessage
 from covid19sim.utils.constants import POSITIVE_TEST_RESULT, NEGATIVE_TEST_RESULT
 if typing.TYPE_CHECKING:
     from covid19sim.human import Human
     from covid19sim.interventions.tracing import BaseMethod
 
-TimestampType = datetime.datetime
 TimeOffsetType = datetime.timedelta
 TimestampDefault = datetime.datetime.utcfromtimestamp(0)
-RealUserIDType = typing.Union[int, str]
 
-UIDType = int  # should be at least 16 bytes for truly unique keys?
 message_uid_bit_count = 128  # to be adjusted with the actual real bit count of the mailbox keys
 message_uid_mask = UIDType((1 << message_uid_bit_count) - 1)
 
-RiskLevelType = np.uint8
 risk_level_bit_count = 4
 risk_level_mask = RiskLevelType((1 << risk_level_bit_count) - 1)
 
@@ -41,85 +38,6 @@ def create_new_uid(rng=None) -> UIDType:
         return uid
 
 
-@dataclasses.dataclass
-class EncounterMessage:
-    """Contains all the observed+unobserved data related to a user encounter message."""
-
-    #####################
-    # observed variables
-
-    uid: UIDType
-    """Unique Identifier (UID) of the encountered user."""
-
-    risk_level: RiskLevelType
-    """Quantified risk level of the encountered user."""
-
-    encounter_time: TimestampType
-    """Discretized encounter timestamp."""
-
-    #############################################
-    # unobserved variables (for debugging only!)
-
-    _sender_uid: typing.Optional[RealUserIDType] = None
-    """Real Unique Identifier (UID) of the encountered user."""
-
-    _receiver_uid: typing.Optional[RealUserIDType] = None
-    """Real Unique Identifier (UID) of the user receiving the message."""
-
-    _real_encounter_time: typing.Optional[TimestampType] = None
-    """Real encounter timestamp."""
-
-    _exposition_event: typing.Optional[bool] = None
-    """Flags whether this encounter corresponds to an exposition event for the receiver."""
-
-    _applied_update_count: typing.Optional[int] = None
-    """List of update messages which have been applied to this encounter."""
-
-
-@dataclasses.dataclass
-class UpdateMessage:
-    """Contains all the observed+unobserved data related to a user update message."""
-
-    #####################
-    # observed variables
-
-    uid: UIDType
-    """Unique Identifier (UID) of the updater at the time of the encounter."""
-
-    old_risk_level: RiskLevelType
-    """Previous quantified risk level of the updater."""
-
-    new_risk_level: RiskLevelType
-    """New quantified risk level of the updater."""
-
-    encounter_time: TimestampType
-    """Discretized encounter timestamp."""
-
-    update_time: TimestampType
-    """Update generation timestamp."""  # TODO: this might be a 1-31 rotating day id?
-
-    #############################################
-    # unobserved variables (for debugging only!)
-
-    _sender_uid: typing.Optional[RealUserIDType] = None
-    """Real Unique Identifier (UID) of the updater."""
-
-    _receiver_uid: typing.Optional[RealUserIDType] = None
-    """Real Unique Identifier (UID) of the user receiving the message."""
-
-    _real_encounter_time: typing.Optional[TimestampType] = None
-    """Real encounter timestamp."""
-
-    _real_update_time: typing.Optional[TimestampType] = None
-    """Real update generation timestamp."""
-
-    _exposition_event: typing.Optional[bool] = None
-    """Flags whether the original encounter corresponds to an exposition event for the receiver."""
-
-    _update_reason: typing.Optional[str] = None
-    """Reason why this update message was sent (for debugging)."""
-
-
 def generate_encounter_message(
         sender: "Human",
         receiver: "Human",
@@ -166,18 +84,10 @@ def exchange_encounter_messages(
     # the encounter messages above are essentially reminders that we need to update that contact
     curr_day_idx = (env_timestamp - initial_timestamp).days
     assert 0 <= curr_day_idx
-    if curr_day_idx not in h1.contact_book.encounters_by_day:
-        assert curr_day_idx not in h1.contact_book.mailbox_keys_by_day
-        h1.contact_book.encounters_by_day[curr_day_idx] = []
-        h1.contact_book.mailbox_keys_by_day[curr_day_idx] = []
-    h1.contact_book.encounters_by_day[curr_day_idx].append(h1_msg)
-    h1.contact_book.mailbox_keys_by_day[curr_day_idx].append(h2_msg.uid)  # message uid == mailbox key
-    if curr_day_idx not in h2.contact_book.encounters_by_day:
-        assert curr_day_idx not in h2.contact_book.mailbox_keys_by_day
-        h2.contact_book.encounters_by_day[curr_day_idx] = []
-        h2.contact_book.mailbox_keys_by_day[curr_day_idx] = []
-    h2.contact_book.encounters_by_day[curr_day_idx].append(h2_msg)
-    h2.contact_book.mailbox_keys_by_day[curr_day_idx].append(h1_msg.uid)  # message uid == mailbox key
+    h1.contact_book.add_encounter(curr_day_idx, h1_msg)
+    h1.contact_book.add_mailbox_key(curr_day_idx, h2_msg.uid)  # message uid == mailbox key
+    h2.contact_book.add_encounter(curr_day_idx, h2_msg)
+    h2.contact_book.add_mailbox_key(curr_day_idx, h1_msg.uid)  # message uid == mailbox key
     return h1_msg, h2_msg
 
 
@@ -330,26 +240,60 @@ class ContactBook:
     Each human owns a contact book. This contact book can be used (for simulation tracing only!) to
     gather statistics on the Nth-order contacts of its owner. By default, it will simply provide a
     way to know who to inform when update messages must be generated.
+
+    Encounters are stored as records of an `EncounterBook` (see `covid19sim.inference.message_store`);
+    update messages are generated from them at once, and returned as dataclasses for the mailboxes.
     """
 
     def __init__(
             self,
             tracing_n_days_history: int,
+            store: typing.Optional[MessageStore] = None,
     ):
         """
         Initializes the contact book.
 
         Args:
             tracing_n_days_history: length of the contact history to keep in this object.
+            store: the message store of the simulation. A store of its own is used if None.
         """
         self.tracing_n_days_history = tracing_n_days_history
+        if store is None:
+            store = MessageStore(start_timestamp=datetime.datetime.min)
         # the encounters we keep here are the messages we sent, not the ones we received
-        self.encounters_by_day: typing.Dict[int, typing.List[EncounterMessage]] = {}
+        self.encounter_book = EncounterBook(store, tracing_n_days_history)
+        # number of encounters kept above for each contact, and a counter of the changes to this set
+        self.contact_counts: typing.Dict[RealUserIDType, int] = {}
+        self.contacts_version = 0
         # the mailbox keys are used to fetch update messages and provide them to the clustering algo
         self.mailbox_keys_by_day: typing.Dict[int, typing.List[UIDType]] = {}
+        # (day, position) of each mailbox key, used to pop update messages without scanning all keys
+        self.mailbox_key_positions: typing.Dict[UIDType, typing.Tuple[int, int]] = {}
         self.latest_update_time = datetime.datetime.min
         self._is_being_traced = False  # used for internal tracing only
 
+    @property
+    def store(self) -> MessageStore:
+        return self.encounter_book.store
+
+    def add_encounter(self, day_idx: int, encounter_message: EncounterMessage):
+        """Registers an encounter message sent on the given day."""
+        self.encounter_book.add_encounter_messages(day_idx, [encounter_message])
+        contact = encounter_message._receiver_uid
+        self.contact_counts[contact] = self.contact_counts.get(contact, 0) + 1
+        self.contacts_version += 1
+
+    def flag_exposition(self, encounter_message: EncounterMessage):
+        """Flags a registered encounter message as the exposition event of its receiver."""
+        encounter_message._exposition_event = True
+        self.encounter_book.flag_exposition(encounter_message._receiver_uid, encounter_message._real_encounter_time)
+
+    def add_mailbox_key(self, day_idx: int, mailbox_key: UIDType):
+        """Registers the mailbox key of an encounter that happened on the given day."""
+        keys = self.mailbox_keys_by_day.setdefault(day_idx, [])
+        self.mailbox_key_positions[mailbox_key] = (day_idx, len(keys))
+        keys.append(mailbox_key)
+
     def get_contacts(
             self,
             humans_map: typing.Dict[str, "Human"],
@@ -362,22 +306,24 @@ class ContactBook:
         #        been confirmed by an initial update received at the contact book owner's timeslot;
         #        this is an approximation of what would really happen however, since we would need
         #        to check whether we have actually received an update from that contact
-        output = {}
-        real_human_encounter_times = collections.defaultdict(set)
-        for day, msgs in self.encounters_by_day.items():
-            for msg in msgs:
-                if make_sure_15min_minimum_between_contacts:
-                    real_human_encounter_times[msg._receiver_uid].add(msg._real_encounter_time)
-                if msg._receiver_uid not in output and \
-                        (not only_with_initial_update or msg.risk_level is not None):
-                    output[msg._receiver_uid] = humans_map[msg._receiver_uid]
+        encounters = self.encounter_book.encounters
         if make_sure_15min_minimum_between_contacts:
-            for human_name, encounter_times in real_human_encounter_times.items():
-                encounter_times = sorted(list(encounter_times))
+            real_human_encounter_times = collections.defaultdict(set)
+            for receiver_uid, real_encounter_time in zip(encounters["receiver_uid"].tolist(),
+                                                         encounters["real_encounter_time"].tolist()):
+                real_human_encounter_times[receiver_uid].add(real_encounter_time)
+            fifteen_minutes = datetime.timedelta(minutes=15) // datetime.timedelta(microseconds=1)
+            for encounter_times in real_human_encounter_times.values():
+                encounter_times = sorted(encounter_times)
                 for encounter_time_idx in range(1, len(encounter_times)):
                     assert (encounter_times[encounter_time_idx] -
-                            encounter_times[encounter_time_idx - 1]) >= datetime.timedelta(minutes=15)
-        return list(output.values())
+                            encounter_times[encounter_time_idx - 1]) >= fifteen_minutes
+        receiver_uids = encounters["receiver_uid"]
+        if only_with_initial_update:
+            receiver_uids = receiver_uids[encounters["risk_level"] != NO_RISK_LEVEL]
+        # contacts in the order of their first encounter
+        _, first_indices = np.unique(receiver_uids, return_index=True)
+        return [humans_map[self.store.string(uid)] for uid in receiver_uids[np.sort(first_indices)].tolist()]
 
     def get_positive_contacts_counts(
             self,
@@ -439,10 +385,12 @@ class ContactBook:
             The risk level change score (a numeric value).
         """
         change = 0
+        days, counts = np.unique(self.encounter_book.day_idxs, return_counts=True)
+        n_encs_by_day = dict(zip(days.tolist(), counts.tolist()))
         for day_idx in set(prev_risk_history_map.keys()) & set(curr_risk_history_map.keys()):
             old_risk_level = min(proba_to_risk_level_map(prev_risk_history_map[day_idx]), 15)
             curr_risk_level = min(proba_to_risk_level_map(curr_risk_history_map[day_idx]), 15)
-            n_encs_for_day = len(self.encounters_by_day.get(day_idx, []))
+            n_encs_for_day = n_encs_by_day.get(day_idx, 0)
             change += abs(curr_risk_level - old_risk_level) * n_encs_for_day
         return change  # Danger potential PII => fewer bits
 
@@ -453,14 +401,18 @@ class ContactBook:
     ):
         """Removes all sent/received encounter messages older than TRACING_N_DAYS_HISTORY."""
         current_day_idx = (current_timestamp - init_timestamp).days
-        self.encounters_by_day = {
-            day: msgs for day, msgs in self.encounters_by_day.items()
-            if day >= current_day_idx - self.tracing_n_days_history
-        }
-        self.mailbox_keys_by_day = {
-            day: keys for day, keys in self.mailbox_keys_by_day.items()
-            if day >= current_day_idx - self.tracing_n_days_history
-        }
+        removed = self.encounter_book.cleanup_contacts(current_day_idx)
+        if len(removed):
+            receiver_uids, counts = np.unique(removed["receiver_uid"], return_counts=True)
+            for receiver_uid, count in zip(receiver_uids.tolist(), counts.tolist()):
+                contact = self.store.string(receiver_uid)
+                self.contact_counts[contact] -= count
+                if not self.contact_counts[contact]:
+                    del self.contact_counts[contact]
+            self.contacts_version += 1
+        for day in [day for day in self.mailbox_keys_by_day if day < current_day_idx - self.tracing_n_days_history]:
+            for key in self.mailbox_keys_by_day.pop(day):
+                self.mailbox_key_positions.pop(key, None)
 
     def generate_initial_updates(
             self,
@@ -486,28 +438,14 @@ class ContactBook:
         Returns:
             A list of update messages to send out to contacts (if any).
         """
-        update_messages = []
-        if intervention is None:
-            return update_messages  # no need to generate update messages until tracing is enabled
-        assert current_day_idx >= 0
-        for encounter_day_idx, encounter_messages in self.encounters_by_day.items():
-            for encounter_message in encounter_messages:
-                if encounter_message.risk_level is None:  # we never sent the first update w/ the risk level
-                    assert 0 <= encounter_day_idx <= current_day_idx, \
-                        "can't have encounters before init or after today...?"
-                    assert encounter_day_idx in risk_history_map, \
-                        "how could we have an encounter without a risk at that point? use default?"
-                    encounter_message.risk_level = \
-                        min(proba_to_risk_level_map(risk_history_map[encounter_day_idx]), 15)
-                    update_messages.append(
-                        create_update_message(
-                            encounter_message=encounter_message,
-                            new_risk_level=RiskLevelType(encounter_message.risk_level),
-                            current_time=current_timestamp,
-                            update_reason="contact",
-                        )
-                    )
-        return update_messages
+        update_records = self.encounter_book.generate_initial_updates(
+            current_day_idx=current_day_idx,
+            current_timestamp=current_timestamp,
+            risk_history_map=risk_history_map,
+            proba_to_risk_level_map=proba_to_risk_level_map,
+            intervention=intervention,
+        )
+        return self.store.update_messages(update_records)
 
     def generate_updates(
             self,
@@ -537,39 +475,81 @@ class ContactBook:
         Returns:
             A list of update messages to send out to contacts (if any).
         """
-        update_messages = []
-        if intervention is None:
-            return update_messages  # no need to generate update messages until tracing is enabled
-        assert current_day_idx >= 0
-        for encounter_day_idx, encounter_messages in self.encounters_by_day.items():
-            assert current_day_idx - encounter_day_idx <= self.tracing_n_days_history, \
-                "contact book should have been cleaned up before calling update method...?"
-            if encounter_day_idx not in prev_risk_history_map.keys():
-                prev_risk_history_map[encounter_day_idx] = curr_risk_history_map[encounter_day_idx]
+        update_records = self.encounter_book.generate_updates(
+            current_day_idx=current_day_idx,
+            current_timestamp=current_timestamp,
+            prev_risk_history_map=prev_risk_history_map,
+            curr_risk_history_map=curr_risk_history_map,
+            proba_to_risk_level_map=proba_to_risk_level_map,
+            update_reason=update_reason,
+            intervention=intervention,
+        )
+        return self.store.update_messages(update_records)
+
+
+class GlobalMailbox(dict):
+    """
+    Simulator-side mailbox holding the personal mailbox (a dictionary of update messages indexed
+    by mailbox key) of every user.
+
+    Mailbox keys are also bucketed by the day of the encounter they belong to, so that expiring
+    old messages only requires dropping the buckets that fell out of the tracing history instead
+    of rebuilding every personal mailbox.
+    """
+
+    def __init__(self, max_encounter_age: int):
+        """
+        Initializes the global mailbox.
+
+        Args:
+            max_encounter_age: age (in days) after which update messages are discarded.
+        """
+        super().__init__()
+        self.max_encounter_age = max_encounter_age
+        # encounter day ordinal => (user, mailbox key) pairs registered for encounters on that day
+        self.buckets: typing.Dict[int, typing.List[typing.Tuple[RealUserIDType, UIDType]]] = {}
+
+    def __missing__(self, user_key: RealUserIDType) -> typing.Dict[UIDType, typing.List[UpdateMessage]]:
+        personal_mailbox = self[user_key] = {}
+        return personal_mailbox
+
+    def add_message(self, user_key: RealUserIDType, update_message: UpdateMessage):
+        """Adds an update message to the personal mailbox of the given user."""
+        mailbox_key = update_message.uid  # mailbox key = message uid
+        personal_mailbox = self[user_key]
+        if mailbox_key not in personal_mailbox:
+            personal_mailbox[mailbox_key] = []
+            day = update_message.encounter_time.toordinal()
+            if day not in self.buckets:
+                self.buckets[day] = []
+            self.buckets[day].append((user_key, mailbox_key))
+        personal_mailbox[mailbox_key].append(update_message)
+
+    def cleanup(self, current_timestamp: TimestampType):
+        """Removes all messages older than `max_encounter_age` days."""
+        # messages are kept if (current_timestamp - encounter_time).days <= max_encounter_age, i.e.
+        # if they happened after the cutoff; only the bucket of the cutoff day has to be checked
+        cutoff = current_timestamp - datetime.timedelta(days=self.max_encounter_age + 1)
+        cutoff_day = cutoff.toordinal()
+        for day in [day for day in self.buckets if day <= cutoff_day]:
+            bucket = self.buckets.pop(day)
+            if day < cutoff_day:
+                for user_key, mailbox_key in bucket:
+                    self[user_key].pop(mailbox_key, None)
                 continue
-            old_risk_level = min(proba_to_risk_level_map(prev_risk_history_map[encounter_day_idx]), 15)
-            new_risk_level = min(proba_to_risk_level_map(curr_risk_history_map[encounter_day_idx]), 15)
-            if old_risk_level != new_risk_level:
-                for encounter_idx, encounter_message in enumerate(encounter_messages):
-                    assert encounter_message.risk_level is not None, \
-                        "should have already initialized all encounters before updating...?"
-                    assert encounter_message.risk_level == old_risk_level or \
-                        encounter_message.risk_level == new_risk_level, \
-                        "encounter message risk mismatch (should have old level if already initialized " \
-                        "or new level if it was initialized just now, but nothing else)"
-                    if encounter_message.risk_level != new_risk_level:
-                        update_messages.append(
-                            create_update_message(
-                                encounter_message=encounter_message,
-                                new_risk_level=RiskLevelType(new_risk_level),
-                                current_time=current_timestamp,
-                                update_reason=update_reason,
-                            )
-                        )
-                        encounter_messages[encounter_idx] = create_updated_encounter_with_message(
-                            encounter_message, update_messages[-1],  # to keep track of applied updates internally...
-                        )
-        return update_messages
+            kept_bucket = []
+            for user_key, mailbox_key in bucket:
+                personal_mailbox = self[user_key]
+                if mailbox_key not in personal_mailbox:
+                    continue
+                messages = [m for m in personal_mailbox[mailbox_key] if m.encounter_time > cutoff]
+                if messages:
+                    personal_mailbox[mailbox_key] = messages
+                    kept_bucket.append((user_key, mailbox_key))
+                else:
+                    del personal_mailbox[mailbox_key]
+            if kept_bucket:
+                self.buckets[day] = kept_bucket
 
 
 def batch_messages(
@@ -0,0 +1,107 @@
+"""
+Routing of humans to inference workers.
+
+Humans are assigned to workers with a consistent hash of their cluster manager key (`city_hash:name`),
+so that each worker always processes the same humans and can keep their cluster managers in its own memory.
+When a worker is removed, only the humans it owned are assigned to other workers.
+"""
+import bisect
+import hashlib
+import typing
+
+# number of points of each worker on the hash ring; more points spread humans more evenly
+default_virtual_nodes = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "little")
+
+
+def get_cluster_mgr_hash(params: typing.Dict) -> str:
+    """Returns the key of the cluster manager of the human in an inference request."""
+    return str(params["city_hash"]) + ":" + params["human"].name
+
+
+class ConsistentHashRing:
+    """
+    Maps keys to nodes (here, inference workers) with consistent hashing.
+    """
+
+    def __init__(self, nodes: typing.Iterable[typing.Hashable] = (), virtual_nodes: int = default_virtual_nodes):
+        """
+        Args:
+            nodes (iterable): nodes to add to the ring
+            virtual_nodes (int): number of points of each node on the ring
+        """
+        self.virtual_nodes = virtual_nodes
+        self.points = []  # sorted hashes of the points
+        self.point_nodes = []  # node of each point, in the same order
+        self.nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    def add(self, node: typing.Hashable):
+        """Adds a node to the ring."""
+        assert node not in self.nodes, f"{node} is already on the ring"
+        self.nodes.add(node)
+        for idx in range(self.virtual_nodes):
+            point = _hash(f"{node}#{idx}")
+            position = bisect.bisect(self.points, point)
+            self.points.insert(position, point)
+            self.point_nodes.insert(position, node)
+
+    def remove(self, node: typing.Hashable):
+        """Removes a node from the ring. Its keys are assigned to the next nodes on the ring."""
+        self.nodes.remove(node)
+        kept = [(point, n) for point, n in zip(self.points, self.point_nodes) if n != node]
+        self.points = [point for point, _ in kept]
+        self.point_nodes = [n for _, n in kept]
+
+    def get(self, key: str) -> typing.Hashable:
+        """Returns the node a key is assigned to."""
+        assert self.points, "there are no nodes on the ring"
+        position = bisect.bisect(self.points, _hash(key)) % len(self.points)
+        return self.point_nodes[position]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def __contains__(self, node):
+        return node in self.nodes
+
+
+def split_keys(
+        keys: typing.Sequence[str],
+        ring: ConsistentHashRing,
+) -> typing.Dict[typing.Hashable, typing.List[int]]:
+    """
+    Splits the cluster manager keys of a batch between the workers which own them.
+
+    Returns:
+        worker => indices of its keys in the batch
+    """
+    parts = {}
+    for idx, key in enumerate(keys):
+        parts.setdefault(ring.get(key), []).append(idx)
+    return parts
+
+
+def split_batch(
+        sample: typing.List[typing.Dict],
+        ring: ConsistentHashRing,
+) -> typing.Dict[typing.Hashable, typing.Tuple[typing.List[int], typing.List[typing.Dict]]]:
+    """
+    Splits a batch of inference requests between the workers which own their humans.
+
+    Args:
+        sample: list of inference requests (see `batch_run_timeslot_heavy_jobs`)
+        ring: consistent hash ring of the workers
+
+    Returns:
+        worker => (indices of the requests in the batch, requests)
+    """
+    keys = [get_cluster_mgr_hash(params) for params in sample]
+    return {
+        worker: (indices, [sample[idx] for idx in indices])
+        for worker, indices in split_keys(keys, ring).items()
+    }
@@ -54,6 +54,9 @@ def parse_args(args=None):
     weights_path_doc = "Path to the specific weights to reload inside the inference engine(s). " \
                        "Will use the 'best checkpoint' weights if not specified."
     inference_argparser.add_argument("--weights-path", default=None, type=str, help=weights_path_doc)
+    threads_doc = "Number of CPU threads used by the inference engine of each worker. " \
+                  "Will use the engine's default if not specified."
+    inference_argparser.add_argument("--threads", default=None, type=int, help=threads_doc)
     datacollect_argparser = subparsers.add_parser("datacollect", help="Create a data collection server")
     data_output_path_doc = "Path to the HDF5 file that will contain all collected data samples."
     datacollect_argparser.add_argument("-o", "--out-path", type=str, help=data_output_path_doc)
@@ -112,6 +115,7 @@ def main(args=None):
             frontend_address=frontend_address,
             backend_address=backend_address,
             weights_path=args.weights_path,
+            n_threads=args.threads,
             verbose=args.verbose,
         )
     elif args.type == "datacollect":
@@ -2,13 +2,13 @@
 Contains utility classes for remote inference inside the simulation.
 """
 
+import collections
 import datetime
 # import h5py
 import zarr
 import numcodecs
 import json
 import multiprocessing
-import multiprocessing.managers
 import numpy as np
 import os
 import pickle
@@ -26,6 +26,9 @@ import covid19sim.inference.clustering.base
 import covid19sim.inference.message_utils
 import covid19sim.inference.helper
 import covid19sim.inference.oracle
+import covid19sim.inference.routing
+import covid19sim.inference.training_data
+import covid19sim.inference.wire_format
 import covid19sim.utils.utils
 
 expected_raw_packet_param_names = [
@@ -36,7 +39,15 @@ expected_processed_packet_param_names = [
 ]
 
 default_poll_delay_ms = 500
+default_reset_timeout_ms = 60 * 1000  # delay after which workers that did not acknowledge a reset are dropped
 default_data_buffer_size = ((10 * 1024) * 1024)  # 10MB
+default_inference_client_pool_size = 16  # connections opened by an inference client pool
+default_inference_max_pending_requests = 4  # requests sent on each connection without having been answered
+default_inference_reply_timeout_ms = 10 * 60 * 1000  # delay without any reply after which the server is deemed dead
+default_data_collection_batch_size = 100  # samples per frame sent by a data collection client
+default_data_collection_max_pending_batches = 8  # frames sent by a client without having been acknowledged
+default_inference_max_batch_size = 64  # humans collated in a single forward pass of the inference engine
+data_collection_formats = ["pickle", covid19sim.inference.training_data.TRAINING_DATA_FORMAT]
 
 if os.environ.get("RAVEN_DIR", None) is not None:
     # if on MPI-IS cluster (htcondor + raven)
@@ -59,6 +70,16 @@ default_datacollect_frontend_address = "ipc://" + os.path.join(frontend_path, "c
 default_datacollect_backend_address = "ipc://" + os.path.join(backend_path, "covid19sim-datacollect-backend.ipc")
 
 
+def _split_envelope(frames: typing.List) -> typing.Tuple[typing.List[bytes], typing.List]:
+    """Splits a message received through a ROUTER socket into its envelope and its (non-empty) payload frames."""
+    delimiter_idx = max(idx for idx, frame in enumerate(frames) if not len(frame))
+    return [bytes(frame) for frame in frames[:delimiter_idx + 1]], frames[delimiter_idx + 1:]
+
+
+def _is_reset(payload: typing.List) -> bool:
+    return len(payload) == 1 and len(payload[0]) == len(b"RESET") and bytes(payload[0]) == b"RESET"
+
+
 class BaseWorker(multiprocessing.Process):
     """Spawns a single worker instance.
 
@@ -170,7 +191,9 @@ class InferenceWorker(BaseWorker):
     Spawns a single inference worker instance.
 
     These workers are managed by the InferenceBroker class. They
-    communicate with the broker using a backend connection.
+    communicate with the broker using a backend connection. The broker
+    always sends the same humans to the same worker, so the cluster
+    managers of these humans are kept in the worker's own memory.
     """
 
     def __init__(
@@ -178,8 +201,8 @@ class InferenceWorker(BaseWorker):
             experiment_directory: typing.AnyStr,
             backend_address: typing.AnyStr,
             identifier: typing.Any,
-            cluster_mgr_map: typing.Dict,
             weights_path: typing.Optional[typing.AnyStr] = None,
+            n_threads: typing.Optional[int] = None,
     ):
         """
         Initializes the inference worker's attributes (counters, condvars, ...).
@@ -188,14 +211,20 @@ class InferenceWorker(BaseWorker):
             experiment_directory: the path to the experiment directory to pass to the inference engine.
             backend_address: address through which to exchange inference requests with the broker.
             identifier: identifier for this worker (name, used for debug purposes only).
-            cluster_mgr_map: map of human-to-cluster-managers to use for clustering.
             weights_path: the path to the specific weight file to use. If not, will use the 'best
                 checkpoint weights' inside the experiment directory.
+            n_threads: the number of CPU threads used by the inference engine. If not, will use the
+                engine's default.
         """
         super().__init__(backend_address=backend_address, identifier=identifier)
         self.experiment_directory = experiment_directory
         self.weights_path = weights_path
-        self.cluster_mgr_map = cluster_mgr_map
+        self.n_threads = n_threads
+        self.cluster_mgr_count = multiprocessing.Value("i", 0)
+
+    def get_cluster_mgr_count(self):
+        """Returns the number of cluster managers held by this worker."""
+        return int(self.cluster_mgr_count.value)
 
     def run(self):
         """Main loop of the inference worker process.
@@ -203,7 +232,9 @@ class InferenceWorker(BaseWorker):
         Will receive brokered requests from the frontend, process them, and respond
         with the result through the broker.
         """
-        engine = InferenceEngineWrapper(self.experiment_directory, self.weights_path)
+        engine = InferenceEngineWrapper(self.experiment_directory, self.weights_path, n_threads=self.n_threads)
+        cluster_mgr_map = {}
+        confs = {}  # id => configuration, for the batches received in the wire format
         context = zmq.Context()
         socket = context.socket(zmq.REQ)
         socket.identity = self.identifier.encode()
@@ -217,23 +248,38 @@ class InferenceWorker(BaseWorker):
         self.packet_counter.value = 0
         self.running_flag.value = 1
         while not self.stop_flag.is_set():
-            if self.reset_flag.is_set():
-                self.time_counter.value = 0.0
-                self.packet_counter.value = 0
-                self.time_init.value = 0.0
-                self.reset_flag.clear()
             evts = dict(poller.poll(default_poll_delay_ms))
             if socket in evts and evts[socket] == zmq.POLLIN:
                 proc_start_time = time.time()
-                address, empty, buffer = socket.recv_multipart()
-                sample = pickle.loads(buffer)
-                response = proc_human_batch(
-                    sample=sample,
-                    engine=engine,
-                    cluster_mgr_map=self.cluster_mgr_map,
-                )
-                response = pickle.dumps(response)
-                socket.send_multipart([address, b"", response])
+                frames = socket.recv_multipart(copy=False)
+                part_id, payload = frames[0].bytes, frames[2:]
+                if _is_reset(payload):
+                    cluster_mgr_map.clear()
+                    self.cluster_mgr_count.value = 0
+                    self.time_counter.value = 0.0
+                    self.packet_counter.value = 0
+                    self.time_init.value = time.time()
+                    socket.send_multipart([part_id, b"", b"READY"])
+                    continue
+                if covid19sim.inference.wire_format.is_encoded(payload[0]):
+                    batch = covid19sim.inference.wire_format.EncodedBatch.from_frames(payload)
+                    if batch.conf_frame is not None:
+                        confs[batch.conf_id] = pickle.loads(batch.conf_frame)
+                    response = proc_human_batch(
+                        sample=batch.decode(confs[batch.conf_id]),
+                        engine=engine,
+                        cluster_mgr_map=cluster_mgr_map,
+                    )
+                    response = covid19sim.inference.wire_format.encode_reply(response)
+                else:
+                    response = proc_human_batch(
+                        sample=pickle.loads(payload[0]),
+                        engine=engine,
+                        cluster_mgr_map=cluster_mgr_map,
+                    )
+                    response = [pickle.dumps(response)]
+                socket.send_multipart([part_id, b""] + response, copy=False)
+                self.cluster_mgr_count.value = len(cluster_mgr_map)
                 with self.time_counter.get_lock():
                     self.time_counter.value += time.time() - proc_start_time
                 with self.packet_counter.get_lock():
@@ -254,6 +300,7 @@ class InferenceBroker(BaseBroker):
             verbose: bool = False,
             verbose_print_delay: float = 5.,
             weights_path: typing.Optional[typing.AnyStr] = None,
+            n_threads: typing.Optional[int] = None,
     ):
         """
         Initializes the inference broker's attributes (counters, condvars, ...).
@@ -267,6 +314,8 @@ class InferenceBroker(BaseBroker):
             verbose_print_delay: specifies how often the extra debug info should be printed.
             weights_path: the path to the specific weight file to use. If not, will use the 'best
                 checkpoint weights' inside the experiment directory.
+            n_threads: the number of CPU threads used by the inference engine of each worker. If
+                not, will use the engine's default.
         """
         super().__init__(
             workers=workers,
@@ -277,11 +326,21 @@ class InferenceBroker(BaseBroker):
         )
         self.model_exp_path = model_exp_path
         self.weights_path = weights_path
+        self.n_threads = n_threads
 
     def run(self):
         """Main loop of the inference broker process.
 
         Will received requests from clients and dispatch them to available workers.
+
+        Humans are routed to workers with consistent hashing (see `covid19sim.inference.routing`),
+        so requests are split between the workers that own their humans, and the replies are merged
+        before being sent back to the client. Requests which are not batches of humans are sent to
+        the least busy worker. If a worker dies, its humans are routed to the other workers, which
+        start over with new cluster managers for them.
+
+        Batches of humans encoded with `covid19sim.inference.wire_format` are split and forwarded without
+        decoding the humans, and each worker receives a configuration once, with the first batch using it.
         """
         print(f"Initializing {self.workers} worker(s) from experiment: {self.model_exp_path}", flush=True)
         if self.weights_path is not None:
@@ -297,70 +356,191 @@ class InferenceBroker(BaseBroker):
         worker_poller = zmq.Poller()
         worker_poller.register(backend, zmq.POLLIN)
         worker_poller.register(frontend, zmq.POLLIN)
-        with multiprocessing.Manager() as mem_manager:
-            worker_map = {}
-            cluster_mgr_map = mem_manager.dict()
-            available_worker_ids = []
-            for worker_idx in range(self.workers):
-                worker_id = f"worker:{worker_idx}"
-                print(f"Launching {worker_id}...", flush=True)
-                worker = InferenceWorker(
-                    experiment_directory=self.model_exp_path,
-                    backend_address=worker_backend_address,
-                    identifier=worker_id,
-                    cluster_mgr_map=cluster_mgr_map,
-                    weights_path=self.weights_path,
-                )
-                worker_map[worker_id] = worker
-                worker.start()
-                request = backend.recv_multipart()
-                worker_id, empty, response = request[:3]
-                assert worker_id == worker.identifier.encode() and response == b"READY"
-                available_worker_ids.append(worker.identifier.encode())
-            last_update_timestamp = time.time()
-            print("Entering dispatch loop...", flush=True)
-            while not self.stop_flag.is_set():
-                evts = dict(worker_poller.poll(default_poll_delay_ms))
-                if backend in evts and evts[backend] == zmq.POLLIN:
-                    request = backend.recv_multipart()
-                    worker_id, empty, client = request[:3]
-                    assert worker_id not in available_worker_ids, \
-                        f"got unexpected stuff from {worker_id}: {request}"
-                    available_worker_ids.append(worker_id)
-                    empty, reply = request[3:]
-                    frontend.send_multipart([client, b"", reply])
-                if available_worker_ids and frontend in evts and evts[frontend] == zmq.POLLIN:
-                    client, empty, request = frontend.recv_multipart()
-                    if request == b"RESET":
-                        print("got reset request, will clear all clusters", flush=True)
-                        assert len(available_worker_ids) == self.workers
-                        for k in list(cluster_mgr_map.keys()):
-                            del cluster_mgr_map[k]
-                        for worker in worker_map.values():
-                            worker.reset_flag.set()
-                        frontend.send_multipart([client, b"", b"READY"])
+        backend_poller = zmq.Poller()
+        backend_poller.register(backend, zmq.POLLIN)
+        worker_map = {}
+        for worker_idx in range(self.workers):
+            worker_id = f"worker:{worker_idx}"
+            print(f"Launching {worker_id}...", flush=True)
+            worker = InferenceWorker(
+                experiment_directory=self.model_exp_path,
+                backend_address=worker_backend_address,
+                identifier=worker_id,
+                weights_path=self.weights_path,
+                n_threads=self.n_threads,
+            )
+            worker_map[worker_id.encode()] = worker
+            worker.start()
+            request = backend.recv_multipart()
+            worker_id, empty, response = request[:3]
+            assert worker_id == worker.identifier.encode() and response == b"READY"
+        ring = covid19sim.inference.routing.ConsistentHashRing(worker_map.keys())
+        worker_queues = {worker_id: collections.deque() for worker_id in worker_map}
+        busy_workers = {}  # worker id => id of the part it is processing
+        parts = {}  # part id => (request id, indices of the part's samples in the request, samples)
+        requests = {}  # request id => [reply envelope, results, number of parts left, is encoded]
+        confs = {}  # configuration id => pickled configuration, for encoded batches
+        worker_conf_ids = {worker_id: set() for worker_id in worker_map}  # configurations sent to each worker
+        part_counter, request_counter = 0, 0
+
+        def enqueue(request_id, indices, sample):
+            nonlocal part_counter
+            if isinstance(sample, covid19sim.inference.wire_format.EncodedBatch):
+                split = covid19sim.inference.routing.split_keys(sample.keys, ring)
+                split = {w: (idxs, sample.subset(idxs)) for w, idxs in split.items()}
+                split = {w: ([indices[i] for i in idxs], batch) for w, (idxs, batch) in split.items()}
+            elif isinstance(sample, list) and all(isinstance(p, dict) and "human" in p for p in sample):
+                split = covid19sim.inference.routing.split_batch(sample, ring)
+                split = {w: ([indices[i] for i in idxs], params) for w, (idxs, params) in split.items()}
+            else:
+                worker_id = min(ring.nodes, key=lambda w: len(worker_queues[w]) + (w in busy_workers))
+                split = {worker_id: (indices, sample)}
+            requests[request_id][2] += len(split)
+            for worker_id, (part_indices, part_sample) in split.items():
+                part_id = str(part_counter).encode()
+                part_counter += 1
+                parts[part_id] = (request_id, part_indices, part_sample)
+                worker_queues[worker_id].append(part_id)
+
+        def dispatch():
+            for worker_id, queue in worker_queues.items():
+                if queue and worker_id not in busy_workers:
+                    part_id = queue.popleft()
+                    sample = parts[part_id][2]
+                    if isinstance(sample, covid19sim.inference.wire_format.EncodedBatch):
+                        conf_frame = None if sample.conf_id in worker_conf_ids[worker_id] else confs[sample.conf_id]
+                        worker_conf_ids[worker_id].add(sample.conf_id)
+                        payload = covid19sim.inference.wire_format.EncodedBatch(
+                            sample.header, sample.human_frames, conf_frame).to_frames()
+                    else:
+                        payload = [pickle.dumps(sample)]
+                    backend.send_multipart([worker_id, b"", part_id, b""] + payload, copy=False)
+                    busy_workers[worker_id] = part_id
+
+        def remove_worker(worker_id, reason):
+            print(f"{worker_id.decode()} {reason}, its humans will be processed by other workers", flush=True)
+            ring.remove(worker_id)
+            if not len(ring):
+                raise RuntimeError("no inference worker left")
+            lost_parts = list(worker_queues.pop(worker_id))
+            if worker_id in busy_workers:
+                lost_parts.append(busy_workers.pop(worker_id))
+            for part_id in lost_parts:
+                request_id, indices, sample = parts.pop(part_id)
+                requests[request_id][2] -= 1
+                enqueue(request_id, indices, sample)
+
+        def remove_dead_workers():
+            for worker_id in [w for w in ring.nodes if not worker_map[w].is_alive()]:
+                remove_worker(worker_id, "died")
+
+        def reset_workers():
+            # workers which die or don't answer in time are dropped from the ring, as in the dispatch loop
+            pending = set(ring.nodes)
+            for worker_id in pending:
+                backend.send_multipart([worker_id, b"", b"RESET", b"", b"RESET"])
+            deadline = time.time() + default_reset_timeout_ms / 1000
+            while pending:
+                if backend_poller.poll(default_poll_delay_ms):
+                    reply = backend.recv_multipart()
+                    if reply[0] in pending:
+                        assert reply[2:] == [b"RESET", b"", b"READY"], f"unexpected reset reply: {reply}"
+                        pending.remove(reply[0])
+                    continue
+                remove_dead_workers()
+                pending &= ring.nodes
+                if pending and time.time() > deadline:
+                    for worker_id in pending:
+                        remove_worker(worker_id, "did not acknowledge the reset")
+                        worker_map[worker_id].terminate()
+                    pending = set()
+
+        last_update_timestamp = time.time()
+        print("Entering dispatch loop...", flush=True)
+        reset_clients = []
+        while not self.stop_flag.is_set():
+            remove_dead_workers()
+            # new requests are only accepted if a worker can take them, which keeps clients waiting otherwise
+            accept_requests = not reset_clients and len(busy_workers) < len(ring)
+            evts = dict((worker_poller if accept_requests else backend_poller).poll(default_poll_delay_ms))
+            if backend in evts and evts[backend] == zmq.POLLIN:
+                request = backend.recv_multipart(copy=False)
+                worker_id, empty, part_id = [frame.bytes for frame in request[:3]]
+                if busy_workers.get(worker_id) == part_id:
+                    del busy_workers[worker_id]
+                    request_id, indices, sample = parts.pop(part_id)
+                    request_state = requests[request_id]
+                    reply = covid19sim.inference.wire_format.decode_payload(request[4:])
+                    if indices is None:
+                        request_state[1] = reply
                     else:
-                        worker_id = available_worker_ids.pop(0)
-                        backend.send_multipart([worker_id, b"", client, b"", request])
-                if self.verbose and time.time() - last_update_timestamp > self.verbose_print_delay:
-                    print(f" {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} stats:")
-                    for worker_id, worker in worker_map.items():
-                        packets = worker.get_processed_count()
-                        delay = worker.get_averge_processing_delay()
-                        uptime = worker.get_processing_uptime()
-                        print(
-                            f"  {worker_id}:"
-                            f"  running={worker.is_running()}"
-                            f"  packets={packets}"
-                            f"  avg_delay={delay:.6f}sec"
-                            f"  proc_time_ratio={uptime:.1%}"
-                            f"  nb_clusters={len(worker.cluster_mgr_map)}"
-                        )
-                    sys.stdout.flush()
-                    last_update_timestamp = time.time()
-            for w in worker_map.values():
-                w.stop_gracefully()
-                w.join()
+                        for idx, result in zip(indices, reply):
+                            request_state[1][idx] = result
+                    request_state[2] -= 1
+                    if not request_state[2]:
+                        del requests[request_id]
+                        if request_state[3]:
+                            reply = covid19sim.inference.wire_format.encode_reply(request_state[1])
+                        else:
+                            reply = [pickle.dumps(request_state[1])]
+                        frontend.send_multipart(request_state[0] + reply, copy=False)
+            if accept_requests and frontend in evts and evts[frontend] == zmq.POLLIN:
+                # REQ clients send [client, b"", request], and pooled DEALER clients add a correlation id
+                # frame to pipeline their requests: [client, b"", correlation id, b"", request]. The request
+                # is either pickled in a single frame, or spans several frames in the wire format.
+                envelope, payload = _split_envelope(frontend.recv_multipart(copy=False))
+                if _is_reset(payload):
+                    print("got reset request, will clear all clusters", flush=True)
+                    reset_clients.append(envelope)
+                else:
+                    request_id = request_counter
+                    request_counter += 1
+                    if covid19sim.inference.wire_format.is_encoded(payload[0]):
+                        sample = covid19sim.inference.wire_format.EncodedBatch.from_frames(payload)
+                        if sample.conf_frame is not None:
+                            confs[sample.conf_id] = sample.conf_frame
+                        assert sample.conf_id in confs, "the configuration of an encoded batch was never received"
+                        requests[request_id] = [envelope, [None] * len(sample), 0, True]
+                        enqueue(request_id, list(range(len(sample))), sample)
+                    else:
+                        sample = pickle.loads(payload[0])
+                        if isinstance(sample, list):
+                            requests[request_id] = [envelope, [None] * len(sample), 0, False]
+                            enqueue(request_id, list(range(len(sample))), sample)
+                        else:
+                            requests[request_id] = [envelope, None, 0, False]
+                            enqueue(request_id, None, sample)
+                    if not requests[request_id][2]:
+                        # empty batch
+                        del requests[request_id]
+                        frontend.send_multipart(envelope + [pickle.dumps([])])
+            if reset_clients and not requests:
+                # the reset waits for the requests of other clients to be processed
+                reset_workers()
+                for envelope in reset_clients:
+                    frontend.send_multipart(envelope + [b"READY"])
+                reset_clients = []
+            dispatch()
+            if self.verbose and time.time() - last_update_timestamp > self.verbose_print_delay:
+                print(f" {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')} stats:")
+                for worker_id, worker in worker_map.items():
+                    packets = worker.get_processed_count()
+                    delay = worker.get_averge_processing_delay()
+                    uptime = worker.get_processing_uptime()
+                    print(
+                        f"  {worker_id.decode()}:"
+                        f"  running={worker.is_running()}"
+                        f"  packets={packets}"
+                        f"  avg_delay={delay:.6f}sec"
+                        f"  proc_time_ratio={uptime:.1%}"
+                        f"  nb_clusters={worker.get_cluster_mgr_count()}"
+                        f"  queued={len(worker_queues.get(worker_id, []))}"
+                    )
+                sys.stdout.flush()
+                last_update_timestamp = time.time()
+        for w in worker_map.values():
+            w.stop_gracefully()
+            w.join()
 
 
 class InferenceClient:
@@ -368,8 +548,9 @@ class InferenceClient:
     Creates a client through which data samples can be sent for inference.
 
     This object will automatically be able to pick a proper remote inference
-    engine. This object should be fairly lightweight and low-cost, so creating
-    it once per day, per human *should* not create a significant overhead.
+    engine. Each client opens its own connection and handles a single request
+    at a time; to send many requests concurrently, use an `InferenceClientPool`.
+    Batches of humans are sent in the format of `covid19sim.inference.wire_format`.
     """
 
     def __init__(
@@ -391,11 +572,12 @@ class InferenceClient:
         if server_address is None:
             server_address = default_inference_frontend_address
         self.socket.connect(server_address)
+        self.encoder = covid19sim.inference.wire_format.RequestEncoder()
 
     def infer(self, sample):
-        """Forwards a data sample for the inference engine using pickle."""
-        self.socket.send_pyobj(sample)
-        return self.socket.recv_pyobj()
+        """Forwards a data sample for the inference engine."""
+        self.socket.send_multipart(self.encoder.encode(sample), copy=False)
+        return covid19sim.inference.wire_format.decode_payload(self.socket.recv_multipart(copy=False))
 
     def request_reset(self):
         self.socket.send(b"RESET")
@@ -403,6 +585,119 @@ class InferenceClient:
         assert response == b"READY"
 
 
+class InferenceClientPool:
+    """
+    Long-lived pool of connections to the inference server, through which batches of samples are
+    streamed concurrently.
+
+    The pool holds a single zmq context and `n_sockets` DEALER sockets, which stay connected for the
+    whole simulation. Requests are pipelined: each socket can have up to `max_pending_requests` requests
+    in flight, and replies are matched to their request with a correlation id, as the broker may
+    answer them in any order. Batches of humans are sent in the format of `covid19sim.inference.wire_format`,
+    and each configuration is only sent once per socket. Sockets cannot be shared between processes or threads, so a pool
+    should only be used by the process (and thread) which created it.
+    """
+
+    def __init__(
+            self,
+            server_address: typing.Optional[typing.AnyStr] = default_inference_frontend_address,
+            n_sockets: int = default_inference_client_pool_size,
+            max_pending_requests: int = default_inference_max_pending_requests,
+            reply_timeout_ms: int = default_inference_reply_timeout_ms,
+    ):
+        """
+        Initializes the pool's attributes (context, sockets).
+
+        Args:
+            server_address: address of the inference server frontend to send requests to.
+            n_sockets: number of connections to the server.
+            max_pending_requests: number of requests that can be in flight on each connection.
+            reply_timeout_ms: delay after which the server is deemed dead if none of the pending requests
+                were answered.
+        """
+        if server_address is None:
+            server_address = default_inference_frontend_address
+        self.server_address = server_address
+        self.context = zmq.Context()
+        self.sockets = []
+        for _ in range(max(n_sockets, 1)):
+            socket = self.context.socket(zmq.DEALER)
+            socket.connect(server_address)
+            self.sockets.append(socket)
+        self.poller = zmq.Poller()
+        for socket in self.sockets:
+            self.poller.register(socket, zmq.POLLIN)
+        self.encoders = {socket: covid19sim.inference.wire_format.RequestEncoder() for socket in self.sockets}
+        self.max_pending_requests = max(max_pending_requests, 1)
+        self.reply_timeout_ms = reply_timeout_ms
+        self.request_counter = 0
+
+    def _timeout_error(self):
+        return RuntimeError(
+            f"the inference server at {self.server_address} did not answer for "
+            f"{self.reply_timeout_ms / 1000:.0f} seconds (is it running?)"
+        )
+
+    def infer_batches(self, batches: typing.Sequence[typing.Any]) -> typing.List[typing.Any]:
+        """
+        Sends batches of samples for inference, and waits for all of them to be processed.
+
+        Args:
+            batches: the batches to send, each of which is sent in a single request.
+
+        Returns:
+            The inference results of each batch, in the order of `batches`.
+        """
+        results = [None] * len(batches)
+        pending = {}  # correlation id => (index of the batch, socket)
+        pending_counts = {socket: 0 for socket in self.sockets}
+        next_batch_idx = 0
+        while next_batch_idx < len(batches) or pending:
+            # fill the sockets which can take more requests, least busy first
+            for socket in sorted(self.sockets, key=pending_counts.get):
+                if next_batch_idx == len(batches) or pending_counts[socket] >= self.max_pending_requests:
+                    break
+                correlation_id = str(self.request_counter).encode()
+                self.request_counter += 1
+                # the empty delimiter frames mimic the envelope of REQ sockets expected by the broker
+                request = self.encoders[socket].encode(batches[next_batch_idx])
+                socket.send_multipart([b"", correlation_id, b""] + request, copy=False)
+                pending[correlation_id] = (next_batch_idx, socket)
+                pending_counts[socket] += 1
+                next_batch_idx += 1
+            events = self.poller.poll(self.reply_timeout_ms)
+            if not events:
+                raise self._timeout_error()
+            for socket, _ in events:
+                while socket.poll(0, zmq.POLLIN):
+                    frames = socket.recv_multipart(copy=False)
+                    batch_idx, _ = pending.pop(frames[1].bytes)
+                    results[batch_idx] = covid19sim.inference.wire_format.decode_payload(frames[3:])
+                    pending_counts[socket] -= 1
+        return results
+
+    def infer(self, sample):
+        """Forwards a data sample for the inference engine."""
+        return self.infer_batches([sample])[0]
+
+    def request_reset(self):
+        """Clears the state of the clusters held by the inference server."""
+        correlation_id = str(self.request_counter).encode()
+        self.request_counter += 1
+        self.sockets[0].send_multipart([b"", correlation_id, b"", b"RESET"])
+        if not self.sockets[0].poll(self.reply_timeout_ms, zmq.POLLIN):
+            raise self._timeout_error()
+        empty, response_id, empty, response = self.sockets[0].recv_multipart()
+        assert response_id == correlation_id and response == b"READY"
+
+    def close(self):
+        """Closes the connections of the pool."""
+        for socket in self.sockets:
+            socket.close(linger=0)
+        self.sockets, self.encoders = [], {}
+        self.context.term()
+
+
 class InferenceServer(InferenceBroker, multiprocessing.Process):
     """Wrapper object used to initialize a broker inside a separate process."""
 
@@ -412,9 +707,13 @@ class InferenceServer(InferenceBroker, multiprocessing.Process):
 
 
 class InferenceEngineWrapper(InferenceEngine):
-    """Inference engine wrapper used to download & extract experiment data, if necessary."""
+    """Inference engine wrapper used to download & extract experiment data, if necessary.
 
-    def __init__(self, experiment_directory, *args, **kwargs):
+    The wrapper also adds a batched inference path (see `infer_batch`), and can limit the number of
+    CPU threads used by the model (`n_threads`).
+    """
+
+    def __init__(self, experiment_directory, *args, n_threads: typing.Optional[int] = None, **kwargs):
         if experiment_directory.startswith("http"):
             assert os.path.isdir("/tmp"), "don't know where to download data to..."
             experiment_root_directory = \
@@ -425,6 +724,59 @@ class InferenceEngineWrapper(InferenceEngine):
             assert len(experiment_subdirectories) == 1, "should only have one dir per experiment zip"
             experiment_directory = experiment_subdirectories[0]
         super().__init__(experiment_directory, *args, **kwargs)
+        if n_threads:
+            import torch
+            torch.set_num_threads(n_threads)
+
+    def can_infer_batch(self) -> bool:
+        """Returns whether the engine exposes the preprocessor and model needed by `infer_batch`."""
+        preprocessor = getattr(self, "preprocessor", None)
+        return hasattr(preprocessor, "preprocess") and hasattr(preprocessor, "collate_fn") \
+            and getattr(self, "model", None) is not None
+
+    def infer_batch(
+            self,
+            human_day_infos: typing.List[typing.Dict],
+            max_batch_size: int = default_inference_max_batch_size,
+    ) -> typing.List[typing.Optional[typing.Dict]]:
+        """Runs inference for many humans, with one forward pass per chunk of `max_batch_size` humans.
+
+        The samples of the humans are collated into padded tensors (their candidate encounter sets have
+        different lengths, so the collated batch holds a mask), and the outputs are scattered back.
+
+        Args:
+            human_day_infos: the daily outputs of the humans, as they would be given to `infer`.
+            max_batch_size: the maximum number of humans collated in a single forward pass.
+
+        Returns:
+            The inference result of each human (see `infer`), or None if it could not be computed.
+        """
+        if not self.can_infer_batch() or max_batch_size <= 1:
+            return [self.infer(human_day_info) for human_day_info in human_day_infos]
+        import torch
+        from ctt.data_loading.loader import InvalidSetSize
+        results = [None] * len(human_day_infos)
+        samples, sample_idxs = [], []
+        for idx, human_day_info in enumerate(human_day_infos):
+            try:
+                samples.append(self.preprocessor.preprocess(human_day_info, as_batch=False))
+            except InvalidSetSize:
+                continue  # no need to do actual inference if the cluster count is zero
+            sample_idxs.append(idx)
+        for chunk_start in range(0, len(samples), max_batch_size):
+            chunk_idxs = sample_idxs[chunk_start:chunk_start + max_batch_size]
+            batch = self.preprocessor.collate_fn(samples[chunk_start:chunk_start + max_batch_size])
+            with torch.no_grad():
+                model_output = self.model(batch.to_dict())
+            contagion_probas = model_output["encounter_variables"].sigmoid().numpy()[:, :, 0]
+            infectiousnesses = model_output["latent_variable"].numpy()[:, :, 0]
+            encounter_counts = batch["mask"].sum(dim=1).long().numpy()
+            for batch_idx, idx in enumerate(chunk_idxs):
+                results[idx] = dict(
+                    contagion_proba=contagion_probas[batch_idx, :encounter_counts[batch_idx]],
+                    infectiousness=infectiousnesses[batch_idx],
+                )
+        return results
 
 
 class DataCollectionWorker(BaseWorker):
@@ -444,6 +796,7 @@ class DataCollectionWorker(BaseWorker):
             compression: typing.Optional[typing.AnyStr] = "lzf",
             compression_opts: typing.Optional[typing.Any] = None,
             config_backup: typing.Optional[typing.Dict] = None,
+            data_format: typing.AnyStr = "pickle",
     ):
         """
         Initializes the data collection worker's attributes (counters, condvars, ...).
@@ -451,8 +804,12 @@ class DataCollectionWorker(BaseWorker):
         Args:
             data_output_path: the path where the collected data should be saved.
             backend_address: address through which to exchange data collection requests with the broker.
+            data_format: "pickle" to store pickled samples in an object array, or "columnar" to store
+                training samples field by field (see `covid19sim.inference.training_data`).
         """
         super().__init__(backend_address=backend_address, identifier="data-collector")
+        assert data_format in data_collection_formats, f"unknown data collection format: {data_format}"
+        self.data_format = data_format
         self.data_output_path = data_output_path
         self.human_count = human_count
         self.simulation_days = simulation_days
@@ -490,21 +847,30 @@ class DataCollectionWorker(BaseWorker):
         config_backup = json.dumps(covid19sim.utils.utils.dumps_conf(self.config_backup)) \
             if self.config_backup else None
         fd.attrs["config"] = config_backup
-        dataset = fd.create_dataset(
-            "dataset",
-            shape=(self.simulation_days, 24, self.human_count,),
-            chunks=(1, None, None),  # 1 x 6 x human_count
-            dtype=object,
-            object_codec=numcodecs.Pickle(),
-        )
-        is_filled = fd.create_dataset(
-            "is_filled",
-            shape=(self.simulation_days, 24, self.human_count,),
-            dtype=bool,
-            fillvalue=False
-        )
+        writer = None
+        if self.data_format == covid19sim.inference.training_data.TRAINING_DATA_FORMAT:
+            writer = covid19sim.inference.training_data.TrainingDataWriter(
+                root=fd,
+                simulation_days=self.simulation_days,
+                human_count=self.human_count,
+            )
+        else:
+            dataset = fd.create_dataset(
+                "dataset",
+                shape=(self.simulation_days, 24, self.human_count,),
+                chunks=(1, None, None),  # 1 x 6 x human_count
+                dtype=object,
+                object_codec=numcodecs.Pickle(),
+            )
+            is_filled = fd.create_dataset(
+                "is_filled",
+                shape=(self.simulation_days, 24, self.human_count,),
+                dtype=bool,
+                fillvalue=False
+            )
         total_dataset_bytes = 0
         sample_idx = 0
+        packet_idx = 0
         current_day = 0
         dataset_cache_factory = lambda: np.zeros(shape=(24, self.human_count),
                                                  dtype=object)
@@ -522,40 +888,51 @@ class DataCollectionWorker(BaseWorker):
             except zmq.error.Again:
                 continue
             proc_start_time = time.time()
-            day_idx, hour_idx, human_idx, buffer = pickle.loads(buffer)
-            total_dataset_bytes += len(buffer)
-            if day_idx == (current_day + 1):
-                # It's a new day
-                # Dump the cache
-                dataset[current_day, :, :] = dataset_cache
-                is_filled[current_day, :, :] = is_filled_cache
-                # Make a new cache
-                dataset_cache = dataset_cache_factory()
-                is_filled_cache = is_filled_cache_factory()
-                # Update the current_day counter
-                current_day += 1
-            elif day_idx == current_day:
-                pass
-            else:
-                raise RuntimeError(f"The worker was at day {current_day}, but got a "
-                                   f"message from day {day_idx}. Bonk!")
-
-            # Write the pickle and is_filled to cache
-            dataset_cache[hour_idx, human_idx] = pickle.loads(buffer)
-            is_filled_cache[hour_idx, human_idx] = True
-            # Note to future self: this is what it used to be:
-            #    dataset[day_idx, hour_idx, human_idx] = pickle.loads(buffer)
-            #    is_filled[day_idx, hour_idx, human_idx] = True
-            socket.send(str(sample_idx).encode())
-            sample_idx += 1
+            packet = pickle.loads(buffer)
+            # clients send batches of samples, but a single sample is also accepted
+            samples = packet if isinstance(packet, list) else [packet]
+            for day_idx, hour_idx, human_idx, buffer in samples:
+                total_dataset_bytes += len(buffer)
+                sample_idx += 1
+                if writer is not None:
+                    writer.write(day_idx, hour_idx, human_idx, pickle.loads(buffer))
+                    continue
+                if day_idx == (current_day + 1):
+                    # It's a new day
+                    # Dump the cache
+                    dataset[current_day, :, :] = dataset_cache
+                    is_filled[current_day, :, :] = is_filled_cache
+                    # Make a new cache
+                    dataset_cache = dataset_cache_factory()
+                    is_filled_cache = is_filled_cache_factory()
+                    # Update the current_day counter
+                    current_day += 1
+                elif day_idx == current_day:
+                    pass
+                else:
+                    raise RuntimeError(f"The worker was at day {current_day}, but got a "
+                                       f"message from day {day_idx}. Bonk!")
+
+                # Write the pickle and is_filled to cache
+                dataset_cache[hour_idx, human_idx] = pickle.loads(buffer)
+                is_filled_cache[hour_idx, human_idx] = True
+                # Note to future self: this is what it used to be:
+                #    dataset[day_idx, hour_idx, human_idx] = pickle.loads(buffer)
+                #    is_filled[day_idx, hour_idx, human_idx] = True
+            socket.send(str(packet_idx).encode())
+            packet_idx += 1
             with self.time_counter.get_lock():
                 self.time_counter.value += time.time() - proc_start_time
             with self.packet_counter.get_lock():
                 self.packet_counter.value += 1
         self.running_flag.value = 0
         socket.close()
-        dataset.attrs["total_samples"] = sample_idx
-        dataset.attrs["total_bytes"] = total_dataset_bytes
+        if writer is not None:
+            writer.close()
+            fd.attrs["total_bytes"] = total_dataset_bytes
+        else:
+            dataset.attrs["total_samples"] = sample_idx
+            dataset.attrs["total_bytes"] = total_dataset_bytes
 
 
 class DataCollectionBroker(BaseBroker):
@@ -574,6 +951,7 @@ class DataCollectionBroker(BaseBroker):
             verbose: bool = False,
             verbose_print_delay: float = 5.,
             config_backup: typing.Optional[typing.Dict] = None,
+            data_format: typing.AnyStr = "pickle",
     ):
         """
         Initializes the data collection broker's attributes (counters, condvars, ...).
@@ -585,6 +963,7 @@ class DataCollectionBroker(BaseBroker):
             backend_address: address through which to exchange data logging requests with the worker.
             verbose: toggles whether to print extra debug information while running.
             verbose_print_delay: specifies how often the extra debug info should be printed.
+            data_format: the format in which the worker stores the samples; see `DataCollectionWorker`.
         """
         super().__init__(
             workers=1,  # cannot safely write more than one sample at a time with this impl
@@ -600,6 +979,7 @@ class DataCollectionBroker(BaseBroker):
         self.compression = compression
         self.compression_opts = compression_opts
         self.config_backup = config_backup
+        self.data_format = data_format
 
     def run(self):
         """Main loop of the data collection broker process.
@@ -625,12 +1005,13 @@ class DataCollectionBroker(BaseBroker):
             compression=self.compression,
             compression_opts=self.compression_opts,
             config_backup=self.config_backup,
+            data_format=self.data_format,
         )
         worker.start()
         backend.setsockopt(zmq.SNDTIMEO, 5)
         last_update_timestamp = time.time()
         curr_queue_size = 0
-        expected_sample_idx = 0
+        expected_packet_idx = 0
         request_queue = []
         print("Entering dispatch loop...", flush=True)
         while not self.stop_flag.is_set():
@@ -650,9 +1031,9 @@ class DataCollectionBroker(BaseBroker):
                 assert curr_queue_size >= len(next_packet)
                 try:
                     backend.send(next_packet)
-                    written_sample_idx_str = backend.recv()
-                    assert expected_sample_idx == int(written_sample_idx_str.decode())
-                    expected_sample_idx = expected_sample_idx + 1
+                    written_packet_idx_str = backend.recv()
+                    assert expected_packet_idx == int(written_packet_idx_str.decode())
+                    expected_packet_idx = expected_packet_idx + 1
                     curr_queue_size -= len(next_packet)
                     request_queue.pop(0)
                 except zmq.error.Again:
@@ -681,14 +1062,19 @@ class DataCollectionClient:
     """
     Creates a client through which data samples can be sent for collection.
 
-    This object should be fairly lightweight and low-cost, so creating
-    it once per day, per human *should* not create a significant overhead.
+    Samples are buffered and sent in batches of `batch_size` samples per frame. Frames are
+    acknowledged asynchronously by the broker, and at most `max_pending_batches` frames can be
+    in flight at once. Since creating the client opens a new connection, it should be reused
+    across calls; see `get_data_collection_client`. The `flush` function must be called to make
+    sure that all written samples were received by the broker.
     """
 
     def __init__(
             self,
             server_address: typing.Optional[typing.AnyStr] = default_datacollect_frontend_address,
             context: typing.Optional[zmq.Context] = None,
+            batch_size: int = default_data_collection_batch_size,
+            max_pending_batches: int = default_data_collection_max_pending_batches,
     ):
         """
         Initializes the client's attributes (socket, context).
@@ -696,25 +1082,84 @@ class DataCollectionClient:
         Args:
             server_address: address of the data collection server frontend to send requests to.
             context: zmq context to create i/o objects from.
+            batch_size: number of samples to buffer before sending them in a single frame.
+            max_pending_batches: number of frames that can be sent before waiting for acknowledgements.
         """
         if context is None:
             context = zmq.Context()
         self.context = context
-        self.socket = self.context.socket(zmq.REQ)
+        self.socket = self.context.socket(zmq.DEALER)
         if server_address is None:
             server_address = default_datacollect_frontend_address
         self.socket.connect(server_address)
+        self.batch_size = max(batch_size, 1)
+        self.max_pending_batches = max(max_pending_batches, 1)
+        self.pending_samples = []
+        self.pending_acks = 0
 
     def write(self, day_idx, hour_idx, human_idx, sample):
-        """Forwards a data sample for the data writer using pickle."""
-        self.socket.send_pyobj((day_idx, hour_idx, human_idx, pickle.dumps(sample)))
-        response = self.socket.recv()
-        assert response == b"GOTCHA"
+        """Buffers a data sample for the data writer using pickle, and sends the buffer once it is full."""
+        self.pending_samples.append((day_idx, hour_idx, human_idx, pickle.dumps(sample)))
+        if len(self.pending_samples) >= self.batch_size:
+            self._send_pending_samples()
+
+    def flush(self):
+        """Sends all buffered samples and waits until the broker acknowledged all of them."""
+        self._send_pending_samples()
+        while self.pending_acks > 0:
+            self._recv_ack(b"GOTCHA")
 
     def request_reset(self):
-        self.socket.send(b"RESET")
-        response = self.socket.recv()
-        assert response == b"READY"
+        self.flush()
+        self.socket.send_multipart([b"", b"RESET"])
+        self.pending_acks += 1
+        self._recv_ack(b"READY")
+
+    def _send_pending_samples(self):
+        if not self.pending_samples:
+            return
+        while self.pending_acks >= self.max_pending_batches:
+            self._recv_ack(b"GOTCHA")
+        # the empty delimiter frame mimics the envelope of REQ sockets expected by the broker
+        self.socket.send_multipart([b"", pickle.dumps(self.pending_samples)])
+        self.pending_samples = []
+        self.pending_acks += 1
+        # collect the acknowledgements which already arrived without blocking
+        while self.pending_acks > 0 and self.socket.poll(0, zmq.POLLIN):
+            self._recv_ack(b"GOTCHA")
+
+    def _recv_ack(self, expected_response):
+        empty, response = self.socket.recv_multipart()
+        assert response == expected_response
+        self.pending_acks -= 1
+
+
+_data_collection_clients: typing.Dict[typing.Tuple[int, typing.AnyStr], DataCollectionClient] = {}
+
+
+def get_data_collection_client(
+        server_address: typing.Optional[typing.AnyStr] = default_datacollect_frontend_address,
+        batch_size: int = default_data_collection_batch_size,
+) -> DataCollectionClient:
+    """
+    Returns the data collection client of the current process for the given server address.
+
+    The client is created on first use, and reused afterwards. Clients are never shared between
+    processes, as zmq sockets cannot be used across a fork.
+
+    Args:
+        server_address: address of the data collection server frontend to send requests to.
+        batch_size: number of samples to buffer before sending them in a single frame.
+
+    Returns:
+        The data collection client.
+    """
+    if server_address is None:
+        server_address = default_datacollect_frontend_address
+    key = (os.getpid(), server_address)
+    if key not in _data_collection_clients:
+        _data_collection_clients[key] = DataCollectionClient(server_address=server_address, batch_size=batch_size)
+    return _data_collection_clients[key]
 
 
 class DataCollectionServer(DataCollectionBroker, multiprocessing.Process):
@@ -734,6 +1179,9 @@ def proc_human_batch(
     """
     Processes a chunk of human data, clustering messages and computing new risk levels.
 
+    With the transformer risk model, the humans of the chunk are collated and run through the model
+    together, in batches of at most `INFERENCE_MAX_BATCH_SIZE` humans (1 falls back to one human at a time).
+
     Args:
         sample: a dictionary of data necessary for clustering+inference.
         engine: the inference engine, pre-instantiated with the right experiment config.
@@ -748,13 +1196,12 @@ def proc_human_batch(
     ref_timestamp = None
 
     for params in sample:
-        human_name = params["human"].name
         timestamp = params["start"] + datetime.timedelta(days=params["current_day"], hours=params["time_slot"])
         if ref_timestamp is None:
             ref_timestamp = timestamp
         else:
             assert ref_timestamp == timestamp, "how can we possibly have different timestamps here"
-        cluster_mgr_hash = str(params["city_hash"]) + ":" + human_name
+        cluster_mgr_hash = covid19sim.inference.routing.get_cluster_mgr_hash(params)
         params["cluster_mgr_hash"] = cluster_mgr_hash
         if cluster_mgr_hash not in cluster_mgr_map:
             cluster_algo_type = covid19sim.inference.clustering.base.get_cluster_manager_type(
@@ -771,7 +1218,17 @@ def proc_human_batch(
         assert not cluster_mgr._is_being_used, "two processes should never try to access the same human"
         cluster_mgr._is_being_used = True
         params["cluster_mgr"] = cluster_mgr
-    results = [_proc_human(params, engine) for params in sample]
+    conf = sample[0]["conf"] if sample else {}
+    max_batch_size = conf.get("INFERENCE_MAX_BATCH_SIZE", default_inference_max_batch_size)
+    if not conf.get("USE_ORACLE") and conf.get("RISK_MODEL") == "transformer" and \
+            max_batch_size > 1 and engine.can_infer_batch():
+        # the humans of the sample go through the model together instead of one at a time
+        results = _proc_human_batch_transformer(sample, engine, max_batch_size)
+    else:
+        results = [_proc_human(params, engine) for params in sample]
+    if sample and sample[0]["conf"].get("COLLECT_TRAINING_DATA"):
+        # samples must reach the broker before the simulation moves on to the next timeslot
+        _get_training_data_client(sample[0]["conf"]).flush()
     for params in sample:
         cluster_mgr = params["cluster_mgr"]
         assert cluster_mgr._is_being_used
@@ -789,8 +1246,41 @@ def proc_human_batch(
     return results
 
 
+def _get_training_data_client(conf):
+    """Returns the pooled client through which training data samples are collected."""
+    return get_data_collection_client(
+        server_address=conf.get("data_collection_server_address", default_datacollect_frontend_address),
+        batch_size=conf.get("DATA_COLLECTION_BATCH_SIZE", default_data_collection_batch_size),
+    )
+
+
 def _proc_human(params, inference_engine):
     """Internal implementation of the `proc_human_batch` function."""
+    daily_output = _get_daily_output(params)
+    conf, human = params["conf"], params["human"]
+    inference_result, risk_history = None, None
+    if conf.get("USE_ORACLE"):
+        risk_history = covid19sim.inference.oracle.oracle(human, conf)
+    elif conf.get("RISK_MODEL") == "transformer":
+        # no need to do actual inference if the cluster count is zero
+        inference_result = inference_engine.infer(daily_output)
+        if inference_result is not None:
+            risk_history = inference_result['infectiousness']
+    return human.name, risk_history
+
+
+def _proc_human_batch_transformer(sample, inference_engine, max_batch_size):
+    """Internal implementation of the `proc_human_batch` function with batched transformer inference."""
+    daily_outputs = [_get_daily_output(params) for params in sample]
+    inference_results = inference_engine.infer_batch(daily_outputs, max_batch_size=max_batch_size)
+    return [
+        (params["human"].name, inference_result["infectiousness"] if inference_result is not None else None)
+        for params, inference_result in zip(sample, inference_results)
+    ]
+
+
+def _get_daily_output(params):
+    """Clusters the new messages of a human and formats its data for inference (or training)."""
     assert isinstance(params, dict) and \
            all([p in params for p in expected_raw_packet_param_names]), \
         "unexpected/broken _proc_human input format between simulator and inference service"
@@ -852,17 +1342,6 @@ def _proc_human(params, inference_engine):
     }
 
     if conf.get("COLLECT_TRAINING_DATA"):
-        data_collect_client = DataCollectionClient(
-            server_address=conf.get("data_collection_server_address", default_datacollect_frontend_address),
-        )
         human_id = int(human.name.split(":")[-1])
-        data_collect_client.write(params["current_day"], params["time_slot"], human_id, daily_output)
-    inference_result, risk_history = None, None
-    if conf.get("USE_ORACLE"):
-        risk_history = covid19sim.inference.oracle.oracle(human, conf)
-    elif conf.get("RISK_MODEL") == "transformer":
-        # no need to do actual inference if the cluster count is zero
-        inference_result = inference_engine.infer(daily_output)
-        if inference_result is not None:
-            risk_history = inference_result['infectiousness']
-    return human.name, risk_history
+        _get_training_data_client(conf).write(params["current_day"], params["time_slot"], human_id, daily_output)
+    return daily_output
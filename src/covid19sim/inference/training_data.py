@@ -0,0 +1,383 @@
+"""
+Columnar storage of the training data collected during simulations.
+
+Each field of the samples produced by `server_utils._proc_human` is stored in its own typed zarr
+array indexed by `(day, hour, human)`, instead of pickling whole samples in an object array:
+    - scalars and fixed-shape arrays are stored as-is, with a compact dtype;
+    - multi-hot arrays (symptoms, preexisting conditions) are stored as bitsets;
+    - variable-length arrays (candidate encounters, infectiousnesses) are concatenated in a single
+      array per field, and each sample stores the offset and the count of its rows.
+
+Arrays are chunked by timeslot and compressed, and each timeslot is flushed once all its samples
+were received. Readers only decompress the chunks they slice, and never unpickle anything.
+"""
+import datetime
+import json
+import typing
+
+import numcodecs
+import numpy as np
+import zarr
+
+TRAINING_DATA_FORMAT = "columnar"
+TRAINING_DATA_FORMAT_VERSION = 1
+
+# field kinds
+SCALAR = "scalar"  # numbers and booleans
+ARRAY = "array"  # fixed-shape arrays
+BITSET = "bitset"  # fixed-shape multi-hot arrays, packed along their last axis
+OPTIONAL = "optional"  # integers which can be None, stored as -1
+TIMESTAMP = "timestamp"  # datetimes which can be None, stored as NaT
+NAME = "name"  # human names, stored as the integer after the last colon
+RAGGED = "ragged"  # arrays with a variable number of rows
+CONSTANT = "constant"  # values shared by all samples, stored in the attributes
+
+# group => field => (kind, storage dtype)
+TRAINING_DATA_SCHEMA = {
+    "observed": {
+        "reported_symptoms": (BITSET, np.uint8),
+        "candidate_encounters": (RAGGED, np.float32),
+        "test_results": (ARRAY, np.int8),
+        "preexisting_conditions": (BITSET, np.uint8),
+        "age": (SCALAR, np.int16),
+        "sex": (SCALAR, np.int8),
+        "risk_mapping": (CONSTANT, None),
+    },
+    "unobserved": {
+        "human_id": (NAME, np.int32),
+        "incubation_days": (SCALAR, np.float64),
+        "recovery_days": (SCALAR, np.float64),
+        "true_symptoms": (BITSET, np.uint8),
+        "is_exposed": (SCALAR, np.bool_),
+        "exposure_encounter": (RAGGED, np.uint8),
+        "exposure_day": (OPTIONAL, np.int16),
+        "is_recovered": (SCALAR, np.bool_),
+        "recovery_day": (OPTIONAL, np.int16),
+        "infectiousness": (RAGGED, np.float32),
+        "true_preexisting_conditions": (BITSET, np.uint8),
+        "true_age": (SCALAR, np.int16),
+        "true_sex": (SCALAR, np.int8),
+        "viral_load_to_infectiousness_multiplier": (SCALAR, np.float64),
+        "infection_timestamp": (TIMESTAMP, "datetime64[us]"),
+        "recovered_timestamp": (TIMESTAMP, "datetime64[us]"),
+    },
+}
+
+default_compressor = numcodecs.Blosc(cname="zstd", clevel=3, shuffle=numcodecs.Blosc.BITSHUFFLE)
+default_ragged_chunk_rows = 1 << 16
+
+
+def _encode(kind, dtype, value):
+    """Returns the value of a field as it is stored in its array."""
+    if kind == BITSET:
+        return np.packbits(np.asarray(value) > 0, axis=-1, bitorder="little")
+    if kind == OPTIONAL:
+        return -1 if value is None else value
+    if kind == TIMESTAMP:
+        return np.datetime64("NaT") if value is None else np.datetime64(value, "us")
+    if kind == NAME:
+        return int(str(value).split(":")[-1])
+    return np.asarray(value, dtype=dtype)
+
+
+def _decode(kind, value, attrs):
+    """Returns the value of a field as it was in the original sample."""
+    if kind == BITSET:
+        bits = np.unpackbits(value, axis=-1, count=attrs["n_bits"], bitorder="little")
+        return bits.astype(attrs["dtype"])
+    if kind == OPTIONAL:
+        return None if value < 0 else int(value)
+    if kind == TIMESTAMP:
+        return None if np.isnat(value) else value.astype(datetime.datetime)
+    if kind == NAME:
+        return f"human:{value}"
+    if kind == SCALAR:
+        return value.item()
+    return value.astype(attrs["dtype"])
+
+
+class TrainingDataWriter:
+    """
+    Writes training samples to a zarr group, one typed array per field.
+
+    Samples are buffered per timeslot, and the buffer of a timeslot is flushed as soon as a sample
+    of another timeslot is written. Samples of a timeslot that was already flushed are still
+    accepted; they are written next to the ones already stored for that timeslot.
+    """
+
+    def __init__(
+            self,
+            root: zarr.hierarchy.Group,
+            simulation_days: int,
+            human_count: int,
+            compressor: typing.Optional[typing.Any] = default_compressor,
+            ragged_chunk_rows: int = default_ragged_chunk_rows,
+    ):
+        """
+        Initializes the writer and creates the arrays which do not depend on the shape of the samples.
+
+        Args:
+            root: the zarr group where to write the data.
+            simulation_days: the number of days in the simulation.
+            human_count: the number of humans in the simulation.
+            compressor: the numcodecs compressor used for all arrays.
+            ragged_chunk_rows: the number of rows per chunk in the arrays of variable-length fields.
+        """
+        self.root = root
+        self.simulation_days = simulation_days
+        self.human_count = human_count
+        self.compressor = compressor
+        self.ragged_chunk_rows = ragged_chunk_rows
+        self.shape = (simulation_days, 24, human_count)
+        self.root.attrs["format"] = TRAINING_DATA_FORMAT
+        self.root.attrs["format_version"] = TRAINING_DATA_FORMAT_VERSION
+        self.is_filled = self.root.zeros(
+            "is_filled", shape=self.shape, chunks=(1, 1, human_count), dtype=bool, compressor=compressor,
+        )
+        for group, fields in TRAINING_DATA_SCHEMA.items():
+            self.root.require_group(group)
+            for name, (kind, _) in fields.items():
+                if kind == RAGGED:
+                    for suffix, dtype in [("offsets", np.int64), ("counts", np.int32)]:
+                        self.root[group].zeros(
+                            f"{name}_{suffix}", shape=self.shape, chunks=(1, 1, human_count),
+                            dtype=dtype, compressor=compressor,
+                        )
+        self.total_samples = 0
+        self.has_arrays = False
+        self.current_slot = None
+        self.flushed_slots = set()
+        self.buffers = None
+
+    def write(self, day_idx: int, hour_idx: int, human_idx: int, sample: typing.Dict):
+        """Buffers a sample; the samples of the previous timeslot are flushed if needed."""
+        slot = (day_idx, hour_idx)
+        if slot != self.current_slot:
+            self.flush()
+            self.current_slot = slot
+        if not self.has_arrays:
+            self._create_arrays(sample)
+        if self.buffers is None:
+            self.buffers = self._make_buffers()
+        for group, fields in TRAINING_DATA_SCHEMA.items():
+            assert set(sample[group]) == set(fields), \
+                f"unexpected {group} fields: {sorted(set(sample[group]) ^ set(fields))}"
+            for name, (kind, dtype) in fields.items():
+                if kind == CONSTANT:
+                    continue
+                if kind == RAGGED:
+                    value = np.asarray(sample[group][name])
+                    self.buffers[group][name].append((human_idx, value))
+                    if len(value):
+                        self._require_ragged_array(group, name, value)
+                else:
+                    self.buffers[group][name][human_idx] = _encode(kind, dtype, sample[group][name])
+        self.buffers["is_filled"][human_idx] = True
+        self.total_samples += 1
+
+    def flush(self):
+        """Writes the buffered samples of the current timeslot."""
+        if self.buffers is None:
+            return
+        day_idx, hour_idx = self.current_slot
+        is_filled = self.buffers["is_filled"]
+        human_idxs = np.flatnonzero(is_filled)
+        is_new_slot = self.current_slot not in self.flushed_slots
+
+        def store(array, values):
+            if is_new_slot:
+                array[day_idx, hour_idx] = values
+            else:
+                array.set_orthogonal_selection((day_idx, hour_idx, human_idxs), values[human_idxs])
+
+        store(self.is_filled, is_filled)
+        for group, fields in TRAINING_DATA_SCHEMA.items():
+            for name, (kind, _) in fields.items():
+                if kind == CONSTANT:
+                    continue
+                if kind != RAGGED:
+                    store(self.root[group][name], self.buffers[group][name])
+                    continue
+                offsets = np.zeros(self.human_count, dtype=np.int64)
+                counts = np.zeros(self.human_count, dtype=np.int32)
+                chunks = [value for _, value in self.buffers[group][name] if len(value)]
+                if chunks:
+                    values = self.root[group][name]
+                    start = values.shape[0]
+                    for human_idx, value in self.buffers[group][name]:
+                        offsets[human_idx], counts[human_idx] = start, len(value)
+                        start += len(value)
+                    values.append(np.concatenate(chunks).astype(values.dtype, copy=False), axis=0)
+                store(self.root[group][f"{name}_offsets"], offsets)
+                store(self.root[group][f"{name}_counts"], counts)
+        self.flushed_slots.add(self.current_slot)
+        self.buffers = None
+
+    def close(self):
+        """Flushes the remaining samples and stores the sample count."""
+        self.flush()
+        self.root.attrs["total_samples"] = self.total_samples
+
+    def _create_arrays(self, sample: typing.Dict):
+        # the shapes of the fixed-shape fields depend on the configuration, so we take them from the first sample
+        for group, fields in TRAINING_DATA_SCHEMA.items():
+            for name, (kind, dtype) in fields.items():
+                if kind == CONSTANT:
+                    self.root.attrs[f"{group}/{name}"] = json.loads(json.dumps(sample[group][name], default=str))
+                    continue
+                if kind == RAGGED:
+                    continue
+                value = _encode(kind, dtype, sample[group][name])
+                array = self.root[group].zeros(
+                    name, shape=self.shape + np.shape(value), chunks=(1, 1, self.human_count) + np.shape(value),
+                    dtype=dtype, compressor=self.compressor,
+                )
+                array.attrs["kind"] = kind
+                if kind in (ARRAY, BITSET):
+                    array.attrs["dtype"] = np.asarray(sample[group][name]).dtype.str
+                if kind == BITSET:
+                    array.attrs["n_bits"] = np.shape(sample[group][name])[-1]
+        self.has_arrays = True
+
+    def _require_ragged_array(self, group: str, name: str, value: np.ndarray):
+        if name in self.root[group]:
+            assert self.root[group][name].shape[1:] == value.shape[1:], \
+                f"unexpected row shape for {group}/{name}: {value.shape[1:]}"
+            return
+        dtype = TRAINING_DATA_SCHEMA[group][name][1]
+        array = self.root[group].zeros(
+            name, shape=(0,) + value.shape[1:], chunks=(self.ragged_chunk_rows,) + value.shape[1:],
+            dtype=dtype, compressor=self.compressor,
+        )
+        array.attrs["kind"] = RAGGED
+        array.attrs["dtype"] = value.dtype.str
+
+    def _make_buffers(self):
+        buffers = {"is_filled": np.zeros(self.human_count, dtype=bool)}
+        for group, fields in TRAINING_DATA_SCHEMA.items():
+            buffers[group] = {}
+            for name, (kind, _) in fields.items():
+                if kind == RAGGED:
+                    buffers[group][name] = []
+                elif kind != CONSTANT:
+                    array = self.root[group][name]
+                    buffers[group][name] = np.zeros((self.human_count,) + array.shape[3:], dtype=array.dtype)
+        return buffers
+
+
+class TrainingDataReader:
+    """
+    Reads the training data written by `TrainingDataWriter`.
+
+    Arrays are opened lazily, so only the chunks covering the requested slices are read and
+    decompressed.
+    """
+
+    def __init__(self, path: typing.AnyStr):
+        """
+        Opens the training data.
+
+        Args:
+            path: the path of the zarr group the data was written to.
+        """
+        self.root = zarr.open(path, "r")
+        assert self.root.attrs.get("format") == TRAINING_DATA_FORMAT, \
+            f"unexpected training data format: {self.root.attrs.get('format')}"
+        assert self.root.attrs["format_version"] <= TRAINING_DATA_FORMAT_VERSION, \
+            f"unsupported training data format version: {self.root.attrs['format_version']}"
+        self.is_filled = self.root["is_filled"]
+        self.simulation_days, _, self.human_count = self.is_filled.shape
+
+    def get_field(self, group: str, name: str, day_idx, hour_idx=slice(None), human_idx=slice(None)) -> np.ndarray:
+        """
+        Returns a slice of a fixed-shape field, as it is stored (e.g. bitsets are still packed).
+
+        Args:
+            group: "observed" or "unobserved".
+            name: the name of the field.
+            day_idx: the day(s) to read.
+            hour_idx: the hour(s) to read.
+            human_idx: the human(s) to read.
+
+        Returns:
+            The typed array slice.
+        """
+        kind = TRAINING_DATA_SCHEMA[group][name][0]
+        assert kind not in (RAGGED, CONSTANT), f"{group}/{name} is not a fixed-shape field"
+        return self.root[group][name][day_idx, hour_idx, human_idx]
+
+    def get_ragged(self, group: str, name: str, day_idx: int, hour_idx: int, human_idx: int) -> np.ndarray:
+        """Returns the rows of a variable-length field for a single sample, with their original dtype."""
+        assert TRAINING_DATA_SCHEMA[group][name][0] == RAGGED, f"{group}/{name} is not a variable-length field"
+        count = self.root[group][f"{name}_counts"][day_idx, hour_idx, human_idx]
+        if count == 0:
+            return self._empty_rows(group, name)
+        values = self.root[group][name]
+        offset = self.root[group][f"{name}_offsets"][day_idx, hour_idx, human_idx]
+        return values[offset:offset + count].astype(values.attrs["dtype"])
+
+    def _empty_rows(self, group: str, name: str) -> np.ndarray:
+        # no rows, with the row shape and dtype of the field (unknown if no sample had any row)
+        if name not in self.root[group]:
+            return np.zeros((0,), dtype=TRAINING_DATA_SCHEMA[group][name][1])
+        values = self.root[group][name]
+        return np.zeros((0, *values.shape[1:]), dtype=values.attrs["dtype"])
+
+    def get_sample(self, day_idx: int, hour_idx: int, human_idx: int) -> typing.Optional[typing.Dict]:
+        """Returns the sample written for a human at a given timeslot, or None if there is none."""
+        if not self.is_filled[day_idx, hour_idx, human_idx]:
+            return None
+        return self._make_sample(self._read_slot(day_idx, hour_idx, slice(human_idx, human_idx + 1)), 0)
+
+    def iter_samples(self, day_idx: int) -> typing.Iterator[typing.Tuple[int, int, typing.Dict]]:
+        """Yields the (hour, human, sample) tuples of all samples written on a given day."""
+        is_filled = self.is_filled[day_idx]
+        for hour_idx in range(24):
+            human_idxs = np.flatnonzero(is_filled[hour_idx])
+            if not len(human_idxs):
+                continue
+            slot = self._read_slot(day_idx, hour_idx, slice(None))
+            for human_idx in human_idxs:
+                yield hour_idx, int(human_idx), self._make_sample(slot, human_idx)
+
+    def _read_slot(self, day_idx: int, hour_idx: int, human_idx: slice) -> typing.Dict:
+        # reads all fields of a timeslot at once, so that each chunk is only decompressed once
+        slot = {"current_day": day_idx}
+        for group, fields in TRAINING_DATA_SCHEMA.items():
+            slot[group] = {}
+            for name, (kind, _) in fields.items():
+                if kind == CONSTANT:
+                    slot[group][name] = self.root.attrs[f"{group}/{name}"]
+                elif kind == RAGGED:
+                    offsets = self.root[group][f"{name}_offsets"][day_idx, hour_idx, human_idx]
+                    counts = self.root[group][f"{name}_counts"][day_idx, hour_idx, human_idx]
+                    values = None
+                    if counts.any():
+                        start, end = offsets[counts > 0].min(), (offsets + counts).max()
+                        values = self.root[group][name]
+                        values = values[start:end].astype(values.attrs["dtype"])
+                        offsets = offsets - start
+                    slot[group][name] = (offsets, counts, values, self._empty_rows(group, name))
+                else:
+                    array = self.root[group][name]
+                    slot[group][name] = (array[day_idx, hour_idx, human_idx], array.attrs.asdict())
+        return slot
+
+    @staticmethod
+    def _make_sample(slot: typing.Dict, idx: int) -> typing.Dict:
+        sample = {"current_day": slot["current_day"]}
+        for group, fields in TRAINING_DATA_SCHEMA.items():
+            sample[group] = {}
+            for name, (kind, _) in fields.items():
+                if kind == CONSTANT:
+                    sample[group][name] = slot[group][name]
+                elif kind == RAGGED:
+                    offsets, counts, values, empty_rows = slot[group][name]
+                    if counts[idx] == 0:
+                        sample[group][name] = empty_rows
+                    else:
+                        sample[group][name] = values[offsets[idx]:offsets[idx] + counts[idx]]
+                else:
+                    values, attrs = slot[group][name]
+                    sample[group][name] = _decode(kind, values[idx], attrs)
+        return sample
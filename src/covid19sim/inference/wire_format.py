@@ -0,0 +1,411 @@
+"""
+Versioned binary format of the inference requests and replies exchanged with the inference server.
+
+A request holds a batch of humans which share the same simulation time and configuration (see
+`batch_run_timeslot_heavy_jobs`). It is sent as a multipart message:
+
+    [header, (configuration), human 1, ..., human N]
+
+The header starts with `WIRE_FORMAT_MAGIC` and the format version, followed by a JSON document with
+the fields shared by the batch and the name and array shapes of each human. The configuration is
+pickled and only sent once per connection; other requests reference it by its id. Each human is a
+single frame which concatenates:
+
+    - a record of `HUMAN_SCALARS_DTYPE` (timestamps are int64 microsecond offsets from the simulation start);
+    - the arrays of `HUMAN_ARRAY_FIELDS`, stored with compact dtypes;
+    - its update messages, as an array of `UPDATE_MESSAGE_DTYPE` records. Strings referenced by the
+      messages (e.g. the real user ids) are stored once per human in the header.
+
+Since every human is a separate frame, the broker can route humans to workers by only decoding the header.
+A reply holds a JSON header with the names of the humans and the shape of their risk history, and a
+single frame with all risk histories as float32.
+"""
+import datetime
+import hashlib
+import json
+import pickle
+import typing
+
+import numpy as np
+
+from covid19sim.inference.human_as_message import HumanAsMessage
+from covid19sim.inference.message_utils import UpdateMessage
+
+WIRE_FORMAT_MAGIC = b"CVWF"
+WIRE_FORMAT_VERSION = 1
+_HEADER_PREFIX = WIRE_FORMAT_MAGIC + bytes([WIRE_FORMAT_VERSION])
+
+# sentinel values of the fields which can be None
+_NONE_TIMESTAMP = np.iinfo(np.int64).min  # NaT
+_NONE_INDEX = -1
+
+HUMAN_SCALARS_DTYPE = np.dtype([
+    ("age", np.int32),
+    ("sex", np.int8),
+    ("obs_age", np.int32),
+    ("obs_sex", np.int8),
+    ("infection_timestamp", np.int64),
+    ("recovered_timestamp", np.int64),
+    ("incubation_days", np.float64),  # NaN if None
+    ("recovery_days", np.float64),  # NaN if None
+    ("viral_load_to_infectiousness_multiplier", np.float64),
+    ("carefulness", np.float64),
+    ("has_app", np.bool_),
+    ("oracle_noise_random_seed", np.int64),  # -1 if None
+])
+
+# array field => (dtype on the wire, dtype once decoded). Conditions and symptoms are binary and
+# test results are -1, 0 or 1, so they are sent as bytes.
+HUMAN_ARRAY_FIELDS = {
+    "preexisting_conditions": (np.uint8, np.float64),
+    "obs_preexisting_conditions": (np.uint8, np.float64),
+    "test_results": (np.int8, np.float64),
+    "rolling_all_symptoms": (np.uint8, np.float64),
+    "rolling_all_reported_symptoms": (np.uint8, np.float64),
+    "infectiousnesses": (np.float64, np.float64),
+}
+
+UPDATE_MESSAGE_DTYPE = np.dtype([
+    ("uid_high", np.uint64),
+    ("uid_low", np.uint64),
+    ("has_uid", np.bool_),
+    ("old_risk_level", np.int8),  # -1 if None
+    ("new_risk_level", np.int8),  # -1 if None
+    ("encounter_time", np.int64),
+    ("update_time", np.int64),
+    ("_real_encounter_time", np.int64),
+    ("_real_update_time", np.int64),
+    ("_sender_uid", np.int32),  # index in the strings of the human, -1 if None
+    ("_receiver_uid", np.int32),
+    ("_exposition_event", np.int8),  # -1 if None
+    ("_update_reason", np.int32),
+])
+
+_UPDATE_MESSAGE_TIMESTAMPS = ["encounter_time", "update_time", "_real_encounter_time", "_real_update_time"]
+_UPDATE_MESSAGE_STRINGS = ["_sender_uid", "_receiver_uid", "_update_reason"]
+_UID_LOW_MASK = (1 << 64) - 1
+_ONE_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+def is_encoded(frame) -> bool:
+    """Returns whether a frame is the header of a message of this format."""
+    return bytes(memoryview(frame)[:len(WIRE_FORMAT_MAGIC)]) == WIRE_FORMAT_MAGIC
+
+
+def is_human_batch(sample) -> bool:
+    """Returns whether an inference request can be encoded with this format."""
+    return isinstance(sample, list) and len(sample) > 0 and \
+        all(isinstance(p, dict) and isinstance(p.get("human"), HumanAsMessage) for p in sample)
+
+
+def encode_conf(conf: typing.Dict) -> typing.Tuple[str, bytes]:
+    """Returns the id and the pickled frame of a configuration."""
+    conf_frame = pickle.dumps(conf)
+    return hashlib.sha1(conf_frame).hexdigest(), conf_frame
+
+
+def _encode_header(header: typing.Dict) -> bytes:
+    return _HEADER_PREFIX + json.dumps(header).encode()
+
+
+def _decode_header(frame) -> typing.Dict:
+    frame = bytes(memoryview(frame))
+    assert frame[:len(WIRE_FORMAT_MAGIC)] == WIRE_FORMAT_MAGIC, "not an encoded inference message"
+    version = frame[len(WIRE_FORMAT_MAGIC)]
+    assert version == WIRE_FORMAT_VERSION, f"unsupported inference message version: {version}"
+    return json.loads(frame[len(_HEADER_PREFIX):].decode())
+
+
+def _to_offsets(timestamps, start: datetime.datetime, cache: typing.Dict) -> typing.List[int]:
+    # messages share few distinct timestamps, so their offsets are cached for the whole batch
+    offsets = []
+    for timestamp in timestamps:
+        offset = cache.get(timestamp)
+        if offset is None:
+            offset = _NONE_TIMESTAMP if timestamp is None else (timestamp - start) // _ONE_MICROSECOND
+            cache[timestamp] = offset
+        offsets.append(offset)
+    return offsets
+
+
+def _from_offsets(offsets, start) -> typing.List:
+    timestamps = (start + offsets.astype("timedelta64[us]")).astype(object)
+    return [None if offset == _NONE_TIMESTAMP else timestamp for offset, timestamp in zip(offsets, timestamps)]
+
+
+def _string_index(strings, value) -> int:
+    if value is None:
+        return _NONE_INDEX
+    return strings.setdefault(value, len(strings))
+
+
+def _encode_human(
+        human: HumanAsMessage,
+        start: datetime.datetime,
+        timestamp_cache: typing.Dict,
+) -> typing.Tuple[typing.Dict, bytes]:
+    scalars = np.zeros(1, dtype=HUMAN_SCALARS_DTYPE)
+    scalars["age"] = human.age
+    scalars["sex"] = human.sex
+    scalars["obs_age"] = human.obs_age
+    scalars["obs_sex"] = human.obs_sex
+    scalars["infection_timestamp"], scalars["recovered_timestamp"] = \
+        _to_offsets([human.infection_timestamp, human.recovered_timestamp], start, timestamp_cache)
+    for key in ["incubation_days", "recovery_days"]:
+        value = getattr(human, key)
+        scalars[key] = np.nan if value is None else value
+    scalars["viral_load_to_infectiousness_multiplier"] = human.viral_load_to_infectiousness_multiplier
+    scalars["carefulness"] = human.carefulness
+    scalars["has_app"] = human.has_app
+    scalars["oracle_noise_random_seed"] = \
+        _NONE_INDEX if human.oracle_noise_random_seed is None else human.oracle_noise_random_seed
+
+    buffers, shapes = [scalars.tobytes()], []
+    for key, (wire_dtype, _) in HUMAN_ARRAY_FIELDS.items():
+        array = np.asarray(getattr(human, key), dtype=np.float64)
+        shapes.append(list(array.shape))
+        buffers.append(array.astype(wire_dtype).tobytes())
+
+    messages = human.update_messages
+    records = np.zeros(len(messages), dtype=UPDATE_MESSAGE_DTYPE)
+    strings = {}
+    if messages:
+        assert all(isinstance(m, UpdateMessage) for m in messages), "only update messages can be encoded"
+        uids = [m.uid for m in messages]
+        records["has_uid"] = [uid is not None for uid in uids]
+        records["uid_high"] = [(uid >> 64) if uid is not None else 0 for uid in uids]
+        records["uid_low"] = [(uid & _UID_LOW_MASK) if uid is not None else 0 for uid in uids]
+        for key in ["old_risk_level", "new_risk_level", "_exposition_event"]:
+            records[key] = [_NONE_INDEX if getattr(m, key) is None else getattr(m, key) for m in messages]
+        for key in _UPDATE_MESSAGE_TIMESTAMPS:
+            records[key] = _to_offsets([getattr(m, key) for m in messages], start, timestamp_cache)
+        for key in _UPDATE_MESSAGE_STRINGS:
+            records[key] = [_string_index(strings, getattr(m, key)) for m in messages]
+    buffers.append(records.tobytes())
+
+    human_header = {"name": human.name, "shapes": shapes, "n_messages": len(messages), "strings": list(strings)}
+    return human_header, b"".join(buffers)
+
+
+def _decode_human(human_header: typing.Dict, frame, start: np.datetime64) -> HumanAsMessage:
+    buffer = memoryview(frame)
+    scalars = np.frombuffer(buffer, dtype=HUMAN_SCALARS_DTYPE, count=1)[0]
+    offset = HUMAN_SCALARS_DTYPE.itemsize
+    arrays = {}
+    for (key, (wire_dtype, dtype)), shape in zip(HUMAN_ARRAY_FIELDS.items(), human_header["shapes"]):
+        count = int(np.prod(shape))
+        arrays[key] = np.frombuffer(buffer, dtype=wire_dtype, count=count, offset=offset).astype(dtype).reshape(shape)
+        offset += count * np.dtype(wire_dtype).itemsize
+    records = np.frombuffer(buffer, dtype=UPDATE_MESSAGE_DTYPE, count=human_header["n_messages"], offset=offset)
+
+    update_messages = []
+    if len(records):
+        strings = human_header["strings"]
+        timestamps = {key: _from_offsets(records[key], start) for key in _UPDATE_MESSAGE_TIMESTAMPS}
+        for idx, record in enumerate(records.tolist()):
+            record = dict(zip(UPDATE_MESSAGE_DTYPE.names, record))
+            update_messages.append(UpdateMessage(
+                uid=(record["uid_high"] << 64) | record["uid_low"] if record["has_uid"] else None,
+                old_risk_level=None if record["old_risk_level"] == _NONE_INDEX else record["old_risk_level"],
+                new_risk_level=None if record["new_risk_level"] == _NONE_INDEX else record["new_risk_level"],
+                encounter_time=timestamps["encounter_time"][idx],
+                update_time=timestamps["update_time"][idx],
+                _sender_uid=None if record["_sender_uid"] == _NONE_INDEX else strings[record["_sender_uid"]],
+                _receiver_uid=None if record["_receiver_uid"] == _NONE_INDEX else strings[record["_receiver_uid"]],
+                _real_encounter_time=timestamps["_real_encounter_time"][idx],
+                _real_update_time=timestamps["_real_update_time"][idx],
+                _exposition_event=None if record["_exposition_event"] == _NONE_INDEX
+                else bool(record["_exposition_event"]),
+                _update_reason=None if record["_update_reason"] == _NONE_INDEX else strings[record["_update_reason"]],
+            ))
+
+    infection_timestamp, recovered_timestamp = _from_offsets(
+        np.array([scalars["infection_timestamp"], scalars["recovered_timestamp"]]), start)
+    incubation_days, recovery_days = scalars["incubation_days"].item(), scalars["recovery_days"].item()
+    oracle_noise_random_seed = scalars["oracle_noise_random_seed"].item()
+    return HumanAsMessage(
+        name=human_header["name"],
+        age=scalars["age"].item(),
+        sex=scalars["sex"].item(),
+        obs_age=scalars["obs_age"].item(),
+        obs_sex=scalars["obs_sex"].item(),
+        preexisting_conditions=arrays["preexisting_conditions"],
+        obs_preexisting_conditions=arrays["obs_preexisting_conditions"],
+        infectiousnesses=arrays["infectiousnesses"],
+        infection_timestamp=infection_timestamp,
+        recovered_timestamp=recovered_timestamp,
+        test_results=arrays["test_results"],
+        rolling_all_symptoms=arrays["rolling_all_symptoms"],
+        rolling_all_reported_symptoms=arrays["rolling_all_reported_symptoms"],
+        incubation_days=None if np.isnan(incubation_days) else incubation_days,
+        recovery_days=None if np.isnan(recovery_days) else recovery_days,
+        viral_load_to_infectiousness_multiplier=scalars["viral_load_to_infectiousness_multiplier"].item(),
+        update_messages=update_messages,
+        carefulness=scalars["carefulness"].item(),
+        has_app=bool(scalars["has_app"]),
+        oracle_noise_random_seed=None if oracle_noise_random_seed == _NONE_INDEX else oracle_noise_random_seed,
+    )
+
+
+class EncodedBatch:
+    """
+    Batch of humans of an inference request, in its encoded form.
+
+    Humans are only decoded by `decode`, so batches can be split and forwarded without decoding them.
+    """
+
+    def __init__(self, header: typing.Dict, human_frames: typing.List, conf_frame=None):
+        """
+        Args:
+            header: fields shared by the batch, and `humans`, the header of each human
+            human_frames: the encoded humans, in the order of `header["humans"]`
+            conf_frame: the pickled configuration, if it is sent with this batch
+        """
+        assert len(header["humans"]) == len(human_frames)
+        self.header = header
+        self.human_frames = human_frames
+        self.conf_frame = conf_frame
+
+    @property
+    def conf_id(self) -> str:
+        return self.header["conf_id"]
+
+    @property
+    def keys(self) -> typing.List[str]:
+        """Keys of the cluster managers of the humans (see `covid19sim.inference.routing.get_cluster_mgr_hash`)."""
+        return [str(self.header["city_hash"]) + ":" + human["name"] for human in self.header["humans"]]
+
+    def __len__(self):
+        return len(self.human_frames)
+
+    @classmethod
+    def encode(cls, sample: typing.List[typing.Dict], conf_id: str, conf_frame=None) -> "EncodedBatch":
+        """
+        Encodes a batch of inference requests.
+
+        Args:
+            sample: inference requests, which should all share the same time, configuration and city.
+            conf_id: id of the configuration (see `encode_conf`).
+            conf_frame: the pickled configuration, if it should be sent with this batch.
+
+        Returns:
+            The encoded batch.
+        """
+        assert is_human_batch(sample)
+        ref = sample[0]
+        header = {
+            "conf_id": conf_id,
+            "start": ref["start"].isoformat(),
+            "current_day": ref["current_day"],
+            "time_slot": ref["time_slot"],
+            "city_hash": ref["city_hash"],
+        }
+        humans, human_frames, timestamp_cache = [], [], {}
+        for params in sample:
+            assert all(params[key] == ref[key] for key in ["start", "current_day", "time_slot", "city_hash"]) \
+                and params["conf"] is ref["conf"], "all requests of a batch should share the same time and settings"
+            human_header, human_frame = _encode_human(params["human"], ref["start"], timestamp_cache)
+            humans.append(human_header)
+            human_frames.append(human_frame)
+        header["humans"] = humans
+        return cls(header, human_frames, conf_frame)
+
+    def decode(self, conf: typing.Dict) -> typing.List[typing.Dict]:
+        """
+        Decodes the batch into inference requests (see `proc_human_batch`).
+
+        Args:
+            conf: the configuration referenced by the batch.
+        """
+        start = np.datetime64(self.header["start"], "us")
+        start_timestamp = start.astype(object)
+        return [
+            {
+                "start": start_timestamp,
+                "current_day": self.header["current_day"],
+                "human": _decode_human(human_header, frame, start),
+                "time_slot": self.header["time_slot"],
+                "conf": conf,
+                "city_hash": self.header["city_hash"],
+            }
+            for human_header, frame in zip(self.header["humans"], self.human_frames)
+        ]
+
+    def subset(self, indices: typing.Sequence[int]) -> "EncodedBatch":
+        """Returns the batch of some of the humans of this batch. The configuration is not included."""
+        header = dict(self.header, humans=[self.header["humans"][idx] for idx in indices])
+        return EncodedBatch(header, [self.human_frames[idx] for idx in indices])
+
+    def to_frames(self) -> typing.List:
+        header = dict(self.header, has_conf=self.conf_frame is not None)
+        frames = [_encode_header(header)]
+        if self.conf_frame is not None:
+            frames.append(self.conf_frame)
+        return frames + list(self.human_frames)
+
+    @classmethod
+    def from_frames(cls, frames: typing.Sequence) -> "EncodedBatch":
+        header = _decode_header(frames[0])
+        has_conf = header.pop("has_conf")
+        conf_frame = frames[1] if has_conf else None
+        return cls(header, list(frames[2 if has_conf else 1:]), conf_frame)
+
+
+def encode_reply(results: typing.Sequence[typing.Tuple[str, typing.Optional[np.ndarray]]]) -> typing.List[bytes]:
+    """
+    Encodes the results of `proc_human_batch`, i.e. the name and the risk history (or None) of each human.
+    """
+    names = [name for name, _ in results]
+    histories = [None if history is None else np.asarray(history, dtype=np.float32) for _, history in results]
+    shapes = [None if history is None else list(history.shape) for history in histories]
+    buffer = b"".join(history.tobytes() for history in histories if history is not None)
+    return [_encode_header({"names": names, "shapes": shapes}), buffer]
+
+
+def decode_reply(frames: typing.Sequence) -> typing.List[typing.Tuple[str, typing.Optional[np.ndarray]]]:
+    """Decodes the results encoded by `encode_reply`."""
+    header = _decode_header(frames[0])
+    buffer = np.frombuffer(memoryview(frames[1]), dtype=np.float32)
+    results, offset = [], 0
+    for name, shape in zip(header["names"], header["shapes"]):
+        if shape is None:
+            results.append((name, None))
+        else:
+            size = int(np.prod(shape))
+            results.append((name, buffer[offset:offset + size].reshape(shape)))
+            offset += size
+    return results
+
+
+def decode_payload(frames: typing.Sequence) -> typing.Any:
+    """Decodes a reply sent either with this format or pickled in a single frame."""
+    if is_encoded(frames[0]):
+        return decode_reply(frames)
+    assert len(frames) == 1, "unexpected pickled payload"
+    return pickle.loads(frames[0])
+
+
+class RequestEncoder:
+    """
+    Encodes the requests sent through a single connection.
+
+    Configurations are only sent with the first batch which references them; the receiver keeps them
+    for the following batches. Samples which are not batches of humans are pickled in a single frame.
+    """
+
+    def __init__(self):
+        self.sent_conf_ids = set()
+        self._conf, self._conf_id, self._conf_frame = None, None, None
+
+    def encode(self, sample) -> typing.List[bytes]:
+        """Returns the frames of a request."""
+        if not is_human_batch(sample):
+            return [pickle.dumps(sample)]
+        conf = sample[0]["conf"]
+        if conf is not self._conf:
+            # the configuration is the same object for the whole simulation, so it is only pickled once
+            self._conf = conf
+            self._conf_id, self._conf_frame = encode_conf(conf)
+        conf_frame = None if self._conf_id in self.sent_conf_ids else self._conf_frame
+        self.sent_conf_ids.add(self._conf_id)
+        return EncodedBatch.encode(sample, self._conf_id, conf_frame).to_frames()
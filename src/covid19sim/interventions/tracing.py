@@ -4,7 +4,6 @@ These are logic engines for doing tracing.
 
 """
 import typing
-from itertools import islice
 from covid19sim.epidemiology.symptoms import MODERATE, SEVERE, EXTREMELY_SEVERE
 from covid19sim.inference.heavy_jobs import DummyMemManager
 from covid19sim.epidemiology.symptoms import STR_TO_SYMPTOMS
@@ -561,7 +560,7 @@ class Heuristic(BaseMethod):
 
         # if there are no recent symptoms
         no_symptoms_past_7_days = \
-            not any(islice(human.rolling_all_reported_symptoms, (human.conf.get("TRACING_N_DAYS_HISTORY") // 2)))
+            not human.rolling_all_reported_symptoms[:human.conf.get("TRACING_N_DAYS_HISTORY") // 2].any()
         assert human.rec_level == getattr(human, '_heuristic_rec_level'), "rec level mismatch"
 
         # No positive test results
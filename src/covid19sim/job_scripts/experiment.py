@@ -14,6 +14,10 @@ import numpy as np
 import yaml
 from omegaconf import DictConfig
 
+from covid19sim.job_scripts.local_executor import (
+    LocalRun, default_mem_per_run, default_server_workers, get_pool_size, get_run_key, get_staging_outdir,
+    run_local_sweep,
+)
 from covid19sim.plotting.utils import env_to_path
 from covid19sim.utils.utils import parse_search_configuration, is_app_based_tracing_intervention, NpEncoder
 
@@ -182,6 +186,8 @@ def check_conf(conf):
                     raise RandomSearchError(
                         "Cannot find train config {}".format(transformer_config)
                     )
+    if use_tmpdir and infra == "local":
+        raise RandomSearchError("Cannot use $SLURM_TMPDIR (use_tmpdir) with infra=local")
     if use_tmpdir and infra != "intel" and not zip_outdir:
         raise RandomSearchError(
             "zip_outdir must be true when using tmpdir (use_tmpdir)"
@@ -430,6 +436,8 @@ def load_template(infra):
         str: template string full of "{variable_name}"
     """
     base = Path(__file__).resolve().parent
+    if infra == "local":
+        return ""  # runs are executed by `local_executor.py`
     if infra == "mila":
         with (base / "mila_sbatch_template.sh").open("r") as f:
             return f.read()
@@ -699,6 +707,15 @@ def main(conf: DictConfig) -> None:
     $ python experiment.py partition=unkillable gres=gpu:1 env_name=covid-env\
                               n_search=20 init_fraction_sick=0.1
 
+    NOTE: with `infra=local`, the runs are executed on this machine by a pool of
+    processes sized to `cpus` (defaults to all cores) and to the memory needed
+    by each run (`mem` GB, defaults to 4). The runs of a job (`n_runs_per_search`)
+    share an inference server with `server_workers` workers. Runs recorded as
+    completed in the sweep's manifest are skipped, so an interrupted sweep can be
+    started again with the same command:
+
+    $ python experiment.py infra=local exp_file=experiment n_search=20 cpus=32 mem=8
+
     """
 
     # These will be filtered out when passing arguments to run.py
@@ -716,7 +733,7 @@ def main(conf: DictConfig) -> None:
         "env_name",  # conda environment to load
         "code_loc",  # where to find the source code, will cd there
         "weights",  # where to find the transformer's weights
-        "infra",  # using Mila or Intel cluster?
+        "infra",  # using Mila or Intel cluster? (or local to run on this machine)
         "now_str",  # naming scheme
         "parallel_search",  # run with & at the end instead of ; to run in subshells
         "ipc",  # run with & at the end instead of ; to run in subshells
@@ -729,6 +746,13 @@ def main(conf: DictConfig) -> None:
         "normalization_folder",  # if this is a normalization run
         "exp_name",  # folder name in base_dir => base_dir/exp_name/method/...
         "email_id", # email id where you can receive notifications regarding jobs (began, completed, failed)
+        "server_workers",  # infra=local: number of workers of each inference server
+    }
+
+    # These are not parameters of the simulation: they are left out of the keys identifying infra=local runs
+    RUN_KEY_EXCLUDED_PARAMS = (RANDOM_SEARCH_SPECIFIC_PARAMS - {"weights"}) | {
+        "outdir",  # derived from base_dir and the intervention
+        "INFERENCE_SERVER_ADDRESS",  # ipc address, random for each sweep
     }
 
     # move back to original directory because hydra moved
@@ -811,6 +835,7 @@ def main(conf: DictConfig) -> None:
     # run n_search jobs
     printlines()
     old_opts = set()
+    local_runs = []
     run_idx = start_index
     for i in range(conf.get("n_search", 1)):
         print("\nJOB", i)
@@ -823,6 +848,8 @@ def main(conf: DictConfig) -> None:
             job_str = fill_beluga_template(template_str, conf)
         elif infra == "intel":
             job_str = fill_intel_template(template_str, conf)
+        elif infra == "local":
+            job_str = ""
         else:
             raise ValueError("Unknown infra " + str(infra))
 
@@ -915,6 +942,16 @@ def main(conf: DictConfig) -> None:
 
             opts["outdir"] = opts["outdir"]
 
+            # ---------------------------------------------------
+            # -----  infra=local: stage outputs of each run  -----
+            # ---------------------------------------------------
+            if infra == "local":
+                run_key = get_run_key(json.dumps(
+                    {k: v for k, v in opts.items() if k not in RUN_KEY_EXCLUDED_PARAMS}, sort_keys=True, cls=NpEncoder
+                ))
+                run_outdir = str(opts["outdir"])
+                opts["outdir"] = get_staging_outdir(run_outdir, run_key)
+
             # --------------------------------
             # -----  Use SLURM_TMPDIR ?  -----
             # --------------------------------
@@ -934,6 +971,22 @@ def main(conf: DictConfig) -> None:
                 exclude.add("intervention")
             hydra_args = get_hydra_args(opts, exclude)
 
+            if infra == "local":
+                server_args = None
+                if use_server:
+                    server_args = [
+                        "--frontend", ipcf, "--backend", ipcb, "inference", "-e", opts["weights"],
+                        "-w", str(conf.get("server_workers", default_server_workers)),
+                    ]
+                local_runs.append(LocalRun(
+                    key=run_key,
+                    hydra_args=hydra_args,
+                    outdir=run_outdir,
+                    server_group=i if use_server else None,
+                    server_args=server_args,
+                ))
+                continue
+
             # echo commandlines run in job
             if not dev:
                 job_str += f"\necho 'python run.py {hydra_args}'\n"
@@ -952,7 +1005,7 @@ def main(conf: DictConfig) -> None:
             job_str += "\n{}{}".format("python run.py" + hydra_args, command_suffix)
             # sample next params
 
-        if skipped:
+        if skipped or infra == "local":
             continue
         # output in slurm_tmpdir and move zips to original outdir specified
         if use_tmpdir and infra != "intel":
@@ -991,6 +1044,11 @@ def main(conf: DictConfig) -> None:
         print()
         printlines()
 
+    if infra == "local":
+        n_workers = get_pool_size(conf.get("cpus"), conf.get("mem", default_mem_per_run))
+        code_loc = conf.get("code_loc") or str(Path(__file__).resolve().parent.parent)
+        run_local_sweep(local_runs, copy_dest, code_loc, n_workers, dev=dev)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,281 @@
+"""
+Executor for `infra=local` sweeps of `experiment.py`, which runs the sampled simulations on the current machine
+instead of submitting jobs to a cluster.
+
+Simulations run as `run.py` subprocesses in a bounded pool sized to the available cores and memory, each pinned to
+its own core. The runs of an experiment job share one inference server, which is started before the first of them
+and stopped after the last. The outcome of each run (exit code, wall time, peak RSS) is recorded in a sweep manifest,
+and the runs which already completed are skipped when the sweep is started again.
+
+Each run writes its outputs in a hidden staging folder of its output directory, whose content is moved to the output
+directory once the run succeeds: the usual `<base_dir>/<method>/<run>/tracker*.pkl` layout is kept, and partial
+outputs of interrupted runs are never picked up by the plotting scripts.
+"""
+import concurrent.futures
+import dataclasses
+import datetime
+import hashlib
+import json
+import os
+import queue
+import shlex
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+import time
+import typing
+from pathlib import Path
+
+import psutil
+
+MANIFEST_FILENAME = "sweep_manifest.json"
+LOGS_DIRNAME = "local_logs"
+STAGING_PREFIX = ".local_"
+default_mem_per_run = 4  # GB, like the sbatch `mem` parameter
+default_server_workers = 2
+server_startup_delay = 5  # seconds to let an inference server bind its sockets before its first client starts
+
+
+@dataclasses.dataclass
+class LocalRun:
+    """A simulation of the sweep, i.e. one `run.py` command."""
+    key: str  # identifies the sampled configuration (see `get_run_key`)
+    hydra_args: str  # command-line arguments of `run.py`
+    outdir: str  # folder in which the run's folder should end up (e.g. `<base_dir>/<method>`)
+    server_group: typing.Optional[int] = None  # index of the inference server used by the run, if any
+    server_args: typing.Optional[typing.List[str]] = None  # command-line arguments of `server_bootstrap.py`
+
+
+def get_run_key(opts_str):
+    """
+    Identifies a sampled configuration, so that completed runs can be recognized by later sweeps.
+
+    Args:
+        opts_str (str): JSON dump of the simulation parameters of the sampled configuration (with sorted keys)
+
+    Returns:
+        str: short hash of the configuration
+    """
+    return hashlib.sha1(opts_str.encode()).hexdigest()[:12]
+
+
+def get_staging_outdir(outdir, key):
+    """
+    Returns the folder in which `run.py` writes the outputs of a run before they are moved to `outdir`.
+    """
+    return str(Path(outdir) / f"{STAGING_PREFIX}{key}")
+
+
+def get_available_cores():
+    """Returns the cores this process may run on."""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def get_pool_size(n_cpus=None, mem_per_run=default_mem_per_run, available_memory=None):
+    """
+    Computes how many simulations can run at once without oversubscribing the cores or the memory.
+
+    Args:
+        n_cpus (int, optional): number of cores to use. Defaults to all the available cores.
+        mem_per_run (float, optional): memory needed by a simulation, in GB.
+        available_memory (int, optional): memory which can be used, in bytes. Defaults to the available memory.
+
+    Returns:
+        int: size of the pool of simulations
+    """
+    if n_cpus is None:
+        n_cpus = len(get_available_cores())
+    if available_memory is None:
+        available_memory = psutil.virtual_memory().available
+    return max(1, min(n_cpus, int(available_memory // (mem_per_run * 1024 ** 3))))
+
+
+def is_completed(entry):
+    """
+    Whether a manifest entry is a run which succeeded and whose outputs are still there.
+    """
+    return (
+        entry.get("returncode") == 0
+        and entry.get("run_dirs")
+        and all(any(Path(run_dir).glob("**/tracker*.pkl")) for run_dir in entry["run_dirs"])
+    )
+
+
+class SweepManifest:
+    """
+    JSON record of the runs of a sweep (`MANIFEST_FILENAME` in the sweep's output directory), written after each run.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.runs = {}
+        if self.path.exists():
+            with self.path.open("r") as f:
+                self.runs = json.load(f).get("runs", {})
+
+    def update(self, key, **values):
+        """Updates the entry of a run and writes the manifest."""
+        with self.lock:
+            self.runs.setdefault(key, {}).update(values)
+            tmp_path = self.path.with_name(self.path.name + ".tmp")
+            with tmp_path.open("w") as f:
+                json.dump({"runs": self.runs}, f, indent=2, sort_keys=True)
+            tmp_path.replace(self.path)
+
+
+class InferenceServers:
+    """
+    Inference servers shared by groups of runs: the server of a group is started when its first run starts and is
+    stopped when its last run ends.
+    """
+
+    def __init__(self, runs, cwd, log_dir):
+        self.cwd = cwd
+        self.log_dir = Path(log_dir)
+        self.lock = threading.Lock()
+        self.n_remaining_runs = {}
+        for run in runs:
+            if run.server_group is not None:
+                self.n_remaining_runs[run.server_group] = self.n_remaining_runs.get(run.server_group, 0) + 1
+        self.processes = {}
+
+    def acquire(self, run):
+        """Starts the server of a run if it is not running yet."""
+        if run.server_group is None:
+            return
+        with self.lock:
+            if run.server_group in self.processes:
+                return
+            with (self.log_dir / f"server_{run.server_group}.log").open("a") as log_file:
+                self.processes[run.server_group] = subprocess.Popen(
+                    [sys.executable, "-m", "covid19sim.inference.server_bootstrap", *run.server_args],
+                    cwd=self.cwd, stdout=log_file, stderr=subprocess.STDOUT,
+                )
+            time.sleep(server_startup_delay)
+
+    def release(self, run):
+        """Stops the server of a run if no other run needs it."""
+        if run.server_group is None:
+            return
+        with self.lock:
+            self.n_remaining_runs[run.server_group] -= 1
+            if self.n_remaining_runs[run.server_group] == 0:
+                self._stop(self.processes.pop(run.server_group, None))
+
+    def stop_all(self):
+        with self.lock:
+            for process in self.processes.values():
+                self._stop(process)
+            self.processes.clear()
+
+    @staticmethod
+    def _stop(process):
+        if process is None or process.poll() is not None:
+            return
+        process.send_signal(signal.SIGINT)  # the server releases its sockets on SIGINT
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+
+def execute_run(run, cores, cwd, log_dir):
+    """
+    Runs a simulation in a subprocess pinned to `cores`.
+
+    Returns:
+        dict: exit code, wall time (seconds) and peak resident memory (MB) of the simulation
+    """
+    command = [sys.executable, "run.py", *shlex.split(run.hydra_args)]
+    start_time = time.perf_counter()
+    with (Path(log_dir) / f"{run.key}.log").open("w") as log_file:
+        log_file.write(" ".join(command) + "\n")
+        log_file.flush()
+        process = subprocess.Popen(command, cwd=cwd, stdout=log_file, stderr=subprocess.STDOUT)
+        # pinned from here rather than with `preexec_fn`, which isn't safe in the threads of the pool
+        if cores and hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(process.pid, cores)
+            except ProcessLookupError:  # the simulation already exited
+                pass
+        # wait4 gives the resource usage of this child only (unlike getrusage(RUSAGE_CHILDREN))
+        _, status, rusage = os.wait4(process.pid, 0)
+        # like `Popen.returncode`: minus the signal number if the simulation was killed
+        process.returncode = -os.WTERMSIG(status) if os.WIFSIGNALED(status) else os.WEXITSTATUS(status)
+    wall_time = time.perf_counter() - start_time
+    peak_rss_kb = rusage.ru_maxrss / (1024 if sys.platform == "darwin" else 1)  # bytes on macOS, KB on Linux
+    return {"returncode": process.returncode, "wall_time": wall_time, "peak_rss_mb": peak_rss_kb / 1024}
+
+
+def run_local_sweep(runs, sweep_dir, code_loc, n_workers, dev=False):
+    """
+    Runs the simulations of a sweep in a pool of `n_workers` processes, skipping the ones which already completed.
+
+    Args:
+        runs (list): `LocalRun`s of the sweep
+        sweep_dir (str): folder of the manifest and of the logs
+        code_loc (str): folder containing `run.py`
+        n_workers (int): maximum number of simulations running at once (see `get_pool_size`)
+        dev (bool, optional): only print what would be run. Defaults to False.
+
+    Returns:
+        SweepManifest: the manifest of the sweep
+    """
+    manifest = SweepManifest(Path(sweep_dir) / MANIFEST_FILENAME)
+    pending = [run for run in runs if not is_completed(manifest.runs.get(run.key, {}))]
+    print(f"{len(runs) - len(pending)} completed run(s) skipped, {len(pending)} to run with {n_workers} worker(s)")
+    if dev:
+        for run in pending:
+            server = f" (inference server {run.server_group})" if run.server_group is not None else ""
+            print(f"\n>>> python run.py{run.hydra_args}{server}")
+        return manifest
+
+    log_dir = Path(sweep_dir) / LOGS_DIRNAME
+    log_dir.mkdir(parents=True, exist_ok=True)
+    servers = InferenceServers(pending, code_loc, log_dir)
+
+    # each worker owns a slice of the cores, which its simulations are pinned to
+    cores = get_available_cores()
+    core_slots = queue.Queue()
+    for slot in range(n_workers):
+        core_slots.put(cores[slot::n_workers] if len(cores) >= n_workers else [])
+
+    def work(run):
+        staging_outdir = get_staging_outdir(run.outdir, run.key)
+        shutil.rmtree(staging_outdir, ignore_errors=True)  # partial outputs of an interrupted run
+        Path(staging_outdir).mkdir(parents=True)
+        slot = core_slots.get()
+        try:
+            servers.acquire(run)
+            manifest.update(
+                run.key, hydra_args=run.hydra_args, outdir=run.outdir, server_group=run.server_group,
+                started_at=datetime.datetime.now().isoformat(), returncode=None,
+            )
+            result = execute_run(run, slot, code_loc, log_dir)
+        finally:
+            servers.release(run)
+            core_slots.put(slot)
+
+        run_dirs = []
+        if result["returncode"] == 0:
+            for path in sorted(Path(staging_outdir).iterdir()):
+                run_dirs.append(str(Path(run.outdir) / path.name))
+                shutil.move(str(path), run_dirs[-1])
+            shutil.rmtree(staging_outdir)
+        manifest.update(run.key, run_dirs=run_dirs, finished_at=datetime.datetime.now().isoformat(), **result)
+        status = "done" if result["returncode"] == 0 else f"failed ({result['returncode']})"
+        print(f"Run {run.key} {status} in {result['wall_time']:.0f}s, peak RSS {result['peak_rss_mb']:.0f}MB")
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=n_workers) as executor:
+            for future in concurrent.futures.as_completed([executor.submit(work, run) for run in pending]):
+                future.result()
+    finally:
+        servers.stop_all()
+    return manifest
@@ -4,24 +4,28 @@ humans will interact. Its `run` loop also contains the tracing application logic
 """
 
 import numpy as np
-import copy
 import datetime
 import itertools
 import math
 import time
 import typing
-from collections import defaultdict, Counter
+from collections import Counter
 from orderedset import OrderedSet
 
 from covid19sim.utils.utils import compute_distance, _get_random_area, relativefreq2absolutefreq, _convert_bin_5s_to_bin_10s, log
 from covid19sim.utils.demographics import get_humans_with_age, assign_households_to_humans, create_locations_and_assign_workplace_to_humans
 from covid19sim.log.track import Tracker
-from covid19sim.inference.heavy_jobs import batch_run_timeslot_heavy_jobs
+from covid19sim.inference.heavy_jobs import RiskInferenceCounters, batch_run_timeslot_heavy_jobs
+from covid19sim.inference.server_utils import InferenceClientPool
 from covid19sim.interventions.tracing import BaseMethod
-from covid19sim.inference.message_utils import UIDType, UpdateMessage, RealUserIDType
+from covid19sim.inference.message_store import MessageStore
+from covid19sim.inference.message_utils import GlobalMailbox, UIDType, UpdateMessage, RealUserIDType
 from covid19sim.distribution_normalization.dist_utils import get_rec_level_transition_matrix
 from covid19sim.interventions.tracing_utils import get_tracing_method
 from covid19sim.locations.test_facility import TestFacility
+from covid19sim.utils.mobility_planner import initialize_mobility_planners
+from covid19sim.utils.population_cache import get_population_cache_key, get_population_cache_path, load_population, save_population
+from covid19sim.utils.risk_history import RiskHistoryMatrix
 
 
 if typing.TYPE_CHECKING:
@@ -37,6 +41,11 @@ class City:
     City agent/environment class. Currently, a single city object will be instantiated at the start of
     a simulation. In the future, multiple 'cities' may be executed in parallel to simulate larger populations.
     """
+    # attributes set by `initialize_humans_and_locations` which are stored in the population cache
+    POPULATION_ATTRIBUTES = [
+        "humans", "households", "age_histogram", "stores", "senior_residences", "hospitals",
+        "miscs", "parks", "schools", "workplaces", "risk_history_matrix", "prev_risk_history_matrix",
+    ]
 
     def __init__(
             self,
@@ -73,6 +82,16 @@ class City:
         self.n_people = n_people
         self.init_fraction_sick = init_fraction_sick
         self.hash = int(time.time_ns())  # real-life time used as hash for inference server data hashing
+        self.inference_client_pool = None  # connections to the inference server, opened on first use
+        self.shard = None  # part of the population simulated by this process (see `covid19sim.locations.sharding`)
+        self.risk_inference_counters = RiskInferenceCounters()  # risk inferences which were run or skipped
+        # rows of the (current & previous) risk history maps of all humans
+        self.risk_history_matrix = RiskHistoryMatrix(conf.get("TRACING_N_DAYS_HISTORY") + 1, capacity=max(n_people, 1))
+        self.prev_risk_history_matrix = RiskHistoryMatrix(conf.get("TRACING_N_DAYS_HISTORY") + 1, capacity=max(n_people, 1))
+        # rows of the risk history maps backed up by `run_app` for GAEN, reused every timeslot
+        self.backup_risk_history_matrix = RiskHistoryMatrix(conf.get("TRACING_N_DAYS_HISTORY") + 1)
+        # encounters of the contact books of all humans are records of this store
+        self.message_store = MessageStore(start_timestamp=env.initial_timestamp)
         self.tracker = Tracker(env, self, conf, logfile)
 
         self.test_type_preference = list(zip(*sorted(conf.get("TEST_TYPES").items(), key=lambda x:x[1]['preference'])))[0]
@@ -97,14 +116,16 @@ class City:
         self.age_histogram = None
 
         log("Initializing humans ...", self.logfile)
-        self.initialize_humans_and_locations()
+        if not self._load_population_from_cache():
+            self.initialize_humans_and_locations()
+
+            log("Computing their preferences", self.logfile)
+            self._compute_preferences()
+            self._save_population_to_cache()
 
         # self.log_static_info()
         self.tracker.track_static_info()
 
-
-        log("Computing their preferences", self.logfile)
-        self._compute_preferences()
         self.tracing_method = None
 
         # GAEN summary statistics that enable the individual to determine whether they should send their info
@@ -116,7 +137,7 @@ class City:
         # database diffs between their last timeslot and their current timeslot; instead, we
         # will give them the global mailbox object (a dictionary) and have them 'pop' all
         # messages they consume from their own (simulation-only!) personal mailbox
-        self.global_mailbox: SimulatorMailboxType = defaultdict(dict)
+        self.global_mailbox: SimulatorMailboxType = GlobalMailbox(self.conf.get('TRACING_N_DAYS_HISTORY'))
         self.tracker.initialize()
 
     def cleanup_global_mailbox(
@@ -126,26 +147,15 @@ class City:
         """Removes all messages older than 14 days from the global mailbox."""
         # note that to keep the simulator efficient, users will directly pop the update messages that
         # they consume, so this is only necessary for edge cases (e.g. dead people can't update)
-        max_encounter_age = self.conf.get('TRACING_N_DAYS_HISTORY')
-        new_global_mailbox = defaultdict(dict)
-        for user_key, personal_mailbox in self.global_mailbox.items():
-            new_personal_mailbox = {}
-            for mailbox_key, messages in personal_mailbox.items():
-                for message in messages:
-                    if (current_timestamp - message.encounter_time).days <= max_encounter_age:
-                        if mailbox_key not in new_personal_mailbox:
-                            new_personal_mailbox[mailbox_key] = []
-                        new_personal_mailbox[mailbox_key].append(message)
-            new_global_mailbox[user_key] = new_personal_mailbox
-        self.global_mailbox = new_global_mailbox
+        self.global_mailbox.cleanup(current_timestamp)
 
     def register_new_messages(
             self,
             current_day_idx: int,
             current_timestamp: datetime.datetime,
             update_messages: typing.List[UpdateMessage],
-            prev_human_risk_history_maps: typing.Dict["Human", typing.Dict[int, float]],
-            new_human_risk_history_maps: typing.Dict["Human", typing.Dict[int, float]],
+            prev_human_risk_history_maps: typing.Dict["Human", typing.Mapping[int, float]],
+            new_human_risk_history_maps: typing.Optional[typing.Dict["Human", typing.Mapping[int, float]]] = None,
     ):
         """Adds new update messages to the global mailbox, passing them to trackers if needed.
 
@@ -153,7 +163,8 @@ class City:
         For this purpose, the risk history level maps of all users are provided as input. Note that
         these risk history maps may not actually be transfered to the server, and we have to be
         careful how we use this data in a safe fashion so that (in real life) only non-PII info
-        needs to be transmitted to the server for filtering.
+        needs to be transmitted to the server for filtering. If the new risk history maps are not
+        provided, the current maps of the humans are used.
         """
         humans_with_updates = {self.hd[m._sender_uid] for m in update_messages}
 
@@ -162,7 +173,8 @@ class City:
             updater_scores = {
                 h: h.contact_book.get_risk_level_change_score(
                     prev_risk_history_map=prev_human_risk_history_maps[h],
-                    curr_risk_history_map=new_human_risk_history_maps[h],
+                    curr_risk_history_map=new_human_risk_history_maps[h]
+                    if new_human_risk_history_maps is not None else h.risk_history_map,
                     proba_to_risk_level_map=h.proba_to_risk_level_map,
                 ) for h in humans_with_updates
             }
@@ -206,11 +218,7 @@ class City:
             self.sent_messages_by_day[current_day_idx] += 1
             source_human.contact_book.latest_update_time = \
                 max(source_human.contact_book.latest_update_time, current_timestamp)
-            mailbox_key = update_message.uid  # mailbox key = message uid
-            personal_mailbox = self.global_mailbox[destination_human.name]
-            if mailbox_key not in personal_mailbox:
-                personal_mailbox[mailbox_key] = []
-            personal_mailbox[mailbox_key].append(update_message)
+            self.global_mailbox.add_message(destination_human.name, update_message)
 
     def _check_should_send_message_gaen(
             self,
@@ -296,21 +304,93 @@ class City:
         # prepare schedule
         log("Preparing schedule ... ")
         start_time = datetime.datetime.now()
-        # TODO - parallelize this for speedup in initialization
-        for human in self.humans:
-            human.mobility_planner.initialize()
+        initialize_mobility_planners(self.humans, self.conf, n_jobs=self.conf.get('SCHEDULE_PRESAMPLING_N_JOBS', 1))
 
         timedelta = (datetime.datetime.now() - start_time).total_seconds()
         log(f"Schedule prepared (Took {timedelta:2.3f}s)", self.logfile)
         self.hd = {human.name: human for human in self.humans}
 
+    def _get_population_cache_path(self):
+        """
+        Returns:
+            (pathlib.Path): file where the population of this city is cached. None if `POPULATION_CACHE_DIR` is not set.
+        """
+        cache_dir = self.conf.get('POPULATION_CACHE_DIR')
+        if not cache_dir:
+            return None
+
+        if getattr(self, "_population_cache_path", None) is None:
+            key = get_population_cache_key(self.conf, self.n_people, self.x_range, self.y_range, self.env.ts_initial, self.rng)
+            self._population_cache_path = get_population_cache_path(cache_dir, key)
+        return self._population_cache_path
+
+    def _get_population_shared_objects(self):
+        """
+        Returns:
+            (dict): objects referenced by the population which are owned by this simulation and aren't cached
+        """
+        return {"env": self.env, "city": self, "conf": self.conf, "tracker": self.tracker, "rng": self.rng,
+                "message_store": self.message_store}
+
+    def _load_population_from_cache(self):
+        """
+        Loads humans, households, locations and their presampled schedules from `POPULATION_CACHE_DIR`, if they were
+        cached by a previous run with the same settings. The state of `self.rng` is the same as after the synthesis.
+
+        Returns:
+            (bool): True if the population was loaded from the cache
+        """
+        path = self._get_population_cache_path()
+        if path is None or not path.exists():
+            return False
+
+        start_time = datetime.datetime.now()
+        try:
+            population = load_population(path, self._get_population_shared_objects())
+        except Exception as e:
+            log(f"Couldn't load the population cached at {path} ({e}). It will be synthesized again.", self.logfile)
+            return False
+
+        self.rng.set_state(population.pop("rng_state"))
+        for attr, value in population.items():
+            setattr(self, attr, value)
+        self.hd = {human.name: human for human in self.humans}
+        # the settings which don't change the population may differ from those of the run which cached it
+        for human in self.humans:
+            human.set_runtime_settings()
+
+        timedelta = (datetime.datetime.now() - start_time).total_seconds()
+        log(f"Population loaded from {path} (Took {timedelta:2.3f}s)", self.logfile)
+        return True
+
+    def _save_population_to_cache(self):
+        """
+        Writes the synthesized population to `POPULATION_CACHE_DIR` so that the next runs with the same settings can load it.
+        """
+        path = self._get_population_cache_path()
+        if path is None or path.exists():
+            return
+
+        population = {attr: getattr(self, attr) for attr in self.POPULATION_ATTRIBUTES}
+        population["rng_state"] = self.rng.get_state()
+        try:
+            save_population(path, population, self._get_population_shared_objects())
+        except Exception as e:
+            log(f"Couldn't cache the population at {path} ({e})", self.logfile)
+            return
+        log(f"Population cached at {path}", self.logfile)
+
     def _initiate_infection_spread_and_modify_mixing_if_needed(self):
         """
         Seeds infection in the population and sets other attributes corresponding to social mixing dynamics.
         """
-        # seed infection
+        # seed infection (shards draw from the whole population, and infect the humans they host)
+        population = self.humans if self.shard is None else self.shard.population
         self.n_init_infected = math.ceil(self.init_fraction_sick * self.n_people)
-        chosen_infected = self.rng.choice(self.humans, size=self.n_init_infected, replace=False)
+        chosen_infected = self.rng.choice(population, size=self.n_init_infected, replace=False)
+        if self.shard is not None:
+            chosen_infected = [human for human in chosen_infected if self.shard.hosts(human)]
+            self.n_init_infected = len(chosen_infected)
         for human in chosen_infected:
             human._get_infected(initial_viral_load=human.rng.random())
 
@@ -349,7 +429,8 @@ class City:
             (x[0], x[1]): math.ceil(age_histogram_bin_10s[(x[0], x[1])] * x[2] * self.conf.get('APP_UPTAKE'))
             for x in self.conf.get("SMARTPHONE_OWNER_FRACTION_BY_AGE")
         }
-        for human in self.humans:
+        # shards go through the whole population so that they agree on who has the app
+        for human in (self.humans if self.shard is None else self.shard.population):
             if all_has_app:
                 # i get an app, you get an app, everyone gets an app
                 human.has_app = True
@@ -534,7 +615,6 @@ class City:
                 current_timestamp=self.env.timestamp,
                 update_messages=update_messages,
                 prev_human_risk_history_maps=prev_risk_history_maps,
-                new_human_risk_history_maps={h: h.risk_history_map for h in self.humans},
             )
 
             # for debugging/plotting a posteriori, track all human/location attributes...
@@ -579,6 +659,26 @@ class City:
                 ),
             )
 
+    def get_inference_client_pool(self) -> typing.Optional[InferenceClientPool]:
+        """
+        Returns the connections to the inference server used by this city, which are kept open for the whole
+        simulation. Returns None if the simulation does not use an inference server.
+        """
+        if not self.conf.get("USE_INFERENCE_SERVER"):
+            return None
+        if self.inference_client_pool is None:
+            self.inference_client_pool = InferenceClientPool(
+                server_address=self.conf.get("INFERENCE_SERVER_ADDRESS", None),
+                n_sockets=self.conf.get("INFERENCE_REQ_PARALLEL_JOBS", 16),
+            )
+        return self.inference_client_pool
+
+    def close_inference_client_pool(self):
+        """Closes the connections to the inference server, if any were opened."""
+        if self.inference_client_pool is not None:
+            self.inference_client_pool.close()
+            self.inference_client_pool = None
+
     def run_app(
             self,
             current_day: int,
@@ -595,6 +695,9 @@ class City:
         (if necessary), and the tracker will be updated with the state of all humans.
         """
         backup_human_init_risks = {}  # backs up human risks before any update takes place
+        if self.conf.get("USE_GAEN"):
+            # the backups are only needed by GAEN; the rows of the previous timeslot's backups are reused
+            self.backup_risk_history_matrix.clear()
 
         # iterate over humans, and if it's their timeslot, then update their state
         for human in alive_humans:
@@ -606,7 +709,8 @@ class City:
             # set the human's risk to a correct value for the day (if it does not exist already)
             human.initialize_daily_risk(current_day)
             # keep a backup of the current risk map before infering anything, in case GAEN needs it
-            backup_human_init_risks[human] = copy.deepcopy(human.risk_history_map)
+            if self.conf.get("USE_GAEN"):
+                backup_human_init_risks[human] = self.backup_risk_history_matrix.copy_map(human.risk_history_map)
             # run 'lightweight' app jobs (e.g. contact book cleanup, symptoms reporting, bdt) without batching
             human.run_timeslot_lightweight_jobs(
                 init_timestamp=self.start_time,
@@ -628,6 +732,8 @@ class City:
                 time_slot=self.env.timestamp.hour,
                 conf=self.conf,
                 city_hash=self.hash,
+                inference_client_pool=self.get_inference_client_pool(),
+                risk_inference_counters=self.risk_inference_counters,
             )
 
         # iterate over humans again, and if it's their timeslot, then prepare risk update messages
@@ -728,7 +834,14 @@ class EmptyCity(City):
         self.parks = []
         self.schools = []
         self.workplaces = []
-        self.global_mailbox: SimulatorMailboxType = defaultdict(dict)
+        self.global_mailbox: SimulatorMailboxType = GlobalMailbox(self.conf.get('TRACING_N_DAYS_HISTORY'))
+        self.inference_client_pool = None
+        self.shard = None
+        self.risk_inference_counters = RiskInferenceCounters()
+        self.risk_history_matrix = RiskHistoryMatrix(self.conf.get("TRACING_N_DAYS_HISTORY") + 1)
+        self.prev_risk_history_matrix = RiskHistoryMatrix(self.conf.get("TRACING_N_DAYS_HISTORY") + 1)
+        self.backup_risk_history_matrix = RiskHistoryMatrix(self.conf.get("TRACING_N_DAYS_HISTORY") + 1)
+        self.message_store = MessageStore(start_timestamp=env.initial_timestamp)
         self.n_init_infected  = 0
         self.init_fraction_sick = 0
 
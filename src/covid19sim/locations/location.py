@@ -10,7 +10,7 @@ from collections import namedtuple
 import numpy as np
 import warnings
 
-from covid19sim.utils.utils import _sample_positive_normal
+from covid19sim.utils.utils import _sample_positive_normal, _sample_positive_normal_vectorized
 from covid19sim.epidemiology.p_infection import get_environment_human_p_transmission
 from covid19sim.epidemiology.viral_load import compute_covid_properties
 
@@ -49,6 +49,124 @@ def _adjust_surveyed_contacts_to_regional_contacts(MEAN_DAILY_KNOWN_CONTACTS_FOR
     return MEAN_DAILY_KNOWN_CONTACTS_FOR_AGEGROUP * MEAN_DAILY_KNOWN_CONTACTS / surveyed_mean
 
 
+class LocationOccupancy:
+    """
+    Array-backed record of the humans currently present at a `Location`.
+    Each human occupies a slot that stores its age bin (width 5) index and its start and leaving times at the location.
+    Slots are kept in the order of arrival (same order as `Location.humans`), so that sampling over the candidate slots
+    is equivalent to sampling over the `OrderedSet` of humans. Removal only marks the slot as free; free slots are
+    compacted away once they outnumber the occupied ones.
+    """
+
+    def __init__(self, initial_capacity=8):
+        """
+        Args:
+            initial_capacity (int): number of slots to preallocate. Arrays grow by doubling when full.
+        """
+        self._slots = [None] * initial_capacity
+        self._index = {}
+        self._n_slots = 0
+        self.occupied = np.zeros(initial_capacity, dtype=bool)
+        self.age_bins = np.zeros(initial_capacity, dtype=np.int64)
+        self.start_times = np.zeros(initial_capacity, dtype=np.float64)
+        self.leaving_times = np.zeros(initial_capacity, dtype=np.float64)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, human):
+        return human in self._index
+
+    def add(self, human):
+        """
+        Adds `human` to a new slot, or refreshes its times if it is already present (its position is then unchanged).
+
+        Args:
+            human (covid19sim.human.Human): human entering the location
+        """
+        slot = self._index.get(human)
+        if slot is None:
+            if self._n_slots == len(self._slots):
+                self._compact_or_grow()
+            slot = self._n_slots
+            self._n_slots += 1
+            self._index[human] = slot
+            self._slots[slot] = human
+            self.occupied[slot] = True
+            self.age_bins[slot] = human.age_bin_width_5.index
+
+        self.start_times[slot] = human.location_start_time
+        self.leaving_times[slot] = human.location_leaving_time
+
+    def remove(self, human):
+        """
+        Frees the slot occupied by `human`.
+
+        Args:
+            human (covid19sim.human.Human): human leaving the location
+        """
+        slot = self._index.pop(human)
+        self._slots[slot] = None
+        self.occupied[slot] = False
+        if not self._index:
+            self._n_slots = 0
+        elif self._n_slots - len(self._index) > max(len(self._index), 16):
+            self._compact_or_grow()
+
+    def slots_except(self, human):
+        """
+        Returns:
+            (np.ndarray): slot indices of all the occupants except `human`, in order of arrival
+        """
+        slots = np.flatnonzero(self.occupied[:self._n_slots])
+        return slots[slots != self._index[human]]
+
+    def humans_at(self, slots):
+        """
+        Args:
+            slots (iterable): slot indices
+
+        Returns:
+            (list): humans occupying `slots`
+        """
+        return [self._slots[i] for i in slots]
+
+    def known_mask(self, human, slots):
+        """
+        Builds the bitmap of occupants in `slots` that are known connections of `human`.
+
+        Args:
+            human (covid19sim.human.Human): human whose known connections are looked up
+            slots (np.ndarray): slot indices
+
+        Returns:
+            (np.ndarray): boolean array aligned with `slots`
+        """
+        known_connections = human.known_connections
+        return np.fromiter((self._slots[i] in known_connections for i in slots), dtype=bool, count=len(slots))
+
+    def _compact_or_grow(self):
+        """
+        Moves occupied slots to the front (preserving their order) and doubles the arrays if they are more than half full.
+        """
+        slots = np.flatnonzero(self.occupied[:self._n_slots])
+        n = len(slots)
+        humans = self.humans_at(slots)
+        capacity = len(self._slots)
+        if 2 * n >= capacity:
+            capacity *= 2
+
+        for name in ["occupied", "age_bins", "start_times", "leaving_times"]:
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:n] = old[slots]
+            setattr(self, name, new)
+
+        self._slots = humans + [None] * (capacity - n)
+        self._index = {human: i for i, human in enumerate(humans)}
+        self._n_slots = n
+
+
 class Location(simpy.Resource):
     """
     Class representing generic locations used in the simulator
@@ -83,6 +201,7 @@ class Location(simpy.Resource):
 
         super().__init__(env, capacity)
         self.humans = OrderedSet()  # OrderedSet instead of set for determinism when iterating
+        self.occupancy = LocationOccupancy()  # array-backed copy of `self.humans` used for vectorized contact sampling
         self.conf = conf
         self.name = name
         self.rng = np.random.RandomState(rng.randint(2 ** 16))
@@ -157,6 +276,7 @@ class Location(simpy.Resource):
             human (covid19sim.human.Human): The human to add.
         """
         self.humans.add(human)
+        self.occupancy.add(human)
         self.binned_humans[human.age_bin_width_5.bin].add(human)
 
     def remove_human(self, human):
@@ -182,6 +302,7 @@ class Location(simpy.Resource):
                 ))
                 self.max_day_contamination = max(self.max_day_contamination, rnd_surface)
             self.humans.remove(human)
+            self.occupancy.remove(human)
             self.binned_humans[human.age_bin_width_5.bin].remove(human)
 
     @property
@@ -270,7 +391,7 @@ class Location(simpy.Resource):
                 return [h for h in self.humans if h != human]
 
             other_humans = [x for x in self.humans if x != human]
-            p_contact = np.ones_like(other_humans, dtype=np.float) / len(other_humans)
+            p_contact = np.ones_like(other_humans, dtype=float) / len(other_humans)
 
         else:
             raise
@@ -356,6 +477,97 @@ class Location(simpy.Resource):
 
         return interactions
 
+    def _sample_interaction_with_type_vectorized(self, type, human):
+        """
+        Vectorized version of `_sample_interaction_with_type` that operates on `self.occupancy`.
+        Number of interactions and interactees are drawn exactly as in `_sample_interaction_with_type`, so for the same
+        state of `self.rng` both return the same interactees. Distances and durations of all the valid interactions are
+        drawn with one call per quantity, so they follow the same distribution but are drawn in a different order.
+
+        Args:
+            type (string): type of interaction to sample. expects "known", "unknown"
+            human (covid19sim.human.Human): human who will interact with the sampled human
+
+        Returns:
+            interactions (list): each element is as follows -
+                human (covid19sim.human.Human): other human with whom to have `type` of interaction
+                distance_profile (covid19sim.locations.location.DistanceProfile): distance from which these two humans met (cms)
+                duration (float): duration for which this encounter took place (seconds)
+        """
+        if type == "known":
+            reduction_factor = human.intervened_behavior.daily_interaction_reduction_factor(self)
+            mean_daily_interactions = self.MEAN_DAILY_KNOWN_CONTACTS_FOR_AGEGROUP[human.age_bin_width_5.index]
+            mean_daily_interactions *= (1 - reduction_factor)
+            min_dist_encounter = self.conf['MIN_DIST_KNOWN_CONTACT']
+            max_dist_encounter = self.conf['MAX_DIST_KNOWN_CONTACT']
+        elif type == "unknown":
+            mean_daily_interactions = self.conf['_MEAN_DAILY_UNKNOWN_CONTACTS']
+            min_dist_encounter = self.conf['MIN_DIST_UNKNOWN_CONTACT']
+            max_dist_encounter = self.conf['MAX_DIST_UNKNOWN_CONTACT']
+        else:
+            raise ValueError(f"Unknown interaction type: {type}")
+
+        mean_daily_interactions += 1e-6 # to avoid error in sampling with 0 mean from negative binomial
+        occupancy = self.occupancy
+        n_occupants = len(occupancy)
+        packing_term = 100 * np.sqrt(self.area / n_occupants)
+        n_interactions = min(n_occupants - 1, self.rng.negative_binomial(mean_daily_interactions, 0.5))
+
+        # sample interactees (same draws as `_sample_interactee`)
+        candidates = occupancy.slots_except(human)
+        if len(candidates) == 0:
+            return []
+
+        if type == "known":
+            known = occupancy.known_mask(human, candidates)
+            if len(candidates) == n_interactions:
+                interactees = candidates[known]
+            else:
+                PREFERENTIAL_ATTACHMENT_FACTOR = self.conf['_CURRENT_PREFERENTIAL_ATTACHMENT_FACTOR']
+                p_base = self.P_CONTACT[occupancy.age_bins[candidates], human.age_bin_width_5.index]
+                p_contact = p_base * (1 - PREFERENTIAL_ATTACHMENT_FACTOR) + known * p_base * PREFERENTIAL_ATTACHMENT_FACTOR
+                p_contact *= (1 - reduction_factor)
+                if p_contact.sum() == 0:
+                    return []
+                p_contact /= p_contact.sum()
+                interactees = candidates[self.rng.choice(len(candidates), size=n_interactions, p=p_contact, replace=True)]
+        else:
+            if len(candidates) == n_interactions:
+                interactees = candidates
+            else:
+                p_contact = np.ones(len(candidates), dtype=float) / len(candidates)
+                interactees = candidates[self.rng.choice(len(candidates), size=n_interactions, p=p_contact, replace=True)]
+
+        # discard the encounters with an overlap which is not relevant for infection
+        t_overlap = (np.minimum(human.location_leaving_time, occupancy.leaving_times[interactees]) -
+                     np.maximum(human.location_start_time, occupancy.start_times[interactees]))
+        valid = t_overlap >= min(self.conf['MIN_MESSAGE_PASSING_DURATION'], self.conf['INFECTION_DURATION'])
+        interactees, t_overlap = interactees[valid], t_overlap[valid]
+        n_valid = len(interactees)
+        if n_valid == 0:
+            return []
+
+        # sample distance of encounters
+        encounter_terms = self.rng.uniform(min_dist_encounter, max_dist_encounter, size=n_valid)
+        distances = np.clip(encounter_terms, a_min=0, a_max=packing_term)
+
+        # sample duration of encounters (seconds)
+        if type == "known":
+            other_bins = occupancy.age_bins[interactees]
+            mean_durations = self.MEAN_DAILY_CONTACT_DURATION_SECONDS[other_bins, human.age_bin_width_5.index]
+            sigma_durations = self.STDDEV_DAILY_CONTACT_DURATION_SECONDS[other_bins, human.age_bin_width_5.index]
+            durations = _sample_positive_normal_vectorized(mean_durations, sigma_durations, self.rng, upper_limit=t_overlap)
+        else:
+            scale_factor_interaction_time = self.conf['SCALE_FACTOR_CONTACT_DURATION']
+            mean_interaction_time = self.conf["GAMMA_UNKNOWN_CONTACT_DURATION"]
+            durations = self.rng.gamma(mean_interaction_time/scale_factor_interaction_time, scale_factor_interaction_time, size=n_valid)
+
+        other_humans = occupancy.humans_at(interactees)
+        return [
+            (other_human, DistanceProfile(encounter_term=encounter_term, packing_term=packing_term, social_distancing_term=None, distance=distance), duration)
+            for other_human, encounter_term, distance, duration in zip(other_humans, encounter_terms.tolist(), distances.tolist(), durations.tolist())
+        ]
+
     def sample_interactions(self, human, unknown_only=False):
         """
         samples how `human` interacts with other `human`s at this location (`self`) at this time.
@@ -379,10 +591,14 @@ class Location(simpy.Resource):
             assert human == self.humans[0]
             return [], []
 
+        sample_interaction_with_type = self._sample_interaction_with_type
+        if self.conf.get('VECTORIZED_CONTACT_SAMPLING', True):
+            sample_interaction_with_type = self._sample_interaction_with_type_vectorized
+
         known_interactions = []
-        unknown_interactions = self._sample_interaction_with_type("unknown", human)
+        unknown_interactions = sample_interaction_with_type("unknown", human)
         if not unknown_only:
-            known_interactions = self._sample_interaction_with_type("known", human)
+            known_interactions = sample_interaction_with_type("known", human)
 
         return known_interactions, unknown_interactions
 
@@ -475,6 +691,8 @@ class Location(simpy.Resource):
             del s['residents']
         if s.get('humans'):
             del s['humans']
+        if s.get('occupancy'):
+            del s['occupancy']
         return s
 
 
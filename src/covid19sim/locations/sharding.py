@@ -0,0 +1,827 @@
+"""
+Splits the population of a simulation across several processes (shards).
+
+A single city is synthesized and forked into `N_SHARDS` workers. Its locations are partitioned into bands of latitude
+holding about as many residents each (see `partition_city`), and each location is simulated by the shard owning it.
+Each human is hosted by exactly one shard at a time, which runs its activities, its app and its tests, while the other
+shards keep a replica of it. When the next activity of a human takes place at a location owned by another shard, the
+human leaves its shard and is sent to the owner of that location at the next synchronization barrier (every hour of
+simulated time by default) along with its whole state: infection, contact book, risk history, pending update messages,
+test and hospitalization. Encounters and infections thus always happen between humans hosted by the same shard, through
+the same code path as in a single-process simulation.
+
+At every barrier, the coordinator also routes update messages to the shard hosting their recipient, copies the public
+state of humans (e.g. test results, quarantine or hospitalization) and of households to their replicas, merges the
+message statistics used by GAEN, and splits the daily budget of tests across shards.
+
+NOTE: a sharded run follows the same population with the same seeds as a single-process run, but isn't bit-for-bit
+equal to it. A human moving to another shard starts its activity at the next barrier instead of at its start time,
+humans only invite or follow humans hosted by their own shard, and replicas are up to a barrier out of date.
+"""
+import copyreg
+import io
+import multiprocessing
+import multiprocessing.connection
+import operator
+import os
+import pickle
+import traceback
+from collections import Counter, defaultdict
+
+import numpy as np
+from orderedset import OrderedSet
+
+from covid19sim.inference.heavy_jobs import DummyMemManager
+from covid19sim.inference.message_store import EncounterBook
+from covid19sim.inference.message_utils import GlobalMailbox
+from covid19sim.locations.hospital import Hospital
+from covid19sim.locations.location import Household
+from covid19sim.log.console_logger import ConsoleLogger
+from covid19sim.utils.constants import QUARANTINE_HOUSEHOLD, SECONDS_PER_DAY, SECONDS_PER_HOUR
+from covid19sim.utils.population_cache import _NATIVE_HUMAN_ATTRIBUTES
+from covid19sim.utils.risk_history import RiskHistoryMap
+from covid19sim.utils.utils import log
+
+# attributes of humans which are read by other humans, e.g. by the residents of their household.
+# They are copied to the replicas of a human whenever they change in the shard hosting it.
+PUBLIC_HUMAN_ATTRIBUTES = [
+    "has_app", "test_type", "test_time", "hidden_test_result", "_will_report_test_result", "time_to_test_result",
+    "has_had_positive_test", "ts_death",
+    "intervened_behavior._behavior_level",
+    "intervened_behavior.quarantine.start_timestamp",
+    "intervened_behavior.quarantine.end_timestamp",
+    "intervened_behavior.quarantine.reasons",
+    "intervened_behavior.quarantine.human_no_longer_needs_quarantining",
+    "mobility_planner.death_timestamp",
+    "mobility_planner.hospitalization_timestamp",
+    "mobility_planner.critical_condition_timestamp",
+    "mobility_planner.human_to_rest_at_home",
+]
+_PUBLIC_ATTRIBUTE_GETTERS = [operator.attrgetter(attr) for attr in PUBLIC_HUMAN_ATTRIBUTES]
+
+# fields of encounter records which are indices in the string table of a `MessageStore`
+_ENCOUNTER_MESSAGE_STRING_FIELDS = ["sender_uid", "receiver_uid"]
+
+
+def _get_public_state(human):
+    # lists are frozen so that states can be compared
+    return tuple(
+        tuple(value) if isinstance(value, list) else value
+        for value in (getter(human) for getter in _PUBLIC_ATTRIBUTE_GETTERS)
+    )
+
+
+def _set_public_state(human, state):
+    for attr, value in zip(PUBLIC_HUMAN_ATTRIBUTES, state):
+        *path, name = attr.split(".")
+        obj = operator.attrgetter(".".join(path))(human) if path else human
+        setattr(obj, name, list(value) if isinstance(value, tuple) else value)
+
+
+def _get_household_state(household):
+    return (
+        tuple(human.name for human in household.residents),
+        tuple(
+            (human.name, tuple(attrs["reasons"]), attrs["suggested_quarantine_end_timestamp"])
+            for human, attrs in household.index_cases.items()
+        ),
+        household.quarantine_start_timestamp,
+        household.quarantine_end_timestamp,
+    )
+
+
+def _reduce_risk_history_map(risk_history_map):
+    matrix, row = risk_history_map.matrix, risk_history_map.row
+    return _restore_risk_history_map, (
+        matrix, row, matrix.values[row].copy(), matrix.days[row].copy(), matrix.insertion_stamps[row].copy(),
+    )
+
+
+def _restore_risk_history_map(matrix, row, values, days, insertion_stamps):
+    # rows are allocated before the city is forked, so a human has the same row in all the shards
+    matrix.values[row] = values
+    matrix.days[row] = days
+    matrix.insertion_stamps[row] = insertion_stamps
+    matrix.n_insertions = max(matrix.n_insertions, int(insertion_stamps.max()))
+    return RiskHistoryMap(matrix, row)
+
+
+def _export_strings(store, records, fields):
+    # the string tables of the message stores diverge after the fork, so records carry their strings
+    string_ids = np.unique(np.concatenate([records[field] for field in fields]))
+    return string_ids, [store.string(x) for x in string_ids.tolist()]
+
+
+def _import_strings(store, records, fields, string_ids, strings):
+    local_ids = np.array([store.string_id(x) for x in strings], dtype=np.int32)
+    for field in fields:
+        records[field] = local_ids[np.searchsorted(string_ids, records[field])]
+
+
+def _reduce_encounter_book(book):
+    encounters = book.encounters.copy()
+    string_ids, strings = _export_strings(book.store, encounters, _ENCOUNTER_MESSAGE_STRING_FIELDS)
+    return _restore_encounter_book, (
+        book.store, book.tracing_n_days_history, encounters, book.day_idxs.copy(), string_ids, strings,
+    )
+
+
+def _restore_encounter_book(store, tracing_n_days_history, encounters, day_idxs, string_ids, strings):
+    _import_strings(store, encounters, _ENCOUNTER_MESSAGE_STRING_FIELDS, string_ids, strings)
+
+    book = EncounterBook(store, tracing_n_days_history)
+    breaks = np.flatnonzero(np.diff(day_idxs)) + 1
+    for days, records in zip(np.split(day_idxs, breaks), np.split(encounters, breaks)):
+        if len(records):
+            book.add_encounters(int(days[0]), records)
+    return book
+
+
+def _get_shared_objects(city):
+    """
+    Returns:
+        (dict): objects owned by the city of a shard, which are referenced by humans but never sent to another shard
+    """
+    shared_objects = {"env": city.env, "city": city, "conf": city.conf, "tracker": city.tracker,
+                      "message_store": city.message_store, "risk_history_matrix": city.risk_history_matrix,
+                      "prev_risk_history_matrix": city.prev_risk_history_matrix}
+    if city.tracing_method is not None:
+        shared_objects["tracing_method"] = city.tracing_method
+    return shared_objects
+
+
+class _MigrationPickler(pickle.Pickler):
+    """
+    Pickler writing references to the humans, locations and objects of the city instead of copying them.
+    They are bound to their counterparts in the shard receiving the pickle. Locations are referred to by their index
+    in the partition, as names of workplaces aren't unique.
+    """
+    def __init__(self, file, shard):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        # this is called for every pickled object, so references are looked up by id
+        self.references = shard.references
+        self.shared_ids = {id(obj): ("shared", name) for name, obj in _get_shared_objects(shard.city).items()}
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        self.dispatch_table[RiskHistoryMap] = _reduce_risk_history_map
+        self.dispatch_table[EncounterBook] = _reduce_encounter_book
+
+    def persistent_id(self, obj):
+        reference = self.references.get(id(obj))
+        return self.shared_ids.get(id(obj)) if reference is None else reference
+
+
+class _MigrationUnpickler(pickle.Unpickler):
+    """
+    Unpickler binding the references written by `_MigrationPickler` to the objects of a shard.
+    """
+    def __init__(self, file, shard):
+        super().__init__(file)
+        self.objects = {
+            "human": shard.city.hd,
+            "location": shard.locations,
+            "shared": _get_shared_objects(shard.city),
+        }
+
+    def persistent_load(self, pid):
+        kind, name = pid
+        return self.objects[kind][name]
+
+
+class ShardMailbox(GlobalMailbox):
+    """
+    Global mailbox of a shard. Update messages to humans hosted by other shards are kept in `outbox` until the next
+    barrier, where they are routed to the shard hosting their recipient.
+    """
+
+    def __init__(self, max_encounter_age, shard):
+        """
+        Args:
+            max_encounter_age (int): age (in days) after which update messages are discarded.
+            shard (CityShard): shard owning this mailbox
+        """
+        super().__init__(max_encounter_age)
+        self.shard = shard
+        self.outbox = []
+
+    def add_message(self, user_key, update_message):
+        if user_key not in self.shard.hosted:
+            self.outbox.append((user_key, update_message))
+            return
+        super().add_message(user_key, update_message)
+
+
+def get_city_locations(city):
+    """
+    Returns:
+        (list): locations of `city`, including the ICUs of hospitals and the common rooms of senior residences
+    """
+    # locations are compared by identity, but hashed by their name
+    locations = OrderedSet()
+    for location in [*city.households, *city.senior_residences, *city.stores, *city.miscs, *city.parks,
+                     *city.schools, *city.workplaces, *city.hospitals]:
+        locations.add(location)
+    for human in city.humans:
+        locations.add(human.household)
+        if human.workplace is not None:
+            locations.add(human.workplace)
+    for location in list(locations):
+        if isinstance(location, Hospital):
+            locations.add(location.icu)
+        if getattr(location, "social_common_room", None) is not None:
+            locations.add(location.social_common_room)
+    return list(locations)
+
+
+def partition_city(city, n_shards):
+    """
+    Splits the locations of `city` into `n_shards` bands of latitude. Residences are split so that each band holds
+    about as many residents, and other locations go to the band of their latitude. ICUs and common rooms of senior
+    residences go to the shard of their hospital or residence.
+
+    Args:
+        city (covid19sim.locations.city.City): city to split
+        n_shards (int): number of shards
+
+    Returns:
+        (dict): shard owning each location
+    """
+    locations = get_city_locations(city)
+    residences = sorted([x for x in locations if isinstance(x, Household)], key=lambda x: (x.lat, x.lon, x.name))
+    assert 0 < n_shards <= len(residences), f"Can't split {len(residences)} residences into {n_shards} shards"
+
+    # each residence goes to the band holding the middle of its residents
+    n_residents = np.array([len(x.residents) for x in residences])
+    middles = np.cumsum(n_residents) - n_residents / 2
+    residence_shards = np.minimum((middles * n_shards / max(n_residents.sum(), 1)).astype(int), n_shards - 1)
+    boundaries = [
+        residences[idx].lat if idx < len(residences) else np.inf
+        for idx in np.searchsorted(residence_shards, np.arange(1, n_shards)).tolist()
+    ]
+
+    owners = {}
+    for location in locations:
+        owners[location] = int(np.searchsorted(boundaries, location.lat, side="right"))
+    for residence, shard_id in zip(residences, residence_shards.tolist()):
+        owners[residence] = shard_id
+        if getattr(residence, "social_common_room", None) is not None:
+            owners[residence.social_common_room] = shard_id
+    for location in locations:
+        if isinstance(location, Hospital):
+            owners[location.icu] = owners[location]
+    return owners
+
+
+def split_test_budget(n_tests, n_queued):
+    """
+    Splits the tests left for the day across shards, in proportion to the humans waiting for a test in each of them.
+
+    Args:
+        n_tests (int): number of tests left
+        n_queued (list): number of humans in the test queue of each shard
+
+    Returns:
+        (list): number of tests each shard can administer
+    """
+    n_queued = np.asarray(n_queued, dtype=np.int64)
+    if n_queued.sum() <= n_tests:
+        return n_queued.tolist()
+
+    shares = n_tests * n_queued / n_queued.sum()
+    allowance = np.floor(shares).astype(np.int64)
+    # the tests left after rounding down go to the largest fractional parts
+    n_left = n_tests - allowance.sum()
+    allowance[np.argsort(allowance - shares, kind="stable")[:n_left]] += 1
+    return allowance.tolist()
+
+
+class CityShard:
+    """
+    Runs the humans hosted by a shard in its copy of the city, and exchanges humans along with their public state
+    with the other shards at synchronization barriers.
+    """
+
+    def __init__(self, shard_id, city, owners, hosts):
+        """
+        Args:
+            shard_id (int): index of this shard
+            city (covid19sim.locations.city.City): copy of the city in this process
+            owners (dict): shard owning each location (see `partition_city`)
+            hosts (dict): shard hosting each human, by name
+        """
+        self.shard_id = shard_id
+        self.city = city
+        self.env = city.env
+        self.owners = owners
+        self.owned = {location for location, owner in owners.items() if owner == shard_id}
+        # `owners` is ordered in the same way in all the shards, which refer to locations by their index in it
+        self.locations = list(owners)
+        self.location_indices = {location: idx for idx, location in enumerate(self.locations)}
+        self.households = [location for location in self.locations if isinstance(location, Household)]
+        self.population = list(city.humans)
+        # references written by `_MigrationPickler` for the humans and locations, which live as long as the city
+        self.references = {id(location): ("location", idx) for idx, location in enumerate(self.locations)}
+        self.references.update((id(human), ("human", human.name)) for human in self.population)
+        self.hosted = {name for name, host in hosts.items() if host == shard_id}
+        self.in_transit = []
+        self.n_migrations = 0
+
+        # states as of the last barrier
+        self.public_states = {human.name: _get_public_state(human) for human in self.population}
+        self.household_states = {household: _get_household_state(household) for household in self.households}
+        self.shared_counters = self._get_shared_counters()
+        facility = city.covid_testing_facility
+        self.test_date, self.test_counts = facility.last_date_to_check_tests, dict(facility.test_count_today)
+
+    def owns(self, location):
+        return location in self.owned
+
+    def hosts(self, human):
+        return human.name in self.hosted
+
+    def start(self, outfile=None):
+        """
+        Registers the processes of the city and of the humans hosted by this shard.
+
+        Args:
+            outfile (str, optional): the run's output file to write to
+        """
+        city = self.city
+        city.shard = self
+        city.humans = [human for human in self.population if human.name in self.hosted]
+        city.global_mailbox = ShardMailbox(city.conf.get('TRACING_N_DAYS_HISTORY'), self)
+
+        self.env.process(city.run(SECONDS_PER_HOUR, outfile))
+        for human in city.humans:
+            self.env.process(human.run())
+        console_logger = ConsoleLogger(frequency=SECONDS_PER_DAY, logfile=city.logfile, conf=city.conf)
+        self.env.process(console_logger.run(self.env, city=city))
+
+    def send_away(self, human, previous_activity, next_activity):
+        """
+        Called by a human whose next activity takes place at a location owned by another shard.
+        The human leaves this shard at the next barrier.
+
+        Args:
+            human (covid19sim.human.Human): human leaving this shard
+            previous_activity (covid19sim.utils.mobility_planner.Activity): last activity of `human` in this shard
+            next_activity (covid19sim.utils.mobility_planner.Activity): activity to do in the other shard
+        """
+        self.in_transit.append((human, previous_activity, next_activity))
+
+    def _pack(self, human, previous_activity, next_activity):
+        city = self.city
+        facility = city.covid_testing_facility
+        in_test_queue = human in facility.test_queue
+        if in_test_queue:
+            facility.test_queue.remove(human)
+
+        hospital = human.mobility_planner.location_of_hospitalization
+        hospitalized_until = None if hospital is None else hospital.patients.pop(human, None)
+        mailbox = city.global_mailbox.pop(human.name, {})
+        return {
+            "name": human.name,
+            "state": human.__dict__,
+            "native_state": {attr: getattr(human, attr) for attr in _NATIVE_HUMAN_ATTRIBUTES},
+            "activities": (previous_activity, next_activity),
+            # update messages don't refer to the city, so they are pickled apart without looking for references
+            "mailbox": pickle.dumps(mailbox, protocol=pickle.HIGHEST_PROTOCOL) if mailbox else None,
+            "in_test_queue": in_test_queue,
+            "hospitalized_until": hospitalized_until,
+            "cluster_manager": DummyMemManager.global_cluster_map.pop(f"{city.hash}:{human.name}", None),
+        }
+
+    def _unpack(self, entry):
+        city = self.city
+        human = city.hd[entry["name"]]
+        self.hosted.add(human.name)
+        human.__dict__.clear()
+        human.__dict__.update(entry["state"])
+        for attr, value in entry["native_state"].items():
+            setattr(human, attr, value)
+
+        if entry["mailbox"] is not None:
+            for messages in pickle.loads(entry["mailbox"]).values():
+                for update_message in messages:
+                    city.global_mailbox.add_message(human.name, update_message)
+        if entry["in_test_queue"]:
+            city.covid_testing_facility.add_to_test_queue(human)
+        if entry["hospitalized_until"] is not None:
+            human.mobility_planner.location_of_hospitalization.patients[human] = entry["hospitalized_until"]
+        if entry["cluster_manager"] is not None:
+            DummyMemManager.global_cluster_map[f"{city.hash}:{human.name}"] = entry["cluster_manager"]
+
+        self.public_states[human.name] = _get_public_state(human)
+        city.humans.append(human)
+        self.env.process(self._resume(human, *entry["activities"]))
+
+    def _get_shared_counters(self):
+        return {
+            "sent_messages_by_day": Counter(self.city.sent_messages_by_day),
+            "risk_change_histogram": Counter(self.city.risk_change_histogram),
+            "risk_change_histogram_sum": self.city.risk_change_histogram_sum,
+        }
+
+    def collect(self):
+        """
+        Gathers what changed in this shard since the last barrier. Humans in transit leave this shard.
+
+        Returns:
+            (dict): departures to each shard, update messages to humans hosted by other shards, public states of
+                humans and households which changed, changes of the counters shared by all shards, and tests
+        """
+        city = self.city
+        public_states = {}
+        for human in city.humans:
+            state = _get_public_state(human)
+            if state != self.public_states[human.name]:
+                self.public_states[human.name] = public_states[human.name] = state
+
+        household_states = {}
+        for household in self.households:
+            state = _get_household_state(household)
+            if state != self.household_states[household]:
+                self.household_states[household] = state
+                household_states[self.location_indices[household]] = state
+
+        entries = defaultdict(list)
+        for human, previous_activity, next_activity in self.in_transit:
+            entries[self.owners[next_activity.location]].append(self._pack(human, previous_activity, next_activity))
+        departures = {}
+        for destination, x in entries.items():
+            buffer = io.BytesIO()
+            _MigrationPickler(buffer, self).dump(x)
+            departures[destination] = ([e["name"] for e in x], sum(e["in_test_queue"] for e in x), buffer.getvalue())
+
+        departed = {human.name for human, _, _ in self.in_transit}
+        if departed:
+            city.humans = [human for human in city.humans if human.name not in departed]
+            self.hosted -= departed
+            self.n_migrations += len(departed)
+            self.in_transit = []
+
+        counters = self._get_shared_counters()
+        for key in ["sent_messages_by_day", "risk_change_histogram"]:
+            counters[key].subtract(self.shared_counters[key])
+        counters["risk_change_histogram_sum"] -= self.shared_counters["risk_change_histogram_sum"]
+
+        facility = city.covid_testing_facility
+        previous_counts = self.test_counts if facility.last_date_to_check_tests == self.test_date else {}
+        tests = Counter({test_type: count - previous_counts.get(test_type, 0)
+                         for test_type, count in facility.test_count_today.items()})
+        self.test_date, self.test_counts = facility.last_date_to_check_tests, dict(facility.test_count_today)
+
+        outbox, city.global_mailbox.outbox = city.global_mailbox.outbox, []
+        return {
+            "departures": departures,
+            "messages": outbox,
+            "public_states": public_states,
+            "household_states": household_states,
+            "counters": counters,
+            "date": self.env.timestamp.date(),
+            "test_date": self.test_date,
+            "tests": tests,
+            "n_queued": len(facility.test_queue),
+        }
+
+    def receive(self, inbound):
+        """
+        Applies what changed in the other shards since the last barrier. Arriving humans resume their activities.
+
+        Args:
+            inbound (dict): arrivals, update messages, public states and counters routed by the coordinator
+        """
+        city = self.city
+        for bundle in inbound.get("arrivals", []):
+            for entry in _MigrationUnpickler(io.BytesIO(bundle), self).load():
+                self._unpack(entry)
+
+        for user_key, update_message in inbound.get("messages", []):
+            city.global_mailbox.add_message(user_key, update_message)
+
+        for name, state in inbound.get("public_states", {}).items():
+            if name not in self.hosted:
+                _set_public_state(city.hd[name], state)
+                self.public_states[name] = state
+
+        for idx, state in inbound.get("household_states", {}).items():
+            household = self.locations[idx]
+            self._set_household_state(household, state)
+            self.household_states[household] = state
+
+        counters = inbound.get("counters")
+        if counters is not None:
+            city.sent_messages_by_day = dict(counters["sent_messages_by_day"])
+            city.risk_change_histogram = Counter(counters["risk_change_histogram"])
+            city.risk_change_histogram_sum = counters["risk_change_histogram_sum"]
+            self.shared_counters = self._get_shared_counters()
+
+        test_allowance = inbound.get("test_allowance")
+        if test_allowance is not None:
+            # the capacity is reset at the first test of a new day
+            facility = city.covid_testing_facility
+            used = facility.test_count_today if facility.last_date_to_check_tests == self.env.timestamp.date() else {}
+            facility.max_capacity_per_test_type = {
+                test_type: used.get(test_type, 0) + allowance for test_type, allowance in test_allowance.items()
+            }
+
+    def _set_household_state(self, household, state):
+        residents, index_cases, start_timestamp, end_timestamp = state
+        hd = self.city.hd
+        previous_end_timestamp = household.quarantine_end_timestamp
+        household.residents[:] = [hd[name] for name in residents]
+        household.index_cases = {
+            hd[name]: {"reasons": list(reasons), "suggested_quarantine_end_timestamp": suggested_end_timestamp}
+            for name, reasons, suggested_end_timestamp in index_cases
+        }
+        household.quarantine_start_timestamp = start_timestamp
+        household.quarantine_end_timestamp = end_timestamp
+
+        # secondary cases quarantine with the index cases hosted by other shards (see `Household.add_to_index_case`)
+        if (
+            end_timestamp is not None
+            and end_timestamp != previous_end_timestamp
+            and end_timestamp > self.env.timestamp
+        ):
+            for human, attrs in household.index_cases.items():
+                if len(attrs['reasons']) == 0 and human.name in self.hosted:
+                    human.intervened_behavior.quarantine.update(QUARANTINE_HOUSEHOLD)
+
+    def _resume(self, human, previous_activity, next_activity):
+        """
+        Process of a human who arrived at the last barrier. It finishes the activities which started before the
+        barrier, and goes on with `Human.run`.
+
+        Yields:
+            simpy.events.Event:
+        """
+        while True:
+            if next_activity.human_dies:
+                yield self.env.process(human.expire())
+
+            if next_activity.location is None:
+                next_activity.refresh_location()
+                if next_activity.location is None:
+                    next_activity.cancel_and_go_to_location(reason="other-shard", location=human.household)
+
+            if next_activity.end_time <= self.env.timestamp:
+                previous_activity, next_activity = next_activity, human.mobility_planner.get_next_activity()
+                continue
+
+            if not self.owns(next_activity.location):
+                self.send_away(human, previous_activity, next_activity)
+                return
+
+            if next_activity.start_time < self.env.timestamp:
+                duration = (next_activity.end_time - self.env.timestamp).total_seconds()
+                yield self.env.process(human.transition_to(next_activity, previous_activity, duration=duration))
+                previous_activity, next_activity = next_activity, human.mobility_planner.get_next_activity()
+            break
+
+        yield from human.run(previous_activity, next_activity)
+
+    def summary(self):
+        """
+        Returns:
+            (dict): epidemic curves of the humans hosted by this shard
+        """
+        tracker = self.city.tracker
+        return {
+            "shard_id": self.shard_id,
+            "n_people": len(self.city.humans),
+            "cases_per_day": list(tracker.cases_per_day),
+            "s_per_day": list(tracker.s_per_day),
+            "e_per_day": list(tracker.e_per_day),
+            "i_per_day": list(tracker.i_per_day),
+            "r_per_day": list(tracker.r_per_day),
+            "n_migrations": self.n_migrations,
+        }
+
+
+def _run_shard(shard_id, conn, city, owners, hosts, outfile=None, logfile=None, on_finish=None):
+    """
+    Entrypoint of a shard process, forked from the coordinator. It waits for instructions of the coordinator, and
+    replies with `("ok", result)`, or with `("error", traceback)` if the shard fails.
+
+    Args:
+        shard_id (int): index of this shard
+        conn (multiprocessing.connection.Connection): pipe to the coordinator
+        city (covid19sim.locations.city.City): copy of the city in this process
+        owners (dict): shard owning each location (see `partition_city`)
+        hosts (dict): shard hosting each human at the start of the simulation, by name
+        outfile (str, optional): the run's output file to write to
+        logfile (str, optional): filepath where the progress is logged. Each shard logs to its own file.
+        on_finish (callable, optional): called with the city of this shard at the end of the simulation
+    """
+    city.conf['SHARD_ID'] = shard_id
+    if logfile is not None:
+        root, ext = os.path.splitext(logfile)
+        city.logfile = city.tracker.logfile = f"{root}_shard_{shard_id}{ext}"
+
+    try:
+        shard = CityShard(shard_id, city, owners, hosts)
+        shard.start(outfile)
+        while True:
+            command, payload = conn.recv()
+            if command == "advance":
+                until, inbound = payload
+                shard.receive(inbound)
+                city.env.run(until=until)
+                conn.send(("ok", shard.collect()))
+            elif command == "stop":
+                if on_finish is not None:
+                    on_finish(city)
+                conn.send(("ok", shard.summary()))
+                conn.close()
+                return
+            else:
+                raise ValueError(f"Unknown command: {command}")
+    except Exception:
+        # the coordinator is waiting for a reply
+        try:
+            conn.send(("error", traceback.format_exc()))
+        except OSError:
+            pass
+        raise
+    finally:
+        city.close_inference_client_pool()
+
+
+def _receive(shard_id, conn, process):
+    """
+    Waits for the reply of a shard.
+
+    Args:
+        shard_id (int): index of the shard
+        conn (multiprocessing.connection.Connection): pipe to the shard
+        process (multiprocessing.Process): process of the shard
+
+    Returns:
+        (object): result sent by the shard
+
+    Raises:
+        RuntimeError: if the shard failed, or exited without replying
+    """
+    multiprocessing.connection.wait([conn, process.sentinel])
+    if not conn.poll():
+        raise RuntimeError(f"Shard {shard_id} exited with code {process.exitcode} without replying")
+    try:
+        status, payload = conn.recv()
+    except EOFError:
+        raise RuntimeError(f"Shard {shard_id} exited with code {process.exitcode} without replying") from None
+    if status == "error":
+        raise RuntimeError(f"Shard {shard_id} failed:\n{payload}")
+    return payload
+
+
+def check_sharded_conf(conf, n_shards):
+    """
+    Checks that the experiment can be split into `n_shards` shards.
+
+    Args:
+        conf (dict): yaml configuration of the experiment
+        n_shards (int): number of shards
+
+    Raises:
+        ValueError: if training data is collected, or if shards are not synchronized at every hour with more than one shard
+    """
+    if n_shards <= 1:
+        return
+
+    if conf.get('COLLECT_TRAINING_DATA', False):
+        raise ValueError("COLLECT_TRAINING_DATA isn't supported with N_SHARDS > 1")
+
+    epoch = conf.get('CROSS_SHARD_SYNC_SECONDS', SECONDS_PER_HOUR)
+    if epoch <= 0 or epoch % SECONDS_PER_HOUR != 0:
+        raise ValueError(f"CROSS_SHARD_SYNC_SECONDS = {epoch} must be a multiple of an hour, "
+                         "the period at which the city updates humans")
+
+
+def run_sharded(city, n_shards, end_time, epoch=SECONDS_PER_HOUR, outfile=None, on_finish=None, logfile=None):
+    """
+    Forks `city` into `n_shards` processes, which are synchronized after every `epoch` of simulated time.
+
+    Args:
+        city (covid19sim.locations.city.City): city whose processes have not been started yet
+        n_shards (int): number of shards
+        end_time (float): timestamp at which the simulation ends
+        epoch (int, optional): simulated seconds between two synchronizations. Defaults to an hour.
+        outfile (str, optional): the run's output file to write to
+        on_finish (callable, optional): called with the city of each shard at the end of the simulation
+        logfile (str, optional): filepath where the progress is logged
+
+    Returns:
+        (list): summary of each shard (see `CityShard.summary`)
+    """
+    owners = partition_city(city, n_shards)
+    hosts = {human.name: owners[human.household] for human in city.humans}
+    test_capacity = dict(city.max_capacity_per_test_type)
+
+    ctx = multiprocessing.get_context("fork")
+    conns, processes = [], []
+    for shard_id in range(n_shards):
+        parent_conn, child_conn = ctx.Pipe()
+        process = ctx.Process(target=_run_shard, args=(shard_id, child_conn, city, owners, hosts, outfile, logfile, on_finish), daemon=True)
+        process.start()
+        # the shard holds the only copy of its end, so that its pipe is closed if it dies
+        child_conn.close()
+        conns.append(parent_conn)
+        processes.append(process)
+
+    start_time = until = city.env.now
+    # the test queues are empty at the start
+    inbound = [{"test_allowance": dict.fromkeys(test_capacity, 0)} for _ in range(n_shards)]
+    shared_counters = {
+        "sent_messages_by_day": Counter(city.sent_messages_by_day),
+        "risk_change_histogram": Counter(city.risk_change_histogram),
+        "risk_change_histogram_sum": city.risk_change_histogram_sum,
+    }
+    tests_per_day = defaultdict(Counter)
+    n_migrations = 0
+    try:
+        while until < end_time:
+            until = min(until + epoch, end_time)
+            for shard_id, conn in enumerate(conns):
+                conn.send(("advance", (until, inbound[shard_id])))
+            outbound = [_receive(shard_id, conn, processes[shard_id]) for shard_id, conn in enumerate(conns)]
+
+            inbound = [{"arrivals": [], "messages": [], "public_states": {}, "household_states": {}} for _ in range(n_shards)]
+            n_queued = [x["n_queued"] for x in outbound]
+            for x in outbound:
+                for destination, (names, n_in_test_queue, bundle) in x["departures"].items():
+                    inbound[destination]["arrivals"].append(bundle)
+                    n_queued[destination] += n_in_test_queue
+                    hosts.update(dict.fromkeys(names, destination))
+                    n_migrations += len(names)
+
+            # update messages go to the new host of their recipient
+            for shard_id, x in enumerate(outbound):
+                for user_key, update_message in x["messages"]:
+                    inbound[hosts[user_key]]["messages"].append((user_key, update_message))
+                # shards apply the changes of the others in the order of their index, so the last writer wins
+                for other_id in range(n_shards):
+                    if other_id != shard_id:
+                        inbound[other_id]["public_states"].update(x["public_states"])
+                        inbound[other_id]["household_states"].update(x["household_states"])
+
+            # counters shared by all the shards
+            for x in outbound:
+                for key in ["sent_messages_by_day", "risk_change_histogram"]:
+                    shared_counters[key].update(x["counters"][key])
+                shared_counters["risk_change_histogram_sum"] += x["counters"]["risk_change_histogram_sum"]
+
+            # the tests left for the day are split across the shards with a test queue
+            for x in outbound:
+                tests_per_day[x["test_date"]].update(x["tests"])
+            today = outbound[0]["date"]
+            test_allowances = [{} for _ in range(n_shards)]
+            for test_type, capacity in test_capacity.items():
+                n_tests = max(capacity - tests_per_day[today][test_type], 0)
+                for shard_id, n_allowed in enumerate(split_test_budget(n_tests, n_queued)):
+                    test_allowances[shard_id][test_type] = n_allowed
+
+            for shard_id in range(n_shards):
+                inbound[shard_id]["counters"] = shared_counters
+                inbound[shard_id]["test_allowance"] = test_allowances[shard_id]
+
+            if (until - start_time) % SECONDS_PER_DAY == 0:
+                log(f"Sharded simulation: day {int((until - start_time) // SECONDS_PER_DAY)} - "
+                    f"{n_migrations} humans moved between shards so far", logfile)
+
+        summaries = []
+        for shard_id, conn in enumerate(conns):
+            conn.send(("stop", None))
+            summaries.append(_receive(shard_id, conn, processes[shard_id]))
+    except BaseException:
+        # the other shards are waiting for instructions
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for conn in conns:
+            conn.close()
+        for process in processes:
+            process.join(timeout=60)
+            if process.is_alive():
+                process.terminate()
+
+    return summaries
+
+
+def aggregate_shard_summaries(summaries):
+    """
+    Sums the epidemic curves of all shards.
+
+    Args:
+        summaries (list): summary of each shard (see `CityShard.summary`)
+
+    Returns:
+        (dict): population-wide curves along with the summary of each shard
+    """
+    aggregate = defaultdict(int)
+    for key in ["cases_per_day", "s_per_day", "e_per_day", "i_per_day", "r_per_day"]:
+        n_days = min(len(s[key]) for s in summaries)
+        aggregate[key] = np.sum([s[key][:n_days] for s in summaries], axis=0).tolist()
+    for key in ["n_people", "n_migrations"]:
+        aggregate[key] = sum(s[key] for s in summaries)
+    aggregate["shards"] = summaries
+    return dict(aggregate)
@@ -36,7 +36,7 @@ class TestFacility(object):
             # TODO : check more scenarios about when the person can be removed from a queue
             to_remove = []
             for human in self.test_queue:
-                if not any(human.symptoms) and not human._test_recommended:
+                if not human.symptoms_bitmask and not human._test_recommended:
                     to_remove.append(human)
 
             _ = [self.test_queue.remove(human) for human in to_remove]
@@ -115,11 +115,12 @@ class TestFacility(object):
         """
         score = 0
 
-        if SEVERE in human.symptoms or EXTREMELY_SEVERE in human.symptoms:
+        symptoms = human.symptoms
+        if SEVERE in symptoms or EXTREMELY_SEVERE in symptoms:
             score += self.conf['P_TEST_SEVERE']
-        elif MODERATE in human.symptoms:
+        elif MODERATE in symptoms:
             score += self.conf['P_TEST_MODERATE']
-        elif MILD in human.symptoms:
+        elif MILD in symptoms:
             score += self.conf['P_TEST_MILD']
 
         if human._test_recommended:
@@ -0,0 +1,159 @@
+"""
+Buffered accumulation of the interactions sampled during a day, for the social mixing statistics of `Tracker.track_mixing`.
+
+Each interaction is appended to a preallocated struct of arrays as two halves, one per human reporting about the other
+(which is how contact surveys are organized). At the end of a day, the halves are reduced with `np.bincount` into
+contact, contact duration and unique people matrices, and into distance and duration histograms, for each interaction
+type and location type. Nothing is kept per pair of age groups during the day.
+
+For very large runs, the interactions of only a random subset of humans can be recorded (see `sampling_rate`).
+The halves reported by these humans are recorded, and reduced values are scaled by the inverse of the sampling rate,
+so that they are unbiased estimates of the values of the whole population.
+"""
+import numpy as np
+
+from covid19sim.utils.constants import SECONDS_PER_MINUTE
+
+INTERACTION_TYPES = ["known", "all", "within_contact_condition"]
+
+# one half of an interaction, as reported by one of its two humans
+HALF_INTERACTION_DTYPE = np.dtype([
+    ("reporter", np.int64),  # dense id of the reporting human
+    ("reporter_age_bin", np.int8),
+    ("contact_age_bin", np.int8),
+    ("location_type_1", np.int8),  # location types of the two humans of the interaction
+    ("location_type_2", np.int8),
+    ("is_known", np.bool_),
+    ("contact_condition", np.bool_),
+    ("mobility_factor", np.float64),
+    ("duration", np.float64),  # seconds
+    ("distance", np.float64),  # cms
+])
+
+
+class MixingAccumulator(object):
+    """
+    Records the interactions of a day and reduces them into mixing statistics.
+    """
+
+    def __init__(self, n_age_bins, location_types, sampling_rate=1.0, seed=0, capacity=4096):
+        """
+        Args:
+            n_age_bins (int): number of age groups
+            location_types (list): location types to break statistics down by, including "all"
+            sampling_rate (float): fraction of humans whose interactions are recorded. Defaults to 1.0 (all of them).
+            seed (int): seed of the draws of the recorded humans, which do not use the simulation's random generators
+            capacity (int): number of halves of interactions to preallocate. The buffer grows as needed.
+        """
+        assert 0 < sampling_rate <= 1, f"sampling rate should be in (0, 1]. Got: {sampling_rate}"
+        assert "all" in location_types, "location types should include 'all'"
+        self.n_age_bins = n_age_bins
+        self.location_types = list(location_types)
+        self.location_type_codes = {location_type: code for code, location_type in enumerate(self.location_types)}
+        self.sampling_rate = sampling_rate
+        self.rng = np.random.RandomState(seed)
+        self.buffer = np.zeros(capacity, dtype=HALF_INTERACTION_DTYPE)
+        self.n_rows = 0
+        self.person_ids = {}  # name of human => dense id
+        self.is_recorded = []  # dense id => whether the interactions reported by this human are recorded
+
+    def _get_person_id(self, name):
+        person_id = self.person_ids.get(name)
+        if person_id is None:
+            person_id = self.person_ids[name] = len(self.person_ids)
+            self.is_recorded.append(self.sampling_rate >= 1 or self.rng.random_sample() < self.sampling_rate)
+        return person_id
+
+    def add(self, name1, name2, age_bin1, age_bin2, location_type1, location_type2, is_known, contact_condition,
+            mobility_factor, duration, distance):
+        """
+        Records an interaction between two humans.
+
+        Args:
+            name1 (str): name of one of the two humans
+            name2 (str): name of the other human
+            age_bin1 (int): index of the age group of `name1`
+            age_bin2 (int): index of the age group of `name2`
+            location_type1 (str): location type of the interaction for `name1` (see `_get_location_type_to_track_mixing`)
+            location_type2 (str): location type of the interaction for `name2`
+            is_known (bool): whether the two humans know each other
+            contact_condition (bool): whether the interaction was within the contact conditions for infection to happen
+            mobility_factor (float): weight of the interaction in the contact matrices
+            duration (float): duration of the interaction (seconds)
+            distance (float): distance of the interaction (cms)
+        """
+        code1 = self.location_type_codes[location_type1]
+        code2 = self.location_type_codes[location_type2]
+        for reporter, reporter_age_bin, contact_age_bin in ((name1, age_bin1, age_bin2), (name2, age_bin2, age_bin1)):
+            person_id = self._get_person_id(reporter)
+            if not self.is_recorded[person_id]:
+                continue
+            if self.n_rows == len(self.buffer):
+                self.buffer = np.resize(self.buffer, 2 * len(self.buffer))
+            self.buffer[self.n_rows] = (person_id, reporter_age_bin, contact_age_bin, code1, code2, is_known,
+                                        contact_condition, mobility_factor, duration, distance)
+            self.n_rows += 1
+
+    def _histogram(self, categories, weights):
+        mask = weights > 0
+        values, inverse = np.unique(categories[mask], return_inverse=True)
+        counts = np.bincount(inverse, weights=weights[mask], minlength=len(values))
+        if self.sampling_rate >= 1:
+            counts = np.rint(counts).astype(np.int64)
+        return dict(zip(values.tolist(), counts.tolist()))
+
+    def reduce(self):
+        """
+        Reduces the interactions recorded since the last call, and clears them.
+
+        Returns:
+            (dict): interaction type => location type => dict with the following keys
+                "total" (np.array): contacts between age groups, weighted by their mobility factor
+                "duration" (np.array): total duration of contacts between age groups (minutes)
+                "n_people" (np.array): number of unique humans of age group j who met age group i, at [i, j]
+                "distance_profile" (dict): number of interactions per distance category (per 10 cms)
+                "duration_profile" (dict): number of interactions per duration category (per 1 min)
+        """
+        rows = self.buffer[:self.n_rows]
+        n = self.n_age_bins
+        n_people = max(len(self.person_ids), 1)
+        scale = 1.0 / self.sampling_rate
+
+        reporter_age_bins = rows["reporter_age_bin"].astype(np.int64)
+        contact_age_bins = rows["contact_age_bin"].astype(np.int64)
+        cells = reporter_age_bins * n + contact_age_bins
+        # in surveys, [i, j] ==> j is the participant and i is the reported contact
+        people_keys = (contact_age_bins * n + reporter_age_bins) * n_people + rows["reporter"]
+        durations = rows["duration"] / SECONDS_PER_MINUTE
+        # Note that the use of ceil makes the upper limit inclusive, i.e. (category - 10, category]
+        distance_categories = 10 * np.ceil(rows["distance"] / 10).astype(np.int64)
+        duration_categories = np.ceil(durations).astype(np.int64)
+
+        is_interaction_type = {
+            "all": np.ones(len(rows), dtype=bool),
+            "known": rows["is_known"],
+            "within_contact_condition": rows["contact_condition"],
+        }
+        reduced = {}
+        for interaction_type in INTERACTION_TYPES:
+            reduced[interaction_type] = {}
+            for code, location_type in enumerate(self.location_types):
+                # an interaction counts once for "all", and once for the location type of each of its two humans
+                if location_type == "all":
+                    multiplicity = is_interaction_type[interaction_type].astype(np.float64)
+                else:
+                    multiplicity = is_interaction_type[interaction_type] * (
+                        (rows["location_type_1"] == code).astype(np.float64) + (rows["location_type_2"] == code))
+
+                unique_people_keys = np.unique(people_keys[multiplicity > 0])
+                reduced[interaction_type][location_type] = {
+                    "total": scale * np.bincount(cells, weights=multiplicity * rows["mobility_factor"], minlength=n * n).reshape(n, n),
+                    "duration": scale * np.bincount(cells, weights=multiplicity * durations, minlength=n * n).reshape(n, n),
+                    "n_people": scale * np.bincount(unique_people_keys // n_people, minlength=n * n).reshape(n, n),
+                    # each half carries half of its interaction
+                    "distance_profile": self._histogram(distance_categories, 0.5 * scale * multiplicity),
+                    "duration_profile": self._histogram(duration_categories, 0.5 * scale * multiplicity),
+                }
+
+        self.n_rows = 0
+        return reduced
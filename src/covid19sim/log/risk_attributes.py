@@ -0,0 +1,319 @@
+"""
+Columnar recording of the hourly risk attributes of humans (see `Tracker.track_humans`).
+
+Attributes are recorded as a struct of arrays with one row per hour and one column per human.
+Rows are preallocated in chunks of `chunk_hours` hours, and full chunks can be written to disk
+instead of being kept in memory. Categorical attributes (e.g. heuristic reasons and test
+results) are integer-coded, and symptoms are stored as bitmasks of their ids.
+
+The recorder behaves as a sequence of dictionaries, one per human and hour, which is what the
+analysis scripts used to get when the attributes were recorded as a list of dictionaries.
+"""
+import bisect
+import collections.abc
+import os
+import typing
+
+import numpy as np
+
+from covid19sim.epidemiology.symptoms import decode_symptoms, encode_symptoms
+if typing.TYPE_CHECKING:
+    from covid19sim.inference.message_utils import ContactBook
+
+# attribute kinds which are not stored as plain numpy dtypes
+CATEGORY = "category"  # hashable values, stored as codes
+SYMPTOMS = "symptoms"  # lists of symptoms, stored as bitmasks
+SPARSE = "sparse"  # arbitrary objects which are empty most of the time, stored by (row, column)
+TIMESTAMP = "timestamp"  # one value per row
+NAME = "name"  # one value per column
+
+# attribute => kind; the order is the one of the keys of the recorded dictionaries
+RISK_ATTRIBUTES = {
+    "has_app": np.bool_,
+    "risk": np.float64,
+    "risk_level": np.int8,
+    "reason": CATEGORY,
+    "rec_level": np.int8,
+    "exposed": np.bool_,
+    "infectious": np.bool_,
+    "symptoms": np.int16,
+    "symptom_names": SYMPTOMS,
+    "clusters": SPARSE,
+    "test": CATEGORY,
+    "recovered": np.bool_,
+    "timestamp": TIMESTAMP,
+    "test_recommended": np.bool_,
+    "name": NAME,
+    "order_1_is_exposed": np.bool_,
+    "order_1_is_infectious": np.bool_,
+    "order_1_is_presymptomatic": np.bool_,
+    "order_1_is_symptomatic": np.bool_,
+    "order_1_is_tested": np.bool_,
+}
+
+# dtype of the arrays storing the attributes of each kind
+_STORAGE_DTYPES = {CATEGORY: np.int16, SYMPTOMS: np.uint64}
+
+
+def _storage_dtype(kind):
+    return _STORAGE_DTYPES.get(kind, kind)
+
+
+class RiskAttributesRecorder(collections.abc.Sequence):
+    """
+    Records the risk attributes of all humans, one hour at a time.
+    """
+
+    def __init__(self, chunk_hours: int = 24, chunk_dir: typing.Optional[str] = None):
+        """
+        Args:
+            chunk_hours (int): number of hours preallocated at once
+            chunk_dir (str, optional): directory where full chunks are written. They are kept in memory if None.
+        """
+        self.chunk_hours = chunk_hours
+        self.chunk_dir = chunk_dir
+        self.names = None
+        self.timestamps = []
+        self.categories = {name: [] for name, kind in RISK_ATTRIBUTES.items() if kind == CATEGORY}
+        self.category_codes = {name: {} for name in self.categories}
+        self.sparse = {name: {} for name, kind in RISK_ATTRIBUTES.items() if kind == SPARSE}
+        # full chunks are either dictionaries of arrays or paths to the files where they were written
+        self.chunks = []
+        self.chunk_starts = []
+        self.current_chunk = None
+        self.current_chunk_rows = 0
+        self._cached_chunk = (None, None)
+
+    @property
+    def n_rows(self):
+        """Number of recorded hours."""
+        return len(self.timestamps)
+
+    def record(self, timestamp, names: typing.Sequence[str], columns: typing.Dict[str, typing.Sequence]):
+        """
+        Records the attributes of all humans at a given hour.
+
+        Args:
+            timestamp (datetime.datetime): current time
+            names (list): names of the humans, in the same order at every hour
+            columns (dict): attribute => values of all humans, in the order of `names`
+        """
+        if self.names is None:
+            self.names = list(names)
+        assert len(names) == len(self.names), "the population should not change while it is being recorded"
+        if self.current_chunk is None:
+            self.current_chunk = {
+                name: np.zeros((self.chunk_hours, len(self.names)), dtype=_storage_dtype(kind))
+                for name, kind in RISK_ATTRIBUTES.items() if kind not in (SPARSE, TIMESTAMP, NAME)
+            }
+            self.current_chunk_rows = 0
+            self.chunk_starts.append(self.n_rows)
+
+        row = self.current_chunk_rows
+        for name, kind in RISK_ATTRIBUTES.items():
+            if kind in (TIMESTAMP, NAME):
+                continue
+            values = columns[name]
+            if kind == CATEGORY:
+                self.current_chunk[name][row] = [self._get_category_code(name, value) for value in values]
+            elif kind == SYMPTOMS:
+                self.current_chunk[name][row] = [encode_symptoms(symptoms) for symptoms in values]
+            elif kind == SPARSE:
+                for column, value in enumerate(values):
+                    if value:
+                        self.sparse[name][(self.n_rows, column)] = value
+            else:
+                self.current_chunk[name][row] = values
+        self.timestamps.append(timestamp)
+        self.current_chunk_rows += 1
+        if self.current_chunk_rows == self.chunk_hours:
+            self._close_current_chunk()
+
+    def get_column(self, name: str) -> np.ndarray:
+        """
+        Returns the values of an attribute as an array of shape (hours, humans). Categorical
+        attributes and symptoms are returned as codes and bitmasks (see `categories` and `decode_symptoms`).
+        """
+        kind = RISK_ATTRIBUTES[name]
+        assert kind not in (SPARSE, TIMESTAMP, NAME), f"{name} is not stored as an array"
+        arrays = [self._load_chunk(idx)[name] for idx in range(len(self.chunks))]
+        if self.current_chunk is not None:
+            arrays.append(self.current_chunk[name][:self.current_chunk_rows])
+        if not arrays:
+            return np.zeros((0, 0), dtype=_storage_dtype(kind))
+        return np.concatenate(arrays)
+
+    def __len__(self):
+        return 0 if self.names is None else self.n_rows * len(self.names)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError("risk attributes index out of range")
+        row, column = divmod(idx, len(self.names))
+        chunk_idx = bisect.bisect_right(self.chunk_starts, row) - 1
+        return self._make_record(self._load_chunk(chunk_idx), row, row - self.chunk_starts[chunk_idx], column)
+
+    def __iter__(self):
+        for chunk_idx, chunk_start in enumerate(self.chunk_starts):
+            chunk = self._load_chunk(chunk_idx)
+            chunk_end = self.chunk_starts[chunk_idx + 1] if chunk_idx + 1 < len(self.chunk_starts) else self.n_rows
+            for row in range(chunk_start, chunk_end):
+                for column in range(len(self.names)):
+                    yield self._make_record(chunk, row, row - chunk_start, column)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_cached_chunk"] = (None, None)
+        if self.current_chunk is not None:
+            # the rows which were not recorded yet are not stored
+            state["chunks"] = self.chunks + [{k: v[:self.current_chunk_rows] for k, v in self.current_chunk.items()}]
+            state["current_chunk"] = None
+        return state
+
+    def _get_category_code(self, name, value):
+        key = frozenset(value) if isinstance(value, (set, frozenset)) else value
+        codes = self.category_codes[name]
+        if key not in codes:
+            codes[key] = len(self.categories[name])
+            self.categories[name].append(key)
+        return codes[key]
+
+    def _close_current_chunk(self):
+        chunk = self.current_chunk
+        if self.chunk_dir is not None:
+            os.makedirs(self.chunk_dir, exist_ok=True)
+            path = os.path.join(self.chunk_dir, f"risk_attributes_{len(self.chunks):05d}.npz")
+            np.savez_compressed(path, **chunk)
+            chunk = path
+        self.chunks.append(chunk)
+        self.current_chunk = None
+
+    def _load_chunk(self, chunk_idx):
+        if chunk_idx == len(self.chunks):
+            return self.current_chunk
+        cached_idx, cached_chunk = self._cached_chunk
+        if cached_idx == chunk_idx:
+            return cached_chunk
+        chunk = self.chunks[chunk_idx]
+        if isinstance(chunk, str):
+            with np.load(chunk) as fd:
+                chunk = {k: fd[k] for k in fd.files}
+        self._cached_chunk = (chunk_idx, chunk)
+        return chunk
+
+    def _make_record(self, chunk, row, chunk_row, column):
+        record = {}
+        for name, kind in RISK_ATTRIBUTES.items():
+            if kind == TIMESTAMP:
+                record[name] = self.timestamps[row]
+            elif kind == NAME:
+                record[name] = self.names[column]
+            elif kind == SPARSE:
+                record[name] = self.sparse[name].get((row, column), [])
+            elif kind == CATEGORY:
+                value = self.categories[name][chunk[name][chunk_row, column]]
+                record[name] = set(value) if isinstance(value, frozenset) else value
+            elif kind == SYMPTOMS:
+                record[name] = decode_symptoms(chunk[name][chunk_row, column])
+            else:
+                record[name] = chunk[name][chunk_row, column].item()
+        return record
+
+
+class Order1Contacts:
+    """
+    Order-1 contacts of all humans, used to check whether any contact of each human is in a given state.
+
+    The contacts are stored as (row, column) pairs of slots. Each human owns a segment of slots, which is rewritten in
+    place when their contact book changed (see `ContactBook.contacts_version`), and unused slots point to a padding
+    column which is never in any state. A segment which gets too small is moved to the end of the slots, and the slots
+    are compacted when there are more than twice as many as needed.
+    """
+
+    def __init__(self, names: typing.Sequence[str], min_capacity: int = 4):
+        """
+        Args:
+            names (list): names of the humans, in the order of the state arrays
+            min_capacity (int, optional): minimum number of slots of a human. Defaults to 4.
+        """
+        n_humans = len(names)
+        self.index = {name: idx for idx, name in enumerate(names)}
+        self.versions = np.full(n_humans, -1, dtype=np.int64)
+        self.min_capacity = min_capacity
+        self.padding = n_humans
+        self.counts = np.zeros(n_humans, dtype=np.int64)
+        self.capacities = np.full(n_humans, min_capacity, dtype=np.int64)
+        self.starts = np.arange(n_humans, dtype=np.int64) * min_capacity
+        self.rows = np.repeat(np.arange(n_humans, dtype=np.int64), min_capacity)
+        self.columns = np.full(n_humans * min_capacity, self.padding, dtype=np.int64)
+        self.size = len(self.rows)
+
+    def update(self, contact_books: typing.Sequence["ContactBook"]):
+        """
+        Refreshes the contacts of the humans whose contact book changed.
+
+        Args:
+            contact_books (list): contact books of the humans, in the order of `names`
+        """
+        for idx, contact_book in enumerate(contact_books):
+            if contact_book.contacts_version != self.versions[idx]:
+                contact_counts = contact_book.contact_counts
+                self._set_contacts(idx, np.fromiter(
+                    (self.index[name] for name in contact_counts), dtype=np.int64, count=len(contact_counts)))
+                self.versions[idx] = contact_book.contacts_version
+        if self.size > 2 * self._get_capacities().sum():
+            self._compact()
+
+    def any(self, state: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            state (np.ndarray): boolean state of all humans
+
+        Returns:
+            (np.ndarray): for each human, whether any of their contacts is in the given state
+        """
+        padded_state = np.append(state, False)
+        return np.bincount(self.rows[:self.size], weights=padded_state[self.columns[:self.size]],
+                           minlength=len(self.counts)) > 0
+
+    def _set_contacts(self, idx, contacts):
+        start, count = self.starts[idx], self.counts[idx]
+        if len(contacts) > self.capacities[idx]:
+            self.columns[start:start + count] = self.padding
+            start, count = self._allocate(idx, max(2 * len(contacts), self.min_capacity)), 0
+        self.columns[start:start + len(contacts)] = contacts
+        self.columns[start + len(contacts):start + count] = self.padding
+        self.counts[idx] = len(contacts)
+
+    def _allocate(self, idx, capacity):
+        """Appends a segment of `capacity` slots for human `idx` and returns its start."""
+        if self.size + capacity > len(self.rows):
+            new_size = max(2 * len(self.rows), self.size + capacity)
+            self.rows = np.resize(self.rows, new_size)
+            self.columns = np.resize(self.columns, new_size)
+        start = self.size
+        self.rows[start:start + capacity] = idx
+        self.columns[start:start + capacity] = self.padding
+        self.starts[idx], self.capacities[idx] = start, capacity
+        self.size += capacity
+        return start
+
+    def _get_capacities(self):
+        """Returns the capacity of the segments after compaction."""
+        return np.maximum(2 * self.counts, self.min_capacity)
+
+    def _compact(self):
+        capacities = self._get_capacities()
+        starts = np.cumsum(capacities) - capacities
+        # position of each contact in its segment
+        offsets = np.arange(self.counts.sum()) - np.repeat(np.cumsum(self.counts) - self.counts, self.counts)
+        columns = np.full(capacities.sum(), self.padding, dtype=np.int64)
+        columns[np.repeat(starts, self.counts) + offsets] = self.columns[np.repeat(self.starts, self.counts) + offsets]
+        self.rows = np.repeat(np.arange(len(capacities), dtype=np.int64), capacities)
+        self.columns = columns
+        self.starts, self.capacities = starts, capacities
+        self.size = len(self.rows)
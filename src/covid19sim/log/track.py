@@ -19,21 +19,35 @@ import pandas as pd
 from covid19sim.plotting.plot_rt import PlotRt
 from covid19sim.utils.utils import log, _get_seconds_since_midnight
 from covid19sim.utils.constants import AGE_BIN_WIDTH_5, ALL_LOCATIONS, SECONDS_PER_DAY, SECONDS_PER_HOUR
-from covid19sim.epidemiology.symptoms import MILD, MODERATE, SEVERE, EXTREMELY_SEVERE
+from covid19sim.epidemiology.symptoms import MILD, MODERATE, SEVERE, EXTREMELY_SEVERE, count_symptoms, decode_symptoms
 from covid19sim.inference.server_utils import DataCollectionServer, DataCollectionClient, \
     default_datacollect_frontend_address
 from covid19sim.utils.utils import log, copy_obj_array_except_env
-from covid19sim.utils.constants import SECONDS_PER_DAY, SECONDS_PER_MINUTE
+from covid19sim.utils.constants import SECONDS_PER_DAY
 from covid19sim.interventions.tracing import Heuristic
+from covid19sim.log.mixing import MixingAccumulator
+from covid19sim.log.risk_attributes import Order1Contacts, RiskAttributesRecorder
+from covid19sim.log.tracker_output import TrackerOutputWriter, get_tracker_output_dir
 if typing.TYPE_CHECKING:
     from covid19sim.human import Human
 from covid19sim.locations.hospital import Hospital, ICU
+from covid19sim.native import SUSCEPTIBLE, EXPOSED, INFECTIOUS, REMOVED, get_population_timestamps, get_seir_states
 
 
 # used by - next_generation_matrix,
 SNAPSHOT_PERCENT_INFECTED_THRESHOLD = 2 # take a snapshot every time percent infected of population increases by this amount
 LOCATION_TYPES_TO_TRACK_MIXING = ["house", "work", "school", "other", "all"]
 WORK_ACTIVITY_STATUS = ["WORK", "WORK-CANCEL--KID", "WORK-CANCEL--ILL", "WORK-CANCEL--QUARANTINE"]
+# fractions of the population with the highest risk for which precision, lift and recall are computed
+RISK_PRECISION_TOP_K = [0.01, 0.03, 0.05, 0.10]
+# risk of each human at the end of a day, and the ground truth it is evaluated against
+RISK_VALUES_DTYPE = np.dtype([
+    ("risk", np.float64),
+    ("is_exposed_or_infectious", np.bool_),
+    ("is_tested_positive", np.bool_),
+    ("has_test_result", np.bool_),
+    ("has_no_symptoms", np.bool_),
+])
 
 def check_if_tracking(f):
     def wrapper(*args, **kwargs):
@@ -76,6 +90,74 @@ def normalize_counter(counter, normalizer=None):
         counter[key] /= total
     return counter
 
+def _count_top_k_positives(risk, is_positive, k):
+    """
+    Counts the positives among the `k` highest risks, in O(n) with a partial selection instead of a full sort.
+    Ties at the k-th highest risk are broken by position, which is what a stable sort by decreasing risk does.
+
+    Args:
+        risk (np.array): risk values
+        is_positive (np.array): boolean ground truth of each risk value
+        k (int): number of highest risks to consider
+
+    Returns:
+        (int): number of positives among the `k` highest risks
+    """
+    if k <= 0:
+        return 0
+    if k >= len(risk):
+        return int(is_positive.sum())
+    threshold = np.partition(risk, len(risk) - k)[len(risk) - k]
+    is_above = risk > threshold
+    n_tied = k - is_above.sum()
+    return int(is_positive[is_above].sum() + is_positive[risk == threshold][:n_tied].sum())
+
+def _compute_risk_precision(risk_values, no_test):
+    """
+    Computes top-k precision, lift and recall of risk values (see `Tracker.compute_risk_precision`).
+
+    Args:
+        risk_values (np.array): array of dtype `RISK_VALUES_DTYPE`
+        no_test (np.array): boolean mask of the risk values of humans considered as not tested
+
+    Returns:
+        top_k_prec (list): precision of the top-k risks for each of `RISK_PRECISION_TOP_K` among all humans,
+            untested humans, and untested humans without symptoms
+        lift (list): lift of the same top-k risks
+        recall (list): recall among each of the three groups of humans
+    """
+    is_positive = risk_values["is_exposed_or_infectious"]
+    total_infected = 1.0 * is_positive.sum()
+    lift = [[], [], []]
+    top_k_prec = [[], [], []]
+    recall = []
+    for idx, mask in enumerate([None, no_test, no_test & risk_values["has_no_symptoms"]]):
+        risk, positives = risk_values["risk"], is_positive
+        if mask is not None:
+            risk, positives = risk[mask], positives[mask]
+        for k in RISK_PRECISION_TOP_K:
+            n_top_k = math.ceil(k * len(risk))
+            pred = 1.0 * _count_top_k_positives(risk, positives, n_top_k)
+
+            # precision
+            if n_top_k:
+                top_k_prec[idx].append(pred / n_top_k)
+            else:
+                # happens when the population size is too small.
+                warnings.warn(f"population size {len(risk_values)} too small to compute top-{k} precision for {n_top_k} people.", RuntimeWarning)
+                top_k_prec[idx].append(-1)
+            # lift
+            if total_infected:
+                lift[idx].append(pred / (k * total_infected))
+            else:
+                lift[idx].append(0) # FIXME: it might not be correct definition for Lift
+
+        z = positives.sum()
+        recall.append(0)
+        if z:
+            recall[-1] = 1.0 * positives.sum() / z
+    return top_k_prec, lift, recall
+
 def _get_location_type_to_track_mixing(human, location):
     """
     Maps a location to a corresponding label in POLYMOD study.
@@ -170,7 +252,6 @@ class Tracker(object):
         contact_matrices_fmt = defaultdict(lambda: {
                     'avg': (0, np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5)))),
                     'total': np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5))),
-                    'n_people': defaultdict(lambda : set()),
                     'avg_daily': (0, np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5)))),
                     "unique_avg_daily": (0, np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5)))),
                 })
@@ -191,6 +272,12 @@ class Tracker(object):
                             "within_contact_condition": deepcopy(contact_duration_matrices_fmt),
                             }
 
+        # interactions of the day, reduced into the matrices above once per day
+        self.mixing_accumulator = MixingAccumulator(
+            len(AGE_BIN_WIDTH_5), LOCATION_TYPES_TO_TRACK_MIXING,
+            sampling_rate=conf.get("MIXING_SAMPLING_RATE", 1.0), seed=conf.get("seed", 0),
+        )
+
         self.bluetooth_contact_matrices = defaultdict(lambda: {
                     'avg_daily': (0, np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5)))),
                     'total': np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5))),
@@ -350,7 +437,16 @@ class Tracker(object):
         # risk model
         self.risk_values = []
         self.avg_infectiousness_per_day = []
-        self.risk_attributes = []
+        # daily metrics are written to disk as the simulation progresses
+        self.output_writer = None
+        if self.conf.get("STREAM_TRACKER_DATA", False) and self.conf.get("outdir") is not None:
+            self.output_writer = TrackerOutputWriter(get_tracker_output_dir(self.conf))
+
+        self.risk_attributes = RiskAttributesRecorder(
+            chunk_hours=self.conf.get("RISK_ATTRIBUTES_CHUNK_HOURS", 24),
+            chunk_dir=self.conf.get("RISK_ATTRIBUTES_CHUNK_DIR", None),
+        )
+        self.order_1_contacts = None
         self.tracing_started = False
 
         # behavior
@@ -604,7 +700,7 @@ class Tracker(object):
 
         #
         self.cases_per_day = [self.n_infected_init]
-        self.s_per_day = [self.n_people - self.n_infected_init]
+        self.s_per_day = [len(self.city.humans) - self.n_infected_init]
         self.e_per_day = [self.n_infected_init]
         self.i_per_day = [0]
         self.r_per_day = [0]
@@ -700,28 +796,16 @@ class Tracker(object):
 
         self.cases_per_day.append(0)
 
-        self.s_per_day.append(sum(h.is_susceptible for h in self.city.humans))
-        self.e_per_day.append(sum(h.is_exposed for h in self.city.humans))
-        self.i_per_day.append(sum(h.is_infectious for h in self.city.humans))
-        self.r_per_day.append(sum(h.is_removed for h in self.city.humans))
+        # SEIR states of the whole population, computed from the timestamps of the native layer
+        humans = self.city.humans
+        states = get_seir_states(get_population_timestamps(humans), self.env.now)
+        n_per_state = np.bincount(states, minlength=4)
+        self.s_per_day.append(int(n_per_state[SUSCEPTIBLE]))
+        self.e_per_day.append(int(n_per_state[EXPOSED]))
+        self.i_per_day.append(int(n_per_state[INFECTIOUS]))
+        self.r_per_day.append(int(n_per_state[REMOVED]))
         self.ei_per_day.append(self.e_per_day[-1] + self.i_per_day[-1])
 
-        for human in self.city.humans:
-            if human.is_susceptible:
-                state = 'S'
-            elif human.is_exposed:
-                state = 'E'
-            elif human.is_infectious:
-                state = 'I'
-            elif human.is_removed:
-                state = 'R'
-            else:
-                raise ValueError(f"{human} is not in any of SEIR states")
-            self.humans_quarantined_state[human.name].append(human.intervened_behavior.is_under_quarantine)
-            self.humans_state[human.name].append(state)
-            self.humans_rec_level[human.name].append(human.rec_level)
-            self.humans_intervention_level[human.name].append(human._intervention_level)
-
         num_humans_in_hospital = sum([hospital.n_covid_patients for hospital in self.city.hospitals])
 
         # test_per_day
@@ -734,49 +818,113 @@ class Tracker(object):
         # recommendation levels related statistics
         self.track_daily_recommendation_levels()
 
-        # risk model
-        prec, lift, recall = self.compute_risk_precision(daily=True)
-        self.risk_precision_daily.append((prec, lift, recall))
-        self.risk_values.append([(h.risk, h.is_exposed or h.is_infectious, h.test_result, len(h.symptoms) == 0) for h in self.city.humans])
-        row = []
-        for h in self.city.humans:
+        # per-human daily rows, in a single pass over the population
+        row, infectiousnesses = [], []
+        risk_values = np.zeros(len(humans), dtype=RISK_VALUES_DTYPE)
+        is_under_quarantine = np.zeros(len(humans), dtype=bool)
+        has_app = np.zeros(len(humans), dtype=bool)
+        for idx, (h, state) in enumerate(zip(humans, states.tolist())):
+            is_infectious = state == INFECTIOUS
+            is_under_quarantine[idx] = h.intervened_behavior.is_under_quarantine
+            has_app[idx] = h.has_app
+            self.humans_quarantined_state[h.name].append(bool(is_under_quarantine[idx]))
+            self.humans_state[h.name].append("SEIR"[state])
+            self.humans_rec_level[h.name].append(h.rec_level)
+            self.humans_intervention_level[h.name].append(h._intervention_level)
+
+            risk, symptoms, reported_symptoms = h.risk, h.symptoms, h.reported_symptoms
+            risk_values[idx] = (risk, state == EXPOSED or is_infectious, h.test_result == "positive", bool(h.test_result), len(symptoms) == 0)
             row.append({
                 "infection_timestamp": h.infection_timestamp,
                 "n_infectious_contacts": h.n_infectious_contacts,
-                "risk": h.risk,
+                "risk": risk,
                 "risk_level": h.risk_level,
                 "rec_level": h.rec_level,
-                "state": h.state.index(1),
+                "state": state,
                 "test_result": h.test_result,
-                "n_symptoms": len(h.symptoms),
-                "symptom_severity": self.compute_severity(h.symptoms),
-                "reported_symptom_severity": self.compute_severity(h.reported_symptoms),
+                "n_symptoms": len(symptoms),
+                "symptom_severity": self.compute_severity(symptoms),
+                "reported_symptom_severity": self.compute_severity(reported_symptoms),
                 "name": h.name,
                 "dead": h.is_dead,
                 "reported_test_result": h.reported_test_result,
-                "n_reported_symptoms": len(h.reported_symptoms),
-                "age": human.age,
+                "n_reported_symptoms": len(reported_symptoms),
+                "age": h.age,
                 "is_in_hospital": isinstance(h.location, Hospital),
                 "is_in_ICU": isinstance(h.location, ICU)
             })
+            infectiousnesses.append(h.get_infectiousness_for_day(self.env.now, is_infectious))
+
+        # risk model
+        self.risk_values.append(risk_values)
+        self.risk_precision_daily.append(_compute_risk_precision(risk_values, ~risk_values["is_tested_positive"]))
 
         self.human_monitor[self.env.timestamp.date()-datetime.timedelta(days=1)] = row
 
         # epi
-        self.avg_infectiousness_per_day.append(np.mean([h.infectiousness for h in self.city.humans]))
+        self.avg_infectiousness_per_day.append(np.mean(infectiousnesses))
 
         # behavior
         # /!\ `intervened_behavior.is_quarantined()` has dropout
-        x = np.array([(human.has_app, human.intervened_behavior.is_under_quarantine, human.is_susceptible or human.is_removed) for human in self.city.humans])
-        n_quarantined_app_users = (x[:, 0] * x[:, 1]).sum()
-        n_quarantined = x[:, 1].sum()
-        n_false_quarantined = (x[:, 1] * x[:, 2]).sum()
-        n_false_quarantined_app_users = (x[:, 0] * x[:, 1] * x[:, 2]).sum()
+        is_false_quarantine = is_under_quarantine & ((states == SUSCEPTIBLE) | (states == REMOVED))
+        n_quarantined_app_users = (has_app & is_under_quarantine).sum()
+        n_quarantined = is_under_quarantine.sum()
+        n_false_quarantined = is_false_quarantine.sum()
+        n_false_quarantined_app_users = (has_app & is_false_quarantine).sum()
         self.daily_quarantine['app_users'].append(n_quarantined_app_users)
         self.daily_quarantine['all'].append(n_quarantined)
         self.daily_quarantine['false_app_users'].append(n_false_quarantined_app_users)
         self.daily_quarantine['false_all'].append(n_false_quarantined)
 
+        if self.output_writer is not None:
+            self.write_day_partition(row)
+
+    def write_day_partition(self, human_monitor_row):
+        """
+        Writes the metrics of the day which just ended (see `TrackerOutputWriter`).
+        Counters which are incremented during the day (e.g. cases) are the ones of that day, and population counts
+        (e.g. SEIR) are the ones which were just computed.
+
+        Args:
+            human_monitor_row (list): attributes of all humans added to `human_monitor`
+        """
+        day_idx = len(self.s_per_day) - 2
+        self.output_writer.write_day(day_idx, "epi", {
+            "cases": self.cases_per_day[-2],
+            "tested": self.tested_per_day[-2],
+            "hospitalization": self.hospitalization_per_day[-2],
+            "critical": self.critical_per_day[-2],
+            "deaths": self.deaths_per_day[-2],
+            "s": self.s_per_day[-1],
+            "e": self.e_per_day[-1],
+            "i": self.i_per_day[-1],
+            "r": self.r_per_day[-1],
+            "ei": self.ei_per_day[-1],
+            "hospital_usage": self.hospital_usage_per_day[-1],
+            "cumulative_incidence": self.cumulative_incidence[-1],
+            "avg_infectiousness": self.avg_infectiousness_per_day[-1],
+        })
+        self.output_writer.write_day(day_idx, "quarantine", {
+            key: values[-1] for key, values in self.daily_quarantine.items()
+        })
+        prec, lift, recall = self.risk_precision_daily[-1]
+        self.output_writer.write_day(day_idx, "risk_precision", {
+            "precision": np.asarray(prec, dtype=np.float64),
+            "lift": np.asarray(lift, dtype=np.float64),
+            "recall": np.asarray(recall, dtype=np.float64),
+        })
+
+        humans = {"name": [h.name for h in self.city.humans]}
+        humans["state"] = [self.humans_state[name][-1] for name in humans["name"]]
+        humans["intervention_level"] = [self.humans_intervention_level[name][-1] for name in humans["name"]]
+        humans["is_quarantined"] = [self.humans_quarantined_state[name][-1] for name in humans["name"]]
+        for key in ["risk", "risk_level", "rec_level", "n_infectious_contacts", "n_symptoms", "symptom_severity",
+                    "reported_symptom_severity", "n_reported_symptoms", "dead", "is_in_hospital", "is_in_ICU"]:
+            humans[key] = [x[key] for x in human_monitor_row]
+        for key in ["test_result", "reported_test_result"]:
+            humans[key] = [x[key] or "" for x in human_monitor_row]
+        self.output_writer.write_day(day_idx, "humans", humans)
+
     def compute_severity(self, symptoms):
         severity = 0
         for s in symptoms:
@@ -817,59 +965,30 @@ class Tracker(object):
 
     def compute_risk_precision(self, daily=True, until_days=None):
         """
-        [summary]
+        Computes precision, lift and recall of the top 1, 3, 5 and 10% risks among all humans, untested humans,
+        and untested humans without symptoms, with exposed or infectious humans as positives.
 
         Args:
-            daily (bool, optional): [description]. Defaults to True.
-            threshold (float, optional): [description]. Defaults to 0.5.
-            until_days ([type], optional): [description]. Defaults to None.
+            daily (bool, optional): if True, uses the current risks of humans. Otherwise, uses the risks recorded at
+                the end of each day until `until_days`. Defaults to True.
+            until_days (int, optional): number of days to consider if `daily` is False. Defaults to None (all days).
 
         Returns:
-            [type]: [description]
+            (tuple): top-k precision, lift and recall (see `_compute_risk_precision`)
         """
         if daily:
-            all = [(h.risk, h.is_exposed or h.is_infectious) for h in self.city.humans]
-            no_test = [(h.risk, h.is_exposed or h.is_infectious) for h in self.city.humans if h.test_result != "positive"]
-            no_test_symptoms = [(h.risk, h.is_exposed or h.is_infectious) for h in self.city.humans if h.test_result != "positive" and len(h.symptoms) == 0]
+            humans = self.city.humans
+            risk_values = np.zeros(len(humans), dtype=RISK_VALUES_DTYPE)
+            for idx, h in enumerate(humans):
+                risk_values[idx] = (h.risk, h.is_exposed or h.is_infectious, h.test_result == "positive",
+                                    bool(h.test_result), not h.symptoms_bitmask)
+            no_test = ~risk_values["is_tested_positive"]
         else:
-            all = [(x[0],x[1]) for daily_risk_values in self.risk_values[:until_days] for x in daily_risk_values]
-            no_test = [(x[0], x[1]) for daily_risk_values in self.risk_values[:until_days] for x in daily_risk_values if not x[2]]
-            no_test_symptoms = [(x[0], x[1]) for daily_risk_values in self.risk_values[:until_days] for x in daily_risk_values if not x[2] and x[3]]
-
-        top_k = [0.01, 0.03, 0.05, 0.10]
-        total_infected = 1.0*sum(1 for x,y in all if y)
-        all = sorted(all, key=lambda y:-y[0])
-        no_test = sorted(no_test, key=lambda y:-y[0])
-        no_test_symptoms = sorted(no_test_symptoms, key = lambda y:-y[0])
-
-        lift = [[], [], []]
-        top_k_prec = [[],[],[]]
-        recall =[]
-        idx = 0
-        for type in [all, no_test, no_test_symptoms]:
-            for k in top_k:
-                xy = type[:math.ceil(k * len(type))]
-                pred = 1.0*sum(1 for x,y in xy if y)
-
-                # precision
-                if len(xy):
-                    top_k_prec[idx].append(pred/len(xy))
-                else:
-                    # happens when the population size is too small.
-                    warnings.warn(f"population size {len(all)} too small to compute top-{k} precision for {len(xy)} people.", RuntimeWarning)
-                    top_k_prec[idx].append(-1)
-                # lift
-                if total_infected:
-                    lift[idx].append(pred/(k*total_infected))
-                else:
-                    lift[idx].append(0) # FIXME: it might not be correct definition for Lift
+            days = self.risk_values[:until_days]
+            risk_values = np.concatenate(days) if days else np.zeros(0, dtype=RISK_VALUES_DTYPE)
+            no_test = ~risk_values["has_test_result"]
 
-            z = sum(1 for x,y in type if y)
-            recall.append(0)
-            if z:
-                recall[-1] = 1.0*sum(1 for x,y in type if y)/z
-            idx += 1
-        return top_k_prec, lift, recall
+        return _compute_risk_precision(risk_values, no_test)
 
     @check_if_tracking
     def track_humans(self, hd: typing.Dict, current_timestamp: datetime.datetime):
@@ -886,33 +1005,40 @@ class Tracker(object):
         ):
             return
 
-        for name, h in hd.items():
-            order_1_contacts = h.contact_book.get_contacts(hd)
-
-            self.risk_attributes.append({
-                "has_app": h.has_app,
-                "risk": h.risk,
-                "risk_level": h.risk_level,
-                "reason": h.heuristic_reasons,
-                "rec_level": h.rec_level,
-                "exposed": h.is_exposed,
-                "infectious": h.is_infectious,
-                "symptoms": len(h.symptoms),
-                "symptom_names": h.reported_symptoms,
-                "clusters": h.intervention.extract_clusters(h) if type(h.intervention) == Heuristic else [],
-                "test": h.test_result,
-                "recovered": h.is_removed,
-                "timestamp": self.env.timestamp,
-                "test_recommended": h._test_recommended,
-                "name": h.name,
-                "order_1_is_exposed": any([c.is_exposed for c in order_1_contacts]),
-                "order_1_is_infectious": any([c.is_infectious for c in order_1_contacts]),
-                "order_1_is_presymptomatic": any([c.is_infectious and
-                                                  len(c.symptoms) == 0 for c in order_1_contacts]),
-                "order_1_is_symptomatic": any([c.is_infectious and
-                                               len(c.symptoms) > 0 for c in order_1_contacts]),
-                "order_1_is_tested": any([c.test_result == "positive" for c in order_1_contacts]),
-            })
+        humans = list(hd.values())
+        n_humans = len(humans)
+        if self.order_1_contacts is None:
+            self.order_1_contacts = Order1Contacts(list(hd.keys()))
+        # only the contacts of humans whose contact book changed are looked up again
+        self.order_1_contacts.update([h.contact_book for h in humans])
+
+        n_symptoms = np.fromiter((count_symptoms(h.symptoms_bitmask) for h in humans), dtype=np.int16, count=n_humans)
+        is_exposed = np.fromiter((h.is_exposed for h in humans), dtype=bool, count=n_humans)
+        is_infectious = np.fromiter((h.is_infectious for h in humans), dtype=bool, count=n_humans)
+        test_results = [h.test_result for h in humans]
+        is_tested = np.array([x == "positive" for x in test_results], dtype=bool)
+
+        self.risk_attributes.record(self.env.timestamp, list(hd.keys()), {
+            "has_app": [h.has_app for h in humans],
+            "risk": [h.risk for h in humans],
+            "risk_level": [h.risk_level for h in humans],
+            "reason": [h.heuristic_reasons for h in humans],
+            "rec_level": [h.rec_level for h in humans],
+            "exposed": is_exposed,
+            "infectious": is_infectious,
+            "symptoms": n_symptoms,
+            "symptom_names": [h.reported_symptoms for h in humans],
+            "clusters": [h.intervention.extract_clusters(h) if type(h.intervention) == Heuristic else []
+                         for h in humans],
+            "test": test_results,
+            "recovered": [h.is_removed for h in humans],
+            "test_recommended": [h._test_recommended for h in humans],
+            "order_1_is_exposed": self.order_1_contacts.any(is_exposed),
+            "order_1_is_infectious": self.order_1_contacts.any(is_infectious),
+            "order_1_is_presymptomatic": self.order_1_contacts.any(is_infectious & (n_symptoms == 0)),
+            "order_1_is_symptomatic": self.order_1_contacts.any(is_infectious & (n_symptoms > 0)),
+            "order_1_is_tested": self.order_1_contacts.any(is_tested),
+        })
 
         if self.keep_full_human_copies:
             assert self.collection_client is not None
@@ -921,6 +1047,7 @@ class Tracker(object):
                 human_id = int(name.split(":")[-1]) - 1
                 current_day = (current_timestamp - self.city.start_time).days
                 self.collection_client.write(current_day, current_timestamp.hour, human_id, human)
+            self.collection_client.flush()
 
         # @@@@@ TODO: do something with location backups
         # location_backups = copy_obj_array_except_env(self.city.get_all_locations())
@@ -1172,7 +1299,7 @@ class Tracker(object):
         # track COVID symptoms to estimate P(symptom = x | COVID = 1)
         # if infected with COVID, keep accumulating symptoms until recovery
         if  human.infection_timestamp is not None:
-            self.symptoms_set['covid'][human.name].update(human.covid_symptoms)
+            self.symptoms_set['covid'][human.name].update(decode_symptoms(human.covid_symptoms))
         else:
             # once human has recovered, count the symptoms into `self.symptoms` and remove this human from symptoms_set
             if human.name in self.symptoms_set['covid']:
@@ -1387,6 +1514,9 @@ class Tracker(object):
             10.(histogram) counts of encounter duration in bins of 1 min for each location type and interaction type ("known", "all", "within_contact_condition")
 
         NOTE: These values are aggregated every simulation day. At the end of the simulation one needs to call this function with all arguments as None to perform updates.
+        Interactions are buffered during the day and reduced into these statistics at once (see `covid19sim.log.mixing.MixingAccumulator`).
+        For very large simulations, `MIXING_SAMPLING_RATE` < 1 records the interactions of only a random fraction of humans,
+        and statistics are estimated from them.
 
         Args:
             human1 (covid19sim.human.Human): one of the two `human`s involved in the encounter.
@@ -1412,22 +1542,29 @@ class Tracker(object):
         if  last_day != day or update_only:
 
             # everything related to contact matrices
+            reduced = self.mixing_accumulator.reduce()
             for interaction_type in self.contact_matrices.keys():
                 for location_type in LOCATION_TYPES_TO_TRACK_MIXING:
                     C = self.contact_matrices[interaction_type][location_type]
                     D = self.contact_duration_matrices[interaction_type][location_type]
+                    R = reduced[interaction_type][location_type]
+                    C['total'] = R['total']
+                    D['total'] = R['duration']
+
+                    # record distance profile/frequency counts (per 10 cms) and duration profile/frequency counts (per 1 min)
+                    for profile, key in [(self.contact_distance_profile, 'distance_profile'), (self.contact_duration_profile, 'duration_profile')]:
+                        for category, count in R[key].items():
+                            P = profile[interaction_type][location_type]
+                            P[category] = P.get(category, 0) + count
 
                     # number of contacts per age group
                     # mean daily contacts per age group (symmetric matrix)
                     n, M = C['avg_daily']
                     C['avg_daily'] = (n+1, (n*M + C['total'])/(n+1))
 
-                    # /!\ Storing number of people per age group might lead to memory problems. It might not be sutiable for larger simulations.
                     # mean daily contacts per person in an age group (similar to survey matrices)
                     n, M = C['unique_avg_daily']
-                    n_people = np.zeros_like(M)
-                    for i, j in C['n_people'].keys():
-                        n_people[i, j] = len(C['n_people'][(i,j)])
+                    n_people = R['n_people']
 
                     # number of unique people age group i met in a day = n_people[i, :].sum()
                     # number of unique people in age group i = n_people[:, i].sum()
@@ -1486,7 +1623,6 @@ class Tracker(object):
 
                     # reset the matrices for counting the next day's events
                     C['total'] = np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5)))
-                    C['n_people'] = defaultdict(lambda : set())
                     D['total'] = np.zeros((len(AGE_BIN_WIDTH_5), len(AGE_BIN_WIDTH_5)))
 
             self.outside_daily_contacts.append(1.0 * self.n_outside_daily_contacts/len(self.city.humans))
@@ -1500,45 +1636,20 @@ class Tracker(object):
         human1_type_of_place = _get_location_type_to_track_mixing(human1, location)
         human2_type_of_place = _get_location_type_to_track_mixing(human2, location)
 
-        i = human1.age_bin_width_5.index
-        j = human2.age_bin_width_5.index
-
-        # everything related to the contact matrices is recorded here
-        interaction_types = ["all"]
-        if interaction_type == "known":
-            interaction_types.append("known")
         if contact_condition:
-            interaction_types.append("within_contact_condition")
             self.track_contact_attributes(human1, human2)
 
             # outside daily contacts
             self.n_outside_daily_contacts += 0.5 if human1_type_of_place != "HOUSEHOLD" else 0
             self.n_outside_daily_contacts += 0.5 if human2_type_of_place != "HOUSEHOLD" else 0
 
-
-        for interaction_type in interaction_types:
-            for location_type in ['all', human1_type_of_place, human2_type_of_place]:
-                C = self.contact_matrices[interaction_type][location_type]
-                D = self.contact_duration_matrices[interaction_type][location_type]
-
-                C['total'][i, j] += global_mobility_factor 
-                C['total'][j, i] += global_mobility_factor
-                # in surveys, ij ==> j is the participant and i is the reported contact
-                C['n_people'][(j,i)].add(human1.name) # i reports about j; len of this set is number of unique people in i that met j
-                C['n_people'][(i,j)].add(human2.name) # j reports about i
-                D['total'][i,j] += duration / SECONDS_PER_MINUTE
-                D['total'][j,i] += duration / SECONDS_PER_MINUTE
-
-                # Note that the use of math.ceil makes the upper limit inclusive.
-                # record distance profile/frequency counts (per 10 cms). It keeps counts for (distance_category - 10,  distance_category].
-                distance_category = 10 * math.ceil(distance_profile.distance / 10)
-                Cp = self.contact_distance_profile[interaction_type][location_type]
-                Cp[distance_category] = Cp.get(distance_category, 0) + 1
-
-                # record duration profile/frequency counts (per 1 min)
-                duration_category = math.ceil(duration / SECONDS_PER_MINUTE)
-                Dp = self.contact_duration_profile[interaction_type][location_type]
-                Dp[duration_category] = Dp.get(duration_category, 0) + 1
+        # everything related to the contact matrices is reduced from these records at the end of the day
+        self.mixing_accumulator.add(
+            human1.name, human2.name, human1.age_bin_width_5.index, human2.age_bin_width_5.index,
+            human1_type_of_place, human2_type_of_place, is_known=interaction_type == "known",
+            contact_condition=contact_condition, mobility_factor=global_mobility_factor,
+            duration=duration, distance=distance_profile.distance,
+        )
 
     @check_if_tracking
     def track_contact_attributes(self, human1, human2, infection_attrs=[]):
@@ -1624,7 +1735,6 @@ class Tracker(object):
         for key0, value0 in self.contact_matrices.items():
             cm[key0] = {}
             for key1, value1 in value0.items():
-                value1.pop("n_people")
                 value1.pop("total")
                 cm[key0][key1] = value1
 
@@ -0,0 +1,177 @@
+"""
+Append-only, partitioned output of the tracker, written while the simulation runs.
+
+Daily metrics are written at the end of every simulated day as one `.npz` file per metric family
+(`<root>/day_<idx>/<family>.npz`), each holding typed arrays (e.g. one value per day for population
+counts, or one value per human for their states). The data extracted at the end of the simulation
+(see `extract_tracker_data`) is written with one file per key (`<root>/summary/<key>.pkl`).
+The shards of a sharded simulation each write to `outdir/shard_<id>/tracker_data` (see `get_tracker_output_dir`).
+
+Files are written under a temporary name and renamed once complete, so the partitions of the days
+which were simulated before a crash can still be read. `TrackerOutput` loads selected keys and days lazily.
+"""
+import collections.abc
+import os
+import pathlib
+import typing
+
+import dill
+import numpy as np
+
+# name of the directory of the partitioned output in the experiment's output directory
+TRACKER_OUTPUT_DIRNAME = "tracker_data"
+SUMMARY_DIRNAME = "summary"
+_DAY_DIR_PREFIX = "day_"
+
+
+def _day_dirname(day_idx: int) -> str:
+    return f"{_DAY_DIR_PREFIX}{day_idx:04d}"
+
+
+def get_tracker_output_dir(conf: typing.Dict) -> str:
+    """
+    Returns the directory of the partitioned output of the process simulating `conf`.
+
+    Args:
+        conf (dict): yaml configuration of the experiment
+
+    Returns:
+        (str): `outdir/tracker_data`, or `outdir/shard_<id>/tracker_data` for a shard of a sharded simulation
+    """
+    outdir = conf["outdir"]
+    if conf.get("SHARD_ID") is not None:
+        outdir = os.path.join(outdir, f"shard_{conf['SHARD_ID']}")
+    return os.path.join(outdir, TRACKER_OUTPUT_DIRNAME)
+
+
+def _atomic_write(path: pathlib.Path, write_fn: typing.Callable[[typing.BinaryIO], None]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as fd:
+        write_fn(fd)
+    os.replace(tmp_path, path)
+
+
+class TrackerOutputWriter:
+    """
+    Writes the daily partitions and the final summary of a simulation.
+    """
+
+    def __init__(self, root: typing.Union[str, pathlib.Path]):
+        """
+        Args:
+            root (str): directory of the partitioned output
+        """
+        self.root = pathlib.Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def write_day(self, day_idx: int, family: str, columns: typing.Dict[str, typing.Any]):
+        """
+        Writes the metrics of a family for a given day.
+
+        Args:
+            day_idx (int): index of the simulated day
+            family (str): name of the metric family (e.g. "epi", "humans")
+            columns (dict): metric name => scalar or array. Values should have a numeric, boolean or string dtype.
+        """
+        arrays = {}
+        for key, value in columns.items():
+            array = np.asarray(value)
+            if array.dtype == object:
+                raise ValueError(f"cannot write {family}/{key}: values should be numbers, booleans or strings")
+            arrays[key] = array
+        path = self.root / _day_dirname(day_idx) / f"{family}.npz"
+        _atomic_write(path, lambda fd: np.savez_compressed(fd, **arrays))
+
+    def write_summary(self, data: typing.Dict[str, typing.Any]):
+        """
+        Writes the data extracted at the end of the simulation, one file per key.
+
+        Args:
+            data (dict): tracker's extracted data (see `extract_tracker_data`)
+        """
+        for key, value in data.items():
+            path = self.root / SUMMARY_DIRNAME / f"{key}.pkl"
+            _atomic_write(path, lambda fd: dill.dump(value, fd))
+
+
+class TrackerOutput(collections.abc.Mapping):
+    """
+    Lazily reads the partitioned output of a simulation.
+
+    The object is a mapping of the summary keys to their values, which are only loaded when accessed.
+    Daily metrics are read with `load_day` and `load_series`, which are also available for the days
+    that were written before an interrupted simulation.
+    """
+
+    def __init__(self, root: typing.Union[str, pathlib.Path]):
+        """
+        Args:
+            root (str): directory of the partitioned output, or the experiment's output directory containing it
+        """
+        root = pathlib.Path(root)
+        if (root / TRACKER_OUTPUT_DIRNAME).is_dir():
+            root = root / TRACKER_OUTPUT_DIRNAME
+        assert root.is_dir(), f"{root} does not exist"
+        self.root = root
+        self._summary = {}
+
+    @property
+    def days(self) -> typing.List[int]:
+        """Indices of the days which were written, sorted."""
+        return sorted(
+            int(path.name[len(_DAY_DIR_PREFIX):])
+            for path in self.root.glob(f"{_DAY_DIR_PREFIX}*") if path.is_dir()
+        )
+
+    def families(self, day_idx: int) -> typing.List[str]:
+        """Names of the metric families written for a given day."""
+        return sorted(path.stem for path in (self.root / _day_dirname(day_idx)).glob("*.npz"))
+
+    def load_day(self, day_idx: int, family: str, keys: typing.Optional[typing.Iterable[str]] = None) -> typing.Dict[str, np.ndarray]:
+        """
+        Args:
+            day_idx (int): index of the simulated day
+            family (str): name of the metric family
+            keys (list, optional): metrics to load. All metrics of the family are loaded if None.
+
+        Returns:
+            (dict): metric name => array
+        """
+        with np.load(self.root / _day_dirname(day_idx) / f"{family}.npz") as fd:
+            keys = fd.files if keys is None else keys
+            return {key: fd[key] for key in keys}
+
+    def load_series(self, family: str, key: str, days: typing.Optional[typing.Iterable[int]] = None) -> np.ndarray:
+        """
+        Stacks the values of a metric over several days.
+
+        Args:
+            family (str): name of the metric family
+            key (str): name of the metric
+            days (list, optional): indices of the days to load. All written days are loaded if None.
+
+        Returns:
+            (np.ndarray): array whose first dimension is the day
+        """
+        days = self.days if days is None else list(days)
+        return np.stack([self.load_day(day_idx, family, [key])[key] for day_idx in days]) if days else np.zeros(0)
+
+    def load(self, keys: typing.Iterable[str]) -> typing.Dict[str, typing.Any]:
+        """Returns the values of some summary keys."""
+        return {key: self[key] for key in keys}
+
+    def __getitem__(self, key):
+        if key not in self._summary:
+            path = self.root / SUMMARY_DIRNAME / f"{key}.pkl"
+            if not path.exists():
+                raise KeyError(key)
+            with open(path, "rb") as fd:
+                self._summary[key] = dill.load(fd)
+        return self._summary[key]
+
+    def __iter__(self):
+        return iter(sorted(path.stem for path in (self.root / SUMMARY_DIRNAME).glob("*.pkl")))
+
+    def __len__(self):
+        return sum(1 for _ in self)
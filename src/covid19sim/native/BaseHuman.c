@@ -813,6 +813,64 @@ static PyObject*              BaseHuman_get_days_since_allergies(BaseHumanObject
 }
 
 
+/* Module-level Functions */
+
+/**
+ * Packs the timestamps of a sequence of Humans contiguously, so that the
+ * states of the whole population can be computed in a vectorized fashion.
+ * 
+ * Returns a bytes object of len(humans) * HUMAN_N_TIMESTAMPS doubles (see
+ * _native.h for their order).
+ */
+
+PyObject*                     BaseHuman_get_population_timestamps(PyObject* module, PyObject* humans){
+    PyObject*        seq;
+    PyObject*        ret;
+    PyObject**       items;
+    BaseHumanObject* h;
+    double*          buf;
+    Py_ssize_t       i, n;
+    (void)module;
+    
+    seq = PySequence_Fast(humans, "expected a sequence of Humans");
+    if(!seq)
+        return NULL;
+    
+    n     = PySequence_Fast_GET_SIZE(seq);
+    items = PySequence_Fast_ITEMS(seq);
+    ret   = PyBytes_FromStringAndSize(NULL, n*HUMAN_N_TIMESTAMPS*sizeof(double));
+    if(!ret)
+        goto fail;
+    
+    buf = (double*)PyBytes_AS_STRING(ret);
+    for(i=0;i<n;i++,buf+=HUMAN_N_TIMESTAMPS){
+        if(!PyObject_TypeCheck(items[i], &BaseHumanType)){
+            PyErr_SetString(PyExc_TypeError, "expected a sequence of Humans");
+            Py_CLEAR(ret);
+            goto fail;
+        }
+        
+        h       = (BaseHumanObject*)items[i];
+        buf[ 0] = h->ts_death;
+        buf[ 1] = h->ts_cold_symptomatic;
+        buf[ 2] = h->ts_flu_symptomatic;
+        buf[ 3] = h->ts_allergy_symptomatic;
+        buf[ 4] = h->ts_covid19_infection;
+        buf[ 5] = h->ts_covid19_infectious;
+        buf[ 6] = h->ts_covid19_symptomatic;
+        buf[ 7] = h->ts_covid19_recovery;
+        buf[ 8] = h->ts_covid19_immunity;
+        buf[ 9] = h->infectiousness_onset_days;
+        buf[10] = h->incubation_days;
+    }
+    
+    /* Abort path. */
+    fail:
+    Py_DECREF(seq);
+    return ret;
+}
+
+
 /**
  * PyMemberDef
  * 
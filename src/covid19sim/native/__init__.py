@@ -1,6 +1,26 @@
 import simpy
 import datetime
-from ._native import BaseEnvironment
+import numpy as np
+from ._native import BaseEnvironment, HUMAN_N_TIMESTAMPS, SECONDS_PER_EPHEMERIS_DAY, get_population_timestamps as _get_population_timestamps
+
+# layout of the rows returned by `get_population_timestamps` (see `_native.h`)
+POPULATION_TIMESTAMPS_DTYPE = np.dtype([
+    ("ts_death", np.float64),
+    ("ts_cold_symptomatic", np.float64),
+    ("ts_flu_symptomatic", np.float64),
+    ("ts_allergy_symptomatic", np.float64),
+    ("ts_covid19_infection", np.float64),
+    ("ts_covid19_infectious", np.float64),
+    ("ts_covid19_symptomatic", np.float64),
+    ("ts_covid19_recovery", np.float64),
+    ("ts_covid19_immunity", np.float64),
+    ("infectiousness_onset_days", np.float64),
+    ("incubation_days", np.float64),
+])
+assert len(POPULATION_TIMESTAMPS_DTYPE) == HUMAN_N_TIMESTAMPS
+
+# indices of the SEIR states returned by `get_seir_states` (same order as `Human.state`)
+SUSCEPTIBLE, EXPOSED, INFECTIOUS, REMOVED = range(4)
 
 
 class Environment(BaseEnvironment, simpy.Environment):
@@ -48,3 +68,37 @@ class Environment(BaseEnvironment, simpy.Environment):
         """
         return self.timestamp.isoformat()
 
+
+
+def get_population_timestamps(humans):
+    """
+    Reads the timestamps of many humans at once from the native layer.
+
+    Args:
+        humans (list): `BaseHuman` objects
+
+    Returns:
+        np.ndarray: read-only structured array of `POPULATION_TIMESTAMPS_DTYPE`, with one row per human
+    """
+    return np.frombuffer(_get_population_timestamps(humans), dtype=POPULATION_TIMESTAMPS_DTYPE)
+
+
+def get_seir_states(timestamps, ts_now):
+    """
+    Vectorized equivalent of the `is_susceptible`, `is_exposed`, `is_infectious` and `is_removed` getters.
+
+    Args:
+        timestamps (np.ndarray): rows returned by `get_population_timestamps`
+        ts_now (float): current simulation time, as POSIX timestamp (`env.now`)
+
+    Returns:
+        np.ndarray: SEIR state index (`SUSCEPTIBLE`, `EXPOSED`, `INFECTIOUS` or `REMOVED`) of each human
+    """
+    is_removed = (ts_now >= timestamps["ts_covid19_immunity"]) | (ts_now >= timestamps["ts_death"])
+    td_infected = ts_now - timestamps["ts_covid19_infection"]
+    infectiousness_onset_secs = timestamps["infectiousness_onset_days"] * SECONDS_PER_EPHEMERIS_DAY
+    states = np.full(len(timestamps), SUSCEPTIBLE, dtype=np.int8)
+    states[td_infected >= 0] = EXPOSED
+    states[(td_infected >= 0) & (td_infected >= infectiousness_onset_secs)] = INFECTIOUS
+    states[is_removed] = REMOVED
+    return states
@@ -31,6 +31,9 @@ extern "C" {
  */
 
 static PyMethodDef _native_METHODS[] = {
+    {"get_population_timestamps", (PyCFunction)BaseHuman_get_population_timestamps, METH_O,
+     "Packs the timestamps of a sequence of Humans into a bytes object of\n"
+     "HUMAN_N_TIMESTAMPS doubles per Human."},
     {NULL},  /* Sentinel */
 };
 
@@ -104,6 +107,7 @@ PyMODINIT_FUNC PyInit__native(void){
     ADDINTMACRO(SECONDS_PER_TROPICAL_YEAR);
     ADDINTMACRO(SECONDS_PER_LEAP_YEAR);
     ADDINTMACRO(HUMAN_SYMPTOM_SNEEZING);
+    ADDINTMACRO(HUMAN_N_TIMESTAMPS);
     #undef ADDINTMACRO
     
     
@@ -68,6 +68,19 @@
 
 #define HUMAN_SYMPTOM_SNEEZING 1<<0 /* Example */
 
+/**
+ * Number of doubles per Human in the buffer returned by
+ * get_population_timestamps(), in this order:
+ *
+ *     ts_death,
+ *     ts_cold_symptomatic,  ts_flu_symptomatic,    ts_allergy_symptomatic,
+ *     ts_covid19_infection, ts_covid19_infectious, ts_covid19_symptomatic,
+ *     ts_covid19_recovery,  ts_covid19_immunity,
+ *     infectiousness_onset_days, incubation_days
+ */
+
+#define HUMAN_N_TIMESTAMPS 11
+
 
 
 /* Extern "C" Guard */
@@ -85,6 +98,10 @@ extern PyTypeObject BaseEnvironmentType;
 extern PyTypeObject BaseHumanType;
 
 
+/* Module-level Functions */
+PyObject* BaseHuman_get_population_timestamps(PyObject* module, PyObject* humans);
+
+
 /* Data Structure and Constant Definitions */
 
 /**
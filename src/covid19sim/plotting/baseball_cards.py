@@ -18,6 +18,7 @@ from typing import Dict, List, Tuple
 
 from matplotlib import pyplot as plt
 
+from covid19sim.epidemiology.symptoms import count_symptoms
 from covid19sim.epidemiology.viral_load import viral_load_for_day
 from covid19sim.human import Human
 from covid19sim.log.event import Event
@@ -430,8 +431,8 @@ def get_symptom_history(human_snapshots: List[Human],
         if timestamp > time_end:
             break
 
-        true_symptoms.append(len(human.rolling_all_symptoms[0]))
-        obs_symptoms.append(len(human.rolling_all_reported_symptoms[0]))
+        true_symptoms.append(count_symptoms(human.rolling_all_symptoms[0]))
+        obs_symptoms.append(count_symptoms(human.rolling_all_reported_symptoms[0]))
         rl_timestamps.append(timestamp)
 
     return true_symptoms, obs_symptoms, rl_timestamps
@@ -6,6 +6,8 @@ from collections import Counter
 from matplotlib import pyplot as plt
 import scipy.stats as stats
 import datetime
+from covid19sim.utils.utils import load_tracker_data
+
 # Constants
 quebec_population = 8485000
 csv_path = "data/qc.csv"
@@ -65,7 +67,7 @@ for sim in os.listdir(sims_dir_path):
     sim_tracker_name = [str(f_name) for f_name in os.listdir(sim_path) if f_name.startswith("tracker_data")][0]
     sim_tracker_path = os.path.join(sim_path, sim_tracker_name)
     # Load the data
-    sim_tracker_data = pickle.load(open(sim_tracker_path, "rb"))
+    sim_tracker_data = load_tracker_data(sim_tracker_path)
     sim_prior_data = pickle.load(open(sim_priors_path, "rb"))
     # Parse data
     sim_dates, sim_deaths, sim_tests, sim_cases = parse_tracker(sim_tracker_data)
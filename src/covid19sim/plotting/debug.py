@@ -1,10 +1,11 @@
 import argparse
-import pickle
 import os
 import datetime
 from pathlib import Path
 import covid19sim.plotting.plot_infection_chains as infection_chains
 from covid19sim.plotting.baseball_cards import DebugDataLoader, generate_debug_plots
+from covid19sim.utils.utils import load_tracker_data
+
 
 def main(path, num_chains=10):
 
@@ -18,8 +19,7 @@ def main(path, num_chains=10):
     human_backups_path = os.path.join(data_path, "human_backups.hdf5")
     tracker_path = next(data_path.glob("tracker*.pkl"))
 
-    with open(tracker_path, "rb") as f:
-        pkl = pickle.load(f)
+    pkl = load_tracker_data(tracker_path)
 
     init_infected = [x['name'] for x in pkl['human_monitor'][datetime.date(2020, 2, 28)] if x['infection_timestamp'] == datetime.datetime(2020, 2, 28, 0, 0)]
     ids = infection_chains.plot(pkl, output_path, num_chains=num_chains, init_infected=init_infected)
@@ -1,9 +1,10 @@
 from pathlib import Path
 import argparse
-import pickle
 import numpy as np
 from collections import defaultdict
 import datetime
+from covid19sim.utils.utils import load_tracker_data
+
 
 def compute_early_warning(data) -> dict:
     """
@@ -122,6 +123,5 @@ if __name__ == "__main__":
 
     for run in runs:
         data_path = list(run.glob("tracker*.pkl"))[0]
-        with data_path.open("rb") as f:
-            data = pickle.load(f)
-            metrics: dict = get_metrics(data)
+        data = load_tracker_data(data_path)
+        metrics: dict = get_metrics(data)
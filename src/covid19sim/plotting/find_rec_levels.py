@@ -6,13 +6,14 @@ Instrunctions below in __main__ section.
 Further details in docs/find_rec-levels.md
 """
 import numpy as np
-import dill
 from collections import defaultdict
 import datetime
 import argparse
 from pathlib import Path
 from sklearn.metrics import confusion_matrix, classification_report, f1_score
 import pdb
+from covid19sim.utils.utils import load_tracker_data
+
 
 
 def proba_to_risk(probas, mapping):
@@ -426,7 +427,7 @@ if __name__ == "__main__":
     # ---------------------------------------
     # -----  Prepare Ground Truth Data  -----
     # ---------------------------------------
-    data = dill.load(open(opts.data, "rb"))
+    data = load_tracker_data(opts.data)
     print("Loaded", opts.data)
     print(
         "\n".join("{:35}: {}".format(k, data_str(v)) for k, v in sorted(data.items()))
@@ -1,10 +1,11 @@
-import pickle
 import os
 import datetime
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import pathlib
+from covid19sim.utils.utils import load_tracker_data
+
 
 retirement_age = 65
 n_bootstraps = 100
@@ -24,9 +25,7 @@ disability_weights = {
 
 
 def load_tracker(path):
-    with open(path, 'rb') as f:
-        tracker_data = pickle.load(f)
-    return tracker_data
+    return load_tracker_data(path)
 
 
 def load_life_expectancies(path):
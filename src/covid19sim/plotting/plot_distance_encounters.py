@@ -1,8 +1,9 @@
 import sys
 import os
-import pickle
 import math
 import matplotlib.pyplot as plt
+from covid19sim.utils.utils import load_tracker_data
+
 
 def proportion(l):
     x = [v/sum(l) for v in l]
@@ -22,8 +23,7 @@ def plot_distance(file_name, outdir):
     out2distance = {'packing term':[], 'encounter term':[], 'social distancing term':[], 'distance':[]}
     in2distance = {'packing term':[], 'encounter term':[], 'social distancing term':[], 'distance':[]}
 
-    with open(file_name, 'rb') as fi:
-        data = pickle.load(fi)['encounter_distances']
+    data = load_tracker_data(file_name, ['encounter_distances'])['encounter_distances']
 
     for line in data:
         items = line.strip().split('\t')
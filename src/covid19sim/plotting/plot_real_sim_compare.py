@@ -7,6 +7,8 @@ import numpy as np
 import pandas as pd
 from collections import Counter
 from matplotlib import pyplot as plt
+from covid19sim.utils.utils import load_tracker_data
+
 
 # Constants
 quebec_population = 8485000
@@ -60,7 +62,7 @@ if not use_cache:
         sim_priors_path = os.path.join(source_path, "train_priors.pkl")
         sim_tracker_path = glob.glob(os.path.join(source_path, "*.pkl"))[0]
 
-        sim_tracker_data = pickle.load(open(sim_tracker_path, "rb"))
+        sim_tracker_data = load_tracker_data(sim_tracker_path)
         sim_prior_data = pickle.load(open(sim_priors_path, "rb"))
         sim_dates, sim_deaths, sim_tests, sim_cases = parse_tracker(sim_tracker_data)
         sim_hospitalizations = [float(x)*100/sim_tracker_data['n_humans'] for x in sim_prior_data['hospitalization_per_day']]
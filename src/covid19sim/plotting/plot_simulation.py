@@ -6,10 +6,11 @@ import pickle
 from collections import Counter
 from matplotlib import pyplot as plt
 import pandas as pd 
+from covid19sim.utils.utils import load_tracker_data
 
 path = "output/sim_v2_people-1000_days-150_init-0.002_uptake--1.0_seed-0_20200715-200646_797000/tracker_data_n_1000_seed_0_20200715-201949_.pkl"
 path2 = "output/sim_v2_people-1000_days-150_init-0.002_uptake--1.0_seed-0_20200715-200646_797000/train_priors.pkl"
-tracker_data = pickle.load(open(path, "rb"))
+tracker_data = load_tracker_data(path)
 prior_data = pickle.load(open(path2, "rb"))
 
 monitor = tracker_data['human_monitor']
@@ -80,21 +80,21 @@ class PlotTracker(object):
         Returns:
             [type]: [description]
         """
-        import dill, os, sys
+        import os
+        from covid19sim.utils.utils import load_tracker_data
 
         if os.path.exists(fname):
-            with open(fname, 'rb') as f:
-                try:
-                    return dill.load(f)
-                except IOError as e:
-                    print("I/O error({0}): {1}".format(e.errno, e.strerror))
-                    exit(0)
-                except ModuleNotFoundError as e:  # handle other exceptions such as attribute errors
-                    print("I/O error({0}): {1}".format(e.errno, e.strerror))
-                    exit(1)
-                except:# handle other exceptions such as attribute errors
-                    print("Dill load, unexpected error:", sys.exc_info()[0])
-                    exit(2)
+            try:
+                return load_tracker_data(fname)
+            except IOError as e:
+                print("I/O error({0}): {1}".format(e.errno, e.strerror))
+                exit(0)
+            except ModuleNotFoundError as e:  # handle other exceptions such as attribute errors
+                print("I/O error({0}): {1}".format(e.errno, e.strerror))
+                exit(1)
+            except:# handle other exceptions such as attribute errors
+                print("Dill load, unexpected error:", sys.exc_info()[0])
+                exit(2)
         else:
             print('Graphics: Error file: {} does not exist'.format(fname))
             sys.exit(3)
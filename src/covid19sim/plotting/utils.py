@@ -3,7 +3,8 @@ import os
 import math
 import warnings
 import multiprocessing as mp
-import pickle
+import dill
+import shutil
 from covid19sim.plotting.plot_rt import PlotRt
 from pathlib import Path
 import yaml
@@ -16,7 +17,10 @@ import random
 import matplotlib.pyplot as plt
 
 from covid19sim.plotting.extract_tracker_metrics import _daily_false_quarantine, _daily_false_susceptible_recovered
-from covid19sim.utils.utils import is_app_based_tracing_intervention
+from covid19sim.utils.utils import is_app_based_tracing_intervention, load_tracker_data
+
+# name of the folder where `read_tracker_keys` caches the tracker data of a run
+RUN_CACHE_DIRNAME = ".tracker_cache"
 
 def env_to_path(path):
     """Transorms an environment variable mention in a json
@@ -71,9 +75,7 @@ def get_data(filename=None, data=None):
     if data:
         return data
     elif filename:
-        with open(filename, "rb") as f:
-            data = pickle.load(f)
-        return data
+        return load_tracker_data(filename)
     else:
         raise ValueError("Please provide either filename, or data")
 
@@ -156,8 +158,7 @@ def get_all_states(filenames):
 def get_rec_levels(filename=None, data=None, normalized=False):
     if data is None:
         if filename is not None:
-            with open(filename, "rb") as f:
-                data = pickle.load(f)
+            data = load_tracker_data(filename)
         else:
             raise ValueError("filename and data arguments are None")
 
@@ -213,8 +214,7 @@ def get_all_rec_levels(filenames=None, data=None, normalized=False):
 
 
 def get_intervention_levels(filename):
-    with open(filename, "rb") as f:
-        data = pickle.load(f)
+    data = load_tracker_data(filename)
 
     humans_rec_level = data["humans_intervention_level"]
     intervention_day = data["intervention_day"]
@@ -268,7 +268,23 @@ def absolute_file_paths(directory):
     return to_return
 
 
-def get_all_data(base_path, keep_pkl_keys, multi_thread=False, limit=100000):
+def get_all_data(base_path, keep_pkl_keys, multi_thread=False, limit=100000, multi_process=False, use_run_cache=False):
+    """
+    Loads the configuration and the tracker data of all runs in `base_path`.
+
+    Args:
+        base_path (str): path to the methods' folders (`<base_path>/<method>/<run>/tracker*.pkl`)
+        keep_pkl_keys (set): keys of the tracker data to load
+        multi_thread (bool, optional): load runs in a thread pool. Defaults to False.
+        limit (int, optional): maximum number of runs per method. Defaults to 100000.
+        multi_process (bool, optional): load runs in a process pool, for which unpickling is not limited by the GIL.
+            Defaults to False.
+        use_run_cache (bool, optional): read and write the loaded keys in a cache in each run's folder
+            (see `read_tracker_keys`). Defaults to False.
+
+    Returns:
+        (dict): method => run => {"conf": configuration, "pkl": tracker data}
+    """
     base_path = Path(base_path).resolve()
     assert base_path.exists()
     methods = [
@@ -297,11 +313,15 @@ def get_all_data(base_path, keep_pkl_keys, multi_thread=False, limit=100000):
 
         try:
             runs = runs[:limit]
-            if multi_thread:
+            if multi_thread or multi_process:
                 print("Loading runs in", m.name, "...", end="\r")
-                with concurrent.futures.ThreadPoolExecutor() as executor:
+                if multi_process:
+                    executor = concurrent.futures.ProcessPoolExecutor()
+                else:
+                    executor = concurrent.futures.ThreadPoolExecutor()
+                with executor:
                     futures = [
-                        executor.submit(thread_read_run, (r, keep_pkl_keys))
+                        executor.submit(thread_read_run, (r, keep_pkl_keys, use_run_cache))
                         for r in runs
                     ]
                     runs_data = [f.result() for f in futures]
@@ -320,7 +340,7 @@ def get_all_data(base_path, keep_pkl_keys, multi_thread=False, limit=100000):
                         "... ({}/{})".format(i + 1, len(runs)),
                         end="\r",
                     )
-                    r, conf, pkl = thread_read_run((r, keep_pkl_keys))
+                    r, conf, pkl = thread_read_run((r, keep_pkl_keys, use_run_cache))
                     sr = str(r)
                     all_data[sm][sr] = {}
                     all_data[sm][sr]["conf"] = conf
@@ -344,17 +364,68 @@ def default_to_regular_dict(d):
     return d
 
 
+def read_tracker_keys(tracker_path, keys, use_cache=False):
+    """
+    Reads some keys of the tracker data dumped by `dump_tracker_data`.
+
+    If `use_cache` is True, loaded keys are cached, one file per key, in the `RUN_CACHE_DIRNAME` folder next to the tracker data,
+    so that they are not decoded again the next time they are requested. The cache is cleared when the
+    tracker data is written again.
+
+    Args:
+        tracker_path (pathlib.Path): path to the tracker data
+        keys (iterable): keys to read
+        use_cache (bool, optional): read and write the cache. Defaults to False.
+
+    Returns:
+        (dict): key => value, for the requested keys that were dumped
+    """
+    if not use_cache:
+        return {k: default_to_regular_dict(v) for k, v in load_tracker_data(tracker_path, keys).items()}
+
+    cache_path = tracker_path.parent / RUN_CACHE_DIRNAME
+    stat = tracker_path.stat()
+    meta = {"tracker": tracker_path.name, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "missing_keys": []}
+    cached_meta = None
+    if (cache_path / "meta.yaml").exists():
+        with (cache_path / "meta.yaml").open("r") as f:
+            cached_meta = yaml.safe_load(f)
+    if cached_meta is None or any(cached_meta.get(k) != meta[k] for k in ["tracker", "size", "mtime_ns"]):
+        shutil.rmtree(cache_path, ignore_errors=True)
+        cache_path.mkdir()
+        cached_meta = meta
+
+    pkl = {}
+    missing_keys = set(cached_meta["missing_keys"])
+    keys_to_load = []
+    for k in keys:
+        if (cache_path / f"{k}.pkl").exists():
+            with (cache_path / f"{k}.pkl").open("rb") as f:
+                pkl[k] = dill.load(f)
+        elif k not in missing_keys:
+            keys_to_load.append(k)
+
+    if keys_to_load:
+        loaded = load_tracker_data(tracker_path, keys_to_load)
+        for k in keys_to_load:
+            if k not in loaded:
+                missing_keys.add(k)
+                continue
+            pkl[k] = default_to_regular_dict(loaded[k])
+            with (cache_path / f"{k}.pkl").open("wb") as f:
+                dill.dump(pkl[k], f)
+        cached_meta["missing_keys"] = sorted(missing_keys)
+        with (cache_path / "meta.yaml").open("w") as f:
+            yaml.safe_dump(cached_meta, f)
+    return pkl
+
+
 def thread_read_run(args):
-    r, keep_pkl_keys = args
+    r, keep_pkl_keys, use_run_cache = args
     with (r / "full_configuration.yaml").open("r") as f:
         conf = yaml.safe_load(f)
-    with open(str(list(r.glob("tracker*.pkl"))[0]), "rb") as f:
-        pkl_data = pickle.load(f)
-        pkl = {
-            k: default_to_regular_dict(v)
-            for k, v in pkl_data.items()
-            if k in keep_pkl_keys
-        }
+    tracker_path = list(r.glob("tracker*.pkl"))[0]
+    pkl = read_tracker_keys(tracker_path, keep_pkl_keys, use_cache=use_run_cache)
 
     return (r, conf, pkl)
 
@@ -412,7 +483,7 @@ def get_all(filename_types=None, pkl_types=None, labels=[], normalized=False):
 def get_fq_r(filename=None, data=None, normalized=False):
     assert filename is not None or data is not None
     if data is None:
-        data = pickle.load(open(filename, "rb"))
+        data = load_tracker_data(filename)
 
     x = get_all_false(data=data, normalized=normalized)
     x = [i.mean() for i in x]
@@ -19,6 +19,7 @@ from covid19sim.locations.city import City
 from covid19sim.utils.env import Env
 from covid19sim.utils.constants import SECONDS_PER_DAY, SECONDS_PER_HOUR
 from covid19sim.log.console_logger import ConsoleLogger
+from covid19sim.inference.heavy_jobs import clear_risk_inference_cache
 from covid19sim.inference.server_utils import DataCollectionServer
 from covid19sim.utils.utils import dump_conf, dump_tracker_data, extract_tracker_data, parse_configuration, log
 
@@ -144,6 +145,29 @@ def main(conf: DictConfig):
     type_of_run = _get_intervention_string(conf)
     conf['INTERVENTION'] = type_of_run
     log(f"Type of run: {type_of_run}", logfile)
+
+    # population split across several processes
+    if conf.get('N_SHARDS', 1) > 1:
+        assert not conf['COLLECT_TRAINING_DATA'], "training data collection isn't supported with N_SHARDS > 1"
+        conf["outfile"] = outfile
+        summary = simulate_sharded(
+            n_shards=conf['N_SHARDS'],
+            n_people=conf["n_people"],
+            init_fraction_sick=conf["init_fraction_sick"],
+            start_time=conf["start_time"],
+            simulation_days=conf["simulation_days"],
+            outfile=conf["outfile"],
+            out_chunk_size=conf["out_chunk_size"],
+            seed=conf["seed"],
+            conf=conf,
+            logfile=logfile,
+            dump_tracker_data=True,
+        )
+        dump_conf(conf, "{}/full_configuration.yaml".format(conf["outdir"]))
+        log(f"Humans moved between shards: {summary['n_migrations']}", logfile)
+        dump_tracker_data(summary, conf["outdir"], f"sharded_summary_n_{conf['n_people']}_seed_{conf['seed']}.pkl")
+        return conf
+
     if conf['COLLECT_TRAINING_DATA']:
         data_output_path = os.path.join(conf["outdir"], "train.zarr")
         collection_server = DataCollectionServer(
@@ -151,6 +175,7 @@ def main(conf: DictConfig):
             config_backup=conf,
             human_count=conf['n_people'],
             simulation_days=conf['simulation_days'],
+            data_format=conf.get('TRAINING_DATA_FORMAT', "columnar"),
         )
         collection_server.start()
     else:
@@ -199,6 +224,8 @@ def main(conf: DictConfig):
         filename = f"tracker_data_n_{conf['n_people']}_seed_{conf['seed']}_{timenow}.pkl"
         data = extract_tracker_data(city.tracker, conf)
         dump_tracker_data(data, conf["outdir"], filename)
+        if city.tracker.output_writer is not None:
+            city.tracker.output_writer.write_summary(data)
     else:
         # ------------------------------------------------------
         # -----     Tune: Write logs And Tacker Data       -----
@@ -210,6 +237,8 @@ def main(conf: DictConfig):
         filename = f"tracker_data_n_{conf['n_people']}_seed_{conf['seed']}_{timenow}.pkl"
         data = extract_tracker_data(city.tracker, conf)
         dump_tracker_data(data, conf["outdir"], filename)
+        if city.tracker.output_writer is not None:
+            city.tracker.output_writer.write_summary(data)
     # Shutdown the data collection server if one's running
     if collection_server is not None:
         collection_server.stop_gracefully()
@@ -224,7 +253,7 @@ def main(conf: DictConfig):
     return conf
 
 
-def simulate(
+def setup_simulation(
     n_people: int = 1000,
     init_fraction_sick: float = 0.01,
     start_time: datetime.datetime = datetime.datetime(2020, 2, 28, 0, 0),
@@ -234,9 +263,11 @@ def simulate(
     seed: int = 0,
     conf: typing.Optional[typing.Dict] = None,
     logfile: str = None,
+    start_processes: bool = True,
 ):
     """
-    Runs a simulation.
+    Builds the environment and the city of a simulation, and registers their processes.
+    Arguments are the same as `simulate`.
 
     Args:
         n_people (int, optional): population size in simulation. Defaults to 1000.
@@ -248,9 +279,12 @@ def simulate(
         seed (int, optional): [description]. Defaults to 0.
         conf (dict): yaml configuration of the experiment.
         logfile (str): filepath where the console output and final tracked metrics will be logged. Prints to the console only if None.
+        start_processes (bool, optional): if False, the processes of the city and its humans are not registered, e.g. to
+            split them across shards (see `covid19sim.locations.sharding`). Defaults to True.
 
     Returns:
-        city (covid19sim.locations.city.City): The city object referencing people, locations, and the tracker post-simulation.
+        env (covid19sim.utils.env.Env): environment ready to be run
+        city (covid19sim.locations.city.City): The city object referencing people, locations, and the tracker.
     """
 
     if conf is None:
@@ -286,7 +320,6 @@ def simulate(
 
     # adjust the simulation days
     conf['simulation_days'] += conf['COVID_START_DAY']
-    simulation_days = conf['simulation_days']
 
     console_logger = ConsoleLogger(frequency=SECONDS_PER_DAY, logfile=logfile, conf=conf)
     logging.root.setLevel(getattr(logging, conf["LOGGING_LEVEL"].upper()))
@@ -302,18 +335,21 @@ def simulate(
     # we might need to reset the state of the clusters held in shared memory (server or not)
     if conf.get("RESET_INFERENCE_SERVER", False):
         if conf.get("USE_INFERENCE_SERVER"):
-            inference_frontend_address = conf.get("INFERENCE_SERVER_ADDRESS", None)
             print("requesting cluster reset from inference server...")
-            from covid19sim.inference.server_utils import InferenceClient
-
-            temporary_client = InferenceClient(
-                server_address=inference_frontend_address
-            )
-            temporary_client.request_reset()
+            try:
+                city.get_inference_client_pool().request_reset()
+            except BaseException:
+                city.close_inference_client_pool()
+                raise
         else:
             from covid19sim.inference.heavy_jobs import DummyMemManager
 
             DummyMemManager.global_cluster_map = {}
+        # the risk histories inferred from the previous clusters cannot be reused
+        clear_risk_inference_cache(city.humans)
+
+    if not start_processes:
+        return env, city
 
     # Initiate city process, which runs every hour
     env.process(city.run(SECONDS_PER_HOUR, outfile))
@@ -324,11 +360,135 @@ def simulate(
 
     env.process(console_logger.run(env, city=city))
 
-    # Run simulation until termination
-    env.run(until=env.ts_initial + simulation_days * SECONDS_PER_DAY)
+    return env, city
+
+
+def simulate(
+    n_people: int = 1000,
+    init_fraction_sick: float = 0.01,
+    start_time: datetime.datetime = datetime.datetime(2020, 2, 28, 0, 0),
+    simulation_days: int = 30,
+    outfile: typing.Optional[typing.AnyStr] = None,
+    out_chunk_size: typing.Optional[int] = None,
+    seed: int = 0,
+    conf: typing.Optional[typing.Dict] = None,
+    logfile: str = None,
+):
+    """
+    Runs a simulation.
+
+    Args:
+        n_people (int, optional): population size in simulation. Defaults to 1000.
+        init_fraction_sick (float, optional): population fraction initialized with Covid-19. Defaults to 0.01.
+        start_time (datetime, optional):  Initial calendar date. Defaults to February 28, 2020.
+        simulation_days (int, optional): Number of days to run the simulation. Defaults to 10.
+        outfile (str, optional): Location to write logs. Defaults to None.
+        out_chunk_size (int, optional): size of chunks to write in logs. Defaults to None.
+        seed (int, optional): [description]. Defaults to 0.
+        conf (dict): yaml configuration of the experiment.
+        logfile (str): filepath where the console output and final tracked metrics will be logged. Prints to the console only if None.
+
+    Returns:
+        city (covid19sim.locations.city.City): The city object referencing people, locations, and the tracker post-simulation.
+    """
+    env, city = setup_simulation(
+        n_people=n_people,
+        init_fraction_sick=init_fraction_sick,
+        start_time=start_time,
+        simulation_days=simulation_days,
+        outfile=outfile,
+        out_chunk_size=out_chunk_size,
+        seed=seed,
+        conf=conf,
+        logfile=logfile,
+    )
+
+    # Run simulation until termination. The connections to the inference server are closed even if it fails.
+    try:
+        env.run(until=env.ts_initial + city.conf['simulation_days'] * SECONDS_PER_DAY)
+    finally:
+        city.close_inference_client_pool()
+    counters = city.risk_inference_counters
+    if counters.skipped:
+        log(f"Skipped {counters.skipped} of {counters.inferred + counters.skipped} risk inferences "
+            f"with unchanged inputs ({counters.skip_ratio:.1%})", logfile)
 
     return city
 
 
+def _dump_shard_tracker_data(city):
+    """
+    Writes the tracker data of a shard in its own sub-directory of `outdir`.
+
+    Args:
+        city (covid19sim.locations.city.City): city simulated by the shard
+    """
+    conf = city.conf
+    outdir = os.path.join(conf["outdir"], f"shard_{conf['SHARD_ID']}")
+    timenow = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    filename = f"tracker_data_n_{conf['n_people']}_seed_{conf['seed']}_{timenow}.pkl"
+    data = extract_tracker_data(city.tracker, conf)
+    dump_tracker_data(data, outdir, filename)
+
+
+def simulate_sharded(
+    n_shards: int,
+    n_people: int = 1000,
+    init_fraction_sick: float = 0.01,
+    start_time: datetime.datetime = datetime.datetime(2020, 2, 28, 0, 0),
+    simulation_days: int = 30,
+    outfile: typing.Optional[typing.AnyStr] = None,
+    out_chunk_size: typing.Optional[int] = None,
+    seed: int = 0,
+    conf: typing.Optional[typing.Dict] = None,
+    logfile: str = None,
+    dump_tracker_data: bool = False,
+):
+    """
+    Runs a simulation whose population is split into `n_shards` regions, each simulated by its own process.
+    The population is synthesized once, and humans move between regions along with their state at every hour of
+    simulated time (see `covid19sim.locations.sharding`).
+
+    Args:
+        n_shards (int): number of regions to simulate in parallel
+        dump_tracker_data (bool, optional): if True, each shard writes its tracker data in `outdir/shard_<id>`. Defaults to False.
+        Other arguments are the same as `simulate`.
+
+    Returns:
+        (dict): population-wide epidemic curves along with the summary of each shard
+    """
+    from covid19sim.locations.sharding import aggregate_shard_summaries, check_sharded_conf, run_sharded
+
+    if conf is None:
+        conf = {}
+    check_sharded_conf(conf, n_shards)
+
+    env, city = setup_simulation(
+        n_people=n_people,
+        init_fraction_sick=init_fraction_sick,
+        start_time=start_time,
+        simulation_days=simulation_days,
+        outfile=outfile,
+        out_chunk_size=out_chunk_size,
+        seed=seed,
+        conf=conf,
+        logfile=logfile,
+        start_processes=False,
+    )
+    # each shard opens its own connections to the inference server
+    city.close_inference_client_pool()
+
+    summaries = run_sharded(
+        city,
+        n_shards,
+        end_time=env.ts_initial + city.conf['simulation_days'] * SECONDS_PER_DAY,
+        epoch=conf.get('CROSS_SHARD_SYNC_SECONDS', SECONDS_PER_HOUR),
+        outfile=outfile,
+        on_finish=_dump_shard_tracker_data if dump_tracker_data else None,
+        logfile=logfile,
+    )
+    return aggregate_shard_summaries(summaries)
+
+
 if __name__ == "__main__":
     main()
@@ -66,6 +66,91 @@ class HouseType(object):
         self.n_people_generation = [n_grandparents, n_parents, n_kids]
         assert sum(self.n_people_generation) == self.n_humans, "size does not match"
 
+class HumanPool(object):
+    """
+    Humans that do not have a household allocated yet, grouped by age bin.
+
+    Humans of a bin are kept in a list from which a human is removed by moving the last human of the bin in its place,
+    and the position of each human is indexed, so that drawing, removing or putting back a human is O(1).
+    The number of humans left in each bin of `bins` (sorted by age) is kept in the array `counts`.
+    """
+    def __init__(self, humans):
+        """
+        Args:
+            humans (dict): keys are age bins (tuple) and values are a list of covid19sim.Human object of that age
+        """
+        self.bins = sorted(set(humans.keys()) | set(AGE_BIN_WIDTH_5), key=lambda x:x[0])
+        self.bin_index = {bin: i for i, bin in enumerate(self.bins)}
+        self._humans = [list(humans.get(bin, [])) for bin in self.bins]
+        self._positions = {human: (i, j) for i, bin_humans in enumerate(self._humans) for j, human in enumerate(bin_humans)}
+        self.counts = np.array([len(bin_humans) for bin_humans in self._humans], dtype=np.int64)
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, human):
+        return human in self._positions
+
+    def count(self, bin):
+        """
+        Returns:
+            (int): number of humans left in `bin`
+        """
+        return int(self.counts[self.bin_index[bin]])
+
+    def get_counts(self, bins):
+        """
+        Returns:
+            (np.array): number of humans left in each of `bins`
+        """
+        return self.counts[[self.bin_index[bin] for bin in bins]]
+
+    def get_humans(self, bin):
+        """
+        Returns:
+            (list): a copy of the humans left in `bin`
+        """
+        return list(self._humans[self.bin_index[bin]])
+
+    def draw(self, bin, rng):
+        """
+        Removes a human drawn uniformly at random from `bin`.
+
+        Args:
+            bin (tuple): age bin to draw from. It should not be empty.
+            rng (np.random.RandomState): Random number generator
+
+        Returns:
+            (covid19sim.human.Human): the drawn human
+        """
+        bin_humans = self._humans[self.bin_index[bin]]
+        human = bin_humans[rng.randint(len(bin_humans))]
+        self.remove(human)
+        return human
+
+    def remove(self, human):
+        """
+        Removes `human` from its bin.
+        """
+        i, j = self._positions.pop(human)
+        bin_humans = self._humans[i]
+        last_human = bin_humans.pop()
+        if last_human is not human:
+            bin_humans[j] = last_human
+            self._positions[last_human] = (i, j)
+        self.counts[i] -= 1
+
+    def add(self, human):
+        """
+        Puts `human` back in its age bin, if it is not there already.
+        """
+        if human in self._positions:
+            return
+        i = self.bin_index[human.age_bin_width_5.bin]
+        self._positions[human] = (i, len(self._humans[i]))
+        self._humans[i].append(human)
+        self.counts[i] += 1
+
 def get_humans_with_age(city, age_histogram, conf, rng):
     """
     Creats human objects corresponding to the numbers in `age_histogram`.
@@ -660,7 +745,7 @@ def assign_households_to_humans(humans, city, conf, logfile=None):
     assert abs(sum(P_TYPES) - 1) < 1e-2, "Probabilities do not sum to 1."
 
     n_people = city.n_people
-    unassigned_humans = humans
+    unassigned_humans = HumanPool(humans)
     age_bins = sorted(humans.keys(), key=lambda x:x[0])
     allocated_humans = []
 
@@ -675,7 +760,7 @@ def assign_households_to_humans(humans, city, conf, logfile=None):
 
     assigned_to_collectives = []
     for bin, P in collectives:
-        for human in unassigned_humans[bin]:
+        for human in unassigned_humans.get_humans(bin):
             if city.rng.random() < P:
                 assigned_to_collectives.append((bin, human))
 
@@ -685,7 +770,7 @@ def assign_households_to_humans(humans, city, conf, logfile=None):
     for bin, human in assigned_to_collectives:
         res = city.rng.choice(city.senior_residences, size=1).item()
         allocated_humans = _assign_household(human, res, allocated_humans)
-        unassigned_humans[bin].remove(human)
+        unassigned_humans.remove(human)
 
     # presample houses equal to the number of houses as per census
     n_houses_approx = math.ceil(n_people / AVG_HOUSEHOLD_SIZE)
@@ -728,12 +813,12 @@ def assign_households_to_humans(humans, city, conf, logfile=None):
     kid_keys = [n for n, houses in unallocated_houses.items() if type(n) == int and n > 0 and len(houses) > 0]
 
     # failure mode
-    start_search_for_kids = sum(len(unassigned_humans[bin]) for bin in KID_BINS + OTHER_MID_BINS) > 0
+    start_search_for_kids = unassigned_humans.get_counts(KID_BINS + OTHER_MID_BINS).sum() > 0
     random_allocation_of_kids = False
 
     while start_search_for_kids and n_failed_attempts < MAX_FAILED_ATTEMPTS_ALLOWED:
         n_kids_needed = sum(len(unallocated_houses[kid_key]) for kid_key in kid_keys)
-        valid_kid_bins = [bin for bin in SEARCH_BINS if len(unassigned_humans[bin]) > 0]
+        valid_kid_bins = [bin for bin in SEARCH_BINS if unassigned_humans.count(bin) > 0]
 
         # expand the search to middle generation
         if n_kids_needed != 0 and len(valid_kid_bins) == 0:
@@ -746,7 +831,7 @@ def assign_households_to_humans(humans, city, conf, logfile=None):
             continue
 
         # allocation succesful in regards to parent-kid constraints
-        _valid_bins = [bin for bin in KID_BINS if len(unassigned_humans[bin]) > 0]
+        _valid_bins = [bin for bin in KID_BINS if unassigned_humans.count(bin) > 0]
         if n_kids_needed == 0 and len(_valid_bins) == 0:
             break
 
@@ -766,7 +851,7 @@ def assign_households_to_humans(humans, city, conf, logfile=None):
 
     if start_search_for_kids and n_failed_attempts < MAX_FAILED_ATTEMPTS_ALLOWED:
         assert sum(len(houses) for n_kids, houses in unallocated_houses.items() if n_kids > 0) == 0, "kids remain to be allocated"
-        assert sum(len(unassigned_humans[kid_bin]) for kid_bin in KID_BINS) == 0, "kids remain to be allocated"
+        assert unassigned_humans.get_counts(KID_BINS).sum() == 0, "kids remain to be allocated"
     elif not start_search_for_kids:
         log("Not searching for kids because there are none", logfile)
     else:
@@ -804,15 +889,15 @@ def assign_households_to_humans(humans, city, conf, logfile=None):
     if not start_search_for_kids or n_failed_attempts == 2 * MAX_FAILED_ATTEMPTS_ALLOWED or random_allocation_of_kids:
         # something is wrong with the algo.
         log(f"Could not find suitable housing for the population. Allocating solo residences.\nFailed attempt - {n_failed_attempts}. Total allocated:{len(allocated_humans)}", logfile)
-        for bin, humans in unassigned_humans.items():
-            for human in humans:
-                unassigned_humans[bin].remove(human)
+        for bin in unassigned_humans.bins:
+            for human in unassigned_humans.get_humans(bin):
+                unassigned_humans.remove(human)
                 housetype = HouseType("solo", 0, 1, P_HOUSEHOLD_SIZE[0])
                 housetype.random = True
                 allocated_humans = create_and_assign_household([human], housetype, conf, city, allocated_humans)
     else:
         assert len(allocated_humans) == city.n_people, "assigned humans and total population do not add up"
-        assert sum(len(val) for x,val in unassigned_humans.items()) == 0, "there are unassigned humans in the list"
+        assert len(unassigned_humans) == 0, "there are unassigned humans in the list"
         assert len(city.households) > 0, "no house generated"
         assert all(not all(human.age < MAX_AGE_CHILDREN for human in house.residents) for house in city.households), "house with only children allocated"
 
@@ -867,7 +952,7 @@ def _sample_other_residents(housetype, unassigned_humans, rng, conf, with_kid=No
 
     Args:
         housetype (HouseType): type of house to assign humans to.
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
         rng (np.random.RandomState): Random number generator
         conf (dict): yaml configuration of the experiment
         with_kid (covid19sim.human.Human): a presampled kid. Default to None.
@@ -884,7 +969,7 @@ def _sample_other_residents(housetype, unassigned_humans, rng, conf, with_kid=No
     AGE_DIFFERENCE_BETWEEN_PARENT_AND_KID = conf['AGE_DIFFERENCE_BETWEEN_PARENT_AND_KID']
     P_CONTACT_HOUSE = np.array(conf['P_CONTACT_MATRIX_HOUSEHOLD'])
 
-    valid_age_bins = [x for x, val in unassigned_humans.items() if len(val) >= 1]
+    valid_age_bins = [x for x, n in zip(unassigned_humans.bins, unassigned_humans.counts) if n >= 1]
     if with_kid is not None:
         n_grandparents, n_parents, n_kids = housetype.n_people_generation
 
@@ -894,7 +979,7 @@ def _sample_other_residents(housetype, unassigned_humans, rng, conf, with_kid=No
         else:
             valid_younger_bins = _get_valid_bins(valid_age_bins, max_age=MAX_AGE_CHILDREN + 5, inclusive=True)
         # check if there are enough kids
-        if sum(len(unassigned_humans[bin]) for bin in valid_younger_bins) < n_kids-1:
+        if unassigned_humans.get_counts(valid_younger_bins).sum() < n_kids-1:
             return [], unassigned_humans
 
         kids = _sample_n_kids(valid_younger_bins, conf, unassigned_humans, rng, size=n_kids-1, with_kid=with_kid)
@@ -968,7 +1053,7 @@ def _sample_n_parents(valid_age_bins, conf, unassigned_humans, rng, n, p_bin):
     Args:
         valid_age_bins (list): age bins that qualify to sample humans
         conf (dict): yaml configuration of the experiment
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
         rng (np.random.RandomState): Random number generator
         n (int): number of kids to sample. Defaults to 0.
         p_bin (list): probability to sample a bin in `valid_age_bins`. Defaults to None.
@@ -991,8 +1076,7 @@ def _sample_n_parents(valid_age_bins, conf, unassigned_humans, rng, n, p_bin):
     # single parent
     if n == 1:
         older_bin = _random_choice(valid_age_bins, rng, size=1, P=p_bin)[0]
-        parent = rng.choice(unassigned_humans[older_bin], size=1).item()
-        unassigned_humans[older_bin].remove(parent)
+        parent = unassigned_humans.draw(older_bin, rng)
         sampled_parents = [parent]
 
     # n=2 couple parent
@@ -1011,7 +1095,7 @@ def _sample_couple(valid_age_bins, conf, unassigned_humans, rng, p_bin=None, ret
     Args:
         valid_age_bins (list): age bins that qualify to sample humans
         conf (dict): yaml configuration of the experiment
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
         rng (np.random.RandomState): Random number generator
         n (int): number of kids to sample. Defaults to 0.
         p_bin (list): probability to sample a bin in `valid_age_bins`. Defaults to None.
@@ -1023,13 +1107,13 @@ def _sample_couple(valid_age_bins, conf, unassigned_humans, rng, p_bin=None, ret
     ASSORTATIVITY_STRENGTH = conf['HOUSEHOLD_ASSORTATIVITY_STRENGTH']
 
     # couple can be in two consecutive bins
-    min_couple_single_bins = [(x,x) for x in valid_age_bins if len(unassigned_humans[x]) >= 2]
+    min_couple_single_bins = [(x,x) for x in valid_age_bins if unassigned_humans.count(x) >= 2]
 
-    age_bins = sorted(unassigned_humans.keys(), key=lambda x:x[0])
+    age_bins = unassigned_humans.bins
     sequential_couple_bins = [
                             (x,y) for x,y in zip(age_bins, age_bins[1:]) \
-                            if (len(unassigned_humans[x]) >= 1
-                                and len(unassigned_humans[y]) >= 1
+                            if (unassigned_humans.count(x) >= 1
+                                and unassigned_humans.count(y) >= 1
                                 and x in valid_age_bins
                                 and y in valid_age_bins)
                             ]
@@ -1058,11 +1142,8 @@ def _sample_couple(valid_age_bins, conf, unassigned_humans, rng, p_bin=None, ret
 
     two_bins = _random_choice(valid_couple_bins, rng, size=1, P=p_couple)[0]
 
-    human1 = rng.choice(unassigned_humans[two_bins[0]], size=1).item()
-    unassigned_humans[two_bins[0]].remove(human1)
-
-    human2 = rng.choice(unassigned_humans[two_bins[1]], size=1).item()
-    unassigned_humans[two_bins[1]].remove(human2)
+    human1 = unassigned_humans.draw(two_bins[0], rng)
+    human2 = unassigned_humans.draw(two_bins[1], rng)
 
     sampled_humans += [human1, human2]
 
@@ -1075,7 +1156,7 @@ def _sample_solo_dweller(valid_age_bins, conf, unassigned_humans, rng):
     Args:
         valid_age_bins (list): age bins that qualify to sample humans
         conf (dict): yaml configuration of the experiment
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
         rng (np.random.RandomState): Random number generator
 
     Returns:
@@ -1086,15 +1167,14 @@ def _sample_solo_dweller(valid_age_bins, conf, unassigned_humans, rng):
     P_AGE_SOLO = [x[2] for x in P_AGE_SOLO_DWELLERS_GIVEN_HOUSESIZE_1]
 
     human = []
-    age_bins = sorted(unassigned_humans.keys(), key=lambda x:x[0])
-    valid_idx = [i for i,bin in enumerate(age_bins) if len(unassigned_humans[bin]) >= 1 and P_AGE_SOLO[i] > 0]
+    age_bins = unassigned_humans.bins
+    valid_idx = [i for i,bin in enumerate(age_bins) if unassigned_humans.count(bin) >= 1 and P_AGE_SOLO[i] > 0]
     valid_age_bins = [age_bins[i] for i in valid_idx]
     if valid_age_bins:
         P = [P_AGE_SOLO[i] for i in valid_idx]
         P = [i / sum(P) for i in P]
         age_bin = _random_choice(valid_age_bins, rng, 1, P)[0]
-        human = rng.choice(unassigned_humans[age_bin], size=1).tolist()
-        unassigned_humans[age_bin].remove(human[0])
+        human = [unassigned_humans.draw(age_bin, rng)]
 
     return human
 
@@ -1105,7 +1185,7 @@ def _sample_random_humans(valid_other_bins, conf, unassigned_humans, rng, size):
     Args:
         valid_age_bins (list): age bins that qualify to sample humans
         conf (dict): yaml configuration of the experiment
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
         rng (np.random.RandomState): Random number generator
         size (int): number of humans to sample
 
@@ -1114,20 +1194,18 @@ def _sample_random_humans(valid_other_bins, conf, unassigned_humans, rng, size):
     """
     ASSORTATIVITY_STRENGTH = conf['HOUSEHOLD_ASSORTATIVITY_STRENGTH']
 
-    all_humans = [(y,x) for x in valid_other_bins for y in unassigned_humans[x]]
-    if len(all_humans) < size:
+    if unassigned_humans.get_counts(valid_other_bins).sum() < size:
         return []
 
     valid_other_bins = sorted(valid_other_bins, key=lambda x:x[0])
     # NOTE: we assign more probability to the bin which has more humans to achieve balance in sampling
-    p_bin = np.array([len(unassigned_humans[x]) for x in valid_other_bins])
+    p_bin = unassigned_humans.get_counts(valid_other_bins)
     humans = []
     while len(humans) < size:
         p = p_bin / p_bin.sum()
         bin = _random_choice(valid_other_bins, rng=rng, size=1, P=p)[0]
-        human = rng.choice(unassigned_humans[bin], size=1).item()
+        human = unassigned_humans.draw(bin, rng)
         humans.append(human)
-        unassigned_humans[bin].remove(human)
 
         # reassign probabilities
         idx = valid_other_bins.index(bin)
@@ -1139,7 +1217,7 @@ def _sample_random_humans(valid_other_bins, conf, unassigned_humans, rng, size):
         if idx > 0:
             p_bin[idx-1] += ASSORTATIVITY_STRENGTH
 
-        p_bin[[i for i, bin in enumerate(valid_other_bins) if len(unassigned_humans[bin]) == 0]] = 0
+        p_bin[unassigned_humans.get_counts(valid_other_bins) == 0] = 0
 
     assert len(humans) == size, "number of humans sampled doesn't equal the expected size"
     return humans
@@ -1151,7 +1229,7 @@ def _sample_n_kids(valid_age_bins, conf, unassigned_humans, rng, size, with_kid=
     Args:
         valid_age_bins (list): age bins that qualify to sample humans
         conf (dict): yaml configuration of the experiment
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
         rng (np.random.RandomState): Random number generator
         size (int): number of humans to sample
 
@@ -1165,10 +1243,9 @@ def _sample_n_kids(valid_age_bins, conf, unassigned_humans, rng, size, with_kid=
     valid_younger_bins = sorted(valid_age_bins, key=lambda x: x[0])
 
     # to balance unsampled bins (only when with_kid is None)
-    p_bin = np.array([len(unassigned_humans[bin]) for bin in valid_younger_bins])
+    p_bin = unassigned_humans.get_counts(valid_younger_bins)
     if with_kid is not None:
-        kid_bin = with_kid.age_bin_width_5.bin
-        assert with_kid not in unassigned_humans[kid_bin],  "kid has been sampled but not removed from unassigned_humans"
+        assert with_kid not in unassigned_humans,  "kid has been sampled but not removed from unassigned_humans"
         #
         total_kids += 1
         kids += [with_kid]
@@ -1177,13 +1254,12 @@ def _sample_n_kids(valid_age_bins, conf, unassigned_humans, rng, size, with_kid=
     while len(kids) < total_kids:
         p_bin = p_bin / p_bin.sum()
         bin = _random_choice(valid_younger_bins, rng=rng, size=1, P=p_bin)[0]
-        kid = rng.choice(unassigned_humans[bin], size=1).item()
+        kid = unassigned_humans.draw(bin, rng)
         kids.append(kid)
-        unassigned_humans[bin].remove(kid)
 
         # reassign probabilities
         idx = valid_younger_bins.index(bin)
-        if len(unassigned_humans[bin]) > 0:
+        if unassigned_humans.count(bin) > 0:
             p_bin[idx] += ASSORTATIVITY_STRENGTH
         else:
             p_bin[idx] = 0.0
@@ -1260,7 +1336,7 @@ def _assign_household(human, res, allocated_humans):
     Returns:
         allocated_humans (list): a list of humans that have been allocated a household
     """
-    assert human not in allocated_humans, f"reassigning household to human:{human}"
+    assert human.household is None, f"reassigning household to human:{human}"
     human.assign_household(res)
     res.residents.append(human)
     allocated_humans.append(human)
@@ -1280,7 +1356,7 @@ def create_and_assign_household(humans_with_same_house, housetype, conf, city, a
     Returns:
         allocated_humans (list): a list of humans that have been allocated a household
     """
-    assert all(human not in allocated_humans for human in humans_with_same_house), f"reassigning household to human"
+    assert all(human.household is None for human in humans_with_same_house), f"reassigning household to human"
     res =  Household(
             env=city.env,
             rng=np.random.RandomState(city.rng.randint(2 ** 16)),
@@ -1343,12 +1419,11 @@ def _revert_allocation(humans, unassigned_humans):
 
     Args:
         humans (list): list of humans to be put back in their respective bins
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
 
     Returns:
-        unassigned_humans (dict): keys are age bin (tuple) and values are humans that do not have a household allocated
+        unassigned_humans (HumanPool): humans that do not have a household allocated, by age bin
     """
     for human in humans:
-        if human not in unassigned_humans[human.age_bin_width_5.bin]:
-            unassigned_humans[human.age_bin_width_5.bin].append(human)
+        unassigned_humans.add(human)
     return unassigned_humans
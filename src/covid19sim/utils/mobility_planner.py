@@ -231,18 +231,20 @@ class MobilityPlanner(object):
             2. `human` is a kid that can go to school, but needs parent supervision at other times
             3. `human` who is free to do anything.
         """
+        self._initialize_current_activity()
+        if not self.follows_adult_schedule:
+            self.full_schedule = deque(_presample_full_schedule(self.human, self.current_activity, self.env.timestamp, self.conf))
+
+    def _initialize_current_activity(self):
+        """
+        Starts `human` from the activity of sleeping, and assigns an adult to follow if `human` is a kid that needs supervision.
+        """
         # start human from the activity of sleeping. (assuming everyone sleeps for same amount of time)
         AVERAGE_TIME_SLEEPING = self.conf['AVERAGE_TIME_SLEEPING']
         duration = AVERAGE_TIME_SLEEPING * SECONDS_PER_HOUR
         self.current_activity = Activity(self.env.timestamp, duration, "sleep", self.human.household, self.human)
         self.schedule_for_day = deque([self.current_activity])
 
-        # presample activities for the entire simulation
-        # simulation is run until these many days pass. We want to sample for all of these days. Add 1 to include the activities on the last day.
-        # Add an additional 1 to be on teh safe side and sample activities for an extra day.
-        n_days = self.conf['simulation_days'] + 1
-        todays_weekday = self.env.timestamp.weekday()
-
         MAX_AGE_CHILDREN_WITHOUT_SUPERVISION = self.conf['MAX_AGE_CHILDREN_WITHOUT_PARENT_SUPERVISION']
         if self.human.age <= MAX_AGE_CHILDREN_WITHOUT_SUPERVISION:
             self.follows_adult_schedule = True
@@ -254,56 +256,25 @@ class MobilityPlanner(object):
                 self.follows_adult_schedule = False
                 log(f"Improper housing allocation has led to {self.human} living without adult. MobilityPlanner will not keep them supervised.", self.human.city.logfile)
 
-        if not self.follows_adult_schedule:
-            ## work
-            if self.human.does_not_work:
-                does_work = np.zeros(n_days)
-            else:
-                does_work = 1.0 * np.array([(todays_weekday + i) % 7 in self.human.working_days for i in range(n_days)])
-                n_working_days = (does_work > 0).sum()
-                does_work[does_work > 0] = [_sample_activity_duration("work", self.conf, self.rng) for _ in range(n_working_days)]
-
-            ## other activities
-            does_grocery = _presample_activity("grocery", self.conf, self.rng, n_days)
-            does_exercise = _presample_activity("exercise", self.conf, self.rng, n_days)
-            does_socialize = _presample_activity("socialize", self.conf, self.rng, n_days)
-
-            # schedule them all while satisfying sleep constraints
-            # Note: we sample locations on the day of activity
-            last_activity = self.current_activity
-            full_schedule = []
-            for i in range(n_days):
-                assert last_activity.name == "sleep", f"found {last_activity} and not sleep"
-
-                # Note: order of appending is important to _patch_schedule
-                # Note: duration of activities is equally important. A variance factor of 10 in the distribution
-                # might result in duration spanning two or more days which will violate the assumptions in this planner.
-                to_schedule = []
-                tentative_date = (self.env.timestamp + datetime.timedelta(days=i)).date()
-                to_schedule.append(Activity(None, does_work[i].item(), "work", self.human.workplace, self.human, tentative_date))
-                to_schedule.append(Activity(None, does_socialize[i].item(), "socialize", None, self.human, tentative_date))
-                to_schedule.append(Activity(None, does_grocery[i].item(), "grocery", None, self.human, tentative_date))
-                to_schedule.append(Activity(None, does_exercise[i].item(), "exercise", None, self.human, tentative_date))
-
-                # adds idle and sleep acivities too
-                schedule = _patch_schedule(self.human, last_activity, to_schedule, self.conf)
-                last_activity = schedule[-1]
-                full_schedule.append(schedule)
-                # (debug)
-                if last_activity.duration == 0:
-                    warnings.warn(f"{self.human} has 0 duration {last_activity}\nschedule:{schedule}\npenultimate:{full_schedule[-2]}")
-
-            assert all(schedule[-1].name == "sleep" for schedule in full_schedule), "sleep not found as last element in a schedule"
-            assert len(full_schedule) == n_days, "not enough schedule prepared"
-
-            # fill the schedule with sleep if there is some time left at the end
-            time_left_to_simulation_end = (full_schedule[-1][-1].end_time -  self.env.timestamp).total_seconds()
-            assert time_left_to_simulation_end > SECONDS_PER_DAY, "A full day's schedule has not been planned"
-            if time_left_to_simulation_end < n_days * SECONDS_PER_DAY:
-                filler_schedule = deque([Activity(full_schedule[-1][-1].end_time, time_left_to_simulation_end, "sleep", self.human.household, self.human, prepend_name="filler")])
-                full_schedule.append(filler_schedule)
-
-            self.full_schedule = deque(full_schedule)
+    def _set_presampled_schedule(self, presampled):
+        """
+        Sets the schedule presampled in another process by `_presample_schedules_in_worker`.
+
+        Args:
+            presampled (tuple): state of `human.rng` after sampling, final duration of the current activity, and
+                activities of each day as tuples (start_time, duration, name, location_key, tentative_date, prepend_name)
+        """
+        rng_state, current_activity_duration, schedules = presampled
+        self.rng.set_state(rng_state)
+        self.current_activity.duration = current_activity_duration
+        locations = {None: None, "household": self.human.household, "workplace": self.human.workplace}
+        self.full_schedule = deque(
+            deque(
+                Activity(start_time, duration, name, locations[location_key], self.human, tentative_date, prepend_name=prepend_name)
+                for start_time, duration, name, location_key, tentative_date, prepend_name in schedule
+            )
+            for schedule in schedules
+        )
 
     def get_schedule(self, for_kids=False):
         """
@@ -359,9 +330,13 @@ class MobilityPlanner(object):
             return None
 
         group = set()
+        shard = self.human.city.shard
         for human in connections:
             if human == self.human:
                 continue
+            # humans hosted by other shards are out of reach (see `covid19sim.locations.sharding`)
+            if shard is not None and not shard.hosts(human):
+                continue
             if human.mobility_planner.receive(activity):
                 group.add(human)
 
@@ -471,6 +446,11 @@ class MobilityPlanner(object):
                 adults = _can_supervise_kid(self.adults_in_house)
 
 
+            # follow an adult simulated by the same shard if there is one (see `covid19sim.locations.sharding`)
+            shard = self.human.city.shard
+            if shard is not None:
+                adults = [adult for adult in adults if shard.hosts(adult)] or adults
+
             adult = self.rng.choice(adults, size=1).item()
             adult_schedule = adult.mobility_planner.get_schedule(for_kids = True)
 
@@ -485,7 +465,8 @@ class MobilityPlanner(object):
             # kid follows adult's location all the time except for when kid is hospitalized or has to stay_at_home
             # adult checks inverted_supervision everytime before finalizing the location
             # thus, if kid needs to be followed, adult follows kid to their location
-            self.adult_to_follow_today.mobility_planner.inverted_supervision.remove(self.human)
+            # (discard) the adult might have been simulated by another shard since yesterday
+            self.adult_to_follow_today.mobility_planner.inverted_supervision.discard(self.human)
             self.adult_to_follow_today = adult
             self.adult_to_follow_today.mobility_planner.inverted_supervision.add(self.human)
 
@@ -682,6 +663,18 @@ class MobilityPlanner(object):
         # otherwise (b) find a location. if there is no location available, cancel the activity and stay at home
         if activity.parent_activity_pointer is not None:
             activity.refresh_location()
+            # the owner of the parent activity is simulated by another shard, or the parent activity has started
+            # without `self.human` (see `covid19sim.locations.sharding`), so there is no location to follow
+            parent_activity = activity.parent_activity_pointer
+            if (
+                activity.location is None
+                and self.human.city.shard is not None
+                and (
+                    not self.human.city.shard.hosts(parent_activity.owner)
+                    or parent_activity.start_time < self.env.timestamp
+                )
+            ):
+                activity.cancel_and_go_to_location(reason="other-shard", location=self.human.household)
             return activity
 
         if activity.location is None:
@@ -1007,6 +1000,167 @@ def _patch_kid_schedule(human, adult_schedule, work_activity, current_activity,
 
     return deque(schedule)
 
+def _presample_full_schedule(human, current_activity, timestamp, conf):
+    """
+    Presamples activities of `human` for the entire simulation.
+
+    Args:
+        human (covid19sim.human.Human): `human` who is free to do anything
+        current_activity (Activity): activity (sleep) that `human` starts the simulation with
+        timestamp (datetime.datetime): start of the simulation
+        conf (dict): yaml configuration of the experiment
+
+    Returns:
+        (list): a deque of `Activity`s for each day
+    """
+    # simulation is run until these many days pass. We want to sample for all of these days. Add 1 to include the activities on the last day.
+    # Add an additional 1 to be on teh safe side and sample activities for an extra day.
+    n_days = conf['simulation_days'] + 1
+    todays_weekday = timestamp.weekday()
+
+    ## work
+    if human.does_not_work:
+        does_work = np.zeros(n_days)
+    else:
+        does_work = 1.0 * np.array([(todays_weekday + i) % 7 in human.working_days for i in range(n_days)])
+        n_working_days = (does_work > 0).sum()
+        does_work[does_work > 0] = _sample_activity_duration("work", conf, human.rng, size=n_working_days)
+
+    ## other activities
+    does_grocery = _presample_activity("grocery", conf, human.rng, n_days)
+    does_exercise = _presample_activity("exercise", conf, human.rng, n_days)
+    does_socialize = _presample_activity("socialize", conf, human.rng, n_days)
+
+    # schedule them all while satisfying sleep constraints
+    # Note: we sample locations on the day of activity
+    last_activity = current_activity
+    full_schedule = []
+    for i in range(n_days):
+        assert last_activity.name == "sleep", f"found {last_activity} and not sleep"
+
+        # Note: order of appending is important to _patch_schedule
+        # Note: duration of activities is equally important. A variance factor of 10 in the distribution
+        # might result in duration spanning two or more days which will violate the assumptions in this planner.
+        to_schedule = []
+        tentative_date = (timestamp + datetime.timedelta(days=i)).date()
+        to_schedule.append(Activity(None, does_work[i].item(), "work", human.workplace, human, tentative_date))
+        to_schedule.append(Activity(None, does_socialize[i].item(), "socialize", None, human, tentative_date))
+        to_schedule.append(Activity(None, does_grocery[i].item(), "grocery", None, human, tentative_date))
+        to_schedule.append(Activity(None, does_exercise[i].item(), "exercise", None, human, tentative_date))
+
+        # adds idle and sleep acivities too
+        schedule = _patch_schedule(human, last_activity, to_schedule, conf)
+        last_activity = schedule[-1]
+        full_schedule.append(schedule)
+        # (debug)
+        if last_activity.duration == 0:
+            warnings.warn(f"{human} has 0 duration {last_activity}\nschedule:{schedule}\npenultimate:{full_schedule[-2]}")
+
+    assert all(schedule[-1].name == "sleep" for schedule in full_schedule), "sleep not found as last element in a schedule"
+    assert len(full_schedule) == n_days, "not enough schedule prepared"
+
+    # fill the schedule with sleep if there is some time left at the end
+    time_left_to_simulation_end = (full_schedule[-1][-1].end_time -  timestamp).total_seconds()
+    assert time_left_to_simulation_end > SECONDS_PER_DAY, "A full day's schedule has not been planned"
+    if time_left_to_simulation_end < n_days * SECONDS_PER_DAY:
+        filler_schedule = deque([Activity(full_schedule[-1][-1].end_time, time_left_to_simulation_end, "sleep", human.household, human, prepend_name="filler")])
+        full_schedule.append(filler_schedule)
+
+    return full_schedule
+
+class _PlanningLocation(object):
+    """
+    Picklable stand-in for the household or the workplace of a `human` whose schedule is presampled in another process.
+    """
+    def __init__(self, key, location):
+        self.key = key
+        self.opening_time = location.opening_time
+        self.closing_time = location.closing_time
+
+class _PlanningHuman(object):
+    """
+    Picklable stand-in exposing the attributes of `human` that are needed to presample its schedule.
+    """
+    def __init__(self, human):
+        self.name = human.name
+        self.rng = np.random.RandomState()
+        self.rng.set_state(human.rng.get_state())
+        self.work_start_time = human.work_start_time
+        self.does_not_work = human.does_not_work
+        self.working_days = human.working_days
+        self.household = _PlanningLocation("household", human.household)
+        self.workplace = None if human.workplace is None else _PlanningLocation("workplace", human.workplace)
+
+    def __repr__(self):
+        return self.name
+
+def _presample_schedules_in_worker(planning_humans, current_activities, timestamp, conf):
+    """
+    Presamples schedules of `planning_humans` in a worker process.
+
+    Args:
+        planning_humans (list): `_PlanningHuman`s
+        current_activities (list): (start_time, duration) of the sleep activity each `human` starts the simulation with
+        timestamp (datetime.datetime): start of the simulation
+        conf (dict): yaml configuration of the experiment
+
+    Returns:
+        (list): presampled schedules as expected by `MobilityPlanner._set_presampled_schedule`
+    """
+    results = []
+    for human, (start_time, duration) in zip(planning_humans, current_activities):
+        human.conf = conf
+        current_activity = Activity(start_time, duration, "sleep", human.household, human)
+        full_schedule = _presample_full_schedule(human, current_activity, timestamp, conf)
+        schedules = [
+            [
+                (a.start_time, a.duration, a.name, None if a.location is None else a.location.key, a.tentative_date, a.prepend_name)
+                for a in schedule
+            ]
+            for schedule in full_schedule
+        ]
+        results.append((human.rng.get_state(), current_activity.duration, schedules))
+    return results
+
+def initialize_mobility_planners(humans, conf, n_jobs=1):
+    """
+    Calls `MobilityPlanner.initialize` for all `humans`.
+    Kids who follow an adult's schedule are handled first as they don't presample any activity.
+    Presampling of other humans is independent as it only uses their own random number generator, so it is distributed
+    across `n_jobs` processes. Resulting schedules are identical to the ones sampled in a single process.
+
+    Args:
+        humans (list): `Human`s whose `MobilityPlanner` needs to be initialized
+        conf (dict): yaml configuration of the experiment
+        n_jobs (int, optional): number of processes to use. -1 uses all cores. Defaults to 1.
+    """
+    for human in humans:
+        human.mobility_planner._initialize_current_activity()
+
+    planners = [human.mobility_planner for human in humans if not human.mobility_planner.follows_adult_schedule]
+    if n_jobs == 1 or len(planners) == 0:
+        for planner in planners:
+            planner.full_schedule = deque(_presample_full_schedule(planner.human, planner.current_activity, planner.env.timestamp, conf))
+        return
+
+    from joblib import Parallel, delayed, effective_n_jobs
+
+    timestamp = planners[0].env.timestamp
+    n_batches = min(len(planners), 4 * effective_n_jobs(n_jobs))
+    batches = [x for x in np.array_split(np.arange(len(planners)), n_batches) if len(x) > 0]
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_presample_schedules_in_worker)(
+            [_PlanningHuman(planners[i].human) for i in batch],
+            [(planners[i].current_activity.start_time, planners[i].current_activity.duration) for i in batch],
+            timestamp,
+            conf,
+        )
+        for batch in batches
+    )
+    for batch, batch_results in zip(batches, results):
+        for i, presampled in zip(batch, batch_results):
+            planners[i]._set_presampled_schedule(presampled)
+
 def _patch_schedule(human, last_activity, activities, conf):
     """
     Makes a continuous schedule out of the list of `activities` in continuation to `last_activity` (expects "sleep") from previous schedule.
@@ -1294,7 +1448,7 @@ def _presample_activity(type_of_activity, conf, rng, n_days):
 
     return does_activity
 
-def _sample_activity_duration(activity, conf, rng):
+def _sample_activity_duration(activity, conf, rng, size=None):
     """
     Samples duration for `activity` according to predefined distribution, parameters of which are defined in the configuration file.
     TODO - Make it age dependent.
@@ -1303,9 +1457,10 @@ def _sample_activity_duration(activity, conf, rng):
         activity (str): type of activity
         conf (dict): yaml configuration of the experiment
         rng (np.random.RandomState): Random number generator
+        size (int, optional): number of durations to sample at once. They are the same as the ones sampled by `size` consecutive calls. Defaults to None.
 
     Returns:
-        (float): duration for which to conduct activity (seconds)
+        (float): duration for which to conduct activity (seconds). (np.array) of `size` durations if `size` is not None.
     """
     SECONDS_CONVERSION_FACTOR = SECONDS_PER_HOUR
 
@@ -1343,6 +1498,10 @@ def _sample_activity_duration(activity, conf, rng):
         raise ValueError
 
     # round off to prevent microseconds in timestamps
+    if size is not None:
+        durations = np.floor(rng.gamma(AVERAGE_TIME/SCALE_FACTOR, SCALE_FACTOR, size=size) * SECONDS_CONVERSION_FACTOR)
+        return np.minimum(durations, MAX_TIME * SECONDS_PER_HOUR)
+
     duration = math.floor(rng.gamma(AVERAGE_TIME/SCALE_FACTOR, SCALE_FACTOR) * SECONDS_CONVERSION_FACTOR)
     return min(duration, MAX_TIME * SECONDS_PER_HOUR)
 
@@ -0,0 +1,256 @@
+"""
+On-disk cache of synthetic populations.
+
+Synthesizing a population (humans, households, workplaces, preferences and presampled schedules) only depends on the
+configuration and on the state of the city's random number generator. Repeated runs with the same settings, e.g. in
+parameter sweeps, can therefore load it from `POPULATION_CACHE_DIR` instead of synthesizing it again.
+
+References to the objects owned by the running simulation (`env`, `city`, `conf` and the tracker) are not stored.
+They are written as placeholders and are bound to the objects of the new simulation when the cache is loaded.
+"""
+import copyreg
+import hashlib
+import io
+import json
+import os
+import pathlib
+import pickle
+import sys
+import threading
+
+from covid19sim.locations.location import Location
+from covid19sim.native._native import BaseHuman
+
+# bump it whenever the layout of cached objects changes
+POPULATION_CACHE_VERSION = 9
+
+# location types whose parameters are stored in the locations of the population
+_SYNTHESIZED_LOCATION_TYPES = [
+    "HOUSEHOLD", "SENIOR_RESIDENCE", "HOSPITAL", "SCHOOL", "WORKPLACE", "STORE", "MISC", "PARK",
+]
+
+# the settings from which the population is synthesized. Other settings, e.g. the risk model, the intervention or the
+# tracker's, don't change the cached population: the attributes of humans depending on them are set again when the
+# population is loaded (see `Human.set_runtime_settings`).
+POPULATION_SYNTHESIS_KEYS = [
+    # demographics and health of humans
+    "P_AGE_REGION", "MEDIAN_AGE_REGION", "P_FEMALE", "P_MALE", "P_CAREFUL_PERSON", "AGE_AFFECTS_CAREFULNESS",
+    "BASELINE_P_ASYMPTOMATIC", "INFLAMMATORY_CONDITIONS", "NORMALIZED_SUSCEPTIBILITY_BY_AGE",
+    "MEAN_DAILY_INTERACTION_FOR_AGE_GROUP", "P_NEVER_RECOVERS", "AVG_FLU_DURATION", "P_HOSPITALIZED_GIVEN_SYMPTOMS",
+    "P_CRITICAL_GIVEN_HOSPITALIZED", "P_FATALITY_GIVEN_CRITICAL",
+    "TRACING_N_DAYS_HISTORY",  # size of the symptom histories and of the risk history matrices
+    # households and collective residences
+    "P_HOUSEHOLD_SIZE", "AVG_HOUSEHOLD_SIZE", "P_FAMILY_TYPE_SIZE_2", "P_FAMILY_TYPE_SIZE_3", "P_FAMILY_TYPE_SIZE_4",
+    "P_FAMILY_TYPE_SIZE_MORE_THAN_5", "P_MULTIGENERATIONAL_FAMILY", "P_MULTIGENERTIONAL_FAMILY_GIVEN_OTHER_HOUSEHOLDS",
+    "P_AGE_SOLO_DWELLERS_GIVEN_HOUSESIZE_1", "AGE_DIFFERENCE_BETWEEN_PARENT_AND_KID", "MAX_AGE_CHILDREN",
+    "MAX_AGE_WITH_PARENT", "P_COLLECTIVE_65_69", "P_COLLECTIVE_70_74", "P_COLLECTIVE_75_above",
+    "N_RESIDENTS_PER_COLLECTIVE", "RESIDENT_TO_STAFF_RATIO", "HOUSEHOLD_ASSORTATIVITY_STRENGTH",
+    # workplaces, schools and hospitals
+    "MIN_WORKING_AGE", "MAX_WORKING_AGE", "P_EMPLOYED_BY_AGE", "WORKPLACE_ASSORTATIVITY_STRENGTH",
+    "P_EMPLOYEES_1_4_PER_WORKPLACE", "P_EMPLOYEES_5_99_PER_WORKPLACE", "P_EMPLOYEES_100_499_PER_WORKPLACE",
+    "P_EMPLOYEES_500_above_PER_WORKPLACE", "AVERAGE_N_EMPLOYEES_PER_WORKPLACE", "AVERAGE_N_EMPLOYEES_PER_STORE",
+    "AVERAGE_N_EMPLOYEES_PER_MISC", "N_STORE_PER_1K_PEOPLE", "N_MISC_PER_1K_PEOPLE", "N_WORKING_DAYS",
+    "WORKING_START_HOUR", "N_HOSPITALS_PER_100K_PEOPLE", "N_DOCTOR_PER_100K_PEOPLE", "NURSE_TO_DOCTOR_RATIO",
+    "MIN_AGE_HEALTHCARE_WORKER", "MAX_AGE_HEALTHCARE_WORKER", "HOSPITAL_BEDS_PER_1K_PEOPLE", "HOSPITAL_BEDS_OCCUPANCY",
+    "ICU_BEDS_PER_1K_PEOPLE", "ICU_BEDS_OCCUPANCY", "P_STUDENT_2_4", "P_STUDENT_4_5", "P_SCHOOL_FOR_AGE_17_19",
+    "P_SCHOOL_FOR_AGE_19_24", "P_SCHOOL_FOR_AGE_25_29", "N_STUDENTS_PER_SCHOOL_2_4", "N_STUDENTS_PER_SCHOOL_4_5",
+    "N_STUDENTS_PER_SCHOOL_5_12", "N_STUDENTS_PER_SCHOOL_12_17", "N_STUDENTS_PER_SCHOOL_17_29",
+    "STUDENT_TEACHER_RATIO_SCHOOL_2_4", "STUDENT_TEACHER_RATIO_SCHOOL_4_5", "STUDENT_TEACHER_RATIO_SCHOOL_5_12",
+    "STUDENT_TEACHER_RATIO_SCHOOL_12_17", "STUDENT_TEACHER_RATIO_SCHOOL_17_29",
+    # contacts at the locations
+    "P_CONTACT_MATRIX_HOUSEHOLD", "P_CONTACT_MATRIX_WORKPLACE", "P_CONTACT_MATRIX_SCHOOL", "P_CONTACT_MATRIX_OTHER",
+    "ADJUSTED_CONTACT_MATRIX_HOUSEHOLD", "ADJUSTED_CONTACT_MATRIX_WORKPLACE", "ADJUSTED_CONTACT_MATRIX_SCHOOL",
+    "ADJUSTED_CONTACT_MATRIX_OTHER", "HOUSEHOLD_MEAN_DAILY_INTERACTIONS", "WORKPLACE_MEAN_DAILY_INTERACTIONS",
+    "SCHOOL_MEAN_DAILY_INTERACTIONS", "OTHER_MEAN_DAILY_INTERACTIONS", "CONTACT_DURATION_NORMAL_MEAN_SECONDS_MATRIX",
+    *[
+        f"{location_type}_{parameter}"
+        for location_type in _SYNTHESIZED_LOCATION_TYPES
+        for parameter in ["CONTACT_FACTOR", "OPEN_CLOSE_HOUR_MINUTE", "OPEN_DAYS", "PROPORTION_AREA", "SURFACE_PROB"]
+    ],
+    # presampled schedules
+    "simulation_days", "AVERAGE_TIME_AWAKE", "AVERAGE_TIME_SLEEPING", "AVERAGE_TIME_SPENT_EXERCISING",
+    "AVERAGE_TIME_SPENT_GROCERY", "AVERAGE_TIME_SPENT_SOCIALIZING", "AVERAGE_TIME_SPENT_WORK", "MAX_TIME_AWAKE",
+    "MAX_TIME_SHORT_ACTVITIES", "MAX_TIME_SLEEP", "MAX_TIME_WORK", "MAX_AGE_CHILDREN_WITHOUT_PARENT_SUPERVISION",
+    "P_EXERCISE_DAYS", "P_GROCERY_SHOPPING_DAYS", "P_SOCIALIZE_DAYS", "TIME_SPENT_SCALE_FACTOR_FOR_SHORT_ACTIVITIES",
+    "TIME_SPENT_SCALE_FACTOR_FOR_WORK", "TIME_SPENT_SCALE_FACTOR_SLEEP_AWAKE",
+]
+
+# attributes of `BaseHuman` which are stored natively and not in `__dict__`.
+# `age` and the other timestamps are derived from them.
+_NATIVE_HUMAN_ATTRIBUTES = [
+    "name", "ts_birth", "ts_death", "ts_cold_symptomatic", "ts_flu_symptomatic", "ts_allergy_symptomatic",
+    "ts_covid19_infection", "ts_covid19_infectious", "ts_covid19_symptomatic", "ts_covid19_recovery",
+    "ts_covid19_immunity", "infectiousness_onset_days", "incubation_days", "is_asymptomatic",
+]
+
+# pickling the population follows references between humans, locations and activities recursively
+_PICKLE_RECURSION_LIMIT = 1000000
+_PICKLE_STACK_SIZE = 512 * 1024 * 1024
+
+
+def get_population_cache_key(conf, n_people, x_range, y_range, ts_initial, rng):
+    """
+    Content address of a population. It changes with the settings from which it is synthesized
+    (`POPULATION_SYNTHESIS_KEYS`), and with the state of the random number generator.
+
+    Args:
+        conf (dict): yaml configuration of the experiment
+        n_people (int): number of people in the city
+        x_range (tuple): (min_x, max_x)
+        y_range (tuple): (min_y, max_y)
+        ts_initial (float): timestamp at which the simulation starts
+        rng (np.random.RandomState): random number generator of the city before the synthesis
+
+    Returns:
+        (str): hexadecimal digest identifying the population
+    """
+    settings = {k: conf.get(k) for k in POPULATION_SYNTHESIS_KEYS}
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps(settings, sort_keys=True, default=str).encode())
+    hasher.update(json.dumps([POPULATION_CACHE_VERSION, n_people, list(x_range), list(y_range), ts_initial]).encode())
+    _, keys, pos, has_gauss, cached_gaussian = rng.get_state()
+    hasher.update(keys.tobytes())
+    hasher.update(json.dumps([int(pos), int(has_gauss), float(cached_gaussian)]).encode())
+    return hasher.hexdigest()
+
+
+def get_population_cache_path(cache_dir, key):
+    """
+    Args:
+        cache_dir (str): directory where populations are cached
+        key (str): see `get_population_cache_key`
+
+    Returns:
+        (pathlib.Path): file where the population identified by `key` is stored
+    """
+    return pathlib.Path(cache_dir) / f"population_{key}.pkl"
+
+
+def _restore_human(cls, env):
+    human = cls.__new__(cls)
+    BaseHuman.__init__(human, env)
+    return human
+
+
+def _reduce_human(human):
+    native_state = {attr: getattr(human, attr) for attr in _NATIVE_HUMAN_ATTRIBUTES}
+    return _restore_human, (type(human), human.env), (human.__dict__, native_state)
+
+
+def _restore_location(cls, name):
+    location = cls.__new__(cls)
+    location.name = name
+    return location
+
+
+def _reduce_location(location):
+    # `Location.__hash__` needs the name, which must be set before locations are added to sets of the population
+    return _restore_location, (type(location), location.name), location.__dict__
+
+
+def _all_subclasses(cls):
+    subclasses = {cls}
+    for subclass in cls.__subclasses__():
+        subclasses |= _all_subclasses(subclass)
+    return subclasses
+
+
+class _PopulationPickler(pickle.Pickler):
+    """
+    Pickler writing placeholders instead of the objects owned by the running simulation.
+    """
+    def __init__(self, file, shared_objects, human_types):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.shared_ids = {id(obj): name for name, obj in shared_objects.items()}
+        self.dispatch_table = copyreg.dispatch_table.copy()
+        for cls in human_types:
+            self.dispatch_table[cls] = _reduce_human
+        for cls in _all_subclasses(Location):
+            self.dispatch_table[cls] = _reduce_location
+
+    def persistent_id(self, obj):
+        return self.shared_ids.get(id(obj))
+
+
+class _PopulationUnpickler(pickle.Unpickler):
+    """
+    Unpickler binding placeholders to the objects of the running simulation.
+    """
+    def __init__(self, file, shared_objects):
+        super().__init__(file)
+        self.shared_objects = shared_objects
+
+    def persistent_load(self, pid):
+        return self.shared_objects[pid]
+
+
+def _run_with_deep_recursion(fn):
+    """
+    Runs `fn` in a thread with a large stack so that deeply linked populations can be (un)pickled.
+
+    Returns:
+        The value returned by `fn`.
+    """
+    result, error = [], []
+
+    def target():
+        try:
+            result.append(fn())
+        except BaseException as e:
+            error.append(e)
+
+    old_limit, old_stack_size = sys.getrecursionlimit(), threading.stack_size()
+    sys.setrecursionlimit(max(old_limit, _PICKLE_RECURSION_LIMIT))
+    threading.stack_size(_PICKLE_STACK_SIZE)
+    try:
+        thread = threading.Thread(target=target)
+        thread.start()
+        thread.join()
+    finally:
+        threading.stack_size(old_stack_size)
+        sys.setrecursionlimit(old_limit)
+
+    if error:
+        raise error[0]
+    return result[0]
+
+
+def save_population(path, population, shared_objects):
+    """
+    Writes `population` to `path`. The file is written atomically so that concurrent runs never read a partial file.
+
+    Args:
+        path (pathlib.Path): file where to store the population
+        population (dict): attributes of the city describing its population, e.g. humans, households, locations
+        shared_objects (dict): objects owned by the running simulation, e.g. env and conf, which are not stored
+    """
+    human_types = {type(h) for h in population.get("humans", []) if isinstance(h, BaseHuman)}
+
+    def dump():
+        buffer = io.BytesIO()
+        _PopulationPickler(buffer, shared_objects, human_types).dump(population)
+        return buffer.getvalue()
+
+    payload = _run_with_deep_recursion(dump)
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.parent / f".{path.name}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def load_population(path, shared_objects):
+    """
+    Reads a population written by `save_population`.
+
+    Args:
+        path (pathlib.Path): file where the population is stored
+        shared_objects (dict): objects of the running simulation replacing the placeholders. Keys are the same as in `save_population`.
+
+    Returns:
+        (dict): attributes of the city describing its population
+    """
+    with open(path, "rb") as f:
+        payload = f.read()
+    return _run_with_deep_recursion(lambda: _PopulationUnpickler(io.BytesIO(payload), shared_objects).load())
@@ -0,0 +1,136 @@
+"""
+Storage of the risk history maps of humans in population-wide NumPy matrices.
+
+Each human owns a row of a `RiskHistoryMatrix`, which holds its risk values as a ring indexed by day
+modulo the number of days in the history. The row is exposed as a `RiskHistoryMap`, which behaves like
+the `{day_idx: risk}` dictionaries the rest of the simulator expects (including their iteration order),
+so snapshots of many humans only require copying their rows.
+"""
+import typing
+
+import numpy as np
+
+# day stored in the empty slots of the rings
+NO_DAY = np.iinfo(np.int64).min
+
+
+class RiskHistoryMatrix:
+    """
+    Rings of risk values for many humans, with one row of `n_days` slots per human.
+
+    A day is stored in the slot `day % n_days`, so a ring holds at most `n_days` consecutive days: storing
+    a day evicts the day that was `n_days` (or a multiple of it) older.
+    """
+
+    def __init__(self, n_days: int, capacity: int = 16):
+        """
+        Args:
+            n_days: the number of slots of each ring, i.e. the number of days kept in a history.
+            capacity: the number of rows to preallocate.
+        """
+        assert n_days > 0 and capacity > 0
+        self.n_days = n_days
+        self.values = np.zeros((capacity, n_days), dtype=np.float64)
+        self.days = np.full((capacity, n_days), NO_DAY, dtype=np.int64)
+        self.insertion_stamps = np.zeros((capacity, n_days), dtype=np.int64)  # to iterate in insertion order
+        self.n_rows = 0
+        self.n_insertions = 0
+
+    def add_row(self) -> int:
+        """Allocates a new (empty) ring and returns its row index."""
+        if self.n_rows == len(self.values):
+            capacity = 2 * len(self.values)
+            self.values = np.resize(self.values, (capacity, self.n_days))
+            self.days = np.resize(self.days, (capacity, self.n_days))
+            self.insertion_stamps = np.resize(self.insertion_stamps, (capacity, self.n_days))
+            self.days[self.n_rows:] = NO_DAY
+        self.n_rows += 1
+        return self.n_rows - 1
+
+    def clear(self):
+        """Releases all the rows (keeping their memory), which invalidates the maps stored in them."""
+        self.days[:self.n_rows] = NO_DAY
+        self.n_rows = 0
+
+    def new_map(self) -> "RiskHistoryMap":
+        """Returns the map of a new (empty) ring."""
+        return RiskHistoryMap(self, self.add_row())
+
+    def copy_map(self, risk_history_map: typing.Mapping[int, float]) -> "RiskHistoryMap":
+        """Returns a copy of a risk history map, stored in a new row of this matrix."""
+        row = self.add_row()
+        if isinstance(risk_history_map, RiskHistoryMap) and risk_history_map.matrix.n_days == self.n_days:
+            source = risk_history_map.matrix
+            self.values[row] = source.values[risk_history_map.row]
+            self.days[row] = source.days[risk_history_map.row]
+            self.insertion_stamps[row] = source.insertion_stamps[risk_history_map.row]
+            self.n_insertions = max(self.n_insertions, source.n_insertions)
+            return RiskHistoryMap(self, row)
+        copy = RiskHistoryMap(self, row)
+        copy.update(risk_history_map)
+        return copy
+
+
+class RiskHistoryMap(typing.MutableMapping[int, float]):
+    """
+    Dictionary-like view of a human's risk history (day index => risk), stored in a `RiskHistoryMatrix`.
+
+    Keys are iterated in insertion order, like with a dictionary. Storing a day more than `n_days` after
+    another day already in the map evicts that older day.
+    """
+
+    __slots__ = ["matrix", "row"]
+
+    def __init__(self, matrix: typing.Optional[RiskHistoryMatrix] = None, row: typing.Optional[int] = None,
+                 n_days: typing.Optional[int] = None):
+        """
+        Args:
+            matrix: the matrix holding the ring of this map. If None, a single-row matrix of `n_days` slots
+                is created for it.
+            row: the row of the ring in the matrix. If None, a new row is allocated.
+            n_days: the number of slots of the ring, if no matrix is given.
+        """
+        if matrix is None:
+            matrix = RiskHistoryMatrix(n_days, capacity=1)
+        self.matrix = matrix
+        self.row = matrix.add_row() if row is None else row
+
+    def _get_slot(self, day_idx: int) -> typing.Optional[int]:
+        slot = day_idx % self.matrix.n_days
+        return slot if self.matrix.days[self.row, slot] == day_idx else None
+
+    def __getitem__(self, day_idx: int) -> float:
+        slot = self._get_slot(day_idx)
+        if slot is None:
+            raise KeyError(day_idx)
+        return self.matrix.values[self.row, slot].item()
+
+    def __setitem__(self, day_idx: int, risk: float):
+        matrix = self.matrix
+        slot = day_idx % matrix.n_days
+        if matrix.days[self.row, slot] != day_idx:
+            matrix.days[self.row, slot] = day_idx
+            matrix.n_insertions += 1
+            matrix.insertion_stamps[self.row, slot] = matrix.n_insertions
+        matrix.values[self.row, slot] = risk
+
+    def __delitem__(self, day_idx: int):
+        slot = self._get_slot(day_idx)
+        if slot is None:
+            raise KeyError(day_idx)
+        self.matrix.days[self.row, slot] = NO_DAY
+
+    def __contains__(self, day_idx) -> bool:
+        return isinstance(day_idx, (int, np.integer)) and self._get_slot(day_idx) is not None
+
+    def __iter__(self) -> typing.Iterator[int]:
+        days = self.matrix.days[self.row]
+        slots = np.flatnonzero(days != NO_DAY)
+        slots = slots[np.argsort(self.matrix.insertion_stamps[self.row, slots], kind="stable")]
+        return iter(days[slots].tolist())
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.matrix.days[self.row] != NO_DAY))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())})"
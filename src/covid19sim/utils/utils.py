@@ -9,6 +9,8 @@ import gc
 import math
 import os
 import pathlib
+import pickle
+import struct
 import subprocess
 import sys
 import textwrap
@@ -420,6 +422,29 @@ def extract_tracker_data(tracker, conf):
     return data
 
 
+# suffix of the sidecar index of the files written by `dump_tracker_data`
+TRACKER_INDEX_SUFFIX = ".index.json"
+
+# protocol 4 is the first one able to pickle objects over 4GB
+_TRACKER_PICKLE_PROTOCOL = 4
+
+
+def _write_tracker_section(f, obj):
+    """
+    Writes to `f` the opcodes which load `obj` from its own pickle, i.e. `dill.loads(<pickle of obj>)`.
+    `dill.loads` is expected to be the first entry of the memo.
+
+    Returns:
+        list: offset and size of the pickle of `obj` in `f`
+    """
+    section = dill.dumps(obj, protocol=_TRACKER_PICKLE_PROTOCOL)
+    f.write(pickle.BINGET + bytes([0]) + pickle.BINBYTES8 + struct.pack("<Q", len(section)))
+    offset = f.tell()
+    f.write(section)
+    f.write(pickle.TUPLE1 + pickle.REDUCE)
+    return [offset, len(section)]
+
+
 def dump_tracker_data(data, outdir, name):
     """
     Writes the tracker's extracted data to outdir/name using dill.
@@ -428,6 +453,12 @@ def dump_tracker_data(data, outdir, name):
 
     Creates the outputdir if need be, including potential missing parents.
 
+    The file is a single pickle of the dictionary, which can be read with `pickle.load`. Each key and value is pickled
+    on its own and embedded in the file as bytes decoded by `dill.loads`, so that it can also be decoded without the
+    other values. The offset and size of the pickle of each value are written in the sidecar index
+    `outdir/name.index.json`, which `load_tracker_data` uses to decode only the requested keys.
+    As the values are pickled separately, objects shared by several values are loaded as distinct copies.
+
     Args:
         data (dict): tracker's extracted data
         outdir (str): directory where to dump the file
@@ -435,8 +466,61 @@ def dump_tracker_data(data, outdir, name):
     """
     outdir = pathlib.Path(outdir)
     outdir.mkdir(exist_ok=True, parents=True)
+    index = {}
     with open(outdir / name, 'wb') as f:
-        dill.dump(data, f)
+        # memo-free outer pickle of the dictionary, whose only memo entry is `dill.loads`
+        f.write(pickle.PROTO + bytes([_TRACKER_PICKLE_PROTOCOL]))
+        for name_part in (b"dill", b"loads"):
+            f.write(pickle.SHORT_BINUNICODE + bytes([len(name_part)]) + name_part)
+        f.write(pickle.STACK_GLOBAL + pickle.MEMOIZE + pickle.POP + pickle.EMPTY_DICT)
+        for key, value in data.items():
+            _write_tracker_section(f, key)
+            index[key] = _write_tracker_section(f, value)
+            f.write(pickle.SETITEM)
+        f.write(pickle.STOP)
+        file_size = f.tell()
+
+    with open(outdir / (name + TRACKER_INDEX_SUFFIX), 'w') as f:
+        json.dump({"file_size": file_size, "keys": index}, f)
+
+
+def load_tracker_data(path, keys=None):
+    """
+    Reads the tracker's extracted data written by `dump_tracker_data`.
+    Files without a sidecar index (e.g. written by `dill.dump`) are loaded in full.
+
+    Args:
+        path (str): path to the dumped file
+        keys (iterable, optional): keys to load. All keys are loaded if None.
+
+    Returns:
+        dict: the extracted data, restricted to `keys` that were dumped
+    """
+    path = pathlib.Path(path)
+    index = None
+    index_path = path.parent / (path.name + TRACKER_INDEX_SUFFIX)
+    if keys is not None and index_path.exists():
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+        # the index is ignored if the file was written again without it
+        if index["file_size"] != path.stat().st_size:
+            index = None
+
+    if index is None:
+        with open(path, 'rb') as f:
+            data = dill.load(f)
+        return data if keys is None else {key: value for key, value in data.items() if key in keys}
+
+    data = {}
+    with open(path, 'rb') as f:
+        for key in keys:
+            if key not in index["keys"]:
+                continue
+            offset, size = index["keys"][key]
+            f.seek(offset)
+            data[key] = dill.loads(f.read(size))
+    return data
+
 
 def parse_search_configuration(conf):
     """
@@ -699,7 +783,8 @@ class DummyHuman:
         # "dummy" attributes replace the original attribute by a less-complex one
         self.dummy_attribs = [
             "env", "location", "household", "workplace", "last_date",
-            "recommendations_to_follow", "recovered_timestamp", "intervened_behavior"# the old states contained in behaviors might break serialization
+            "recommendations_to_follow", "recovered_timestamp", "intervened_behavior",# the old states contained in behaviors might break serialization
+            "risk_history_map", "prev_risk_history_map",  # rows of population-wide matrices
         ]
         self.env = DummyEnv(human.env)
         self.location = human.location.name if human.location else ""
@@ -707,6 +792,8 @@ class DummyHuman:
         self.workplace = human.workplace.name if human.workplace else ""
         self.last_date = dict(human.last_date)
         self.recommendations_to_follow = [str(rec) for rec in human.recommendations_to_follow]
+        self.risk_history_map = dict(human.risk_history_map)
+        self.prev_risk_history_map = dict(human.prev_risk_history_map)
         # "blacklisted" attributes are overriden with `None`, no matter their original value
         self.blacklisted_attribs = [
             "conf", "city", "known_connections", "my_history", "visits", "proba_to_risk_level_map",  "mobility_planner"
@@ -863,6 +950,33 @@ def _sample_positive_normal(mean, sigma, rng, upper_limit=None):
     x = rng.normal(mean, sigma)
     return x if _filter(x) else _sample_positive_normal(mean, sigma, rng, upper_limit)
 
+def _sample_positive_normal_vectorized(mean, sigma, rng, upper_limit=None):
+    """
+    Vectorized version of `_sample_positive_normal`. Samples are drawn for all elements at once and only the rejected
+    ones are redrawn until every element is accepted.
+
+    Args:
+        mean (np.ndarray): mean of gaussian for each sample
+        sigma (np.ndarray): stdandard deviation of gaussian for each sample
+        rng (np.random.RandomState): Random number generator
+        upper_limit (np.ndarray): upper limit above which x will be rejected. None if there is no upper limit.
+
+    Returns:
+        (np.ndarray): samples
+    """
+    mean, sigma = np.broadcast_arrays(np.asarray(mean, dtype=np.float64), np.asarray(sigma, dtype=np.float64))
+    upper_limit = np.full(mean.shape, np.inf) if upper_limit is None else np.broadcast_to(upper_limit, mean.shape)
+    upper_limit = np.where(upper_limit > 0, upper_limit, np.inf)
+
+    x = np.empty(mean.shape, dtype=np.float64)
+    rejected = np.arange(mean.size)
+    while rejected.size > 0:
+        samples = rng.normal(mean.flat[rejected], sigma.flat[rejected])
+        accepted = (0 <= samples) & (samples <= upper_limit.flat[rejected])
+        x.flat[rejected[accepted]] = samples[accepted]
+        rejected = rejected[~accepted]
+    return x
+
 def is_app_based_tracing_intervention(intervention=None, intervention_conf=None):
     """
     Determines if the intervention requires an app.
@@ -1,14 +1,37 @@
+import collections
+import contextlib
 import os
-import time
+import signal
 import unittest.mock
 from tempfile import TemporaryDirectory
 
+import numpy as np
+
 import covid19sim.inference.server_utils
 import covid19sim.inference.server_bootstrap
+from covid19sim.inference.human_as_message import HumanAsMessage
+from tests.test_wire_format import make_batch
+
 
+Human = collections.namedtuple("Human", ["name"])
+server_startup_timeout_ms = 60 * 1000
 
-def fake_proc_human_batch(sample, *args, **kwargs):
-    return sample
+
+def fake_proc_human_batch(sample, *args, cluster_mgr_map=None, **kwargs):
+    if not isinstance(sample, list) or not all(isinstance(params, dict) for params in sample):
+        return sample
+    # counts how many times each human was seen by the worker which processed it
+    results = []
+    for params in sample:
+        name = params["human"].name
+        cluster_mgr_map[name] = cluster_mgr_map.get(name, 0) + 1
+        if isinstance(params["human"], HumanAsMessage):
+            # replies to encoded batches hold a risk history
+            history = [os.getpid(), cluster_mgr_map[name], len(params["human"].update_messages), params["conf"]["x"]]
+            results.append((name, np.array(history, dtype=np.float64)))
+        else:
+            results.append((name, os.getpid(), cluster_mgr_map[name]))
+    return results
 
 
 class InferenceServerWrapper(covid19sim.inference.server_utils.InferenceServer):
@@ -21,28 +44,135 @@ class InferenceServerWrapper(covid19sim.inference.server_utils.InferenceServer):
             return covid19sim.inference.server_utils.InferenceServer.run(self)
 
 
+@contextlib.contextmanager
+def run_inference_server(**kwargs):
+    """Starts an inference server with fake workers, and yields its frontend address once it answers requests."""
+    with TemporaryDirectory() as d:
+        frontend_address = "ipc://" + os.path.join(d, "frontend.ipc")
+        inference_server = InferenceServerWrapper(
+            model_exp_path=covid19sim.inference.server_bootstrap.default_model_exp_path,
+            frontend_address=frontend_address,
+            backend_address="ipc://" + os.path.join(d, "backend.ipc"),
+            **kwargs,
+        )
+        inference_server.start()
+        try:
+            # the broker only answers once all its workers are ready
+            client_pool = covid19sim.inference.server_utils.InferenceClientPool(
+                server_address=frontend_address,
+                n_sockets=1,
+                reply_timeout_ms=server_startup_timeout_ms,
+            )
+            try:
+                assert client_pool.infer("ready?") == "ready?"
+            finally:
+                client_pool.close()
+            yield frontend_address
+        finally:
+            inference_server.stop_gracefully()
+            inference_server.join()
+
+
 class ServerTests(unittest.TestCase):
     def test_inference(self):
-        with TemporaryDirectory() as d:
-            frontend_address = "ipc://" + os.path.join(d, "frontend.ipc")
-            backend_address = "ipc://" + os.path.join(d, "backend.ipc")
-            inference_server = InferenceServerWrapper(
-                model_exp_path=covid19sim.inference.server_bootstrap.default_model_exp_path,
-                workers=2,
-                frontend_address=frontend_address,
-                backend_address=backend_address,
-                verbose=True,
-            )
-            inference_server.start()
-            time.sleep(10)
+        with run_inference_server(workers=2, verbose=True) as frontend_address:
             remote_engine = covid19sim.inference.server_utils.InferenceClient(
                 server_address=frontend_address,
             )
             for test_idx in range(100):
                 remote_output = remote_engine.infer(test_idx)
                 assert remote_output == test_idx
-            inference_server.stop_gracefully()
-            inference_server.join()
+
+    def test_human_affinity(self):
+        with run_inference_server(workers=3) as frontend_address:
+            remote_engine = covid19sim.inference.server_utils.InferenceClient(
+                server_address=frontend_address,
+            )
+            batch = [{"human": Human(f"human:{idx}"), "city_hash": 0} for idx in range(50)]
+            owners = {}
+            for timeslot_idx in range(3):
+                results = remote_engine.infer(batch)
+                assert [name for name, _, _ in results] == [params["human"].name for params in batch]
+                for name, pid, count in results:
+                    # each human is always processed by the same worker, which keeps its state
+                    assert owners.setdefault(name, pid) == pid
+                    assert count == timeslot_idx + 1
+            assert len(set(owners.values())) == 3
+
+            # a reset clears the state kept by the workers
+            remote_engine.request_reset()
+            assert all(count == 1 for _, _, count in remote_engine.infer(batch))
+
+    def test_reset_with_dead_worker(self):
+        with run_inference_server(workers=3) as frontend_address:
+            remote_engine = covid19sim.inference.server_utils.InferenceClient(
+                server_address=frontend_address,
+            )
+            batch = [{"human": Human(f"human:{idx}"), "city_hash": 0} for idx in range(50)]
+            pids = {pid for _, pid, _ in remote_engine.infer(batch)}
+            assert len(pids) == 3
+
+            # the reset doesn't wait for a worker which died, and its humans are moved to the other workers
+            dead_pid = pids.pop()
+            os.kill(dead_pid, signal.SIGKILL)
+            remote_engine.request_reset()
+            results = remote_engine.infer(batch)
+            assert {pid for _, pid, _ in results} == pids
+            assert all(count == 1 for _, _, count in results)
+
+    def test_client_pool(self):
+        with run_inference_server(workers=2) as frontend_address:
+            client_pool = covid19sim.inference.server_utils.InferenceClientPool(
+                server_address=frontend_address,
+                n_sockets=3,
+                max_pending_requests=2,
+            )
+            client_pool.request_reset()
+            for timeslot_idx in range(3):
+                # replies are matched to their batch whatever the order in which they arrive
+                batches = [
+                    [{"human": Human(f"human:{batch_idx}:{idx}"), "city_hash": 0} for idx in range(10)]
+                    for batch_idx in range(20)
+                ]
+                batched_results = client_pool.infer_batches(batches)
+                for batch, results in zip(batches, batched_results):
+                    assert [name for name, _, _ in results] == [params["human"].name for params in batch]
+                    assert all(count == timeslot_idx + 1 for _, _, count in results)
+            assert client_pool.infer(42) == 42
+            client_pool.close()
+
+    def test_client_pool_without_server(self):
+        with TemporaryDirectory() as d:
+            client_pool = covid19sim.inference.server_utils.InferenceClientPool(
+                server_address="ipc://" + os.path.join(d, "frontend.ipc"),
+                n_sockets=2,
+                reply_timeout_ms=100,
+            )
+            # a dead server fails the requests instead of hanging forever
+            with self.assertRaises(RuntimeError):
+                client_pool.infer(42)
+            with self.assertRaises(RuntimeError):
+                client_pool.request_reset()
+            client_pool.close()
+
+    def test_wire_format(self):
+        with run_inference_server(workers=2) as frontend_address:
+            client_pool = covid19sim.inference.server_utils.InferenceClientPool(
+                server_address=frontend_address,
+                n_sockets=2,
+            )
+            conf = {"x": 3}
+            batches = [make_batch(10, conf, seed=batch_idx, first_idx=batch_idx * 10) for batch_idx in range(4)]
+            for timeslot_idx in range(2):
+                batched_results = client_pool.infer_batches(batches)
+                for batch, results in zip(batches, batched_results):
+                    assert [name for name, _ in results] == [params["human"].name for params in batch]
+                    for params, (_, history) in zip(batch, results):
+                        assert history.dtype == np.float32
+                        assert list(history[1:]) == [timeslot_idx + 1, len(params["human"].update_messages), 3]
+            # the pickled format is still used for other samples
+            assert client_pool.infer(42) == 42
+            client_pool.close()
 
 
 if __name__ == "__main__":
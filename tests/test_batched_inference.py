@@ -0,0 +1,113 @@
+import numpy as np
+import torch
+from ctt.data_loading.loader import InvalidSetSize
+
+from covid19sim.inference.server_utils import InferenceEngineWrapper, proc_human_batch
+from tests.test_wire_format import make_batch
+
+
+class FakeEngine:
+    """Engine whose risk history depends on the candidate encounters of each human."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def can_infer_batch(self):
+        return True
+
+    def infer(self, daily_output):
+        candidate_encounters = daily_output["observed"]["candidate_encounters"]
+        if not len(candidate_encounters):
+            return None
+        return {"infectiousness": np.full(14, candidate_encounters[:, 2].sum(), dtype=float)}
+
+    def infer_batch(self, daily_outputs, max_batch_size):
+        self.batch_sizes.append(len(daily_outputs))
+        return [self.infer(daily_output) for daily_output in daily_outputs]
+
+
+class StubBatch:
+    """Collated samples, which behave like the batches of the ctt preprocessor."""
+
+    def __init__(self, tensors):
+        self.tensors = tensors
+
+    def __getitem__(self, key):
+        return self.tensors[key]
+
+    def to(self, *args, **kwargs):
+        return self
+
+    def to_dict(self):
+        return dict(self.tensors)
+
+
+class StubPreprocessor:
+    """Preprocessor whose samples are the candidate encounters of the humans, padded when collated."""
+
+    def preprocess(self, human_day_info, as_batch=True):
+        candidate_encounters = human_day_info["observed"]["candidate_encounters"]
+        if not len(candidate_encounters):
+            raise InvalidSetSize
+        sample = torch.tensor(candidate_encounters, dtype=torch.float32)
+        return self.collate_fn([sample]) if as_batch else sample
+
+    def collate_fn(self, samples):
+        encounters = torch.nn.utils.rnn.pad_sequence(samples, batch_first=True)
+        mask = torch.zeros(encounters.shape[:2])
+        for idx, sample in enumerate(samples):
+            mask[idx, :len(sample)] = 1.
+        return StubBatch({"encounters": encounters, "mask": mask})
+
+
+class StubModel:
+    """Model whose outputs depend on the encounters of each human, but not on their padding."""
+
+    def __init__(self):
+        self.batch_sizes = []
+
+    def __call__(self, inputs):
+        encounters, mask = inputs["encounters"], inputs["mask"]
+        self.batch_sizes.append(len(encounters))
+        encounter_variables = encounters[:, :, 2:3] - encounters[:, :, :1]
+        mean_risk = (encounters[:, :, 2] * mask).sum(dim=1, keepdim=True) / mask.sum(dim=1, keepdim=True)
+        latent_variable = mean_risk[:, None, :] * torch.arange(1., 15.)[None, :, None]
+        return {"encounter_variables": encounter_variables, "latent_variable": latent_variable}
+
+
+def test_infer_batch_matches_infer():
+    engine = InferenceEngineWrapper.__new__(InferenceEngineWrapper)  # without loading an experiment
+    engine.preprocessor, engine.model = StubPreprocessor(), StubModel()
+    assert engine.can_infer_batch()
+    rng = np.random.RandomState(0)
+    # humans without candidate encounters cannot be preprocessed (InvalidSetSize)
+    encounter_counts = [3, 0, 1, 7, 2, 0, 5, 5, 1, 4, 6]
+    human_day_infos = [{"observed": {"candidate_encounters": rng.rand(n, 4)}} for n in encounter_counts]
+    results = engine.infer_batch(human_day_infos, max_batch_size=4)
+    assert engine.model.batch_sizes == [4, 4, 1]
+    assert len(results) == len(human_day_infos)
+    for human_day_info, result in zip(human_day_infos, results):
+        expected = engine.infer(human_day_info)
+        if expected is None:
+            assert result is None
+            continue
+        assert result.keys() == expected.keys()
+        for key in expected:
+            np.testing.assert_allclose(result[key], expected[key], rtol=1e-6)
+    assert [len(result["contagion_proba"]) for result in results if result is not None] == \
+        [n for n in encounter_counts if n]
+
+
+def test_batched_inference_matches_single():
+    results = {}
+    for max_batch_size in [1, 64]:
+        conf = {
+            "TRACING_N_DAYS_HISTORY": 14, "RISK_MODEL": "transformer", "INFERENCE_MAX_BATCH_SIZE": max_batch_size,
+        }
+        engine = FakeEngine()
+        results[max_batch_size] = proc_human_batch(make_batch(8, conf), engine, cluster_mgr_map={})
+        assert engine.batch_sizes == ([] if max_batch_size == 1 else [8])
+    assert any(risk_history is not None for _, risk_history in results[64])
+    for (name, risk_history), (expected_name, expected_risk_history) in zip(results[64], results[1]):
+        assert name == expected_name
+        np.testing.assert_array_equal(risk_history, expected_risk_history)
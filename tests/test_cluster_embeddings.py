@@ -0,0 +1,166 @@
+import datetime
+import os
+import pickle
+import time
+
+import numpy as np
+import pytest
+
+from covid19sim.inference.clustering.blind import BlindClusterManager
+from covid19sim.inference.clustering.gaen import GAENClusterManager
+from covid19sim.inference.clustering.perfect import PerfectClusterManager
+from covid19sim.inference.clustering.simple import SimplisticClusterManager
+from covid19sim.inference.helper import candidate_exposures
+from covid19sim.inference.message_utils import EncounterMessage, batch_messages, create_new_uid, \
+    create_update_message, create_updated_encounter_with_message
+
+START = datetime.datetime(2020, 2, 28)
+MAX_HISTORY_OFFSET = datetime.timedelta(days=14)
+
+
+def make_encounters(rng, day, n_encounters):
+    return [
+        EncounterMessage(
+            uid=create_new_uid(rng),
+            risk_level=int(rng.randint(16)),
+            encounter_time=day,
+            _sender_uid=f"human:{rng.randint(1000)}",
+            _receiver_uid="human:0",
+            _real_encounter_time=day,
+            _exposition_event=[None, False, True][rng.randint(3)],
+        )
+        for _ in range(n_encounters)
+    ]
+
+
+def make_manager(manager_type, n_days, n_encounters_per_day, seed=0):
+    rng = np.random.RandomState(seed)
+    manager = manager_type(
+        max_history_offset=MAX_HISTORY_OFFSET,
+        generate_embeddings_by_timestamp=True,
+        generate_backw_compat_embeddings=True,
+    )
+    for day_idx in range(n_days):
+        day = START + datetime.timedelta(days=day_idx)
+        manager.set_current_timestamp(day)
+        manager.add_messages(make_encounters(rng, day, n_encounters_per_day), current_timestamp=day)
+    return manager
+
+
+def _get_reference_exposition(cluster, target_timestamp):
+    """Returns the exposition flag of a cluster on a day, or None if it has no encounter on that day."""
+    if hasattr(cluster, "messages_by_timestamp"):
+        cluster_timestamp_match = False
+        cluster_contains_matching_exposition = False
+        for cluster_timestamp, messages in cluster.messages_by_timestamp.items():
+            if cluster_timestamp.date() == target_timestamp.date():
+                cluster_timestamp_match = True
+                cluster_contains_matching_exposition |= \
+                    any([m._exposition_event for m in messages])
+                if cluster_contains_matching_exposition:
+                    break
+        return cluster_contains_matching_exposition if cluster_timestamp_match else None
+    cluster_timestamp_match = \
+        any([msg.encounter_time.date() == target_timestamp.date() for msg in cluster.messages])
+    if not cluster_timestamp_match:
+        return None
+    return any([m._exposition_event for m in cluster.messages])
+
+
+def get_reference_arrays(manager):
+    """Assembles the arrays one cluster and one day at a time, like the original implementation."""
+    embeddings, expositions = [], []
+    target_timestamp = manager.latest_refresh_timestamp - manager.max_history_offset
+    while target_timestamp <= manager.latest_refresh_timestamp:
+        for cluster in manager.clusters:
+            embed = cluster.get_cluster_embedding(
+                current_timestamp=target_timestamp,
+                include_cluster_id=True,
+                old_compat_mode=True,
+            )
+            if embed is not None:
+                embeddings.append([*embed, (manager.latest_refresh_timestamp - target_timestamp).days])
+        target_timestamp += datetime.timedelta(days=1)
+    target_timestamp = manager.latest_refresh_timestamp - manager.max_history_offset
+    while target_timestamp <= manager.latest_refresh_timestamp:
+        for cluster in manager.clusters:
+            exposition = _get_reference_exposition(cluster, target_timestamp)
+            if exposition is not None:
+                expositions.append(exposition)
+        target_timestamp += datetime.timedelta(days=1)
+    return np.asarray(embeddings), np.asarray(expositions)
+
+
+@pytest.mark.parametrize("manager_type", [BlindClusterManager, GAENClusterManager])
+def test_embeddings_match_reference(manager_type):
+    manager = make_manager(manager_type, n_days=20, n_encounters_per_day=30)
+    embeddings, expositions = candidate_exposures(manager)
+    expected_embeddings, expected_expositions = get_reference_arrays(manager)
+    assert embeddings.dtype == np.int64 and expositions.dtype == bool
+    np.testing.assert_array_equal(embeddings, expected_embeddings)
+    np.testing.assert_array_equal(expositions, expected_expositions)
+    np.testing.assert_array_equal(manager.get_embeddings_array(), embeddings)
+    np.testing.assert_array_equal(manager._get_expositions_array(), expositions)
+    # the offsets go from the oldest day to the latest one
+    assert (np.diff(embeddings[:, 3]) <= 0).all()
+
+    empty_manager = make_manager(manager_type, n_days=0, n_encounters_per_day=0)
+    assert candidate_exposures(empty_manager)[0].shape == (0,)
+
+
+@pytest.mark.parametrize("manager_type", [
+    BlindClusterManager, GAENClusterManager, PerfectClusterManager, SimplisticClusterManager,
+])
+def test_embeddings_follow_cluster_changes(manager_type):
+    # the rows of the clusters are kept up-to-date as encounters and (batched) updates split, merge and
+    # expire clusters, and rebuilt when the manager is unpickled
+    rng = np.random.RandomState(1)
+    manager = manager_type(
+        max_history_offset=MAX_HISTORY_OFFSET,
+        add_orphan_updates_as_clusters=True,  # as in the simulation
+        generate_embeddings_by_timestamp=True,
+        generate_backw_compat_embeddings=True,
+    )
+    encounters = []
+    for day_idx in range(25):
+        day = START + datetime.timedelta(days=day_idx)
+        encounters = [e for e in encounters if day - e.encounter_time < MAX_HISTORY_OFFSET]
+        updates = []
+        for encounter_idx in rng.choice(len(encounters), size=min(len(encounters), 5), replace=False):
+            encounter = encounters[encounter_idx]
+            new_risk_level = (encounter.risk_level + 1 + rng.randint(15)) % 16
+            updates.append(create_update_message(encounter, new_risk_level, day))
+            encounters[encounter_idx] = create_updated_encounter_with_message(encounter, updates[-1])
+        new_encounters = make_encounters(rng, day, int(rng.randint(10)))
+        encounters.extend(new_encounters)
+        manager.set_current_timestamp(day)
+        manager.add_messages(new_encounters, current_timestamp=day)
+        manager.add_messages(batch_messages(updates) if day_idx % 2 else updates, current_timestamp=day)
+        if day_idx % 5 == 4:
+            manager = pickle.loads(pickle.dumps(manager))
+
+        embeddings, expositions = candidate_exposures(manager)
+        expected_embeddings, expected_expositions = get_reference_arrays(manager)
+        np.testing.assert_array_equal(embeddings, expected_embeddings.reshape(embeddings.shape))
+        np.testing.assert_array_equal(expositions, expected_expositions)
+
+
+@pytest.mark.skipif(not os.environ.get("COVID19SIM_BENCHMARKS"), reason="set COVID19SIM_BENCHMARKS=1 to run")
+def test_embeddings_benchmark():
+    manager = make_manager(BlindClusterManager, n_days=15, n_encounters_per_day=200)
+    n_repeats = 5
+
+    start_time = time.perf_counter()
+    for _ in range(n_repeats):
+        expected = get_reference_arrays(manager)
+    reference_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    for _ in range(n_repeats):
+        result = candidate_exposures(manager)
+    buffer_time = time.perf_counter() - start_time
+
+    print(f"\n{len(manager.clusters)} clusters: per-cluster loop {reference_time / n_repeats * 1000:.2f} ms, "
+          f"embedding buffer {buffer_time / n_repeats * 1000:.2f} ms")
+    np.testing.assert_array_equal(result[0], expected[0])
+    np.testing.assert_array_equal(result[1], expected[1])
@@ -1,4 +1,5 @@
 import numpy as np
+import pickle
 import unittest
 
 import covid19sim.inference.clustering.blind as clu
@@ -284,6 +285,68 @@ class BlindClusteringTests(unittest.TestCase):
                 min_homogeneity = 1 / len(self.message_context.contact_messages)
                 self.assertLessEqual(min_homogeneity, homogeneity_scores[id])
 
+    def test_signature_index(self):
+        """
+        clusters are indexed by (risk level, timestamp); after merging, each signature
+        has a single cluster, and the index survives pickling
+        """
+        for _ in range(20):
+            self.message_context.insert_random_messages(
+                n_encounter=30,
+                n_update=10,
+                exposure_tick=np.random.randint(self.message_context.max_tick),
+            )
+        messages = self.message_context.contact_messages
+        cluster_manager = clu.BlindClusterManager(
+            max_history_offset=self.message_context.max_history_offset,
+            add_orphan_updates_as_clusters=True,
+        )
+        cluster_manager.add_messages(messages[:len(messages) // 2])
+        signatures = [(c.risk_level, c.first_update_time) for c in cluster_manager.clusters]
+        self.assertEqual(len(signatures), len(set(signatures)))
+        for cluster in cluster_manager.clusters:
+            self.assertIs(cluster_manager._find_cluster(*signatures.pop(0)), cluster)
+
+        # a restored manager keeps clustering the same way
+        restored_manager = pickle.loads(pickle.dumps(cluster_manager))
+        cluster_manager.add_messages(messages[len(messages) // 2:])
+        restored_manager.add_messages(messages[len(messages) // 2:])
+        self.assertEqual(
+            [(c.cluster_id, c.risk_level, c.first_update_time, c.get_encounter_count())
+             for c in cluster_manager.clusters],
+            [(c.cluster_id, c.risk_level, c.first_update_time, c.get_encounter_count())
+             for c in restored_manager.clusters],
+        )
+
+    def test_split_cluster_order(self):
+        """
+        clusters split from another one are inserted right after it, in the list and in the index,
+        including once the order keys have to be renumbered
+        """
+        def make_cluster(cluster_id):
+            message = mu.EncounterMessage(uid=cluster_id, risk_level=cluster_id % 2,
+                                          encounter_time=mu.TimestampDefault)
+            return clu.BlindCluster.create_cluster_from_message(message, cluster_id)
+
+        cluster_manager = clu.BlindClusterManager(max_history_offset=self.message_context.max_history_offset)
+        expected_clusters = []
+        for cluster_id in range(4):
+            cluster = make_cluster(cluster_id)
+            cluster_manager._append_cluster(cluster)
+            expected_clusters.append(cluster)
+        # more splits after the same cluster than there is room for between two order keys
+        for cluster_id in range(4, 4 + 100):
+            cluster = make_cluster(cluster_id)
+            previous_cluster = expected_clusters[1] if cluster_id % 3 else expected_clusters[-1]
+            cluster_manager._insert_cluster_after(previous_cluster, cluster)
+            expected_clusters.insert(expected_clusters.index(previous_cluster) + 1, cluster)
+        self.assertEqual(cluster_manager.clusters, expected_clusters)
+        for risk_level in range(2):
+            self.assertEqual(
+                cluster_manager._get_cluster_index()[(risk_level, mu.TimestampDefault)],
+                [c for c in expected_clusters if c.risk_level == risk_level],
+            )
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,43 @@
+import os
+import time
+from tempfile import TemporaryDirectory
+
+import zarr
+
+from covid19sim.inference.server_utils import DataCollectionServer, get_data_collection_client
+
+
+def test_batched_data_collection():
+    """
+    Samples written through the pooled client should all be stored, whatever the batch size.
+    """
+    n_people, n_days = 30, 3
+    with TemporaryDirectory() as d:
+        frontend_address = "ipc://" + os.path.join(d, "frontend.ipc")
+        collection_server = DataCollectionServer(
+            data_output_path=os.path.join(d, "train.zarr"),
+            human_count=n_people,
+            simulation_days=n_days,
+            frontend_address=frontend_address,
+            backend_address="ipc://" + os.path.join(d, "backend.ipc"),
+        )
+        collection_server.start()
+
+        client = get_data_collection_client(frontend_address, batch_size=7)
+        assert get_data_collection_client(frontend_address) is client
+        for day_idx in range(n_days):
+            for hour_idx in [0, 12]:
+                for human_idx in range(n_people):
+                    client.write(day_idx, hour_idx, human_idx, {"day": day_idx, "human": human_idx})
+                client.flush()
+                assert client.pending_acks == 0 and not client.pending_samples
+
+        # wait for the worker to write the queued samples
+        time.sleep(1)
+        collection_server.stop_gracefully()
+        collection_server.join()
+
+        fd = zarr.open(os.path.join(d, "train.zarr"), "r")
+        assert fd["dataset"].attrs["total_samples"] == n_days * 2 * n_people
+        assert fd["is_filled"][0, 12].all() and not fd["is_filled"][0, 6].any()
+        assert fd["dataset"][1, 0, 5] == {"day": 1, "human": 5}
@@ -0,0 +1,77 @@
+import datetime
+import types
+import unittest.mock
+
+import numpy as np
+
+from covid19sim.inference.heavy_jobs import RiskInferenceCounters, batch_run_timeslot_heavy_jobs, \
+    clear_risk_inference_cache
+
+START = datetime.datetime(2020, 2, 28)
+CONF = {
+    "RISK_MODEL": "transformer", "SKIP_UNCHANGED_RISK_INFERENCE": True, "TRACING_N_DAYS_HISTORY": 14,
+    "TRANSFORMER_EXP_PATH": "",
+}
+
+
+def make_human(idx, city):
+    human = types.SimpleNamespace(
+        name=f"human:{idx}", has_app=True, time_slots=[5], is_dead=False, city=city, env=city.env, conf=CONF,
+        test_results=[], time_to_test_result=None, rng=np.random.RandomState(idx),
+        contact_book=types.SimpleNamespace(mailbox_key_positions={}),
+        reported_symptoms_version=0, risk_inference_inputs=None, risk_inference_output=None,
+        risk_history_map={},
+    )
+    human.apply_transformer_risk_updates = \
+        lambda current_day_idx, risk_history: human.risk_history_map.update({current_day_idx: risk_history[0]})
+    return human
+
+
+def fake_make_human_as_message(human, personal_mailbox, conf):
+    personal_mailbox.clear()
+    human.rng.randint(1000)
+    return human
+
+
+def fake_proc_human_batch(sample, engine, cluster_mgr_map):
+    return [(params["human"].name, np.full(14, params["current_day"] + .5)) for params in sample]
+
+
+def test_unchanged_humans_are_skipped():
+    city = types.SimpleNamespace(env=types.SimpleNamespace(timestamp=START))
+    humans = [make_human(idx, city) for idx in range(4)]
+    city.hd = {human.name: human for human in humans}
+    mailbox = {human.name: {} for human in humans}
+    counters = RiskInferenceCounters()
+
+    def run(day_idx, hour=5):
+        city.env.timestamp = START + datetime.timedelta(days=day_idx, hours=hour)
+        with unittest.mock.patch("covid19sim.inference.heavy_jobs.make_human_as_message", fake_make_human_as_message), \
+                unittest.mock.patch("covid19sim.inference.heavy_jobs.proc_human_batch") as proc_human_batch:
+            proc_human_batch.side_effect = fake_proc_human_batch
+            batch_run_timeslot_heavy_jobs(
+                humans, START, city.env.timestamp, mailbox, 5, CONF, risk_inference_counters=counters)
+            return sorted(params["human"].name for params in proc_human_batch.call_args[0][0])
+
+    assert run(0) == ["human:0", "human:1", "human:2", "human:3"]
+    assert run(0) == []
+    humans[0].contact_book.mailbox_key_positions["uid"] = (0, 0)
+    mailbox["human:0"]["uid"] = ["update"]
+    humans[1].reported_symptoms_version += 1
+    humans[2].test_results.append(("positive", START, 0))
+    humans[2].time_to_test_result = 0
+    assert run(0) == ["human:0", "human:1", "human:2"]
+    assert (counters.inferred, counters.skipped) == (7, 5)
+    assert counters.skip_ratio == 5 / 12
+    # the previous risk history is applied again when the inference is skipped
+    humans[3].risk_history_map.clear()
+    assert run(0) == []
+    assert humans[3].risk_history_map == {0: .5}
+    assert run(1) == ["human:0", "human:1", "human:2", "human:3"]
+    # the random stream of the humans does not depend on the skipped inferences
+    assert all(human.rng.randint(1000) == np.random.RandomState(idx).randint(1000, size=6)[-1]
+               for idx, human in enumerate(humans))
+    # the cached risk histories are not reused once the clusters of the inference engine are reset
+    assert run(1) == []
+    clear_risk_inference_cache(humans)
+    assert run(1) == ["human:0", "human:1", "human:2", "human:3"]
@@ -9,7 +9,7 @@ from covid19sim.utils.demographics import _create_senior_residences, assign_hous
 from covid19sim.locations.location import Household
 from covid19sim.locations.city import EmptyCity
 from covid19sim.inference.message_utils import UpdateMessage
-from covid19sim.epidemiology.symptoms import MODERATE, SEVERE, EXTREMELY_SEVERE
+from covid19sim.epidemiology.symptoms import MILD, MODERATE, SEVERE, EXTREMELY_SEVERE, encode_symptoms
 from covid19sim.inference.heavy_jobs import DummyMemManager
 
 class TrackerMock:
@@ -187,28 +187,28 @@ class HeuristicTest(unittest.TestCase):
 
     def test_symptoms_empty(self):
         reported_symptoms = []
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
         risk_history, rec_level = self.heuristic.handle_symptoms(self.human1)
         assert rec_level == 0
         assert risk_history == []
 
     def test_symptoms_mild(self):
-        reported_symptoms = ["mild"]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        reported_symptoms = [MILD]
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
         risk_history, rec_level = self.heuristic.handle_symptoms(self.human1)
         assert rec_level == 2
         assert risk_history == [0.79687407, 0.79687407, 0.79687407, 0.79687407, 0.79687407, 0.79687407, 0.79687407]
 
     def test_symptoms_moderate(self):
         reported_symptoms = [MODERATE]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
         risk_history, rec_level = self.heuristic.handle_symptoms(self.human1)
         assert rec_level == 3
         assert risk_history == [0.90514533, 0.90514533, 0.90514533, 0.90514533, 0.90514533, 0.90514533, 0.90514533]
 
     def test_symptoms_severe(self):
         reported_symptoms = [SEVERE]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
         risk_history, rec_level = self.heuristic.handle_symptoms(self.human1)
         assert rec_level == 3
         assert risk_history == [0.94996601, 0.94996601, 0.94996601, 0.94996601, 0.94996601, 0.94996601, 0.94996601]
@@ -216,7 +216,7 @@ class HeuristicTest(unittest.TestCase):
 
     def test_symptoms_exteremely_severe(self):
         reported_symptoms = [EXTREMELY_SEVERE]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
         risk_history, rec_level = self.heuristic.handle_symptoms(self.human1)
         assert rec_level == 3
         assert risk_history == [0.94996601, 0.94996601, 0.94996601, 0.94996601, 0.94996601, 0.94996601, 0.94996601]
@@ -233,7 +233,7 @@ class HeuristicTest(unittest.TestCase):
         self.human1.env = self.env
 
         reported_symptoms = [SEVERE]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
         mailbox = {}
         risk_history = self.heuristic.compute_risk(self.human1, mailbox, self.hd)
         assert self.human1._heuristic_rec_level == 0
@@ -244,7 +244,7 @@ class HeuristicTest(unittest.TestCase):
         self.env = Env(self.start_time + datetime.timedelta(days=3))
         self.human1.env = self.env
         reported_symptoms = [SEVERE]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
 
         # Risk Level 1
         rel_encounter_day = 5
@@ -260,8 +260,8 @@ class HeuristicTest(unittest.TestCase):
     def test_high_risk_message_and_mild_symptoms_diff_days(self):
         self.env = Env(self.start_time + datetime.timedelta(days=3))
         self.human1.env = self.env
-        reported_symptoms = ["mild"]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        reported_symptoms = [MILD]
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
 
         rel_encounter_day = 2
         num_encounters = 1
@@ -307,8 +307,8 @@ class HeuristicTest(unittest.TestCase):
         self.human1._rec_level = 3
         self.human1._heuristic_rec_level = 3
         self.human1.risk_history_map = {1: 0.9, 2: 0.9, 3: 0.9}
-        reported_symptoms = ["mild"]
-        self.human1.rolling_all_reported_symptoms.appendleft(reported_symptoms)
+        reported_symptoms = [MILD]
+        self.human1.rolling_all_reported_symptoms[0] = encode_symptoms(reported_symptoms)
 
         risk_history = self.heuristic.compute_risk(self.human1, clusters, self.hd)
         assert self.human1._heuristic_rec_level == 3
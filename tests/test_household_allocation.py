@@ -0,0 +1,92 @@
+import datetime
+import os
+import time
+
+import numpy as np
+import pytest
+
+from covid19sim.epidemiology.human_properties import get_age_bin
+from covid19sim.locations.city import EmptyCity
+from covid19sim.utils.constants import AGE_BIN_WIDTH_5
+from covid19sim.utils.demographics import HumanPool, assign_households_to_humans, get_humans_with_age
+from covid19sim.utils.env import Env
+from covid19sim.utils.utils import relativefreq2absolutefreq
+from tests.utils import get_test_conf
+
+
+class PooledHuman:
+    """Stand-in for the humans of a pool, which only need an age bin."""
+    __slots__ = ["name", "age_bin_width_5"]
+
+    def __init__(self, name, age):
+        self.name = name
+        self.age_bin_width_5 = get_age_bin(age, width=5)
+
+
+def make_pool(n_humans_per_bin):
+    humans = {}
+    for bin in AGE_BIN_WIDTH_5:
+        humans[bin] = [PooledHuman(len(humans) * n_humans_per_bin + i, bin[0]) for i in range(n_humans_per_bin)]
+    return HumanPool(humans)
+
+
+def test_pool_draw_remove_add():
+    rng = np.random.RandomState(0)
+    pool = make_pool(20)
+    bins = pool.bins
+    n_humans = 20 * len(bins)
+    humans = {bin: pool.get_humans(bin) for bin in bins}
+    assert len(pool) == n_humans and pool.get_counts(bins).tolist() == [20] * len(bins)
+
+    drawn = [pool.draw(bins[3], rng) for _ in range(20)]
+    assert pool.count(bins[3]) == 0 and set(drawn) == set(humans[bins[3]])
+    assert all(human not in pool for human in drawn)
+
+    removed = humans[bins[5]][:10]
+    for human in removed:
+        pool.remove(human)
+    assert sorted(h.name for h in pool.get_humans(bins[5])) == sorted(h.name for h in humans[bins[5]][10:])
+
+    # putting back humans is idempotent
+    for human in drawn + removed + humans[bins[0]]:
+        pool.add(human)
+    assert len(pool) == n_humans and pool.counts.sum() == n_humans
+    for bin in bins:
+        assert set(pool.get_humans(bin)) == set(humans[bin])
+
+
+def make_humans(conf, n_people):
+    rng = np.random.RandomState(0)
+    city = EmptyCity(Env(datetime.datetime(2020, 2, 28)), rng, (0, 1000), (0, 1000), conf)
+    city.n_people = n_people
+    age_histogram = relativefreq2absolutefreq(
+        bins_fractions={(x[0], x[1]): x[2] for x in conf['P_AGE_REGION']}, n_elements=city.n_people, rng=city.rng,
+    )
+    return city, get_humans_with_age(city, age_histogram, conf, rng)
+
+
+def check_allocation(allocated_humans, city):
+    assert len(allocated_humans) == len(set(allocated_humans)) == city.n_people
+    residences = list(city.households) + city.senior_residences
+    assert sum(len(res.residents) for res in residences) == city.n_people
+    assert all(human in human.household.residents for human in allocated_humans)
+
+
+def test_assign_households_to_humans():
+    conf = get_test_conf("naive_local.yaml")
+    city, humans = make_humans(conf, 1000)
+    check_allocation(assign_households_to_humans(humans, city, conf), city)
+
+
+@pytest.mark.skipif(not os.environ.get("COVID19SIM_BENCHMARKS"), reason="set COVID19SIM_BENCHMARKS=1 to run")
+@pytest.mark.parametrize("n_people", [10_000, 100_000, 1_000_000])
+def test_household_synthesis_benchmark(n_people):
+    conf = get_test_conf("naive_local.yaml")
+    city, humans = make_humans(conf, n_people)
+
+    start_time = time.perf_counter()
+    allocated_humans = assign_households_to_humans(humans, city, conf)
+    synthesis_time = time.perf_counter() - start_time
+
+    print(f"\n{n_people} humans: {len(city.households)} households synthesized in {synthesis_time:.2f} s")
+    check_allocation(allocated_humans, city)
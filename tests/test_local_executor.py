@@ -0,0 +1,92 @@
+import json
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+from covid19sim.job_scripts.local_executor import (
+    MANIFEST_FILENAME, LocalRun, get_pool_size, get_run_key, get_staging_outdir, run_local_sweep,
+)
+
+# stand-in for `run.py`: writes a run folder in `outdir`, and fails if asked to
+FAKE_RUN_PY = textwrap.dedent("""
+    import sys
+    from pathlib import Path
+    args = dict(arg.split("=", 1) for arg in sys.argv[1:])
+    if args.get("fail") == "True":
+        sys.exit(3)
+    run_dir = Path(args["outdir"]) / ("sim_v2_seed-" + args["seed"])
+    run_dir.mkdir(parents=True)
+    (run_dir / "tracker_data.pkl").write_bytes(bytearray(10 ** 6))
+""")
+
+EXPERIMENT_PY = Path(__file__).parent.parent / "src/covid19sim/job_scripts/experiment.py"
+
+
+def make_runs(base_dir, seeds, fail=()):
+    runs = []
+    for seed in seeds:
+        key = get_run_key(json.dumps({"seed": seed}))
+        outdir = str(Path(base_dir) / "heuristicv1")
+        hydra_args = f" seed={seed} outdir={get_staging_outdir(outdir, key)} fail={seed in fail}"
+        runs.append(LocalRun(key=key, hydra_args=hydra_args, outdir=outdir))
+    return runs
+
+
+def test_pool_size():
+    assert get_pool_size(n_cpus=8, mem_per_run=4, available_memory=64 * 1024 ** 3) == 8
+    assert get_pool_size(n_cpus=8, mem_per_run=4, available_memory=10 * 1024 ** 3) == 2
+    assert get_pool_size(n_cpus=8, mem_per_run=4, available_memory=1024) == 1
+    assert get_pool_size(mem_per_run=1e-6) >= 1
+
+
+def test_local_sweep(tmp_path):
+    code_loc = tmp_path / "code"
+    code_loc.mkdir()
+    (code_loc / "run.py").write_text(FAKE_RUN_PY)
+    base_dir = tmp_path / "sweep"
+
+    runs = make_runs(base_dir, seeds=range(4), fail={2})
+    manifest = run_local_sweep(runs, str(base_dir), str(code_loc), n_workers=2)
+    assert (base_dir / MANIFEST_FILENAME).exists()
+    for seed, run in enumerate(runs):
+        entry = manifest.runs[run.key]
+        assert entry["wall_time"] > 0 and entry["peak_rss_mb"] > 0
+        if seed == 2:
+            assert entry["returncode"] == 3 and entry["run_dirs"] == []
+        else:
+            assert entry["returncode"] == 0
+            assert [Path(run_dir).name for run_dir in entry["run_dirs"]] == [f"sim_v2_seed-{seed}"]
+    # the outputs of successful runs are moved out of their staging folders
+    assert sorted(path.name for path in (base_dir / "heuristicv1").glob("sim_v2_*")) == \
+        ["sim_v2_seed-0", "sim_v2_seed-1", "sim_v2_seed-3"]
+
+    # only the failed run is run again, and the manifest is reloaded from the disk
+    (code_loc / "run.py").write_text(FAKE_RUN_PY.replace("sys.exit(3)", "pass"))
+    finished_at = {key: entry["finished_at"] for key, entry in manifest.runs.items()}
+    manifest = run_local_sweep(runs, str(base_dir), str(code_loc), n_workers=2)
+    rerun = [key for key, entry in manifest.runs.items() if entry["finished_at"] != finished_at[key]]
+    assert rerun == [runs[2].key] and manifest.runs[runs[2].key]["returncode"] == 0
+    assert not list((base_dir / "heuristicv1").glob(".local_*"))
+
+
+def test_experiment_skips_completed_runs(tmp_path):
+    code_loc = tmp_path / "code"
+    code_loc.mkdir()
+    (code_loc / "run.py").write_text(FAKE_RUN_PY)
+    base_dir = tmp_path / "sweep"
+    command = [
+        sys.executable, str(EXPERIMENT_PY), "infra=local", "exp_file=heuristic_debug_singles",
+        f"base_dir={base_dir}", f"code_loc={code_loc}", "cpus=2", "mem=1",
+    ]
+
+    # each sweep has its own `now_str`, the runs of the first one are still recognized by the second one
+    subprocess.run(command, cwd=tmp_path, check=True)
+    with (base_dir / MANIFEST_FILENAME).open("r") as f:
+        runs = json.load(f)["runs"]
+    assert len(runs) == 3 and all(entry["returncode"] == 0 for entry in runs.values())
+
+    output = subprocess.run(command, cwd=tmp_path, check=True, stdout=subprocess.PIPE, universal_newlines=True).stdout
+    assert "3 completed run(s) skipped, 0 to run" in output
+    with (base_dir / MANIFEST_FILENAME).open("r") as f:
+        assert json.load(f)["runs"] == runs
@@ -0,0 +1,180 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from covid19sim.epidemiology.human_properties import get_age_bin
+from covid19sim.locations.location import Location
+from covid19sim.utils.env import Env
+from tests.utils import get_test_conf
+
+
+class _Human:
+    """
+    Minimal stand-in for `covid19sim.human.Human` exposing the attributes used for contact sampling.
+    """
+    def __init__(self, name, age, reduction_factor, location_start_time, location_leaving_time):
+        self.name = name
+        self.age_bin_width_5 = get_age_bin(age, width=5)
+        self.known_connections = set()
+        self.intervened_behavior = _Behavior(reduction_factor)
+        self.location_start_time = location_start_time
+        self.location_leaving_time = location_leaving_time
+        self.is_infectious = False
+
+
+class _Behavior:
+    def __init__(self, reduction_factor):
+        self.reduction_factor = reduction_factor
+
+    def daily_interaction_reduction_factor(self, location):
+        return self.reduction_factor
+
+
+def _make_location(conf, seed, n_humans, reduction_factor=0.0):
+    """
+    Builds a location filled with `n_humans` lightweight humans exposing the attributes required for contact sampling.
+    """
+    rng = np.random.RandomState(seed)
+    env = Env(datetime.datetime(2020, 2, 28, 0, 0))
+    location = Location(
+        env=env,
+        rng=rng,
+        conf=conf,
+        area=1000,
+        name="MISC:0",
+        location_type="MISC",
+        lat=0,
+        lon=0,
+        capacity=None,
+    )
+
+    humans = []
+    for i in range(n_humans):
+        age = rng.randint(0, 90)
+        start_time = env.ts_initial + rng.randint(0, 3600)
+        humans.append(_Human(
+            name=f"human:{i}",
+            age=age,
+            reduction_factor=reduction_factor,
+            location_start_time=start_time,
+            location_leaving_time=start_time + rng.randint(0, 4 * 3600),
+        ))
+
+    # some known connections to exercise preferential attachment
+    for human in humans:
+        for other_human in rng.choice(humans, size=3, replace=False):
+            if other_human is not human:
+                human.known_connections.add(other_human)
+                other_human.known_connections.add(human)
+
+    # some humans leave before others arrive to exercise the removal of slots
+    for human in humans:
+        location.add_human(human)
+    for human in humans[::4]:
+        location.remove_human(human)
+    for human in humans[::8]:
+        location.add_human(human)
+
+    return location
+
+
+@pytest.mark.parametrize('seed', [0, 1, 2])
+@pytest.mark.parametrize('interaction_type', ["known", "unknown"])
+def test_vectorized_interactees_match_reference(seed, interaction_type):
+    """
+    With the same seed, the vectorized sampler should pick the same interactees as the per-interactee sampler.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    conf['_CURRENT_PREFERENTIAL_ATTACHMENT_FACTOR'] = conf['BEGIN_PREFERENTIAL_ATTACHMENT_FACTOR']
+    conf['_MEAN_DAILY_UNKNOWN_CONTACTS'] = 5.0
+
+    reference = _make_location(conf, seed, n_humans=60)
+    vectorized = _make_location(conf, seed, n_humans=60)
+    occupied_slots = np.flatnonzero(vectorized.occupancy.occupied)
+    assert [h.name for h in reference.humans] == [h.name for h in vectorized.occupancy.humans_at(occupied_slots)]
+
+    for ref_human, vec_human in zip(list(reference.humans), list(vectorized.humans)):
+        # distances and durations are drawn in a different order, so both samplers start from the same state
+        vectorized.rng.set_state(reference.rng.get_state())
+        ref_interactions = reference._sample_interaction_with_type(interaction_type, ref_human)
+        vec_interactions = vectorized._sample_interaction_with_type_vectorized(interaction_type, vec_human)
+        assert [x[0].name for x in ref_interactions] == [x[0].name for x in vec_interactions]
+
+        for other_human, distance_profile, duration in vec_interactions:
+            assert other_human is not vec_human
+            assert 0 <= distance_profile.distance <= distance_profile.packing_term
+            assert duration >= 0
+            if interaction_type == "known":
+                t_overlap = (min(vec_human.location_leaving_time, other_human.location_leaving_time) -
+                             max(vec_human.location_start_time, other_human.location_start_time))
+                assert duration <= t_overlap
+
+
+def test_vectorized_duration_distribution_matches_reference():
+    """
+    Durations and distances sampled by both samplers should follow the same distribution.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    conf['_CURRENT_PREFERENTIAL_ATTACHMENT_FACTOR'] = conf['BEGIN_PREFERENTIAL_ATTACHMENT_FACTOR']
+    conf['_MEAN_DAILY_UNKNOWN_CONTACTS'] = 5.0
+
+    samples = {"reference": [], "vectorized": []}
+    for seed in range(10):
+        reference = _make_location(conf, seed, n_humans=40)
+        vectorized = _make_location(conf, seed, n_humans=40)
+        for human in list(reference.humans):
+            for interaction_type in ["known", "unknown"]:
+                samples["reference"] += [(x[1].distance, x[2]) for x in reference._sample_interaction_with_type(interaction_type, human)]
+        for human in list(vectorized.humans):
+            for interaction_type in ["known", "unknown"]:
+                samples["vectorized"] += [(x[1].distance, x[2]) for x in vectorized._sample_interaction_with_type_vectorized(interaction_type, human)]
+
+    reference, vectorized = np.array(samples["reference"]), np.array(samples["vectorized"])
+    assert len(reference) > 500
+    assert np.allclose(reference.mean(axis=0), vectorized.mean(axis=0), rtol=0.1)
+
+
+def test_vectorized_sampling_with_full_reduction():
+    """
+    The vectorized sampler samples no known interactions when `human`'s contacts are entirely reduced, while its
+    unknown interactions are left untouched.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    conf['_CURRENT_PREFERENTIAL_ATTACHMENT_FACTOR'] = conf['BEGIN_PREFERENTIAL_ATTACHMENT_FACTOR']
+    conf['_MEAN_DAILY_UNKNOWN_CONTACTS'] = 5.0
+
+    n_interactions = {}
+    for reduction_factor in [0.0, 1.0]:
+        location = _make_location(conf, 0, n_humans=20, reduction_factor=reduction_factor)
+        n_interactions[reduction_factor] = {"known": 0, "unknown": 0}
+        for human in list(location.humans):
+            for interaction_type in ["known", "unknown"]:
+                interactions = location._sample_interaction_with_type_vectorized(interaction_type, human)
+                n_interactions[reduction_factor][interaction_type] += len(interactions)
+                for other_human, distance_profile, duration in interactions:
+                    assert other_human is not human and other_human in location.humans
+                    assert 0 <= distance_profile.distance <= distance_profile.packing_term
+                    assert duration >= 0
+
+    assert n_interactions[0.0]["known"] > 0
+    assert n_interactions[1.0]["known"] == 0
+    assert n_interactions[1.0]["unknown"] > 0
+
+
+def test_vectorized_sampling_is_the_default(monkeypatch):
+    """
+    `sample_interactions` uses the vectorized sampler when `VECTORIZED_CONTACT_SAMPLING` is not in the configuration.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    conf['_CURRENT_PREFERENTIAL_ATTACHMENT_FACTOR'] = conf['BEGIN_PREFERENTIAL_ATTACHMENT_FACTOR']
+    conf['_MEAN_DAILY_UNKNOWN_CONTACTS'] = 5.0
+    conf.pop('VECTORIZED_CONTACT_SAMPLING', None)
+    location = _make_location(conf, 0, n_humans=20)
+
+    def _reference_sampler(type, human):
+        raise AssertionError("the per-interactee sampler should not be used by default")
+
+    monkeypatch.setattr(location, "_sample_interaction_with_type", _reference_sampler)
+    for human in list(location.humans):
+        location.sample_interactions(human)
@@ -0,0 +1,78 @@
+import datetime
+
+import numpy as np
+
+from covid19sim.inference.message_utils import ContactBook, GlobalMailbox, UpdateMessage
+
+
+def _make_message(rng, uid, receiver, encounter_time):
+    return UpdateMessage(uid=uid, old_risk_level=0, new_risk_level=int(rng.randint(16)),
+                         encounter_time=encounter_time, update_time=encounter_time, _receiver_uid=receiver)
+
+
+def _reference_cleanup(mailbox, current_timestamp, max_encounter_age):
+    # full rebuild of the mailbox, as it was done before messages were bucketed by day
+    new_mailbox = {}
+    for user_key, personal_mailbox in mailbox.items():
+        new_personal_mailbox = {}
+        for mailbox_key, messages in personal_mailbox.items():
+            kept = [m for m in messages if (current_timestamp - m.encounter_time).days <= max_encounter_age]
+            if kept:
+                new_personal_mailbox[mailbox_key] = kept
+        if new_personal_mailbox:
+            new_mailbox[user_key] = new_personal_mailbox
+    return new_mailbox
+
+
+def _non_empty(mailbox):
+    return {user_key: dict(personal_mailbox) for user_key, personal_mailbox in mailbox.items() if personal_mailbox}
+
+
+def test_cleanup_matches_full_rebuild():
+    rng = np.random.RandomState(0)
+    max_encounter_age = 3
+    start = datetime.datetime(2020, 2, 28)
+    mailbox, reference = GlobalMailbox(max_encounter_age), {}
+    uids = {}
+    for day in range(12):
+        for hour in [0, 7, 13, 23]:
+            current_timestamp = start + datetime.timedelta(days=day, hours=hour)
+            for _ in range(20):
+                receiver = f"human:{rng.randint(5)}"
+                encounter_day = max(day - rng.randint(6), 0)
+                encounter_time = start + datetime.timedelta(days=encounter_day)
+                uid = uids.setdefault((receiver, encounter_day, rng.randint(3)), len(uids))
+                message = _make_message(rng, uid, receiver, encounter_time)
+                mailbox.add_message(receiver, message)
+                reference.setdefault(receiver, {}).setdefault(uid, []).append(message)
+
+            # humans consume some of their messages in between cleanups
+            for user_key in list(reference):
+                for uid in list(reference[user_key])[::4]:
+                    assert mailbox[user_key].pop(uid) == reference[user_key].pop(uid)
+
+            mailbox.cleanup(current_timestamp)
+            reference = _reference_cleanup(reference, current_timestamp, max_encounter_age)
+            assert _non_empty(mailbox) == reference
+            assert len(mailbox.buckets) <= max_encounter_age + 2
+
+
+def test_personal_mailboxes_are_created_on_access():
+    mailbox = GlobalMailbox(14)
+    assert mailbox["human:0"] == {}
+    assert "human:0" in mailbox
+
+
+def test_contact_book_mailbox_key_positions():
+    contact_book = ContactBook(tracing_n_days_history=2)
+    for day in range(5):
+        contact_book.mailbox_keys_by_day[day] = []
+        for i in range(3):
+            contact_book.add_mailbox_key(day, 10 * day + i)
+    assert contact_book.mailbox_key_positions[21] == (2, 1)
+
+    start = datetime.datetime(2020, 2, 28)
+    contact_book.cleanup_contacts(start, start + datetime.timedelta(days=4))
+    assert sorted(contact_book.mailbox_keys_by_day) == [2, 3, 4]
+    expected_keys = [key for keys in contact_book.mailbox_keys_by_day.values() for key in keys]
+    assert sorted(contact_book.mailbox_key_positions, key=contact_book.mailbox_key_positions.get) == expected_keys
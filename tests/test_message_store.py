@@ -0,0 +1,170 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from covid19sim.inference.message_store import (
+    NO_RISK_LEVEL, EncounterBook, MessageStore,
+)
+from covid19sim.inference.message_utils import (
+    ContactBook, EncounterMessage, RiskLevelType, create_new_uid,
+    create_update_message, create_updated_encounter_with_message,
+)
+
+START = datetime.datetime(2020, 2, 28, 0, 0)
+TRACING_N_DAYS_HISTORY = 14
+
+
+def proba_to_risk_level(proba):
+    return int(proba * 16)
+
+
+def make_encounters(rng, day_idx, n_encounters):
+    day = START + datetime.timedelta(days=day_idx)
+    return [
+        EncounterMessage(
+            uid=create_new_uid(rng),
+            risk_level=None,
+            encounter_time=day,
+            _sender_uid="human:0",
+            _receiver_uid=f"human:{rng.randint(1, 20)}",
+            _real_encounter_time=day + datetime.timedelta(seconds=int(rng.randint(86400))),
+            _exposition_event=bool(rng.randint(2)),
+        )
+        for _ in range(n_encounters)
+    ]
+
+
+class _ReferenceContactBook:
+    """
+    Encounters of a contact book stored as lists of dataclasses, with the per-message update logic that
+    `ContactBook` used before it was backed by an `EncounterBook`.
+    """
+
+    def __init__(self, tracing_n_days_history):
+        self.tracing_n_days_history = tracing_n_days_history
+        self.encounters_by_day = {}
+
+    def add_encounter(self, day_idx, encounter_message):
+        self.encounters_by_day.setdefault(day_idx, []).append(encounter_message)
+
+    def get_contacts(self, only_with_initial_update=False):
+        output = {}
+        for msgs in self.encounters_by_day.values():
+            for msg in msgs:
+                if msg._receiver_uid not in output and (not only_with_initial_update or msg.risk_level is not None):
+                    output[msg._receiver_uid] = None
+        return list(output)
+
+    def cleanup_contacts(self, current_day_idx):
+        for day in [day for day in self.encounters_by_day if day < current_day_idx - self.tracing_n_days_history]:
+            del self.encounters_by_day[day]
+
+    def generate_initial_updates(self, current_day_idx, current_timestamp, risk_history_map, proba_to_risk_level_map):
+        update_messages = []
+        for encounter_day_idx, encounter_messages in self.encounters_by_day.items():
+            for encounter_message in encounter_messages:
+                if encounter_message.risk_level is None:
+                    encounter_message.risk_level = \
+                        min(proba_to_risk_level_map(risk_history_map[encounter_day_idx]), 15)
+                    update_messages.append(create_update_message(
+                        encounter_message=encounter_message,
+                        new_risk_level=RiskLevelType(encounter_message.risk_level),
+                        current_time=current_timestamp,
+                        update_reason="contact",
+                    ))
+        return update_messages
+
+    def generate_updates(self, current_day_idx, current_timestamp, prev_risk_history_map, curr_risk_history_map,
+                         proba_to_risk_level_map, update_reason):
+        update_messages = []
+        for encounter_day_idx, encounter_messages in self.encounters_by_day.items():
+            if encounter_day_idx not in prev_risk_history_map.keys():
+                prev_risk_history_map[encounter_day_idx] = curr_risk_history_map[encounter_day_idx]
+                continue
+            old_risk_level = min(proba_to_risk_level_map(prev_risk_history_map[encounter_day_idx]), 15)
+            new_risk_level = min(proba_to_risk_level_map(curr_risk_history_map[encounter_day_idx]), 15)
+            if old_risk_level != new_risk_level:
+                for encounter_idx, encounter_message in enumerate(encounter_messages):
+                    if encounter_message.risk_level != new_risk_level:
+                        update_messages.append(create_update_message(
+                            encounter_message=encounter_message,
+                            new_risk_level=RiskLevelType(new_risk_level),
+                            current_time=current_timestamp,
+                            update_reason=update_reason,
+                        ))
+                        encounter_messages[encounter_idx] = create_updated_encounter_with_message(
+                            encounter_message, update_messages[-1],
+                        )
+        return update_messages
+
+
+def test_contact_book_matches_reference():
+    rng = np.random.RandomState(0)
+    store = MessageStore(START)
+    contact_book = ContactBook(tracing_n_days_history=TRACING_N_DAYS_HISTORY, store=store)
+    reference = _ReferenceContactBook(TRACING_N_DAYS_HISTORY)
+    risk_history, prev_risk_history = {}, {}
+    for day_idx in range(20):
+        timestamp = START + datetime.timedelta(days=day_idx, hours=int(rng.randint(24)))
+        for encounter in make_encounters(rng, day_idx, int(rng.randint(0, 6))):
+            reference.add_encounter(day_idx, encounter)
+            contact_book.add_encounter(day_idx, EncounterMessage(**encounter.__dict__))
+        for day_offset in range(TRACING_N_DAYS_HISTORY + 1):
+            risk_history[day_idx - day_offset] = rng.rand()
+
+        contact_book.cleanup_contacts(START, timestamp)
+        reference.cleanup_contacts(day_idx)
+        initial_updates = contact_book.generate_initial_updates(
+            day_idx, timestamp, risk_history, proba_to_risk_level, intervention=object())
+        assert initial_updates == reference.generate_initial_updates(
+            day_idx, timestamp, risk_history, proba_to_risk_level)
+
+        kwargs = dict(
+            current_day_idx=day_idx,
+            current_timestamp=timestamp,
+            curr_risk_history_map=risk_history,
+            proba_to_risk_level_map=proba_to_risk_level,
+            update_reason="unknown",
+        )
+        reference_prev_history = dict(prev_risk_history)
+        updates = contact_book.generate_updates(prev_risk_history_map=prev_risk_history, intervention=object(), **kwargs)
+        assert updates == reference.generate_updates(prev_risk_history_map=reference_prev_history, **kwargs)
+        assert prev_risk_history == reference_prev_history
+        prev_risk_history.update(risk_history)
+
+        expected = [m for messages in reference.encounters_by_day.values() for m in messages]
+        assert store.encounter_messages(contact_book.encounter_book.encounters) == expected
+        humans_map = {name: name for name in store.strings}
+        for only_with_initial_update in [False, True]:
+            assert contact_book.get_contacts(humans_map, only_with_initial_update) == \
+                reference.get_contacts(only_with_initial_update)
+        assert sum(contact_book.contact_counts.values()) == len(expected)
+    assert (contact_book.encounter_book.encounters["risk_level"] != NO_RISK_LEVEL).all()
+    assert np.array_equal(np.unique(contact_book.encounter_book.day_idxs), sorted(reference.encounters_by_day))
+
+
+def test_flag_exposition():
+    rng = np.random.RandomState(2)
+    encounter_book = EncounterBook(MessageStore(START), TRACING_N_DAYS_HISTORY, initial_capacity=2)
+    encounters = make_encounters(rng, 0, 5)
+    for encounter in encounters:
+        encounter._exposition_event = False
+    encounters.append(EncounterMessage(**encounters[2].__dict__))
+    encounter_book.add_encounter_messages(0, encounters)
+    encounter_book.flag_exposition(encounters[2]._receiver_uid, encounters[2]._real_encounter_time)
+    # only the latest of the identical encounters is flagged
+    assert encounter_book.encounters["exposition_event"].tolist() == [0, 0, 0, 0, 0, 1]
+
+
+def test_generate_updates_checks_risk_levels():
+    rng = np.random.RandomState(3)
+    encounter_book = EncounterBook(MessageStore(START), TRACING_N_DAYS_HISTORY)
+    encounter_book.add_encounter_messages(0, make_encounters(rng, 0, 3))
+    timestamp = START + datetime.timedelta(days=1)
+    encounter_book.generate_initial_updates(1, timestamp, {0: .1}, proba_to_risk_level, intervention=object())
+    # the risk level of an encounter is neither the previous nor the new one of its day
+    encounter_book._records["risk_level"][1] = 7
+    with pytest.raises(AssertionError, match="risk mismatch"):
+        encounter_book.generate_updates(1, timestamp, {0: .1}, {0: .9}, proba_to_risk_level, "unknown",
+                                        intervention=object())
@@ -0,0 +1,93 @@
+import math
+from collections import defaultdict
+
+import numpy as np
+
+from covid19sim.log.mixing import INTERACTION_TYPES, MixingAccumulator
+from covid19sim.log.track import LOCATION_TYPES_TO_TRACK_MIXING
+from covid19sim.utils.constants import AGE_BIN_WIDTH_5, SECONDS_PER_MINUTE
+
+N_AGE_BINS = len(AGE_BIN_WIDTH_5)
+
+
+def _sample_interactions(rng, n_interactions, n_humans):
+    ages = rng.randint(0, N_AGE_BINS, n_humans)
+    location_types = ["house", "work", "school", "other"]
+    interactions = []
+    for _ in range(n_interactions):
+        name1, name2 = rng.choice(n_humans, 2, replace=False)
+        interactions.append(dict(
+            name1=f"human:{name1}", name2=f"human:{name2}", age_bin1=ages[name1], age_bin2=ages[name2],
+            location_type1=rng.choice(location_types), location_type2=rng.choice(location_types),
+            is_known=rng.rand() < 0.3, contact_condition=rng.rand() < 0.2, mobility_factor=rng.rand() < 0.8,
+            duration=rng.uniform(0, 3600), distance=rng.uniform(0, 1000),
+        ))
+    return interactions
+
+
+def _reference(interactions):
+    # what the tracker used to record for each interaction
+    total = defaultdict(lambda: np.zeros((N_AGE_BINS, N_AGE_BINS)))
+    duration = defaultdict(lambda: np.zeros((N_AGE_BINS, N_AGE_BINS)))
+    people = defaultdict(lambda: defaultdict(set))
+    distance_profile = defaultdict(dict)
+    duration_profile = defaultdict(dict)
+    for x in interactions:
+        i, j = x["age_bin1"], x["age_bin2"]
+        interaction_types = ["all"] + ["known"] * x["is_known"] + ["within_contact_condition"] * x["contact_condition"]
+        for interaction_type in interaction_types:
+            for location_type in ["all", x["location_type1"], x["location_type2"]]:
+                key = (interaction_type, location_type)
+                total[key][i, j] += x["mobility_factor"]
+                total[key][j, i] += x["mobility_factor"]
+                people[key][(j, i)].add(x["name1"])
+                people[key][(i, j)].add(x["name2"])
+                duration[key][i, j] += x["duration"] / SECONDS_PER_MINUTE
+                duration[key][j, i] += x["duration"] / SECONDS_PER_MINUTE
+                distance_category = 10 * math.ceil(x["distance"] / 10)
+                distance_profile[key][distance_category] = distance_profile[key].get(distance_category, 0) + 1
+                duration_category = math.ceil(x["duration"] / SECONDS_PER_MINUTE)
+                duration_profile[key][duration_category] = duration_profile[key].get(duration_category, 0) + 1
+    return total, duration, people, distance_profile, duration_profile
+
+
+def test_reduce_matches_per_interaction_updates():
+    rng = np.random.RandomState(0)
+    interactions = _sample_interactions(rng, 2000, 300)
+    accumulator = MixingAccumulator(N_AGE_BINS, LOCATION_TYPES_TO_TRACK_MIXING, capacity=16)
+    for x in interactions:
+        accumulator.add(**x)
+    reduced = accumulator.reduce()
+    total, duration, people, distance_profile, duration_profile = _reference(interactions)
+
+    for interaction_type in INTERACTION_TYPES:
+        for location_type in LOCATION_TYPES_TO_TRACK_MIXING:
+            key, R = (interaction_type, location_type), reduced[interaction_type][location_type]
+            n_people = np.zeros((N_AGE_BINS, N_AGE_BINS))
+            for (i, j), names in people[key].items():
+                n_people[i, j] = len(names)
+            assert np.allclose(R["total"], total[key])
+            assert np.allclose(R["duration"], duration[key])
+            assert (R["n_people"] == n_people).all()
+            assert R["distance_profile"] == distance_profile[key]
+            assert R["duration_profile"] == duration_profile[key]
+
+    # the buffer is cleared after a reduction
+    assert accumulator.reduce()["all"]["all"]["total"].sum() == 0
+
+
+def test_sampling_estimates():
+    rng = np.random.RandomState(1)
+    interactions = _sample_interactions(rng, 50000, 5000)
+    accumulator = MixingAccumulator(N_AGE_BINS, LOCATION_TYPES_TO_TRACK_MIXING, sampling_rate=0.25, seed=3)
+    for x in interactions:
+        accumulator.add(**x)
+    assert 0.2 < np.mean(accumulator.is_recorded) < 0.3
+
+    reduced = accumulator.reduce()["all"]["all"]
+    total, duration, people, _, _ = _reference(interactions)
+    assert abs(reduced["total"].sum() / total[("all", "all")].sum() - 1) < 0.05
+    assert abs(reduced["duration"].sum() / duration[("all", "all")].sum() - 1) < 0.05
+    n_people = sum(len(names) for names in people[("all", "all")].values())
+    assert abs(reduced["n_people"].sum() / n_people - 1) < 0.05
+    assert abs(sum(reduced["distance_profile"].values()) / len(interactions) - 1) < 0.05
@@ -13,6 +13,7 @@ from tests.utils import get_test_conf
 from covid19sim.inference.helper import (conditions_to_np, symptoms_to_np, encode_age, encode_sex,
                                          encode_test_result, recovered_array, candidate_exposures,
                                          exposure_array)
+from covid19sim.epidemiology.symptoms import count_symptoms
 from covid19sim.inference.heavy_jobs import DummyMemManager
 from covid19sim.inference.human_as_message import get_test_results_array
 from covid19sim.inference.server_utils import DataCollectionServer
@@ -104,12 +105,12 @@ def validate_human_message(test_case, message, human):
     test_case.assertEqual(message.rolling_all_symptoms.shape[0], len(human.rolling_all_symptoms))
     for m_rolling_all_symptoms, h_rolling_all_symptoms in \
             zip(message.rolling_all_symptoms, human.rolling_all_symptoms):
-        test_case.assertEqual(m_rolling_all_symptoms.sum(), len(h_rolling_all_symptoms))
+        test_case.assertEqual(m_rolling_all_symptoms.sum(), count_symptoms(h_rolling_all_symptoms))
     test_case.assertEqual(message.rolling_all_reported_symptoms.shape[0],
                           len(human.rolling_all_reported_symptoms))
     for m_rolling_all_reported_symptoms, h_rolling_all_reported_symptomsin in \
             zip(message.rolling_all_reported_symptoms, human.rolling_all_reported_symptoms):
-        test_case.assertEqual(m_rolling_all_reported_symptoms.sum(), len(h_rolling_all_reported_symptomsin))
+        test_case.assertEqual(m_rolling_all_reported_symptoms.sum(), count_symptoms(h_rolling_all_reported_symptomsin))
 
     # TODO: add a serious way to test whether the correct update messages were added from the mailbox?
 
@@ -543,7 +544,9 @@ class HumanAsMessageTest(unittest.TestCase):
 
         human = Human(env=env, city={'city': 'city'}, name=1, age=25, rng=rng, conf=conf)
         human.has_app = True
-        human.contact_book.mailbox_keys_by_day[0] = [0, 1]  # add two dummy encounter keys
+        human.contact_book.mailbox_keys_by_day[0] = []
+        for mailbox_key in [0, 1]:  # add two dummy encounter keys
+            human.contact_book.add_mailbox_key(0, mailbox_key)
         personal_mailbox = {1: ["fake_message"]}  # create a dummy personal mailbox with one update
         dummy_conf = {"TRACING_N_DAYS_HISTORY": 14}  # create a dummy config (only needs 1 setting)
         message = make_human_as_message(human, personal_mailbox, dummy_conf)
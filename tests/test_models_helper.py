@@ -3,7 +3,7 @@ import unittest
 import warnings
 
 from covid19sim.epidemiology.human_properties import PREEXISTING_CONDITIONS
-from covid19sim.epidemiology.symptoms import SYMPTOMS, STR_TO_SYMPTOMS
+from covid19sim.epidemiology.symptoms import SYMPTOMS, STR_TO_SYMPTOMS, encode_symptoms
 
 from covid19sim.inference.helper import conditions_to_np, symptoms_to_np, \
     encode_age, encode_sex, encode_test_result, PREEXISTING_CONDITIONS_META
@@ -62,14 +62,14 @@ class ModelsHelperTest(unittest.TestCase):
             self.assertEqual(np_conditions.min(), 0)
 
     def test_symptoms_to_np(self):
-        np_symptoms = symptoms_to_np([[s for s in SYMPTOMS]] * 14, {"TRACING_N_DAYS_HISTORY": 14})
+        np_symptoms = symptoms_to_np([encode_symptoms(SYMPTOMS)] * 14, {"TRACING_N_DAYS_HISTORY": 14})
 
         self.assertEqual(np_symptoms.shape, (14, len(SYMPTOMS)))
         self.assertEqual(np_symptoms.sum(), len(SYMPTOMS) * 14)
         self.assertEqual(np_symptoms.max(), 1)
         self.assertEqual(np_symptoms.min(), 1)
 
-        np_symptoms = symptoms_to_np([[]] * 14, {"TRACING_N_DAYS_HISTORY": 14})
+        np_symptoms = symptoms_to_np([encode_symptoms([])] * 14, {"TRACING_N_DAYS_HISTORY": 14})
 
         self.assertEqual(np_symptoms.shape, (14, len(SYMPTOMS)))
         self.assertEqual(np_symptoms.sum(), 0)
@@ -77,7 +77,7 @@ class ModelsHelperTest(unittest.TestCase):
         self.assertEqual(np_symptoms.min(), 0)
 
         for symptom in SYMPTOMS:
-            np_symptoms = symptoms_to_np([[symptom]] * 14, {"TRACING_N_DAYS_HISTORY": 14})
+            np_symptoms = symptoms_to_np([encode_symptoms([symptom])] * 14, {"TRACING_N_DAYS_HISTORY": 14})
 
             self.assertEqual(np_symptoms.shape, (14, len(SYMPTOMS)))
 
@@ -94,7 +94,7 @@ class ModelsHelperTest(unittest.TestCase):
         for i, symptom in zip(range(len(raw_symptoms)), SYMPTOMS):
             raw_symptoms[i].append(symptom)
 
-        np_symptoms = symptoms_to_np(raw_symptoms, {"TRACING_N_DAYS_HISTORY": 14})
+        np_symptoms = symptoms_to_np([encode_symptoms(s) for s in raw_symptoms], {"TRACING_N_DAYS_HISTORY": 14})
 
         self.assertEqual(np_symptoms.shape, (14, len(SYMPTOMS)))
         self.assertEqual(np_symptoms.sum(), 14)
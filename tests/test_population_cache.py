@@ -0,0 +1,151 @@
+import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import numpy as np
+from orderedset import OrderedSet
+
+from covid19sim.locations.city import City
+from covid19sim.locations.location import Location
+from covid19sim.native._native import BaseHuman
+from covid19sim.utils.env import Env
+from covid19sim.run import setup_simulation
+from covid19sim.utils.population_cache import get_population_cache_key, get_population_cache_path, \
+    load_population, save_population
+from tests.utils import get_test_conf
+
+
+class _Human(BaseHuman):
+    """
+    Minimal stand-in for `covid19sim.human.Human` holding references to simulation-owned objects.
+    """
+    def __init__(self, env, city, name, age, conf):
+        super().__init__(env)
+        self.env = env
+        self.city = city
+        self.conf = conf
+        self.name = f"human:{name}"
+        self.age = age
+        self.is_asymptomatic = name % 2 == 0
+        self.rng = np.random.RandomState(name)
+        self.household = None
+        self.known_connections = set()
+
+
+def _make_simulation(conf, n_humans=20):
+    env = Env(datetime.datetime(2020, 2, 28, 0, 0))
+    city = SimpleNamespace(rng=np.random.RandomState(0))
+    households = OrderedSet()
+    for i in range(4):
+        households.add(Location(env=env, rng=city.rng, conf=conf, area=100, name=f"HOUSEHOLD:{i}",
+                                location_type="HOUSEHOLD", lat=0, lon=0, capacity=None))
+
+    humans = [_Human(env, city, i, 20 + i, conf) for i in range(n_humans)]
+    for human in humans:
+        human.household = households[int(human.name.split(":")[1]) % 4]
+        human.known_connections.update(humans[:3])
+
+    shared_objects = {"env": env, "city": city, "conf": conf, "rng": city.rng}
+    return {"humans": humans, "households": households}, shared_objects
+
+
+def test_population_cache_key():
+    conf = get_test_conf("test_covid_testing.yaml")
+    key = get_population_cache_key(conf, 100, (0, 1000), (0, 1000), 0, np.random.RandomState(0))
+    assert key == get_population_cache_key(conf, 100, (0, 1000), (0, 1000), 0, np.random.RandomState(0))
+
+    # output settings don't change the population
+    assert key == get_population_cache_key(dict(conf, outdir="elsewhere"), 100, (0, 1000), (0, 1000), 0, np.random.RandomState(0))
+
+    assert key != get_population_cache_key(conf, 101, (0, 1000), (0, 1000), 0, np.random.RandomState(0))
+    assert key != get_population_cache_key(conf, 100, (0, 1000), (0, 1000), 0, np.random.RandomState(1))
+    assert key != get_population_cache_key(conf, 100, (0, 1000), (0, 1000), 3600, np.random.RandomState(0))
+    assert key != get_population_cache_key(dict(conf, simulation_days=1), 100, (0, 1000), (0, 1000), 0, np.random.RandomState(0))
+    assert key != get_population_cache_key(dict(conf, P_HOUSEHOLD_SIZE=[0.2] * 5), 100, (0, 1000), (0, 1000), 0, np.random.RandomState(0))
+
+    # neither do the settings of the risk model, the intervention or the simulation loop
+    runtime_settings = dict(RISK_MODEL="digital", INTERVENTION_DAY=3, UPDATES_PER_DAY=2, VECTORIZED_CONTACT_SAMPLING=False,
+                            MIXING_SAMPLING_RATE=0.1, N_SHARDS=2)
+    assert key == get_population_cache_key(dict(conf, **runtime_settings), 100, (0, 1000), (0, 1000), 0, np.random.RandomState(0))
+
+
+def test_population_cache_roundtrip(tmp_path):
+    conf = get_test_conf("test_covid_testing.yaml")
+    population, shared_objects = _make_simulation(conf)
+    path = get_population_cache_path(tmp_path, "test")
+    save_population(path, population, shared_objects)
+    assert path.exists()
+
+    # objects owned by the new simulation
+    new_conf = get_test_conf("test_covid_testing.yaml")
+    _, new_shared_objects = _make_simulation(new_conf, n_humans=0)
+    loaded = load_population(path, new_shared_objects)
+
+    assert [h.name for h in loaded["humans"]] == [h.name for h in population["humans"]]
+    for human, loaded_human in zip(population["humans"], loaded["humans"]):
+        assert loaded_human.env is new_shared_objects["env"]
+        assert loaded_human.city is new_shared_objects["city"]
+        assert loaded_human.conf is new_conf
+        assert loaded_human.age == human.age
+        assert loaded_human.is_asymptomatic == human.is_asymptomatic
+        assert loaded_human.rng.random() == human.rng.random()
+        assert loaded_human.household in loaded["households"]
+        assert loaded_human.household.name == human.household.name
+        assert {h.name for h in loaded_human.known_connections} == {h.name for h in human.known_connections}
+
+    # references between cached objects are preserved
+    assert loaded["humans"][0].known_connections == set(loaded["humans"][:3])
+    for household in loaded["households"]:
+        assert household.env is new_shared_objects["env"]
+        assert household.conf is new_conf
+
+
+def test_population_cache_cyclic_locations(tmp_path):
+    """
+    Locations are hashed by name, so they can be added to sets before the rest of their state is restored.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    population, shared_objects = _make_simulation(conf)
+    for human in population["humans"]:
+        human.household.humans.add(human)
+        human.visited = {human.household}
+
+    path = get_population_cache_path(tmp_path, "test")
+    save_population(path, population, shared_objects)
+    loaded = load_population(path, shared_objects)
+    for human in loaded["humans"]:
+        assert human.household in human.visited
+        assert human in human.household.humans
+
+
+def _setup_city(cache_dir, **settings):
+    conf = get_test_conf("test_covid_testing.yaml")
+    conf.update(POPULATION_CACHE_DIR=str(cache_dir), **settings)
+    _, city = setup_simulation(n_people=100, init_fraction_sick=0.01, start_time=datetime.datetime(2020, 2, 28, 0, 0),
+                               simulation_days=5, seed=0, conf=conf)
+    return city
+
+
+def test_population_cache_hit_with_other_runtime_settings(tmp_path, monkeypatch):
+    city = _setup_city(tmp_path)
+    assert len(list(tmp_path.glob("population_*.pkl"))) == 1
+
+    def _synthesize(self):
+        raise AssertionError("the population should be loaded from the cache")
+
+    monkeypatch.setattr(City, "initialize_humans_and_locations", _synthesize)
+    cached_city = _setup_city(tmp_path, RISK_MODEL="digital", INTERVENTION_DAY=3, UPDATES_PER_DAY=2, RHO=0.1,
+                              VECTORIZED_CONTACT_SAMPLING=False, MIXING_SAMPLING_RATE=0.1)
+    assert cached_city.tracker.mixing_accumulator.sampling_rate == 0.1
+    assert [h.name for h in cached_city.humans] == [h.name for h in city.humans]
+    for human, cached_human in zip(city.humans, cached_city.humans):
+        assert cached_human.time_slot == human.time_slot
+        assert cached_human.time_slots == [human.time_slot, (human.time_slot + 12) % 24]
+        assert cached_human.rho == 0.1
+        assert cached_human.intervened_behavior.human is cached_human
+        assert cached_human.intervened_behavior.conf is cached_city.conf
+
+    # settings of the synthesis aren't looked up in the cache
+    with pytest.raises(AssertionError, match="loaded from the cache"):
+        _setup_city(tmp_path, P_CAREFUL_PERSON=0.1)
@@ -0,0 +1,47 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from covid19sim.native import Environment, SECONDS_PER_EPHEMERIS_DAY, get_population_timestamps, get_seir_states
+from covid19sim.native._native import BaseHuman
+
+START = datetime.datetime(2020, 2, 28)
+
+
+def make_population(env, n_humans, seed=0):
+    rng = np.random.RandomState(seed)
+    humans = []
+    for _ in range(n_humans):
+        human = BaseHuman(env)
+        human.infectiousness_onset_days = rng.uniform(0, 3)
+        kind = rng.randint(5)
+        if kind >= 1:  # infected at some point in the past 10 days (or in the future)
+            human.ts_covid19_infection = env.now + rng.uniform(-10, 1) * SECONDS_PER_EPHEMERIS_DAY
+        if kind == 2:
+            human.ts_covid19_immunity = env.now - rng.uniform(0, 1) * SECONDS_PER_EPHEMERIS_DAY
+        if kind == 3 and rng.rand() < .5:
+            human.ts_death = env.now + rng.uniform(-1, 1) * SECONDS_PER_EPHEMERIS_DAY
+        humans.append(human)
+    return humans
+
+
+def test_seir_states_match_getters():
+    env = Environment(START)
+    humans = make_population(env, 500)
+    timestamps = get_population_timestamps(humans)
+    assert timestamps.shape == (500,)
+    np.testing.assert_array_equal(timestamps["ts_covid19_infection"], [h.ts_covid19_infection for h in humans])
+    np.testing.assert_array_equal(timestamps["ts_death"], [h.ts_death for h in humans])
+
+    states = get_seir_states(timestamps, env.now)
+    expected = [[h.is_susceptible, h.is_exposed, h.is_infectious, h.is_removed].index(True) for h in humans]
+    np.testing.assert_array_equal(states, expected)
+    assert len(np.unique(states)) == 4
+
+
+def test_population_timestamps_type_check():
+    env = Environment(START)
+    assert get_population_timestamps([]).shape == (0,)
+    with pytest.raises(TypeError):
+        get_population_timestamps([BaseHuman(env), object()])
@@ -0,0 +1,118 @@
+import datetime
+import pickle
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from covid19sim.epidemiology.symptoms import STR_TO_SYMPTOMS
+from covid19sim.inference.message_utils import ContactBook, exchange_encounter_messages
+from covid19sim.log.risk_attributes import RISK_ATTRIBUTES, Order1Contacts, RiskAttributesRecorder
+
+
+def _make_columns(rng, n_humans):
+    symptoms = list(STR_TO_SYMPTOMS.values())
+    return {
+        "has_app": rng.rand(n_humans) > 0.5,
+        "risk": rng.rand(n_humans),
+        "risk_level": rng.randint(0, 16, n_humans),
+        "reason": [set(rng.choice(["symptoms", "risk message", "positive test"], rng.randint(0, 3), replace=False))
+                   for _ in range(n_humans)],
+        "rec_level": rng.randint(-1, 4, n_humans),
+        "exposed": rng.rand(n_humans) > 0.5,
+        "infectious": rng.rand(n_humans) > 0.5,
+        "symptoms": rng.randint(0, 5, n_humans),
+        "symptom_names": [sorted(rng.choice(symptoms, rng.randint(0, 4), replace=False), key=int)
+                          for _ in range(n_humans)],
+        "clusters": [[(1, 3, 2)] if rng.rand() > 0.8 else [] for _ in range(n_humans)],
+        "test": [rng.choice([None, "positive", "negative"]) for _ in range(n_humans)],
+        "recovered": rng.rand(n_humans) > 0.5,
+        "test_recommended": rng.rand(n_humans) > 0.5,
+        **{name: rng.rand(n_humans) > 0.5 for name in RISK_ATTRIBUTES if name.startswith("order_1")},
+    }
+
+
+def _expected_records(timestamp, names, columns):
+    records = []
+    for idx, name in enumerate(names):
+        record = {}
+        for key in RISK_ATTRIBUTES:
+            if key == "timestamp":
+                record[key] = timestamp
+            elif key == "name":
+                record[key] = name
+            else:
+                value = columns[key][idx]
+                record[key] = value.item() if isinstance(value, np.generic) else value
+        records.append(record)
+    return records
+
+
+@pytest.mark.parametrize("use_chunk_dir", [False, True])
+def test_risk_attributes_recorder(tmp_path, use_chunk_dir):
+    rng = np.random.RandomState(0)
+    names = [f"human:{i}" for i in range(7)]
+    recorder = RiskAttributesRecorder(chunk_hours=4, chunk_dir=str(tmp_path) if use_chunk_dir else None)
+    expected = []
+    start = datetime.datetime(2020, 2, 28)
+    for hour in range(10):
+        timestamp = start + datetime.timedelta(hours=hour)
+        columns = _make_columns(rng, len(names))
+        recorder.record(timestamp, names, columns)
+        expected.extend(_expected_records(timestamp, names, columns))
+
+    assert len(recorder) == len(expected)
+    assert list(recorder) == expected
+    assert recorder[13] == expected[13] and recorder[-1] == expected[-1]
+    assert recorder[5:20] == expected[5:20]
+    assert len(list(tmp_path.iterdir())) == (2 if use_chunk_dir else 0)
+    assert recorder.get_column("risk").shape == (10, len(names))
+    np.testing.assert_array_equal(recorder.get_column("risk").ravel(), [x["risk"] for x in expected])
+
+    # the rows which were not recorded yet are not pickled
+    loaded = pickle.loads(pickle.dumps(recorder))
+    assert list(loaded) == expected
+    assert sorted(loaded, key=lambda x: x["timestamp"])[0] == expected[0]
+
+
+@pytest.mark.parametrize("min_capacity", [1, 4])
+def test_order_1_contacts_match_contact_book(min_capacity):
+    rng = np.random.RandomState(0)
+    start = datetime.datetime(2020, 2, 28)
+    humans = [SimpleNamespace(name=f"human:{i}", contact_book=ContactBook(tracing_n_days_history=2))
+              for i in range(30)]
+    hd = {h.name: h for h in humans}
+    order_1_contacts = Order1Contacts(list(hd), min_capacity=min_capacity)
+    for day in range(6):
+        for hour in range(0, 24, 6):
+            timestamp = start + datetime.timedelta(days=day, hours=hour)
+            for _ in range(10):
+                h1, h2 = rng.choice(humans, 2, replace=False)
+                exchange_encounter_messages(h1, h2, timestamp, start)
+
+            order_1_contacts.update([h.contact_book for h in humans])
+            assert order_1_contacts.size <= 2 * max(2 * order_1_contacts.counts.sum(), len(humans) * min_capacity)
+            state = rng.rand(len(humans)) > 0.7
+            expected = [any(state[int(c.name.split(":")[1])] for c in h.contact_book.get_contacts(hd)) for h in humans]
+            np.testing.assert_array_equal(order_1_contacts.any(state), expected)
+        for h in humans:
+            h.contact_book.cleanup_contacts(start, start + datetime.timedelta(days=day + 1))
+
+
+def test_order_1_contacts_compaction():
+    names = [f"human:{i}" for i in range(10)]
+    books = [SimpleNamespace(contact_counts={}, contacts_version=0) for _ in names]
+    order_1_contacts = Order1Contacts(names, min_capacity=1)
+    state = np.zeros(len(names), dtype=bool)
+    state[-1] = True
+    for n_contacts in [1, 2, 5, 9, 1]:
+        contacts = names[-n_contacts:]
+        books[0].contact_counts = {name: 1 for name in contacts}
+        books[0].contacts_version += 1
+        order_1_contacts.update(books)
+        expected = np.zeros(len(names), dtype=bool)
+        expected[0] = True
+        np.testing.assert_array_equal(order_1_contacts.any(state), expected)
+    # the segments left behind by human:0 as their contacts grew are reclaimed once most of them expired
+    np.testing.assert_array_equal(order_1_contacts.rows, [0, 0] + list(range(1, 10)))
+    np.testing.assert_array_equal(order_1_contacts.columns, [9] + [10] * 10)
@@ -0,0 +1,67 @@
+import numpy as np
+
+from covid19sim.utils.risk_history import RiskHistoryMap, RiskHistoryMatrix
+
+N_DAYS = 15
+
+
+def run_daily_updates(risk_history_map, n_days_simulated, rng):
+    """Updates a risk history map like humans do (daily init, pruning, overwrites and reinsertions)."""
+    for current_day_idx in range(n_days_simulated):
+        if current_day_idx not in risk_history_map:
+            risk_history_map[current_day_idx] = risk_history_map.get(current_day_idx - 1, .01)
+        for day_idx in list(risk_history_map.keys()):
+            if current_day_idx - day_idx >= N_DAYS:
+                del risk_history_map[day_idx]
+        for day_offset in rng.choice(N_DAYS, size=rng.randint(N_DAYS), replace=False):
+            if current_day_idx - day_offset in risk_history_map:
+                risk_history_map[current_day_idx - day_offset] = float(rng.rand())
+        if rng.rand() < .2:
+            day_idx = current_day_idx - int(rng.randint(N_DAYS))
+            if day_idx in risk_history_map:
+                risk = risk_history_map.pop(day_idx)
+                risk_history_map[day_idx] = risk
+        yield current_day_idx
+
+
+def test_risk_history_map_matches_dict():
+    matrix = RiskHistoryMatrix(N_DAYS, capacity=1)
+    maps = [matrix.new_map() for _ in range(3)]
+    for seed, risk_history_map in enumerate(maps):
+        expected = {}
+        updates = run_daily_updates(risk_history_map, 40, np.random.RandomState(seed))
+        expected_updates = run_daily_updates(expected, 40, np.random.RandomState(seed))
+        for _ in zip(updates, expected_updates):
+            assert list(risk_history_map.items()) == list(expected.items())
+            assert list(risk_history_map.values()) == list(expected.values())
+            assert len(risk_history_map) == len(expected)
+    assert matrix.n_rows == 3
+    assert 0 not in maps[0] and "0" not in maps[0] and 39 in maps[0]
+
+
+def test_ring_evicts_old_days():
+    risk_history_map = RiskHistoryMap(n_days=N_DAYS)
+    for day_idx in range(N_DAYS):
+        risk_history_map[day_idx] = float(day_idx)
+    risk_history_map[N_DAYS] = 1.
+    assert 0 not in risk_history_map and list(risk_history_map) == list(range(1, N_DAYS + 1))
+    assert risk_history_map.get(0) is None and risk_history_map.pop(0, None) is None
+
+
+def test_copy_map():
+    matrix = RiskHistoryMatrix(N_DAYS)
+    risk_history_map = matrix.new_map()
+    risk_history_map.update({3: .5, 1: .25, 2: .75})
+    backup_matrix = RiskHistoryMatrix(N_DAYS, capacity=1)
+    backups = [backup_matrix.copy_map(risk_history_map), backup_matrix.copy_map({3: .5, 1: .25, 2: .75})]
+    risk_history_map[3] = 1.
+    del risk_history_map[1]
+    for backup in backups:
+        assert list(backup.items()) == [(3, .5), (1, .25), (2, .75)]
+    # insertions in the copies keep the insertion order of the original map
+    backups[0][4] = 0.
+    assert list(backups[0]) == [3, 1, 2, 4]
+    # the rows of a cleared matrix are reused by the next copies
+    backup_matrix.clear()
+    backup = backup_matrix.copy_map({5: .1})
+    assert backup_matrix.n_rows == 1 and list(backup.items()) == [(5, .1)]
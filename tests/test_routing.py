@@ -0,0 +1,37 @@
+import collections
+
+from covid19sim.inference.routing import ConsistentHashRing, get_cluster_mgr_hash, split_batch
+
+Human = collections.namedtuple("Human", ["name"])
+
+
+def test_consistent_hash_ring():
+    workers = [f"worker:{idx}".encode() for idx in range(4)]
+    ring = ConsistentHashRing(workers)
+    keys = [f"1234:human:{idx}" for idx in range(2000)]
+    owners = {key: ring.get(key) for key in keys}
+    counts = collections.Counter(owners.values())
+    assert set(counts) == set(workers)
+    assert min(counts.values()) > len(keys) / len(workers) / 2
+
+    # only the humans of a removed worker are moved, and they are spread over the other workers
+    ring.remove(workers[1])
+    assert workers[1] not in ring and len(ring) == 3
+    moved = {key for key in keys if ring.get(key) != owners[key]}
+    assert moved == {key for key in keys if owners[key] == workers[1]}
+    assert len({ring.get(key) for key in moved}) == 3
+
+    # adding it back restores the initial assignment
+    ring.add(workers[1])
+    assert all(ring.get(key) == owners[key] for key in keys)
+
+
+def test_split_batch():
+    ring = ConsistentHashRing([b"worker:0", b"worker:1", b"worker:2"])
+    sample = [{"human": Human(f"human:{idx}"), "city_hash": city_hash} for city_hash in [1, 2] for idx in range(30)]
+    parts = split_batch(sample, ring)
+    assert sorted(idx for indices, _ in parts.values() for idx in indices) == list(range(len(sample)))
+    for worker, (indices, requests) in parts.items():
+        assert [sample[idx] for idx in indices] == requests
+        assert all(ring.get(get_cluster_mgr_hash(params)) == worker for params in requests)
+    assert get_cluster_mgr_hash(sample[31]) == "2:human:1"
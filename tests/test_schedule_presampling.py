@@ -0,0 +1,97 @@
+import datetime
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from covid19sim.epidemiology.human_properties import get_age_bin
+from covid19sim.locations.location import Household, Location
+from covid19sim.utils.env import Env
+from covid19sim.utils.mobility_planner import MobilityPlanner, _sample_activity_duration, initialize_mobility_planners
+from tests.utils import get_test_conf
+
+
+class _Human:
+    """
+    Minimal stand-in for `covid19sim.human.Human` exposing the attributes used to presample schedules.
+    """
+    def __init__(self, env, city, name, age, household, workplace, conf, seed):
+        self.env = env
+        self.city = city
+        self.conf = conf
+        self.name = f"human:{name}"
+        self.age = age
+        self.age_bin_width_10 = get_age_bin(age, width=10)
+        self.rng = np.random.RandomState(seed)
+        self.household = household
+        self.workplace = workplace
+        self.does_not_work = workplace is None
+        self.work_start_time = None if workplace is None else workplace.opening_time
+        self.working_days = [0, 1, 2, 3, 4]
+        household.residents.append(self)
+        self.mobility_planner = MobilityPlanner(self, env, conf)
+
+    def __repr__(self):
+        return self.name
+
+
+def _make_population(conf, n_humans=40):
+    rng = np.random.RandomState(0)
+    env = Env(datetime.datetime(2020, 2, 28, 0, 0))
+    city = SimpleNamespace(logfile=None)
+    kwargs = dict(env=env, rng=rng, conf=conf, area=100, lat=0, lon=0, capacity=None)
+    workplace = Location(name="WORKPLACE:0", location_type="WORKPLACE", **kwargs)
+    households = [Household(name=f"HOUSEHOLD:{i}", location_type="HOUSEHOLD", **kwargs) for i in range(n_humans // 4)]
+    humans = []
+    for i in range(n_humans):
+        age = 5 + (i * 7) % 80
+        humans.append(_Human(env, city, i, age, households[i % len(households)], workplace if i % 3 else None, conf, seed=i))
+    return humans
+
+
+def _describe(humans):
+    description = []
+    for human in humans:
+        planner = human.mobility_planner
+        description.append((
+            repr(planner.current_activity),
+            [[repr(a) for a in schedule] for schedule in planner.full_schedule],
+            planner.follows_adult_schedule,
+            sorted(h.name for h in planner.inverted_supervision),
+            human.rng.random(),
+        ))
+    return description
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_presampled_schedules_match_serial(n_jobs):
+    """
+    Schedules presampled in parallel should be identical to the ones presampled by `MobilityPlanner.initialize`.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    conf['simulation_days'] = 5
+
+    serial = _make_population(conf)
+    for human in serial:
+        human.mobility_planner.initialize()
+
+    parallel = _make_population(conf)
+    initialize_mobility_planners(parallel, conf, n_jobs=n_jobs)
+
+    assert any(h.mobility_planner.follows_adult_schedule for h in serial)
+    assert _describe(serial) == _describe(parallel)
+    for human in parallel:
+        for schedule in human.mobility_planner.full_schedule:
+            for activity in schedule:
+                assert activity.owner is human
+                assert activity.location in [None, human.household, human.workplace]
+
+
+def test_batched_durations_match_sequential():
+    conf = get_test_conf("test_covid_testing.yaml")
+    for activity in ["work", "grocery", "sleep"]:
+        rng, batched_rng = np.random.RandomState(0), np.random.RandomState(0)
+        sequential = [_sample_activity_duration(activity, conf, rng) for _ in range(50)]
+        batched = _sample_activity_duration(activity, conf, batched_rng, size=50)
+        assert np.array_equal(sequential, batched)
+        assert rng.random() == batched_rng.random()
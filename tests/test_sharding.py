@@ -0,0 +1,143 @@
+import datetime
+import math
+import os
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from covid19sim.inference.message_store import EncounterBook, MessageStore
+from covid19sim.inference.message_utils import EncounterMessage, create_new_uid
+from covid19sim.locations.hospital import Hospital
+from covid19sim.locations.location import Household
+from covid19sim.locations.sharding import ShardMailbox, _reduce_encounter_book, aggregate_shard_summaries, \
+    check_sharded_conf, get_city_locations, partition_city, run_sharded, split_test_budget
+from covid19sim.run import setup_simulation, simulate_sharded
+from covid19sim.utils.constants import SECONDS_PER_HOUR
+from tests.utils import get_test_conf
+
+START = datetime.datetime(2020, 2, 28, 0, 0)
+
+
+def _digital_conf(conf):
+    conf.update(RISK_MODEL="digital", INTERVENTION_DAY=0, APP_UPTAKE=-1, N_BEHAVIOR_LEVELS=4,
+                REC_LEVEL_THRESHOLDS=[0, 0, 1], TRACING_ORDER=1, MAKE_HOUSEHOLD_BEHAVE_SAME_AS_MAX_RISK_RESIDENT=True)
+    return conf
+
+
+def test_split_test_budget():
+    assert split_test_budget(10, [2, 3]) == [2, 3]
+    assert split_test_budget(4, [6, 2]) == [3, 1]
+    assert split_test_budget(5, [1, 1, 1, 7]) == [1, 1, 0, 3]
+    assert sum(split_test_budget(7, [5, 5, 5])) == 7
+    assert split_test_budget(0, [0, 0]) == [0, 0]
+
+
+def test_sharded_conf():
+    check_sharded_conf({"RISK_MODEL": "digital"}, 1)
+    check_sharded_conf({"RISK_MODEL": "digital", "CROSS_SHARD_SYNC_SECONDS": 7200}, 2)
+    with pytest.raises(ValueError):
+        check_sharded_conf({"CROSS_SHARD_SYNC_SECONDS": 1800}, 2)
+    with pytest.raises(ValueError):
+        check_sharded_conf({"COLLECT_TRAINING_DATA": True}, 2)
+
+
+def test_partition_city():
+    conf = get_test_conf("test_covid_testing.yaml")
+    _, city = setup_simulation(n_people=200, init_fraction_sick=0.05, start_time=START, simulation_days=2, seed=0,
+                               conf=conf, start_processes=False)
+    owners = partition_city(city, 3)
+    assert set(owners) == set(get_city_locations(city))
+    assert set(owners.values()) == {0, 1, 2}
+
+    # every human lives in a residence of some shard, and shards hold about as many residents
+    n_residents = np.zeros(3, dtype=int)
+    for human in city.humans:
+        n_residents[owners[human.household]] += 1
+    assert n_residents.sum() == 200
+    assert n_residents.max() - n_residents.min() <= max(len(x.residents) for x in owners if isinstance(x, Household))
+
+    for location in owners:
+        if isinstance(location, Hospital):
+            assert owners[location.icu] == owners[location]
+
+
+def test_shard_mailbox_keeps_messages_to_other_shards():
+    shard = SimpleNamespace(hosted={"human:0"})
+    mailbox = ShardMailbox(14, shard)
+    message = SimpleNamespace(uid=0, encounter_time=START)
+    mailbox.add_message("human:1", message)
+    assert mailbox.outbox == [("human:1", message)]
+    assert "human:1" not in mailbox
+
+
+def test_encounter_book_moves_to_another_store():
+    rng = np.random.RandomState(0)
+    store, other_store = MessageStore(START), MessageStore(START)
+    other_store.string_id("human:5")  # the string tables of both stores differ
+    book = EncounterBook(store, 14)
+    for day_idx in range(3):
+        book.add_encounter_messages(day_idx, [
+            EncounterMessage(uid=create_new_uid(rng), risk_level=None, encounter_time=START, _sender_uid="human:0",
+                             _receiver_uid=f"human:{rng.randint(1, 10)}", _real_encounter_time=START)
+            for _ in range(4)
+        ])
+
+    restore, args = _reduce_encounter_book(book)
+    moved = restore(other_store, *args[1:])
+    assert moved.store is other_store
+    assert np.array_equal(moved.day_idxs, book.day_idxs)
+    assert store.encounter_messages(book.encounters) == other_store.encounter_messages(moved.encounters)
+
+
+@pytest.mark.parametrize("digital", [False, True])
+def test_sharded_simulation(digital):
+    """
+    Humans move between shards, and every human is counted by exactly one shard every day.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    if digital:
+        conf = _digital_conf(conf)
+    n_people, init_fraction_sick = 100, 0.1
+    summary = simulate_sharded(2, n_people=n_people, init_fraction_sick=init_fraction_sick, start_time=START,
+                               simulation_days=3, seed=0, conf=conf)
+    assert summary['n_people'] == n_people
+    assert summary['n_migrations'] > 0
+    assert summary['cases_per_day'][0] == math.ceil(init_fraction_sick * n_people)
+    for seir in zip(summary['s_per_day'], summary['e_per_day'], summary['i_per_day'], summary['r_per_day']):
+        assert sum(seir) == n_people
+
+
+def _fail(until):
+    raise ValueError("shard failure")
+
+
+def _exit(until):
+    os._exit(3)
+
+
+@pytest.mark.parametrize("run, error", [(_fail, "shard failure"), (_exit, "exited with code 3")])
+def test_failed_shard_stops_the_simulation(run, error):
+    """
+    A shard which fails or dies raises in the coordinator instead of leaving it waiting for a reply.
+    """
+    conf = get_test_conf("test_covid_testing.yaml")
+    env, city = setup_simulation(n_people=100, init_fraction_sick=0.1, start_time=START, simulation_days=1, seed=0,
+                                 conf=conf, start_processes=False)
+    # shards are forked from the coordinator, so they run the patched environment
+    env.run = run
+    with pytest.raises(RuntimeError, match=error):
+        run_sharded(city, 2, end_time=env.now + SECONDS_PER_HOUR)
+
+
+def test_aggregate_shard_summaries():
+    summaries = [
+        {"shard_id": i, "n_people": 5, "n_migrations": i, "cases_per_day": [1, i], "s_per_day": [4, 4],
+         "e_per_day": [1, 1], "i_per_day": [0, 0], "r_per_day": [0, 0]}
+        for i in range(2)
+    ]
+    aggregate = aggregate_shard_summaries(summaries)
+    assert aggregate['n_people'] == 10
+    assert aggregate['n_migrations'] == 1
+    assert aggregate['cases_per_day'] == [2, 1]
+    assert len(aggregate['shards']) == 2
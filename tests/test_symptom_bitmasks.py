@@ -0,0 +1,48 @@
+import numpy as np
+
+from covid19sim.epidemiology.symptoms import STR_TO_SYMPTOMS, SymptomGroups, bitmasks_to_np, count_symptoms, \
+    decode_symptoms, drop_symptoms, encode_progression, encode_symptoms
+from covid19sim.inference.helper import symptoms_to_np
+
+
+def test_encode_decode():
+    rng = np.random.RandomState(0)
+    symptoms = list(STR_TO_SYMPTOMS.values())
+    for _ in range(100):
+        sampled = rng.choice(symptoms, rng.randint(0, len(symptoms)), replace=False).tolist()
+        mask = encode_symptoms(sampled)
+        assert decode_symptoms(mask) == sorted(sampled, key=int)
+        assert decode_symptoms(np.uint64(mask)) == sorted(sampled, key=int)
+        assert count_symptoms(mask) == len(sampled)
+    assert encode_symptoms(symptoms) == 2 ** len(symptoms) - 1
+
+
+def test_progression_to_np():
+    progression = [[], [STR_TO_SYMPTOMS["fever"]], [STR_TO_SYMPTOMS["cough"], STR_TO_SYMPTOMS["moderate"]]]
+    masks = encode_progression(progression)
+    assert masks.dtype == np.uint64 and masks.tolist() == [encode_symptoms(x) for x in progression]
+
+    conf = {"TRACING_N_DAYS_HISTORY": 4}
+    encoded = symptoms_to_np(masks, conf)
+    assert encoded.shape == (4, len(STR_TO_SYMPTOMS))
+    for day, symptoms in enumerate(progression):
+        assert set(np.flatnonzero(encoded[day])) == {int(s) for s in symptoms}
+    assert not encoded[3].any()
+    assert (bitmasks_to_np(masks)[:, :len(STR_TO_SYMPTOMS)] == encoded[:3]).all()
+
+
+def test_dropout_and_dropin():
+    rng = np.random.RandomState(0)
+    mask = encode_symptoms(STR_TO_SYMPTOMS.values())
+    assert drop_symptoms(mask, rng, 0.0) == mask
+    assert drop_symptoms(mask, rng, 1.0) == 0
+    assert drop_symptoms(0, rng, 0.0) == 0
+
+    n_kept = [count_symptoms(drop_symptoms(mask, rng, 0.3)) for _ in range(1000)]
+    assert all(drop_symptoms(mask, rng, 0.3) & ~mask == 0 for _ in range(100))
+    assert abs(np.mean(n_kept) / len(STR_TO_SYMPTOMS) - 0.7) < 0.02
+
+    groups = [encode_symptoms(group) for group in SymptomGroups.DROP_IN_GROUPS]
+    for _ in range(100):
+        dropped_in = SymptomGroups.sample_bitmask(rng, [0.5, 0.3, 0.2])
+        assert dropped_in and dropped_in & ~np.bitwise_or.reduce(groups) == 0
@@ -1,10 +1,11 @@
 import datetime
+import math
 
 import numpy as np
 
 from covid19sim.utils.env import Env
 from covid19sim.human import Human
-from covid19sim.log.track import Tracker
+from covid19sim.log.track import RISK_PRECISION_TOP_K, RISK_VALUES_DTYPE, Tracker, _compute_risk_precision
 from tests.utils import get_test_conf
 from covid19sim.locations.city import EmptyCity
 from covid19sim.locations.location import Household
@@ -119,3 +120,39 @@ def test_track_serial_interval():
         for i in [5,0,2]:
             assert len(t.serial_interval_book_from[humans[i].name])==0
             assert len(t.serial_interval_book_to[humans[i].name])==0
+
+
+def _sorted_top_k_precision(risk_values, no_test, k):
+    # reference implementation: stable sort of all risks by decreasing value
+    precision = []
+    for mask in [np.ones(len(risk_values), dtype=bool), no_test, no_test & risk_values["has_no_symptoms"]]:
+        values = sorted(zip(risk_values["risk"][mask], risk_values["is_exposed_or_infectious"][mask]), key=lambda y: -y[0])
+        top_k = values[:math.ceil(k * len(values))]
+        precision.append(sum(1 for x, y in top_k if y) / len(top_k))
+    return precision
+
+
+def test_compute_risk_precision():
+    rng = np.random.RandomState(0)
+    risk_values = np.zeros(5000, dtype=RISK_VALUES_DTYPE)
+    # few distinct risk values, so that many humans are tied at the top-k threshold
+    risk_values["risk"] = rng.choice([0.01, 0.2, 0.5, 0.8, 0.9], size=len(risk_values), p=[0.9, 0.04, 0.03, 0.02, 0.01])
+    risk_values["is_exposed_or_infectious"] = rng.rand(len(risk_values)) < risk_values["risk"]
+    risk_values["has_test_result"] = rng.rand(len(risk_values)) < 0.2
+    risk_values["is_tested_positive"] = risk_values["has_test_result"] & risk_values["is_exposed_or_infectious"]
+    risk_values["has_no_symptoms"] = rng.rand(len(risk_values)) < 0.7
+    no_test = ~risk_values["has_test_result"]
+
+    top_k_prec, lift, recall = _compute_risk_precision(risk_values, no_test)
+    n_positives = risk_values["is_exposed_or_infectious"].sum()
+    for i, k in enumerate(RISK_PRECISION_TOP_K):
+        expected = _sorted_top_k_precision(risk_values, no_test, k)
+        assert np.allclose([prec[i] for prec in top_k_prec], expected)
+        n_top_k = math.ceil(k * len(risk_values))
+        assert np.isclose(lift[0][i], top_k_prec[0][i] * n_top_k / (k * n_positives))
+    assert recall == [1.0, 1.0, 1.0]
+
+    # with 10 humans, every top-k is the first of the humans with the highest risk
+    top_k_prec, _, _ = _compute_risk_precision(risk_values[:10], no_test[:10])
+    top_1 = risk_values["is_exposed_or_infectious"][np.argmax(risk_values["risk"][:10])]
+    assert top_k_prec[0] == [float(top_1)] * len(RISK_PRECISION_TOP_K)
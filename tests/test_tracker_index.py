@@ -0,0 +1,118 @@
+import json
+import os
+import pickle
+from collections import defaultdict
+
+import dill
+import numpy as np
+import yaml
+
+from covid19sim.plotting.utils import RUN_CACHE_DIRNAME, get_all_data, read_tracker_keys
+from covid19sim.utils.utils import TRACKER_INDEX_SUFFIX, dump_tracker_data, load_tracker_data
+
+
+def _make_tracker_data(seed):
+    rng = np.random.RandomState(seed)
+    humans_state = defaultdict(list)
+    for i in range(10):
+        humans_state[f"human:{i}"] = list(rng.choice(["S", "E", "I", "R"], 5))
+    return {
+        "intervention_day": 3,
+        "cases_per_day": list(rng.randint(0, 10, 20)),
+        "humans_state": humans_state,
+        "human_monitor": {day: rng.rand(10) for day in range(20)},
+    }
+
+
+def test_dump_tracker_data_index(tmp_path):
+    data = _make_tracker_data(0)
+    # a value holding the pickle of another value
+    data["cases_pickle"] = dill.dumps(data["cases_per_day"])
+    dump_tracker_data(data, tmp_path, "tracker_data.pkl")
+    assert sorted(os.listdir(tmp_path)) == ["tracker_data.pkl", "tracker_data.pkl" + TRACKER_INDEX_SUFFIX]
+
+    # the file is a single pickle of the dictionary
+    with open(tmp_path / "tracker_data.pkl", "rb") as f:
+        full = pickle.load(f)
+        assert f.read() == b""
+    assert full.keys() == data.keys()
+    assert full["humans_state"] == data["humans_state"]
+    assert full["cases_pickle"] == data["cases_pickle"]
+    np.testing.assert_array_equal(full["human_monitor"][4], data["human_monitor"][4])
+
+    # each value is a protocol 4 pickle of its own, which supports objects over 4GB
+    with open(tmp_path / ("tracker_data.pkl" + TRACKER_INDEX_SUFFIX)) as f:
+        offset, size = json.load(f)["keys"]["humans_state"]
+    with open(tmp_path / "tracker_data.pkl", "rb") as f:
+        f.seek(offset)
+        section = f.read(size)
+    assert section[:2] == pickle.PROTO + bytes([4])
+    assert dill.loads(section) == data["humans_state"]
+
+    partial = load_tracker_data(tmp_path / "tracker_data.pkl", ["cases_per_day", "n_humans"])
+    assert partial == {"cases_per_day": data["cases_per_day"]}
+    assert load_tracker_data(tmp_path / "tracker_data.pkl", ["cases_pickle"]) == {"cases_pickle": data["cases_pickle"]}
+    assert load_tracker_data(tmp_path / "tracker_data.pkl").keys() == data.keys()
+
+    # the index is ignored once the file is written again without it
+    with open(tmp_path / "tracker_data.pkl", "wb") as f:
+        pickle.dump({"cases_per_day": [1], "n_humans": 1}, f)
+    assert load_tracker_data(tmp_path / "tracker_data.pkl", ["cases_per_day"]) == {"cases_per_day": [1]}
+    assert load_tracker_data(tmp_path / "tracker_data.pkl") == {"cases_per_day": [1], "n_humans": 1}
+
+
+def test_dump_tracker_data_shared_references(tmp_path):
+    # values are pickled separately, so objects shared by several values are loaded as distinct copies
+    shared = {"human:0": [1, 2]}
+    dump_tracker_data({"a": shared, "b": shared, "c": [shared, shared]}, tmp_path, "tracker_data.pkl")
+    data = load_tracker_data(tmp_path / "tracker_data.pkl")
+    assert data["a"] == data["b"] == shared
+    assert data["a"] is not data["b"]
+    # references within a value are kept
+    assert data["c"][0] is data["c"][1]
+
+
+def test_read_tracker_keys_cache(tmp_path):
+    data = _make_tracker_data(0)
+    dump_tracker_data(data, tmp_path, "tracker_data.pkl")
+    tracker_path = tmp_path / "tracker_data.pkl"
+
+    assert read_tracker_keys(tracker_path, {"humans_state"})["humans_state"] == dict(data["humans_state"])
+    assert not (tmp_path / RUN_CACHE_DIRNAME).exists()
+
+    pkl = read_tracker_keys(tracker_path, {"humans_state", "n_humans"}, use_cache=True)
+    assert pkl["humans_state"] == dict(data["humans_state"])
+    assert not isinstance(pkl["humans_state"], defaultdict)
+    assert sorted(os.listdir(tmp_path / RUN_CACHE_DIRNAME)) == ["humans_state.pkl", "meta.yaml"]
+
+    # cached keys are read from the cache
+    with open(tmp_path / RUN_CACHE_DIRNAME / "humans_state.pkl", "wb") as f:
+        pickle.dump("cached", f)
+    assert read_tracker_keys(tracker_path, {"humans_state"}, use_cache=True) == {"humans_state": "cached"}
+
+    # the cache is cleared when the tracker data is written again
+    dump_tracker_data(_make_tracker_data(1), tmp_path, "tracker_data.pkl")
+    os.utime(tracker_path, ns=(0, 0))
+    assert read_tracker_keys(tracker_path, {"humans_state"}, use_cache=True)["humans_state"] != "cached"
+
+
+def test_get_all_data(tmp_path):
+    for method in ["bdt1", "heuristicv1"]:
+        for seed in range(3):
+            run_path = tmp_path / method / f"sim_seed_{seed}"
+            run_path.mkdir(parents=True)
+            with open(run_path / "full_configuration.yaml", "w") as f:
+                yaml.safe_dump({"seed": seed, "INTERVENTION": method}, f)
+            dump_tracker_data(_make_tracker_data(seed), run_path, f"tracker_data_n_10_seed_{seed}.pkl")
+
+    keys = {"cases_per_day", "intervention_day"}
+    sequential = get_all_data(tmp_path, keys)
+    parallel = get_all_data(tmp_path, keys, multi_process=True)
+    cached = get_all_data(tmp_path, keys, use_run_cache=True)
+    assert sequential.keys() == parallel.keys() == cached.keys()
+    for method, runs in sequential.items():
+        assert len(runs) == 3
+        for run, run_data in runs.items():
+            assert run_data["pkl"] == parallel[method][run]["pkl"] == cached[method][run]["pkl"]
+            assert run_data["pkl"].keys() == keys
+            assert run_data["conf"]["seed"] == int(run[-1])
@@ -0,0 +1,58 @@
+import os
+from collections import defaultdict
+
+import numpy as np
+import pytest
+
+from covid19sim.log.tracker_output import TRACKER_OUTPUT_DIRNAME, TrackerOutput, TrackerOutputWriter, get_tracker_output_dir
+
+
+def test_partitioned_output_roundtrip(tmp_path):
+    writer = TrackerOutputWriter(tmp_path / TRACKER_OUTPUT_DIRNAME)
+    n_days, n_people = 5, 7
+    for day_idx in range(n_days):
+        writer.write_day(day_idx, "epi", {"cases": day_idx * 2, "s": n_people - day_idx})
+        writer.write_day(day_idx, "humans", {
+            "name": [f"human:{i}" for i in range(n_people)],
+            "risk": np.linspace(0, 1, n_people) * day_idx,
+            "test_result": ["positive" if i == day_idx else "" for i in range(n_people)],
+        })
+
+    # the days written so far can be read before the summary is written
+    output = TrackerOutput(tmp_path)
+    assert output.days == list(range(n_days))
+    assert output.families(0) == ["epi", "humans"]
+    assert len(output) == 0
+    np.testing.assert_array_equal(output.load_series("epi", "cases"), np.arange(n_days) * 2)
+    risks = output.load_series("humans", "risk", days=[1, 3])
+    assert risks.shape == (2, n_people) and risks[1, -1] == 3
+    humans = output.load_day(2, "humans", keys=["test_result"])
+    assert list(humans) == ["test_result"] and humans["test_result"][2] == "positive"
+
+    summary = {"cases_per_day": [0, 2, 4], "humans_state": defaultdict(list, {"human:0": ["S", "E"]})}
+    writer.write_summary(summary)
+    output = TrackerOutput(tmp_path)
+    assert sorted(output) == ["cases_per_day", "humans_state"]
+    assert output.load(["humans_state"]) == {"humans_state": summary["humans_state"]}
+    with pytest.raises(KeyError):
+        output["risk_attributes"]
+
+
+def test_object_columns_are_rejected(tmp_path):
+    writer = TrackerOutputWriter(tmp_path)
+    with pytest.raises(ValueError):
+        writer.write_day(0, "humans", {"test_result": ["positive", None]})
+    # nothing is left behind by a failed write
+    assert TrackerOutput(tmp_path).days == []
+
+
+def test_shards_write_to_their_own_directory(tmp_path):
+    assert get_tracker_output_dir({"outdir": str(tmp_path)}) == os.path.join(str(tmp_path), TRACKER_OUTPUT_DIRNAME)
+    roots = [get_tracker_output_dir({"outdir": str(tmp_path), "SHARD_ID": shard_id}) for shard_id in range(2)]
+    assert roots[0] != roots[1]
+    for shard_id, root in enumerate(roots):
+        TrackerOutputWriter(root).write_day(0, "epi", {"cases": shard_id})
+    for shard_id, root in enumerate(roots):
+        assert TrackerOutput(os.path.dirname(root)).load_day(0, "epi")["cases"] == shard_id
+    # temporary files are named after the writing process, and renamed once complete
+    assert not list(tmp_path.glob("**/.*.tmp"))
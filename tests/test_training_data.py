@@ -0,0 +1,102 @@
+import datetime
+
+import numpy as np
+import zarr
+
+from covid19sim.inference.training_data import TrainingDataReader, TrainingDataWriter
+
+
+def _make_sample(rng, day_idx, human_idx):
+    n_encounters = rng.randint(0, 4)
+    return {
+        "current_day": day_idx,
+        "observed": {
+            "reported_symptoms": (rng.rand(14, 27) > 0.9).astype(float),
+            "candidate_encounters": rng.randint(0, 16, (n_encounters, 4)) if n_encounters else np.asarray([]),
+            "test_results": rng.randint(-1, 2, 14).astype(float),
+            "preexisting_conditions": (rng.rand(11) > 0.5).astype(float),
+            "age": int(rng.randint(-1, 90)),
+            "sex": int(rng.randint(-1, 3)),
+            "risk_mapping": [0.0, 0.01, 0.1],
+        },
+        "unobserved": {
+            "human_id": f"human:{human_idx}",
+            "incubation_days": rng.rand() * 10,
+            "recovery_days": rng.rand() * 20,
+            "true_symptoms": (rng.rand(14, 27) > 0.8).astype(float),
+            "is_exposed": bool(n_encounters),
+            "exposure_encounter": (rng.rand(n_encounters) > 0.5).astype(float) if n_encounters else np.asarray([]),
+            "exposure_day": 3 if n_encounters else None,
+            "is_recovered": False,
+            "recovery_day": None,
+            "infectiousness": rng.rand(rng.randint(0, 14)),
+            "true_preexisting_conditions": (rng.rand(11) > 0.5).astype(float),
+            "true_age": int(rng.randint(0, 90)),
+            "true_sex": int(rng.randint(0, 3)),
+            "viral_load_to_infectiousness_multiplier": rng.rand(),
+            "infection_timestamp": datetime.datetime(2020, 3, 1, 4) if n_encounters else None,
+            "recovered_timestamp": datetime.datetime.min,
+        },
+    }
+
+
+def _assert_sample_equal(expected, actual):
+    assert expected.keys() == actual.keys()
+    if not isinstance(expected, dict):
+        return
+    for key, value in expected.items():
+        if isinstance(value, dict):
+            _assert_sample_equal(value, actual[key])
+        elif isinstance(value, np.ndarray):
+            # empty rows keep the row shape of their field
+            assert actual[key].shape == value.shape or value.size == 0 and len(actual[key]) == 0, key
+            if value.size:
+                assert actual[key].dtype == value.dtype, key
+                np.testing.assert_allclose(actual[key], value, rtol=1e-6, err_msg=key)
+        else:
+            assert actual[key] == value, key
+
+
+def test_training_data_roundtrip(tmp_path):
+    rng = np.random.RandomState(0)
+    n_days, n_people = 3, 10
+    writer = TrainingDataWriter(zarr.open(str(tmp_path / "train.zarr"), "w"), n_days, n_people)
+    expected = {}
+    for day_idx in range(n_days):
+        for hour_idx in [0, 5]:
+            for human_idx in range(n_people):
+                if (human_idx + hour_idx) % 3:
+                    continue
+                sample = _make_sample(rng, day_idx, human_idx)
+                expected[(day_idx, hour_idx, human_idx)] = sample
+                writer.write(day_idx, hour_idx, human_idx, sample)
+
+    # samples of a timeslot which was already flushed are still stored
+    late_sample = _make_sample(rng, 0, 1)
+    expected[(0, 0, 1)] = late_sample
+    writer.write(0, 0, 1, late_sample)
+    writer.close()
+
+    reader = TrainingDataReader(str(tmp_path / "train.zarr"))
+    assert reader.root.attrs["total_samples"] == len(expected)
+    actual = {}
+    for day_idx in range(n_days):
+        for hour_idx, human_idx, sample in reader.iter_samples(day_idx):
+            actual[(day_idx, hour_idx, human_idx)] = sample
+    assert actual.keys() == expected.keys()
+    for key, sample in expected.items():
+        _assert_sample_equal(sample, actual[key])
+        _assert_sample_equal(sample, reader.get_sample(*key))
+    assert reader.get_sample(1, 1, 1) is None
+
+    # fixed-shape fields can be sliced without decoding whole samples
+    ages = reader.get_field("observed", "age", 0, 0)
+    assert ages.shape == (n_people,) and ages[3] == expected[(0, 0, 3)]["observed"]["age"]
+    assert reader.get_field("observed", "reported_symptoms", 0).shape == (24, n_people, 14, 4)
+
+    # samples without rows have the row shape and dtype of their field
+    key = next(k for k, x in expected.items() if len(x["observed"]["candidate_encounters"]) == 0)
+    stored = reader.root["observed"]["candidate_encounters"]
+    for encounters in [actual[key]["observed"]["candidate_encounters"], reader.get_ragged("observed", "candidate_encounters", *key)]:
+        assert encounters.shape == (0, 4) and encounters.dtype == np.dtype(stored.attrs["dtype"])
+        assert encounters[:, 1].shape == (0,)
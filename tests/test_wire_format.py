@@ -0,0 +1,119 @@
+import collections
+import datetime
+import pickle
+
+import numpy as np
+import pytest
+
+from covid19sim.inference.human_as_message import HumanAsMessage
+from covid19sim.inference.message_utils import UpdateMessage, create_new_uid
+from covid19sim.inference.wire_format import (
+    EncodedBatch, RequestEncoder, decode_payload, decode_reply, encode_conf, encode_reply, is_encoded,
+)
+
+START = datetime.datetime(2020, 2, 28)
+
+
+def make_human(idx, rng, n_messages=20):
+    messages = [
+        UpdateMessage(
+            uid=create_new_uid(rng) if msg_idx % 3 else None,
+            old_risk_level=int(rng.randint(16)),
+            new_risk_level=int(rng.randint(16)),
+            encounter_time=START + datetime.timedelta(days=int(rng.randint(10))),
+            update_time=START + datetime.timedelta(days=11),
+            _sender_uid=f"human:{rng.randint(100)}",
+            _receiver_uid=f"human:{idx}",
+            _real_encounter_time=START + datetime.timedelta(seconds=int(rng.randint(10 ** 6))),
+            _real_update_time=None if msg_idx % 2 else START,
+            _exposition_event=[None, True, False][msg_idx % 3],
+            _update_reason=["contact", None][msg_idx % 2],
+        )
+        for msg_idx in range(n_messages)
+    ]
+    return HumanAsMessage(
+        name=f"human:{idx}",
+        age=34,
+        sex=1,
+        obs_age=-1,
+        obs_sex=2,
+        preexisting_conditions=(rng.rand(11) > .5).astype(float),
+        obs_preexisting_conditions=np.zeros(11),
+        infectiousnesses=collections.deque(rng.rand(14)),
+        infection_timestamp=None if idx % 2 else START + datetime.timedelta(hours=5),
+        recovered_timestamp=datetime.datetime.min,
+        test_results=rng.randint(-1, 2, 14).astype(float),
+        rolling_all_symptoms=(rng.rand(14, 27) > .8).astype(float),
+        rolling_all_reported_symptoms=(rng.rand(14, 27) > .9).astype(float),
+        incubation_days=0,
+        recovery_days=None,
+        viral_load_to_infectiousness_multiplier=rng.rand(),
+        update_messages=messages,
+        carefulness=0.3,
+        has_app=True,
+        oracle_noise_random_seed=None if idx % 2 else 12,
+    )
+
+
+def make_batch(n_humans, conf, seed=0, first_idx=0):
+    rng = np.random.RandomState(seed)
+    return [
+        {"start": START, "current_day": 3, "human": make_human(idx, rng), "time_slot": 5, "conf": conf, "city_hash": 77}
+        for idx in range(first_idx, first_idx + n_humans)
+    ]
+
+
+def test_batch_roundtrip():
+    conf = {"TRACING_N_DAYS_HISTORY": 14, "RISK_MODEL": "transformer"}
+    sample = make_batch(10, conf)
+    conf_id, conf_frame = encode_conf(conf)
+    frames = EncodedBatch.encode(sample, conf_id, conf_frame).to_frames()
+    assert is_encoded(frames[0]) and len(frames) == len(sample) + 2
+    assert sum(len(frame) for frame in frames) < len(pickle.dumps(sample)) / 2
+
+    batch = EncodedBatch.from_frames(frames)
+    assert batch.conf_id == conf_id and pickle.loads(batch.conf_frame) == conf
+    assert batch.keys == ["77:" + params["human"].name for params in sample]
+    decoded = batch.decode(conf)
+    for params, decoded_params in zip(sample, decoded):
+        assert {k: v for k, v in params.items() if k != "human"} == \
+            {k: v for k, v in decoded_params.items() if k != "human"}
+        human, decoded_human = params["human"], decoded_params["human"]
+        for key in human.__dataclass_fields__:
+            value, decoded_value = getattr(human, key), getattr(decoded_human, key)
+            if key == "infectiousnesses":
+                np.testing.assert_array_equal(np.array(value), decoded_value)
+            elif isinstance(value, np.ndarray):
+                np.testing.assert_array_equal(value, decoded_value)
+                assert value.dtype == decoded_value.dtype
+            else:
+                assert value == decoded_value, key
+
+    # humans can be forwarded without being decoded
+    subset = EncodedBatch.from_frames(batch.subset([3, 5]).to_frames())
+    assert subset.conf_frame is None
+    assert [params["human"].name for params in subset.decode(conf)] == ["human:3", "human:5"]
+
+
+def test_request_encoder_sends_conf_once():
+    conf = {"TRACING_N_DAYS_HISTORY": 14}
+    encoder = RequestEncoder()
+    first, second = encoder.encode(make_batch(3, conf)), encoder.encode(make_batch(3, conf, seed=1))
+    assert EncodedBatch.from_frames(first).conf_frame is not None
+    assert EncodedBatch.from_frames(second).conf_frame is None
+    assert EncodedBatch.from_frames(second).conf_id == EncodedBatch.from_frames(first).conf_id
+    # other samples are pickled
+    assert encoder.encode(42) == [pickle.dumps(42)] and decode_payload([pickle.dumps(42)]) == 42
+    with pytest.raises(AssertionError):
+        EncodedBatch.encode([{"human": None}], "conf")
+
+
+def test_reply_roundtrip():
+    results = [("human:0", np.linspace(0, 1, 14)), ("human:1", None), ("human:2", np.ones(14))]
+    frames = encode_reply(results)
+    assert len(frames[1]) == 2 * 14 * 4  # float32
+    decoded = decode_reply(frames)
+    assert [name for name, _ in decoded] == ["human:0", "human:1", "human:2"]
+    assert decoded[1][1] is None
+    np.testing.assert_allclose(decoded[0][1], results[0][1], rtol=1e-6)
+    assert decoded[0][1].dtype == np.float32